@@ -1,3 +1,5 @@
+import array
+import collections
 import threading
 import typing
 
@@ -62,6 +64,8 @@ basic_permission_to_str_lookup = {
 
 SEARCH_RESULTS_CACHE_TIMEOUT = 4 * 3600
 
+MAX_NUM_SEARCH_RESULTS_CURSORS = 16
+
 SESSION_EXPIRY = 86400
 
 api_request_dialog_open = False
@@ -268,6 +272,8 @@ class APIPermissions( HydrusSerialisable.SerialisableBaseNamed ):
         self._last_search_results = None
         self._search_results_timeout = 0
         
+        self._cursor_keys_to_search_results = collections.OrderedDict()
+        
         self._lock = threading.Lock()
         
     
@@ -324,6 +330,25 @@ class APIPermissions( HydrusSerialisable.SerialisableBaseNamed ):
             
         
     
+    def AddSearchResultsCursor( self, hash_ids ) -> str:
+        
+        # a search's full sorted results, for paging through with a cursor. an int64 array is a lot smaller than a list when there are millions
+        
+        cursor_key = HydrusData.GenerateKey().hex()
+        
+        with self._lock:
+            
+            self._cursor_keys_to_search_results[ cursor_key ] = ( array.array( 'q', hash_ids ), HydrusTime.GetNow() + SEARCH_RESULTS_CACHE_TIMEOUT )
+            
+            while len( self._cursor_keys_to_search_results ) > MAX_NUM_SEARCH_RESULTS_CURSORS:
+                
+                self._cursor_keys_to_search_results.popitem( last = False )
+                
+            
+        
+        return '{}:0'.format( cursor_key )
+        
+    
     def CheckAtLeastOnePermission( self, permissions ):
         
         with self._lock:
@@ -495,6 +520,56 @@ class APIPermissions( HydrusSerialisable.SerialisableBaseNamed ):
             
         
     
+    def GetSearchResultsCursorPage( self, cursor: str, limit: int ):
+        
+        # the cursor says where the page starts, so asking for the same cursor again, say after a network error, gets the same page
+        
+        try:
+            
+            ( cursor_key, position ) = cursor.split( ':' )
+            
+            position = int( position )
+            
+        except:
+            
+            raise HydrusExceptions.BadRequestException( 'Sorry, I did not understand that cursor!' )
+            
+        
+        if position < 0:
+            
+            raise HydrusExceptions.BadRequestException( 'Sorry, I did not understand that cursor!' )
+            
+        
+        with self._lock:
+            
+            if cursor_key not in self._cursor_keys_to_search_results:
+                
+                raise HydrusExceptions.BadRequestException( 'It looks like those search results are no longer available--please run the search again!' )
+                
+            
+            ( hash_ids, timeout ) = self._cursor_keys_to_search_results[ cursor_key ]
+            
+            self._cursor_keys_to_search_results[ cursor_key ] = ( hash_ids, HydrusTime.GetNow() + SEARCH_RESULTS_CACHE_TIMEOUT )
+            
+            self._cursor_keys_to_search_results.move_to_end( cursor_key )
+            
+            page_hash_ids = hash_ids[ position : position + limit ].tolist()
+            
+            next_position = position + limit
+            
+            if next_position < len( hash_ids ):
+                
+                next_cursor = '{}:{}'.format( cursor_key, next_position )
+                
+            else:
+                
+                next_cursor = None
+                
+            
+            return ( page_hash_ids, next_cursor, len( hash_ids ) )
+            
+        
+    
     def HasPermission( self, permission ):
         
         with self._lock:
@@ -512,6 +587,14 @@ class APIPermissions( HydrusSerialisable.SerialisableBaseNamed ):
                 self._last_search_results = None
                 
             
+            for ( cursor_key, ( hash_ids, timeout ) ) in list( self._cursor_keys_to_search_results.items() ):
+                
+                if HydrusTime.TimeHasPassed( timeout ):
+                    
+                    del self._cursor_keys_to_search_results[ cursor_key ]
+                    
+                
+            
         
     
     def PermitsEverything( self ):
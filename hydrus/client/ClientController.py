@@ -40,6 +40,7 @@ from hydrus.client.files import ClientFilesManager
 from hydrus.client.gui import ClientGUIDialogsMessage
 from hydrus.client.gui import ClientGUISplash
 from hydrus.client.gui import QtPorting as QP
+from hydrus.client.importing import ClientImportFiles
 
 if not HG.twisted_is_broke:
     
@@ -372,6 +373,8 @@ class Controller( HydrusController.HydrusController ):
                 
             
         
+        ClientImportFiles.ShutdownFileImportWorkerPool()
+        
     
     @staticmethod
     def instance() -> 'Controller':
@@ -1212,6 +1215,7 @@ class Controller( HydrusController.HydrusController ):
         
         self.frame_splash_status.SetSubtext( 'image caches' )
         
+        self.render_disk_cache = ClientCaches.RenderDiskCache( self, os.path.join( self.db_dir, 'client_render_cache' ) )
         self.images_cache = ClientCaches.ImageRendererCache( self )
         self.image_tiles_cache = ClientCaches.ImageTileCache( self )
         self.thumbnails_cache = ClientCaches.ThumbnailCache( self )
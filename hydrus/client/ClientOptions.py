@@ -207,6 +207,7 @@ class ClientOptions( HydrusSerialisable.SerialisableBase ):
             'file_viewing_statistics_active_on_dupe_filter' : False,
             'prefix_hash_when_copying' : False,
             'file_system_waits_on_wakeup' : False,
+            'store_thumbnails_in_pack_files' : False,
             'show_system_everything' : True,
             'watch_clipboard_for_watcher_urls' : False,
             'watch_clipboard_for_other_recognised_urls' : False,
@@ -462,6 +463,7 @@ class ClientOptions( HydrusSerialisable.SerialisableBase ):
             'thumbnail_border' : 1,
             'thumbnail_margin' : 2,
             'thumbnail_dpr_percent' : 100,
+            'file_import_worker_processes' : 0,
             'file_maintenance_idle_throttle_files' : 1,
             'file_maintenance_idle_throttle_time_delta' : 2,
             'file_maintenance_active_throttle_files' : 1,
@@ -488,6 +490,7 @@ class ClientOptions( HydrusSerialisable.SerialisableBase ):
             'repository_processing_rest_percentage_idle' : 5,
             'repository_processing_work_time_ms_normal' : 500,
             'repository_processing_rest_percentage_normal' : 10,
+            'repository_processing_num_updates_to_prefetch' : 2,
             'tag_display_processing_work_time_ms_idle' : 15000,
             'tag_display_processing_rest_percentage_idle' : 3,
             'tag_display_processing_work_time_ms_normal' : 100,
@@ -546,7 +549,8 @@ class ClientOptions( HydrusSerialisable.SerialisableBase ):
             'slideshow_short_duration_cutoff_percentage' : 75,
             'slideshow_long_duration_overspill_percentage' : 50,
             'num_to_show_in_ac_dropdown_children_tab' : 40,
-            'number_of_unselected_medias_to_present_tags_for' : 4096
+            'number_of_unselected_medias_to_present_tags_for' : 4096,
+            'render_disk_cache_size' : None
         }
         
         #
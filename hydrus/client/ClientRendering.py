@@ -423,6 +423,28 @@ class ImageRenderer( ClientCachesBase.CacheableObject ):
         return qt_image
         
     
+    def GetNumPyTile( self, clip_rect: QC.QRect, target_resolution: QC.QSize ):
+        
+        # the raw pixels for a tile, for anything that wants to keep them around outside of Qt
+        # if we have a colour profile, the final pixels only exist after Qt has done its conversion, so we return None
+        
+        if self._icc_profile_bytes is not None or self._render_failed:
+            
+            return None
+            
+        
+        ( my_width, my_height ) = self._resolution
+        
+        my_full_rect = QC.QRect( 0, 0, my_width, my_height )
+        
+        if not my_full_rect.contains( clip_rect ):
+            
+            return None
+            
+        
+        return self._GetNumPyImage( clip_rect, target_resolution )
+        
+    
     def GetQtPixmap( self, clip_rect = None, target_resolution = None ):
         
         # colourspace conversions seem to be exclusively QImage territory
@@ -1,6 +1,9 @@
+import collections
+import concurrent.futures
 import hashlib
 from io import BytesIO
 import json
+import queue
 import random
 import threading
 import time
@@ -11,11 +14,13 @@ from hydrus.core import HydrusConstants as HC
 from hydrus.core import HydrusData
 from hydrus.core import HydrusExceptions
 from hydrus.core import HydrusGlobals as HG
+from hydrus.core import HydrusLists
 from hydrus.core import HydrusNumbers
 from hydrus.core import HydrusSerialisable
 from hydrus.core import HydrusTags
 from hydrus.core import HydrusTime
 from hydrus.core.networking import HydrusNetwork
+from hydrus.core.networking import HydrusNetworkBinaryUpdates
 from hydrus.core.networking import HydrusNetworkVariableHandling
 from hydrus.core.networking import HydrusNetworking
 
@@ -1516,6 +1521,318 @@ class ServiceRestricted( ServiceRemote ):
             
         
     
+def PrepareRepositoryUpdateForProcessing( update_hash: bytes, update_mime: int, content_types ):
+    
+    # this does the file read and gets the update ready to iterate, so the db thread does not wait on disk
+    # a binary update is only a reader here, and its sections are decoded a block at a time as rows are pulled, so we never hold a whole update's rows
+    # when we are prefetching, a prefetch worker does that pulling a little ahead of the db--see DecodeAheadIterator
+    # an old json update is parsed in full, as it always was, but that now happens in the prefetch thread
+    
+    update_path = CG.client_controller.client_files_manager.GetFilePath( update_hash, update_mime )
+    
+    with open( update_path, 'rb' ) as f:
+        
+        update_network_bytes = f.read()
+        
+    
+    try:
+        
+        update = HydrusNetworkBinaryUpdates.CreateUpdateFromNetworkBytes( update_network_bytes, streaming = True )
+        
+        if update_mime == HC.APPLICATION_HYDRUS_UPDATE_DEFINITIONS:
+            
+            if not isinstance( update, ( HydrusNetwork.DefinitionsUpdate, HydrusNetworkBinaryUpdates.BinaryDefinitionsUpdateReader ) ):
+                
+                raise HydrusExceptions.UnsupportedFileException( 'Not a definitions update!' )
+                
+            
+            num_rows = update.GetNumRows()
+            
+            iterator_dict = {
+                'service_hash_ids_to_hashes' : iter( update.IterateHashIdsToHashes() ),
+                'service_tag_ids_to_tags' : iter( update.IterateTagIdsToTags() )
+            }
+            
+        else:
+            
+            if not isinstance( update, ( HydrusNetwork.ContentUpdate, HydrusNetworkBinaryUpdates.BinaryContentUpdateReader ) ):
+                
+                raise HydrusExceptions.UnsupportedFileException( 'Not a content update!' )
+                
+            
+            num_rows = update.GetNumRows( content_types )
+            
+            iterator_dict = {}
+            
+            if HC.CONTENT_TYPE_FILES in content_types:
+                
+                iterator_dict[ 'new_files' ] = iter( update.GetNewFiles() )
+                iterator_dict[ 'deleted_files' ] = iter( update.GetDeletedFiles() )
+                
+            
+            if HC.CONTENT_TYPE_MAPPINGS in content_types:
+                
+                iterator_dict[ 'new_mappings' ] = HydrusData.SmoothOutMappingIterator( update.GetNewMappings(), 50 )
+                iterator_dict[ 'deleted_mappings' ] = HydrusData.SmoothOutMappingIterator( update.GetDeletedMappings(), 50 )
+                
+            
+            if HC.CONTENT_TYPE_TAG_PARENTS in content_types:
+                
+                iterator_dict[ 'new_parents' ] = iter( update.GetNewTagParents() )
+                iterator_dict[ 'deleted_parents' ] = iter( update.GetDeletedTagParents() )
+                
+            
+            if HC.CONTENT_TYPE_TAG_SIBLINGS in content_types:
+                
+                iterator_dict[ 'new_siblings' ] = iter( update.GetNewTagSiblings() )
+                iterator_dict[ 'deleted_siblings' ] = iter( update.GetDeletedTagSiblings() )
+                
+            
+        
+    except HydrusExceptions.UnsupportedFileException:
+        
+        raise
+        
+    except Exception as e:
+        
+        raise HydrusExceptions.SerialisationException( 'Could not parse update {}: {}'.format( update_hash.hex(), e ) )
+        
+    
+    return ( num_rows, iterator_dict )
+    
+
+# a decode-ahead section holds at most this many chunks of this many rows
+DECODE_AHEAD_CHUNK_SIZE = 256
+DECODE_AHEAD_MAX_CHUNKS = 4
+
+class DecodeAheadIterator( object ):
+    
+    # a prefetch worker pulls rows out of a lazy update section and puts them in a small queue, and the db thread iterates that queue
+    # so the decompress and parse happens off the db thread, but we never hold more than a few chunks of an update in memory
+    
+    def __init__( self, iterator, cancel_event: threading.Event ):
+        
+        self._iterator = iterator
+        self._cancel_event = cancel_event
+        
+        self._queue = queue.Queue( maxsize = DECODE_AHEAD_MAX_CHUNKS )
+        
+        self._current_chunk = collections.deque()
+        self._done = False
+        
+    
+    def __iter__( self ):
+        
+        return self
+        
+    
+    def __next__( self ):
+        
+        while len( self._current_chunk ) == 0:
+            
+            if self._done:
+                
+                raise StopIteration()
+                
+            
+            item = self._Get()
+            
+            if item is None:
+                
+                self._done = True
+                
+            elif isinstance( item, Exception ):
+                
+                self._done = True
+                
+                raise item
+                
+            else:
+                
+                self._current_chunk = collections.deque( item )
+                
+            
+        
+        return self._current_chunk.popleft()
+        
+    
+    def _Get( self ):
+        
+        while True:
+            
+            try:
+                
+                return self._queue.get( timeout = 1.0 )
+                
+            except queue.Empty:
+                
+                if self._cancel_event.is_set():
+                    
+                    raise HydrusExceptions.CancelledException( 'Update prefetch was cancelled!' )
+                    
+                
+            
+        
+    
+    def _Put( self, item ) -> bool:
+        
+        while not self._cancel_event.is_set():
+            
+            try:
+                
+                self._queue.put( item, timeout = 1.0 )
+                
+                return True
+                
+            except queue.Full:
+                
+                continue
+                
+            
+        
+        return False
+        
+    
+    def Fill( self ):
+        
+        # returns False if we were cancelled partway through
+        
+        try:
+            
+            while True:
+                
+                chunk = HydrusLists.PullNFromIterator( self._iterator, DECODE_AHEAD_CHUNK_SIZE )
+                
+                if len( chunk ) == 0:
+                    
+                    break
+                    
+                
+                if not self._Put( chunk ):
+                    
+                    return False
+                    
+                
+            
+            return self._Put( None )
+            
+        except Exception as e:
+            
+            return self._Put( e )
+            
+        
+    
+
+def PrepareAndDecodeRepositoryUpdateAhead( result_future: concurrent.futures.Future, cancel_event: threading.Event, update_hash: bytes, update_mime: int, content_types ):
+    
+    if not result_future.set_running_or_notify_cancel():
+        
+        return
+        
+    
+    try:
+        
+        ( num_rows, iterator_dict ) = PrepareRepositoryUpdateForProcessing( update_hash, update_mime, content_types )
+        
+    except Exception as e:
+        
+        result_future.set_exception( e )
+        
+        return
+        
+    
+    decode_ahead_iterator_dict = { name : DecodeAheadIterator( iterator, cancel_event ) for ( name, iterator ) in iterator_dict.items() }
+    
+    result_future.set_result( ( num_rows, decode_ahead_iterator_dict ) )
+    
+    # the db works through the sections in the order we made them, so we fill them in that order
+    # this worker stays on this update until it is all decoded, which is fine since the db only ever waits on the oldest update, and that one always got a worker first
+    
+    for decode_ahead_iterator in decode_ahead_iterator_dict.values():
+        
+        if not decode_ahead_iterator.Fill():
+            
+            return
+            
+        
+    
+
+class RepositoryUpdatePrefetcher( object ):
+    
+    def __init__( self, jobs, num_to_prefetch: int ):
+        
+        # jobs is a list of ( update_hash, update_mime, content_types ), in processing order
+        
+        self._jobs = collections.deque( jobs )
+        self._num_to_prefetch = num_to_prefetch
+        
+        self._futures = collections.deque()
+        
+        self._cancel_event = threading.Event()
+        
+        self._executor = None
+        
+        if self._num_to_prefetch > 0:
+            
+            self._executor = concurrent.futures.ThreadPoolExecutor( max_workers = self._num_to_prefetch, thread_name_prefix = 'repository update prefetch' )
+            
+            self._TopUp()
+            
+        
+    
+    def _TopUp( self ):
+        
+        # at most num_to_prefetch updates are waiting here, on top of the one the caller is working through
+        
+        while len( self._futures ) < self._num_to_prefetch and len( self._jobs ) > 0:
+            
+            ( update_hash, update_mime, content_types ) = self._jobs.popleft()
+            
+            future = concurrent.futures.Future()
+            
+            self._executor.submit( PrepareAndDecodeRepositoryUpdateAhead, future, self._cancel_event, update_hash, update_mime, content_types )
+            
+            self._futures.append( future )
+            
+        
+    
+    def GetNext( self ):
+        
+        if self._executor is None:
+            
+            ( update_hash, update_mime, content_types ) = self._jobs.popleft()
+            
+            return PrepareRepositoryUpdateForProcessing( update_hash, update_mime, content_types )
+            
+        
+        future = self._futures.popleft()
+        
+        self._TopUp()
+        
+        return future.result()
+        
+    
+    def Shutdown( self ):
+        
+        self._jobs.clear()
+        
+        # stops any worker that is still decoding ahead, including for the update the caller was working on
+        self._cancel_event.set()
+        
+        if self._executor is not None:
+            
+            for future in self._futures:
+                
+                future.cancel()
+                
+            
+            self._futures.clear()
+            
+            self._executor.shutdown( wait = False, cancel_futures = True )
+            
+        
+    
+
 class ServiceRepository( ServiceRestricted ):
     
     def __init__( self, service_key, service_type, name, dictionary = None ):
@@ -1835,7 +2152,7 @@ class ServiceRepository( ServiceRestricted ):
                     
                     try:
                         
-                        update = HydrusSerialisable.CreateFromNetworkBytes( update_network_string )
+                        update = HydrusNetworkBinaryUpdates.CreateUpdateFromNetworkBytes( update_network_string )
                         
                     except Exception as e:
                         
@@ -1963,8 +2280,12 @@ class ServiceRepository( ServiceRestricted ):
             did_definition_analyze = False
             did_content_analyze = False
             
+            num_updates_to_prefetch = CG.client_controller.new_options.GetInteger( 'repository_processing_num_updates_to_prefetch' )
+            
             definition_start_time = HydrusTime.GetNowPrecise()
             
+            definitions_prefetcher = RepositoryUpdatePrefetcher( [ ( definition_hash, HC.APPLICATION_HYDRUS_UPDATE_DEFINITIONS, content_types ) for ( definition_hash, content_types ) in definition_hashes_and_content_types ], num_updates_to_prefetch )
+            
             try:
                 
                 for ( definition_hash, content_types ) in definition_hashes_and_content_types:
@@ -1982,7 +2303,7 @@ class ServiceRepository( ServiceRestricted ):
                     
                     try:
                         
-                        update_path = CG.client_controller.client_files_manager.GetFilePath( definition_hash, HC.APPLICATION_HYDRUS_UPDATE_DEFINITIONS )
+                        ( rows_in_this_update, iterator_dict ) = definitions_prefetcher.GetNext()
                         
                     except HydrusExceptions.FileMissingException:
                         
@@ -1990,38 +2311,21 @@ class ServiceRepository( ServiceRestricted ):
                         
                         raise Exception( 'An unusual error has occured during repository processing: a definition update file ({}) was missing. Your repository should be paused, and all update files have been scheduled for a presence check. I recommend you run _database->maintenance->clear/fix orphan file records_ too. Please then permit file maintenance under _database->file maintenance->manage scheduled jobs_ to finish its new work, which should fix this, before unpausing your repository.'.format( definition_hash.hex() ) )
                         
-                    
-                    with open( update_path, 'rb' ) as f:
-                        
-                        update_network_bytes = f.read()
+                    except HydrusExceptions.UnsupportedFileException:
                         
-                    
-                    try:
+                        CG.client_controller.WriteSynchronous( 'schedule_repository_update_file_maintenance', self._service_key, ClientFilesMaintenance.REGENERATE_FILE_DATA_JOB_FILE_METADATA )
                         
-                        definition_update = HydrusSerialisable.CreateFromNetworkBytes( update_network_bytes )
+                        raise Exception( 'An unusual error has occured during repository processing: a definition update file ({}) has incorrect metadata. Your repository should be paused, and all update files have been scheduled for a metadata rescan. Please permit file maintenance under _database->file maintenance->manage scheduled jobs_ to finish its new work, which should fix this, before unpausing your repository.'.format( definition_hash.hex() ) )
                         
-                    except:
+                    except HydrusExceptions.SerialisationException:
                         
                         CG.client_controller.WriteSynchronous( 'schedule_repository_update_file_maintenance', self._service_key, ClientFilesMaintenance.REGENERATE_FILE_DATA_JOB_FILE_INTEGRITY_DATA_REMOVE_RECORD )
                         
                         raise Exception( 'An unusual error has occured during repository processing: a definition update file ({}) was invalid. Your repository should be paused, and all update files have been scheduled for an integrity check. Please permit file maintenance under _database->file maintenance->manage scheduled jobs_ to finish its new work, which should fix this, before unpausing your repository.'.format( definition_hash.hex() ) )
                         
                     
-                    if not isinstance( definition_update, HydrusNetwork.DefinitionsUpdate ):
-                        
-                        CG.client_controller.WriteSynchronous( 'schedule_repository_update_file_maintenance', self._service_key, ClientFilesMaintenance.REGENERATE_FILE_DATA_JOB_FILE_METADATA )
-                        
-                        raise Exception( 'An unusual error has occured during repository processing: a definition update file ({}) has incorrect metadata. Your repository should be paused, and all update files have been scheduled for a metadata rescan. Please permit file maintenance under _database->file maintenance->manage scheduled jobs_ to finish its new work, which should fix this, before unpausing your repository.'.format( definition_hash.hex() ) )
-                        
-                    
-                    rows_in_this_update = definition_update.GetNumRows()
                     rows_done_in_this_update = 0
                     
-                    iterator_dict = {}
-                    
-                    iterator_dict[ 'service_hash_ids_to_hashes' ] = iter( definition_update.GetHashIdsToHashes().items() )
-                    iterator_dict[ 'service_tag_ids_to_tags' ] = iter( definition_update.GetTagIdsToTags().items() )
-                    
                     while len( iterator_dict ) > 0:
                         
                         this_work_start_time = HydrusTime.GetNowPrecise()
@@ -2084,6 +2388,8 @@ class ServiceRepository( ServiceRestricted ):
                 
             finally:
                 
+                definitions_prefetcher.Shutdown()
+                
                 self._LogFinalRowSpeed( definition_start_time, total_definition_rows_completed, 'definitions' )
                 
             
@@ -2094,6 +2400,8 @@ class ServiceRepository( ServiceRestricted ):
             
             content_start_time = HydrusTime.GetNowPrecise()
             
+            content_prefetcher = RepositoryUpdatePrefetcher( [ ( content_hash, HC.APPLICATION_HYDRUS_UPDATE_CONTENT, content_types ) for ( content_hash, content_types ) in content_hashes_and_content_types ], num_updates_to_prefetch )
+            
             try:
                 
                 for ( content_hash, content_types ) in content_hashes_and_content_types:
@@ -2111,7 +2419,7 @@ class ServiceRepository( ServiceRestricted ):
                     
                     try:
                         
-                        update_path = CG.client_controller.client_files_manager.GetFilePath( content_hash, HC.APPLICATION_HYDRUS_UPDATE_CONTENT )
+                        ( rows_in_this_update, iterator_dict ) = content_prefetcher.GetNext()
                         
                     except HydrusExceptions.FileMissingException:
                         
@@ -2119,59 +2427,21 @@ class ServiceRepository( ServiceRestricted ):
                         
                         raise Exception( 'An unusual error has occured during repository processing: a content update file ({}) was missing. Your repository should be paused, and all update files have been scheduled for a presence check. I recommend you run _database->maintenance->clear/fix orphan file records_ too. Please then permit file maintenance under _database->file maintenance->manage scheduled jobs_ to finish its new work, which should fix this, before unpausing your repository.'.format( content_hash.hex() ) )
                         
-                    
-                    with open( update_path, 'rb' ) as f:
+                    except HydrusExceptions.UnsupportedFileException:
                         
-                        update_network_bytes = f.read()
-                        
-                    
-                    try:
+                        CG.client_controller.WriteSynchronous( 'schedule_repository_update_file_maintenance', self._service_key, ClientFilesMaintenance.REGENERATE_FILE_DATA_JOB_FILE_METADATA )
                         
-                        content_update = HydrusSerialisable.CreateFromNetworkBytes( update_network_bytes )
+                        raise Exception( 'An unusual error has occured during repository processing: a content update file ({}) has incorrect metadata. Your repository should be paused, and all update files have been scheduled for a metadata rescan. Please permit file maintenance under _database->file maintenance->manage scheduled jobs_ to finish its new work, which should fix this, before unpausing your repository.'.format( content_hash.hex() ) )
                         
-                    except:
+                    except HydrusExceptions.SerialisationException:
                         
                         CG.client_controller.WriteSynchronous( 'schedule_repository_update_file_maintenance', self._service_key, ClientFilesMaintenance.REGENERATE_FILE_DATA_JOB_FILE_INTEGRITY_DATA_REMOVE_RECORD )
                         
                         raise Exception( 'An unusual error has occured during repository processing: a content update file ({}) was invalid. Your repository should be paused, and all update files have been scheduled for an integrity check. Please permit file maintenance under _database->file maintenance->manage scheduled jobs_ to finish its new work, which should fix this, before unpausing your repository.'.format( content_hash.hex() ) )
                         
                     
-                    if not isinstance( content_update, HydrusNetwork.ContentUpdate ):
-                        
-                        CG.client_controller.WriteSynchronous( 'schedule_repository_update_file_maintenance', self._service_key, ClientFilesMaintenance.REGENERATE_FILE_DATA_JOB_FILE_METADATA )
-                        
-                        raise Exception( 'An unusual error has occured during repository processing: a content update file ({}) has incorrect metadata. Your repository should be paused, and all update files have been scheduled for a metadata rescan. Please permit file maintenance under _database->file maintenance->manage scheduled jobs_ to finish its new work, which should fix this, before unpausing your repository.'.format( content_hash.hex() ) )
-                        
-                    
-                    rows_in_this_update = content_update.GetNumRows( content_types )
                     rows_done_in_this_update = 0
                     
-                    iterator_dict = {}
-                    
-                    if HC.CONTENT_TYPE_FILES in content_types:
-                        
-                        iterator_dict[ 'new_files' ] = iter( content_update.GetNewFiles() )
-                        iterator_dict[ 'deleted_files' ] = iter( content_update.GetDeletedFiles() )
-                        
-                    
-                    if HC.CONTENT_TYPE_MAPPINGS in content_types:
-                        
-                        iterator_dict[ 'new_mappings' ] = HydrusData.SmoothOutMappingIterator( content_update.GetNewMappings(), 50 )
-                        iterator_dict[ 'deleted_mappings' ] = HydrusData.SmoothOutMappingIterator( content_update.GetDeletedMappings(), 50 )
-                        
-                    
-                    if HC.CONTENT_TYPE_TAG_PARENTS in content_types:
-                        
-                        iterator_dict[ 'new_parents' ] = iter( content_update.GetNewTagParents() )
-                        iterator_dict[ 'deleted_parents' ] = iter( content_update.GetDeletedTagParents() )
-                        
-                    
-                    if HC.CONTENT_TYPE_TAG_SIBLINGS in content_types:
-                        
-                        iterator_dict[ 'new_siblings' ] = iter( content_update.GetNewTagSiblings() )
-                        iterator_dict[ 'deleted_siblings' ] = iter( content_update.GetDeletedTagSiblings() )
-                        
-                    
                     while len( iterator_dict ) > 0:
                         
                         this_work_start_time = HydrusTime.GetNowPrecise()
@@ -2234,6 +2504,8 @@ class ServiceRepository( ServiceRestricted ):
                 
             finally:
                 
+                content_prefetcher.Shutdown()
+                
                 self._LogFinalRowSpeed( content_start_time, total_content_rows_completed, 'content rows' )
                 
             
@@ -2433,6 +2705,15 @@ class ServiceRepository( ServiceRestricted ):
             
         
     
+    def GetUpdateFormat( self ) -> int:
+        
+        with self._lock:
+            
+            # older servers do not have this option and only ever send json
+            return self._service_options.get( 'update_format', HydrusNetwork.UPDATE_FORMAT_JSON )
+            
+        
+    
     def GetUpdatePeriod( self ) -> int:
         
         with self._lock:
@@ -1,13 +1,18 @@
 import collections
 import json
+import numpy
+import os
 import threading
 import time
+import typing
 
 from hydrus.core import HydrusConstants as HC
 from hydrus.core import HydrusExceptions
 from hydrus.core import HydrusThreading
 from hydrus.core import HydrusData
 from hydrus.core import HydrusGlobals as HG
+from hydrus.core import HydrusPaths
+from hydrus.core import HydrusTemp
 from hydrus.core import HydrusTime
 from hydrus.core.files import HydrusFileHandling
 from hydrus.core.files.images import HydrusBlurhash
@@ -126,6 +131,418 @@ class ParsingCache( object ):
         
     
 
+class RenderDiskCache( object ):
+    
+    # a persistent second tier behind the image tile cache and the Client API's rendered files
+    # everything in here is derived from a file's content, which never changes for a hash, so nothing goes stale. we just throw the least recently used stuff out when we hit the size limit
+    
+    def __init__( self, controller: "CG.ClientController.Controller", cache_dir: str ):
+        
+        self._controller = controller
+        self._cache_dir = cache_dir
+        
+        self._size_limit = self._controller.new_options.GetNoneableInteger( 'render_disk_cache_size' )
+        
+        self._keys_to_sizes = collections.OrderedDict()
+        self._total_size = 0
+        
+        self._initialised = False
+        self._initialising = False
+        
+        self._num_hits = 0
+        self._num_misses = 0
+        self._num_evictions = 0
+        
+        self._lock = threading.Lock()
+        
+        self._StartInitialisation()
+        
+        self._controller.sub( self, 'NotifyNewOptions', 'notify_new_options' )
+        self._controller.sub( self, 'DeleteHashes', 'clear_render_disk_cache' )
+        
+    
+    def _Delete( self, key ):
+        
+        if key not in self._keys_to_sizes:
+            
+            return
+            
+        
+        size = self._keys_to_sizes.pop( key )
+        
+        self._total_size -= size
+        
+        try:
+            
+            os.remove( self._GetPath( key ) )
+            
+        except FileNotFoundError:
+            
+            pass
+            
+        
+    
+    def _EvictToSize( self ):
+        
+        if self._size_limit is None:
+            
+            return
+            
+        
+        while self._total_size > self._size_limit and len( self._keys_to_sizes ) > 0:
+            
+            deletee_key = next( iter( self._keys_to_sizes ) )
+            
+            self._Delete( deletee_key )
+            
+            self._num_evictions += 1
+            
+        
+    
+    def _GetPath( self, key ):
+        
+        ( hash, variant ) = key
+        
+        hash_hex = hash.hex()
+        
+        return os.path.join( self._cache_dir, hash_hex[:2], '{}_{}'.format( hash_hex, variant ) )
+        
+    
+    def _Initialise( self ):
+        
+        # we use mtime as 'last accessed', so the least recently used order survives a restart
+        
+        keys_sizes_and_times = []
+        
+        try:
+            
+            HydrusPaths.MakeSureDirectoryExists( self._cache_dir )
+            
+            for prefix_entry in os.scandir( self._cache_dir ):
+                
+                if not prefix_entry.is_dir():
+                    
+                    continue
+                    
+                
+                for entry in os.scandir( prefix_entry.path ):
+                    
+                    ( hash_hex, underscore, variant ) = entry.name.partition( '_' )
+                    
+                    if entry.name.endswith( '.tmp' ):
+                        
+                        # left over from a write that never finished
+                        
+                        try:
+                            
+                            os.remove( entry.path )
+                            
+                        except:
+                            
+                            pass
+                            
+                        
+                        continue
+                        
+                    
+                    if variant == '':
+                        
+                        continue
+                        
+                    
+                    try:
+                        
+                        hash = bytes.fromhex( hash_hex )
+                        
+                        stat_result = entry.stat()
+                        
+                    except:
+                        
+                        continue
+                        
+                    
+                    keys_sizes_and_times.append( ( ( hash, variant ), stat_result.st_size, stat_result.st_mtime ) )
+                    
+                
+            
+        except Exception as e:
+            
+            HydrusData.Print( 'Could not load the render disk cache at "{}"! Error follows:'.format( self._cache_dir ) )
+            
+            HydrusData.PrintException( e, do_wait = False )
+            
+            with self._lock:
+                
+                self._initialising = False
+                
+            
+            return
+            
+        
+        keys_sizes_and_times.sort( key = lambda row: row[2] )
+        
+        with self._lock:
+            
+            for ( key, size, mtime ) in keys_sizes_and_times:
+                
+                self._keys_to_sizes[ key ] = size
+                self._total_size += size
+                
+            
+            self._initialised = True
+            self._initialising = False
+            
+            self._EvictToSize()
+            
+        
+    
+    def _IsEnabled( self ):
+        
+        return self._initialised and self._size_limit is not None
+        
+    
+    def _StartInitialisation( self ):
+        
+        if self._size_limit is not None and not self._initialised and not self._initialising:
+            
+            self._initialising = True
+            
+            self._controller.CallToThread( self._Initialise )
+            
+        
+    
+    def AddData( self, hash: bytes, variant: str, data: bytes ):
+        
+        key = ( hash, variant )
+        
+        with self._lock:
+            
+            if not self._IsEnabled() or key in self._keys_to_sizes:
+                
+                return
+                
+            
+            path = self._GetPath( key )
+            
+        
+        # write outside the lock, to a unique temp path so nothing ever sees half a file and two writers of the same key can't trample each other
+        
+        temp_path = None
+        
+        try:
+            
+            HydrusPaths.MakeSureDirectoryExists( os.path.dirname( path ) )
+            
+            ( os_file_handle, temp_path ) = HydrusTemp.GetTempPath( suffix = '.tmp', dir = os.path.dirname( path ) )
+            
+            with os.fdopen( os_file_handle, 'wb' ) as f:
+                
+                f.write( data )
+                
+            
+            os.replace( temp_path, path )
+            
+        except Exception as e:
+            
+            if temp_path is not None and os.path.exists( temp_path ):
+                
+                try:
+                    
+                    os.remove( temp_path )
+                    
+                except:
+                    
+                    pass
+                    
+                
+            
+            HydrusData.Print( 'Could not write to the render disk cache at "{}"! Error follows:'.format( path ) )
+            
+            HydrusData.PrintException( e, do_wait = False )
+            
+            return
+            
+        
+        with self._lock:
+            
+            if key not in self._keys_to_sizes:
+                
+                self._keys_to_sizes[ key ] = len( data )
+                self._total_size += len( data )
+                
+            
+            self._EvictToSize()
+            
+        
+    
+    def AddNumPyImage( self, hash: bytes, variant: str, numpy_image: numpy.ndarray ):
+        
+        # png at the fastest compression level is a good trade here--lossless, quick to decode, and about a third the size of the raw pixels
+        
+        data = HydrusImageHandling.GenerateFileBytesForRenderAPI( numpy_image, HC.IMAGE_PNG, 1 )
+        
+        self.AddData( hash, variant, data )
+        
+    
+    def Clear( self ):
+        
+        with self._lock:
+            
+            for key in list( self._keys_to_sizes.keys() ):
+                
+                self._Delete( key )
+                
+            
+        
+    
+    def DeleteData( self, hash: bytes, variant: str ):
+        
+        with self._lock:
+            
+            self._Delete( ( hash, variant ) )
+            
+        
+    
+    def DeleteHashes( self, hashes ):
+        
+        with self._lock:
+            
+            hashes = set( hashes )
+            
+            deletee_keys = [ key for key in self._keys_to_sizes.keys() if key[0] in hashes ]
+            
+            for key in deletee_keys:
+                
+                self._Delete( key )
+                
+            
+        
+    
+    def GetData( self, hash: bytes, variant: str ) -> typing.Optional[ bytes ]:
+        
+        key = ( hash, variant )
+        
+        with self._lock:
+            
+            if not self._IsEnabled():
+                
+                return None
+                
+            
+            if key not in self._keys_to_sizes:
+                
+                self._num_misses += 1
+                
+                return None
+                
+            
+            path = self._GetPath( key )
+            
+        
+        try:
+            
+            with open( path, 'rb' ) as f:
+                
+                data = f.read()
+                
+            
+            os.utime( path )
+            
+        except:
+            
+            # someone cleared the folder under us or similar
+            
+            with self._lock:
+                
+                self._Delete( key )
+                
+                self._num_misses += 1
+                
+            
+            return None
+            
+        
+        with self._lock:
+            
+            if key in self._keys_to_sizes:
+                
+                self._keys_to_sizes.move_to_end( key )
+                
+            
+            self._num_hits += 1
+            
+        
+        return data
+        
+    
+    def GetNumPyImage( self, hash: bytes, variant: str ) -> typing.Optional[ numpy.ndarray ]:
+        
+        data = self.GetData( hash, variant )
+        
+        if data is None:
+            
+            return None
+            
+        
+        try:
+            
+            return HydrusImageHandling.GenerateNumPyImageFromBytes( data, HC.IMAGE_PNG )
+            
+        except Exception as e:
+            
+            self.DeleteData( hash, variant )
+            
+            return None
+            
+        
+    
+    def GetStatistics( self ) -> dict:
+        
+        with self._lock:
+            
+            return {
+                'name' : 'render disk cache',
+                'eviction_policy' : 'least recently used',
+                'hits' : self._num_hits,
+                'misses' : self._num_misses,
+                'evictions' : self._num_evictions,
+                'expirations' : 0,
+                'num_items' : len( self._keys_to_sizes ),
+                'size' : self._total_size,
+                'size_limit' : 0 if self._size_limit is None else self._size_limit
+            }
+            
+        
+    
+    def HasData( self, hash: bytes, variant: str ) -> bool:
+        
+        with self._lock:
+            
+            return self._IsEnabled() and ( hash, variant ) in self._keys_to_sizes
+            
+        
+    
+    def IsEnabled( self ) -> bool:
+        
+        with self._lock:
+            
+            return self._IsEnabled()
+            
+        
+    
+    def NotifyNewOptions( self ):
+        
+        with self._lock:
+            
+            self._size_limit = self._controller.new_options.GetNoneableInteger( 'render_disk_cache_size' )
+            
+            self._EvictToSize()
+            
+            self._StartInitialisation()
+            
+        
+    
+
 class ImageRendererCache( object ):
     
     def __init__( self, controller: "CG.ClientController.Controller" ):
@@ -135,7 +552,7 @@ class ImageRendererCache( object ):
         cache_size = self._controller.new_options.GetInteger( 'image_cache_size' )
         cache_timeout = self._controller.new_options.GetInteger( 'image_cache_timeout' )
         
-        self._data_cache = ClientCachesBase.DataCache( self._controller, 'image cache', cache_size, timeout = cache_timeout )
+        self._data_cache = ClientCachesBase.DataCache( self._controller, 'image cache', cache_size, timeout = cache_timeout, cache_eviction_policy_type = ClientCachesBase.CACHE_EVICTION_POLICY_W_TINYLFU )
         
         self._controller.sub( self, 'NotifyNewOptions', 'notify_new_options' )
         self._controller.sub( self, 'Clear', 'clear_image_cache' )
@@ -175,6 +592,11 @@ class ImageRendererCache( object ):
         return image_renderer
         
     
+    def GetStatistics( self ) -> dict:
+        
+        return self._data_cache.GetStatistics()
+        
+    
     def HasImageRenderer( self, hash ) -> bool:
         
         key = hash
@@ -213,7 +635,7 @@ class ImageTileCache( object ):
         cache_size = self._controller.new_options.GetInteger( 'image_tile_cache_size' )
         cache_timeout = self._controller.new_options.GetInteger( 'image_tile_cache_timeout' )
         
-        self._data_cache = ClientCachesBase.DataCache( self._controller, 'image tile cache', cache_size, timeout = cache_timeout )
+        self._data_cache = ClientCachesBase.DataCache( self._controller, 'image tile cache', cache_size, timeout = cache_timeout, cache_eviction_policy_type = ClientCachesBase.CACHE_EVICTION_POLICY_W_TINYLFU )
         
         self._controller.sub( self, 'NotifyNewOptions', 'notify_new_options' )
         self._controller.sub( self, 'Clear', 'clear_image_tile_cache' )
@@ -224,12 +646,27 @@ class ImageTileCache( object ):
         self._data_cache.Clear()
         
     
-    def GetTile( self, image_renderer: ClientRendering.ImageRenderer, media_result: ClientMediaResult.MediaResult, clip_rect, target_resolution ) -> ClientRendering.ImageTile:
+    def _GetDiskCacheVariant( self, media_result: ClientMediaResult.MediaResult, clip_rect, target_resolution ):
         
-        hash = media_result.GetHash()
+        # the zoom quality goes in too, since changing it changes the pixels
+        ( scale_up_quality, scale_down_quality ) = self._controller.new_options.GetMediaZoomQuality( media_result.GetMime() )
+        
+        return 'tile_{}_{}_{}_{}_{}_{}_{}_{}'.format(
+            clip_rect.left(),
+            clip_rect.top(),
+            clip_rect.width(),
+            clip_rect.height(),
+            target_resolution.width(),
+            target_resolution.height(),
+            scale_up_quality,
+            scale_down_quality
+        )
         
-        key = (
-            hash,
+    
+    def _GetKey( self, media_result: ClientMediaResult.MediaResult, clip_rect, target_resolution ):
+        
+        return (
+            media_result.GetHash(),
             clip_rect.left(),
             clip_rect.top(),
             clip_rect.right(),
@@ -238,11 +675,43 @@ class ImageTileCache( object ):
             target_resolution.height()
         )
         
+    
+    def GetTile( self, image_renderer: ClientRendering.ImageRenderer, media_result: ClientMediaResult.MediaResult, clip_rect, target_resolution ) -> ClientRendering.ImageTile:
+        
+        hash = media_result.GetHash()
+        
+        key = self._GetKey( media_result, clip_rect, target_resolution )
+        
         result = self._data_cache.GetIfHasData( key )
         
         if result is None:
             
-            qt_pixmap = image_renderer.GetQtPixmap( clip_rect = clip_rect, target_resolution = target_resolution )
+            render_disk_cache = self._controller.render_disk_cache
+            
+            variant = self._GetDiskCacheVariant( media_result, clip_rect, target_resolution )
+            
+            numpy_image = render_disk_cache.GetNumPyImage( hash, variant )
+            
+            if numpy_image is None and render_disk_cache.IsEnabled() and image_renderer.IsReady():
+                
+                numpy_image = image_renderer.GetNumPyTile( clip_rect, target_resolution )
+                
+                if numpy_image is not None:
+                    
+                    self._controller.CallToThread( render_disk_cache.AddNumPyImage, hash, variant, numpy_image )
+                    
+                
+            
+            if numpy_image is None:
+                
+                qt_pixmap = image_renderer.GetQtPixmap( clip_rect = clip_rect, target_resolution = target_resolution )
+                
+            else:
+                
+                ( height, width, depth ) = numpy_image.shape
+                
+                qt_pixmap = self._controller.bitmap_manager.GetQtPixmapFromBuffer( width, height, depth * 8, numpy_image.data )
+                
             
             tile = ClientRendering.ImageTile( hash, clip_rect, qt_pixmap )
             
@@ -256,6 +725,21 @@ class ImageTileCache( object ):
         return tile
         
     
+    def GetStatistics( self ) -> dict:
+        
+        return self._data_cache.GetStatistics()
+        
+    
+    def HasTile( self, media_result: ClientMediaResult.MediaResult, clip_rect, target_resolution ) -> bool:
+        
+        if self._data_cache.HasData( self._GetKey( media_result, clip_rect, target_resolution ) ):
+            
+            return True
+            
+        
+        return self._controller.render_disk_cache.HasData( media_result.GetHash(), self._GetDiskCacheVariant( media_result, clip_rect, target_resolution ) )
+        
+    
     def NotifyNewOptions( self ):
         
         cache_size = self._controller.new_options.GetInteger( 'image_tile_cache_size' )
@@ -273,7 +757,7 @@ class ThumbnailCache( object ):
         cache_size = self._controller.new_options.GetInteger( 'thumbnail_cache_size' )
         cache_timeout = self._controller.new_options.GetInteger( 'thumbnail_cache_timeout' )
         
-        self._data_cache = ClientCachesBase.DataCache( self._controller, 'thumbnail cache', cache_size, timeout = cache_timeout )
+        self._data_cache = ClientCachesBase.DataCache( self._controller, 'thumbnail cache', cache_size, timeout = cache_timeout, cache_eviction_policy_type = ClientCachesBase.CACHE_EVICTION_POLICY_W_TINYLFU )
         
         self._magic_mime_thumbnail_ease_score_lookup = {}
         
@@ -353,7 +837,7 @@ class ThumbnailCache( object ):
         
         try:
             
-            thumbnail_path = self._controller.client_files_manager.GetThumbnailPath( media_result )
+            thumbnail_bytes = self._controller.client_files_manager.GetThumbnailBytes( media_result )
             
         except HydrusExceptions.FileMissingException as e:
             
@@ -371,9 +855,9 @@ class ThumbnailCache( object ):
         
         try:
             
-            thumbnail_mime = HydrusFileHandling.GetThumbnailMime( thumbnail_path )
+            thumbnail_mime = HydrusFileHandling.GetThumbnailMimeFromBytes( thumbnail_bytes )
             
-            numpy_image = HydrusImageHandling.GenerateNumPyImage( thumbnail_path, thumbnail_mime )
+            numpy_image = HydrusImageHandling.GenerateNumPyImageFromBytes( thumbnail_bytes, thumbnail_mime )
             
         except Exception as e:
             
@@ -382,6 +866,10 @@ class ThumbnailCache( object ):
                 # file is malformed, let's force a regen
                 self._controller.files_maintenance_manager.RunJobImmediately( [ media_result ], ClientFilesMaintenance.REGENERATE_FILE_DATA_JOB_FORCE_THUMBNAIL, pub_job_status = False )
                 
+                thumbnail_bytes = self._controller.client_files_manager.GetThumbnailBytes( media_result )
+                
+                thumbnail_mime = HydrusFileHandling.GetThumbnailMimeFromBytes( thumbnail_bytes )
+                
             except Exception as e:
                 
                 summary = 'The thumbnail for file {} was not loadable. An attempt to regenerate it failed.'.format( hash.hex() )
@@ -393,7 +881,7 @@ class ThumbnailCache( object ):
             
             try:
                 
-                numpy_image = HydrusImageHandling.GenerateNumPyImage( thumbnail_path, thumbnail_mime )
+                numpy_image = HydrusImageHandling.GenerateNumPyImageFromBytes( thumbnail_bytes, thumbnail_mime )
                 
             except Exception as e:
                 
@@ -751,6 +1239,11 @@ class ThumbnailCache( object ):
         return default_thumb_hydrus_bitmap
         
     
+    def GetStatistics( self ) -> dict:
+        
+        return self._data_cache.GetStatistics()
+        
+    
     def HasThumbnailCached( self, media ):
         
         display_media = media.GetDisplayMedia()
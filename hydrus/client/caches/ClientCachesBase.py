@@ -1,4 +1,5 @@
 import collections
+import numpy
 import threading
 import typing
 
@@ -8,6 +9,421 @@ from hydrus.core import HydrusTime
 
 from hydrus.client import ClientGlobals as CG
 
+CACHE_EVICTION_POLICY_LRU = 0
+CACHE_EVICTION_POLICY_W_TINYLFU = 1
+
+cache_eviction_policy_string_lookup = {
+    CACHE_EVICTION_POLICY_LRU : 'least recently used',
+    CACHE_EVICTION_POLICY_W_TINYLFU : 'W-TinyLFU'
+}
+
+FREQUENCY_SKETCH_SEEDS = ( 0x97CB3127, 0xB15E3E2B, 0xC3A5C85C, 0x8F1BBCDD )
+FREQUENCY_SKETCH_HALVE_TABLE = bytes( i >> 1 for i in range( 256 ) )
+
+class FrequencySketch( object ):
+    
+    # a count-min sketch of small counters that all get halved every now and then, so old popularity fades
+    # this is the 'TinyLFU' part: it remembers roughly how often we have seen keys, including ones we no longer hold, in very little memory
+    
+    def __init__( self ):
+        
+        self._SetWidth( 1024 )
+        
+    
+    def _GetIndices( self, key ):
+        
+        h = hash( key ) & 0xFFFFFFFFFFFFFFFF
+        
+        return [ row * self._width + ( ( ( ( h ^ seed ) * 0x9E3779B97F4A7C15 ) & 0xFFFFFFFFFFFFFFFF ) >> self._shift ) for ( row, seed ) in enumerate( FREQUENCY_SKETCH_SEEDS ) ]
+        
+    
+    def _SetWidth( self, width: int ):
+        
+        self._width = width
+        self._shift = 64 - ( width.bit_length() - 1 )
+        
+        self._table = bytearray( len( FREQUENCY_SKETCH_SEEDS ) * width )
+        
+        self._num_increments = 0
+        self._sample_size = 10 * width
+        
+    
+    def EnsureCapacity( self, num_keys: int ):
+        
+        if num_keys > self._width:
+            
+            width = self._width
+            
+            while width < num_keys:
+                
+                width *= 2
+                
+            
+            # a key's column is the top bits of its mixed hash, so when we double the width, each old column splits into the two next to each other
+            # copying each old counter into all the columns it splits into keeps every estimate where it was, so we don't forget anything while the cache warms up
+            
+            factor = width // self._width
+            
+            old_table = numpy.frombuffer( self._table, dtype = numpy.uint8 ).reshape( ( len( FREQUENCY_SKETCH_SEEDS ), self._width ) )
+            
+            new_table = bytearray( numpy.repeat( old_table, factor, axis = 1 ).tobytes() )
+            
+            num_increments = self._num_increments
+            
+            self._SetWidth( width )
+            
+            self._table = new_table
+            self._num_increments = num_increments
+            
+        
+    
+    def GetFrequency( self, key ) -> int:
+        
+        return min( self._table[ index ] for index in self._GetIndices( key ) )
+        
+    
+    def Increment( self, key ):
+        
+        for index in self._GetIndices( key ):
+            
+            if self._table[ index ] < 15:
+                
+                self._table[ index ] += 1
+                
+            
+        
+        self._num_increments += 1
+        
+        if self._num_increments >= self._sample_size:
+            
+            self._table = bytearray( self._table.translate( FREQUENCY_SKETCH_HALVE_TABLE ) )
+            
+            self._num_increments //= 2
+            
+        
+    
+
+class CacheEvictionPolicy( object ):
+    
+    def __init__( self, capacity: int ):
+        
+        self._capacity = capacity
+        
+    
+    def Add( self, key, size: int ):
+        
+        raise NotImplementedError()
+        
+    
+    def Clear( self ):
+        
+        raise NotImplementedError()
+        
+    
+    def GetVictim( self ):
+        
+        raise NotImplementedError()
+        
+    
+    def RecordMiss( self, key ):
+        
+        pass
+        
+    
+    def Remove( self, key ):
+        
+        raise NotImplementedError()
+        
+    
+    def SetCapacity( self, capacity: int ):
+        
+        self._capacity = capacity
+        
+    
+    def Touch( self, key ):
+        
+        raise NotImplementedError()
+        
+    
+    def UpdateSize( self, key, size: int ):
+        
+        pass
+        
+    
+
+class CacheEvictionPolicyLRU( CacheEvictionPolicy ):
+    
+    def __init__( self, capacity: int ):
+        
+        super().__init__( capacity )
+        
+        self._keys = collections.OrderedDict()
+        
+    
+    def Add( self, key, size: int ):
+        
+        self._keys[ key ] = None
+        
+        self._keys.move_to_end( key )
+        
+    
+    def Clear( self ):
+        
+        self._keys = collections.OrderedDict()
+        
+    
+    def GetVictim( self ):
+        
+        if len( self._keys ) == 0:
+            
+            return None
+            
+        
+        return next( iter( self._keys ) )
+        
+    
+    def Remove( self, key ):
+        
+        if key in self._keys:
+            
+            del self._keys[ key ]
+            
+        
+    
+    def Touch( self, key ):
+        
+        if key in self._keys:
+            
+            self._keys.move_to_end( key )
+            
+        
+    
+
+class CacheEvictionPolicyWTinyLFU( CacheEvictionPolicy ):
+    
+    # new items go into a small LRU 'window'. when it overflows, its oldest item has to beat the oldest 'probation' item in the main area on popularity to get in
+    # a second hit in probation promotes an item to 'protected', which is most of the main area
+    # so, a big one-off scroll through thumbnails just churns the window, and what you keep coming back to stays put
+    # everything is measured in bytes, since our items vary in size by several orders of magnitude
+    
+    WINDOW_PERCENTAGE = 0.01
+    PROTECTED_PERCENTAGE = 0.8
+    
+    def __init__( self, capacity: int ):
+        
+        super().__init__( capacity )
+        
+        self._sketch = FrequencySketch()
+        
+        self.Clear()
+        
+    
+    def _GetMainCapacity( self ):
+        
+        return self._capacity - self._GetWindowCapacity()
+        
+    
+    def _GetProtectedCapacity( self ):
+        
+        return int( self._GetMainCapacity() * self.PROTECTED_PERCENTAGE )
+        
+    
+    def _GetWindowCapacity( self ):
+        
+        return int( self._capacity * self.WINDOW_PERCENTAGE )
+        
+    
+    def _NumKeys( self ):
+        
+        return len( self._window ) + len( self._probation ) + len( self._protected )
+        
+    
+    def Add( self, key, size: int ):
+        
+        self._window[ key ] = size
+        self._window_bytes += size
+        
+        self._sketch.EnsureCapacity( self._NumKeys() )
+        
+        # while the main area still has space, window overflow goes straight in without having to fight for it
+        
+        main_capacity = self._GetMainCapacity()
+        
+        while self._window_bytes > self._GetWindowCapacity() and len( self._window ) > 1:
+            
+            ( candidate_key, candidate_size ) = next( iter( self._window.items() ) )
+            
+            if self._probation_bytes + self._protected_bytes + candidate_size > main_capacity:
+                
+                break
+                
+            
+            del self._window[ candidate_key ]
+            self._window_bytes -= candidate_size
+            
+            self._probation[ candidate_key ] = candidate_size
+            self._probation_bytes += candidate_size
+            
+    
+    def Clear( self ):
+        
+        self._window = collections.OrderedDict()
+        self._probation = collections.OrderedDict()
+        self._protected = collections.OrderedDict()
+        
+        self._window_bytes = 0
+        self._probation_bytes = 0
+        self._protected_bytes = 0
+        
+    
+    def GetVictim( self ):
+        
+        # something bigger than the whole cache is never going to fit, so no point throwing out lots of small things for it
+        for ( key, size ) in self._window.items():
+            
+            if size > self._capacity:
+                
+                return key
+                
+            
+        
+        # anything the window cannot hold is a candidate for the main area
+        while self._window_bytes > self._GetWindowCapacity() and len( self._window ) > 1:
+            
+            ( candidate_key, candidate_size ) = self._window.popitem( last = False )
+            
+            self._window_bytes -= candidate_size
+            
+            main_has_room = self._probation_bytes + self._protected_bytes + candidate_size <= self._GetMainCapacity()
+            
+            if len( self._probation ) > 0:
+                
+                victim_key = next( iter( self._probation ) )
+                
+            elif len( self._protected ) > 0:
+                
+                victim_key = next( iter( self._protected ) )
+                
+            else:
+                
+                victim_key = None
+                
+            
+            if main_has_room or victim_key is None or self._sketch.GetFrequency( candidate_key ) > self._sketch.GetFrequency( victim_key ):
+                
+                self._probation[ candidate_key ] = candidate_size
+                self._probation_bytes += candidate_size
+                
+                if main_has_room:
+                    
+                    continue
+                    
+                
+                return victim_key
+                
+            else:
+                
+                # rejected. put it back at the old end of the window and have it go
+                
+                self._window[ candidate_key ] = candidate_size
+                self._window.move_to_end( candidate_key, last = False )
+                self._window_bytes += candidate_size
+                
+                return candidate_key
+                
+            
+        
+        for segment in ( self._probation, self._protected, self._window ):
+            
+            if len( segment ) > 0:
+                
+                return next( iter( segment ) )
+                
+            
+        
+        return None
+        
+    
+    def RecordMiss( self, key ):
+        
+        self._sketch.Increment( key )
+        
+    
+    def Remove( self, key ):
+        
+        if key in self._window:
+            
+            self._window_bytes -= self._window.pop( key )
+            
+        elif key in self._probation:
+            
+            self._probation_bytes -= self._probation.pop( key )
+            
+        elif key in self._protected:
+            
+            self._protected_bytes -= self._protected.pop( key )
+            
+        
+    
+    def Touch( self, key ):
+        
+        self._sketch.Increment( key )
+        
+        if key in self._window:
+            
+            self._window.move_to_end( key )
+            
+        elif key in self._probation:
+            
+            size = self._probation.pop( key )
+            self._probation_bytes -= size
+            
+            self._protected[ key ] = size
+            self._protected_bytes += size
+            
+            protected_capacity = self._GetProtectedCapacity()
+            
+            while self._protected_bytes > protected_capacity and len( self._protected ) > 1:
+                
+                ( demotee_key, demotee_size ) = self._protected.popitem( last = False )
+                self._protected_bytes -= demotee_size
+                
+                self._probation[ demotee_key ] = demotee_size
+                self._probation_bytes += demotee_size
+                
+            
+        elif key in self._protected:
+            
+            self._protected.move_to_end( key )
+            
+        
+    
+    def UpdateSize( self, key, size: int ):
+        
+        for ( segment, bytes_attribute ) in ( ( self._window, '_window_bytes' ), ( self._probation, '_probation_bytes' ), ( self._protected, '_protected_bytes' ) ):
+            
+            if key in segment:
+                
+                setattr( self, bytes_attribute, getattr( self, bytes_attribute ) + size - segment[ key ] )
+                
+                segment[ key ] = size
+                
+                return
+                
+            
+        
+    
+
+def GenerateCacheEvictionPolicy( cache_eviction_policy_type: int, capacity: int ) -> CacheEvictionPolicy:
+    
+    if cache_eviction_policy_type == CACHE_EVICTION_POLICY_W_TINYLFU:
+        
+        return CacheEvictionPolicyWTinyLFU( capacity )
+        
+    
+    return CacheEvictionPolicyLRU( capacity )
+    
+
 class CacheableObject( object ):
     
     def GetEstimatedMemoryFootprint( self ) -> int:
@@ -18,18 +434,26 @@ class CacheableObject( object ):
 
 class DataCache( object ):
     
-    def __init__( self, controller: "CG.ClientController.Controller", name, cache_size, timeout = 1200 ):
+    def __init__( self, controller: "CG.ClientController.Controller", name, cache_size, timeout = 1200, cache_eviction_policy_type = CACHE_EVICTION_POLICY_LRU ):
         
         self._controller = controller
         self._name = name
         self._cache_size = cache_size
         self._timeout = timeout
+        self._cache_eviction_policy_type = cache_eviction_policy_type
         
         self._keys_to_data = {}
         self._keys_fifo = collections.OrderedDict()
         
+        self._eviction_policy = GenerateCacheEvictionPolicy( self._cache_eviction_policy_type, self._cache_size )
+        
         self._total_estimated_memory_footprint = 0
         
+        self._num_hits = 0
+        self._num_misses = 0
+        self._num_evictions = 0
+        self._num_expirations = 0
+        
         self._lock = threading.Lock()
         
         self._controller.sub( self, 'MaintainCache', 'memory_maintenance_pulse' )
@@ -46,6 +470,13 @@ class DataCache( object ):
         
         del self._keys_to_data[ key ]
         
+        if key in self._keys_fifo:
+            
+            del self._keys_fifo[ key ]
+            
+        
+        self._eviction_policy.Remove( key )
+        
         self._total_estimated_memory_footprint -= size_estimate
         
         if HG.cache_report_mode:
@@ -54,11 +485,21 @@ class DataCache( object ):
             
         
     
-    def _DeleteItem( self ):
-        
-        ( deletee_key, last_access_time ) = self._keys_fifo.popitem( last = False )
+    def _EvictToSize( self, keep_key = None ):
         
-        self._Delete( deletee_key )
+        while self._total_estimated_memory_footprint > self._cache_size and len( self._keys_to_data ) > 0:
+            
+            deletee_key = self._eviction_policy.GetVictim()
+            
+            if deletee_key is None or deletee_key == keep_key:
+                
+                break
+                
+            
+            self._Delete( deletee_key )
+            
+            self._num_evictions += 1
+            
         
     
     def _GetData( self, key ) -> CacheableObject:
@@ -69,7 +510,9 @@ class DataCache( object ):
             
         
         self._TouchKey( key )
-
+        
+        self._num_hits += 1
+        
         ( data, size_estimate ) = self._keys_to_data[ key ]
         
         new_estimate = data.GetEstimatedMemoryFootprint()
@@ -80,6 +523,8 @@ class DataCache( object ):
             
             self._keys_to_data[ key ] = ( data, new_estimate )
             
+            self._eviction_policy.UpdateSize( key, new_estimate )
+            
         
         return data
         
@@ -94,6 +539,8 @@ class DataCache( object ):
         
         self._keys_fifo[ key ] = HydrusTime.GetNow()
         
+        self._eviction_policy.Touch( key )
+        
     
     def Clear( self ):
         
@@ -102,6 +549,8 @@ class DataCache( object ):
             self._keys_to_data = {}
             self._keys_fifo = collections.OrderedDict()
             
+            self._eviction_policy.Clear()
+            
             self._total_estimated_memory_footprint = 0
             
         
@@ -112,18 +561,16 @@ class DataCache( object ):
             
             if key not in self._keys_to_data:
                 
-                while self._total_estimated_memory_footprint > self._cache_size:
-                    
-                    self._DeleteItem()
-                    
-                
                 size_estimate = data.GetEstimatedMemoryFootprint()
                 
                 self._keys_to_data[ key ] = ( data, size_estimate )
+                self._keys_fifo[ key ] = HydrusTime.GetNow()
                 
                 self._total_estimated_memory_footprint += size_estimate
                 
-                self._TouchKey( key )
+                self._eviction_policy.Add( key, size_estimate )
+                
+                self._EvictToSize( keep_key = key )
                 
                 if HG.cache_report_mode:
                     
@@ -166,6 +613,10 @@ class DataCache( object ):
                 
             else:
                 
+                self._num_misses += 1
+                
+                self._eviction_policy.RecordMiss( key )
+                
                 return None
                 
             
@@ -179,6 +630,24 @@ class DataCache( object ):
             
         
     
+    def GetStatistics( self ) -> dict:
+        
+        with self._lock:
+            
+            return {
+                'name' : self._name,
+                'eviction_policy' : cache_eviction_policy_string_lookup[ self._cache_eviction_policy_type ],
+                'hits' : self._num_hits,
+                'misses' : self._num_misses,
+                'evictions' : self._num_evictions,
+                'expirations' : self._num_expirations,
+                'num_items' : len( self._keys_to_data ),
+                'size' : self._total_estimated_memory_footprint,
+                'size_limit' : self._cache_size
+            }
+            
+        
+    
     def HasData( self, key ) -> bool:
         
         with self._lock:
@@ -191,10 +660,7 @@ class DataCache( object ):
         
         with self._lock:
             
-            while self._total_estimated_memory_footprint > self._cache_size:
-                
-                self._DeleteItem()
-                
+            self._EvictToSize()
             
             while True:
                 
@@ -208,7 +674,16 @@ class DataCache( object ):
                     
                     if HydrusTime.TimeHasPassed( last_access_time + self._timeout ):
                         
-                        self._DeleteItem()
+                        if key in self._keys_to_data:
+                            
+                            self._Delete( key )
+                            
+                            self._num_expirations += 1
+                            
+                        else:
+                            
+                            del self._keys_fifo[ key ]
+                            
                         
                     else:
                         
@@ -226,6 +701,8 @@ class DataCache( object ):
             self._cache_size = cache_size
             self._timeout = timeout
             
+            self._eviction_policy.SetCapacity( self._cache_size )
+            
         
         self.MaintainCache()
         
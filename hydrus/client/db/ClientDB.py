@@ -24,6 +24,7 @@ from hydrus.core import HydrusSerialisable
 from hydrus.core import HydrusTags
 from hydrus.core import HydrusTime
 from hydrus.core.networking import HydrusNetwork
+from hydrus.core.networking import HydrusNetworkBinaryUpdates
 
 from hydrus.client import ClientAPI
 from hydrus.client import ClientConstants as CC
@@ -89,6 +90,7 @@ from hydrus.client.search import ClientNumberTest
 from hydrus.client.search import ClientSearchFavouriteSearches
 from hydrus.client.search import ClientSearchFileSearchContext
 from hydrus.client.search import ClientSearchPredicate
+from hydrus.client.search import ClientSearchResultCache
 
 # noinspection PyUnresolvedReferences
 from hydrus.client.importing import ClientImportSubscriptionLegacy
@@ -240,6 +242,67 @@ class DB( HydrusDB.HydrusDB ):
     
     READ_WRITE_ACTIONS = [ 'service_info', 'system_predicates', 'missing_thumbnail_hashes' ]
     
+    # these may be served by the read pool, on a read-only connection that sees the last commit
+    # don't put anything here that gives out objects the main connection keeps updated, like media results
+    READ_POOL_SAFE_ACTIONS = {
+        'autocomplete_predicates',
+        'file_info_managers_from_ids',
+        'file_query_ids',
+        'tag_predicates'
+    }
+    
+    # the writes that change something the read pool's modules hold in memory, like service objects or sibling and parent lookups
+    # everything else, including the heavy everyday writes and forced commits, only changes rows
+    READ_POOL_MODULE_CHANGING_WRITE_ACTIONS = {
+        'dirty_services',
+        'fix_logically_inconsistent_mappings',
+        'regenerate_local_hash_cache',
+        'regenerate_local_tag_cache',
+        'regenerate_searchable_subtag_maps',
+        'regenerate_tag_cache',
+        'regenerate_tag_display_mappings_cache',
+        'regenerate_tag_display_pending_mappings_cache',
+        'regenerate_tag_mappings_cache',
+        'regenerate_tag_mappings_tags',
+        'regenerate_tag_parents_cache',
+        'regenerate_tag_pending_mappings_cache',
+        'regenerate_tag_siblings_and_parents_cache',
+        'repair_invalid_tags',
+        'repopulate_mappings_from_cache',
+        'repopulate_tag_cache_missing_subtags',
+        'repopulate_tag_display_mappings_cache',
+        'reprocess_repository',
+        'reset_repository',
+        'reset_repository_processing',
+        'resync_combined_deleted_files',
+        'resync_tag_mappings_cache_files',
+        'sync_tag_display_maintenance',
+        'tag_display_application',
+        'update_server_services',
+        'update_services'
+    }
+    
+    # these writes never change what a file search returns, or they invalidate the file search result cache themselves
+    FILE_SEARCH_RESULT_CACHE_SAFE_WRITE_ACTIONS = {
+        'analyze',
+        'backup',
+        'content_updates',
+        'db_integrity',
+        'delete_serialisable_named',
+        'file_maintenance_add_jobs',
+        'file_maintenance_add_jobs_hashes',
+        'file_maintenance_cancel_jobs',
+        'maintain_hashed_serialisables',
+        'push_recent_tags',
+        'register_shutdown_work',
+        'save_options',
+        'serialisable',
+        'serialisable_atomic',
+        'serialisable_simple',
+        'serialisables_overwrite',
+        'vacuum'
+    }
+    
     def __init__( self, controller: "CG.ClientController.Controller", db_dir, db_name ):
         
         self._initial_messages = []
@@ -250,6 +313,9 @@ class DB( HydrusDB.HydrusDB ):
         self._regen_tags_managers_hash_ids = set()
         self._regen_tags_managers_tag_ids = set()
         
+        self._file_search_result_cache = ClientSearchResultCache.FileSearchResultCache()
+        self._perceptual_hash_search_index_cache = ClientDBSimilarFiles.PerceptualHashSearchIndexCache()
+        
         super().__init__( controller, db_dir, db_name )
         
         # helps linter
@@ -397,6 +463,64 @@ class DB( HydrusDB.HydrusDB ):
             
         
     
+    def _CacheTagDisplayApplyImplicationChanges( self, tag_service_id, tag_ids_to_previous_implied_by ):
+        
+        # the actual lookup has changed under these display tags, so now we compare where their implications were with where they are and migrate the display mappings and counts to match
+        # this is all done in a few large set-based jobs across the whole batch, rather than a couple of queries and a counts update for every tag
+        
+        tag_ids_to_after_implied_by = self.modules_tag_display.GetTagsToImpliedBy( ClientTags.TAG_DISPLAY_DISPLAY_ACTUAL, tag_service_id, set( tag_ids_to_previous_implied_by.keys() ) )
+        
+        tag_ids_to_delete_implied_by = {}
+        tag_ids_to_add_implied_by = {}
+        
+        all_tag_ids_altered = set()
+        
+        for ( tag_id, previous_implied_by ) in tag_ids_to_previous_implied_by.items():
+            
+            after_implied_by = tag_ids_to_after_implied_by[ tag_id ]
+            
+            to_delete = previous_implied_by.difference( after_implied_by )
+            to_add = after_implied_by.difference( previous_implied_by )
+            
+            if len( to_delete ) > 0:
+                
+                tag_ids_to_delete_implied_by[ tag_id ] = to_delete
+                
+                all_tag_ids_altered.add( tag_id )
+                all_tag_ids_altered.update( to_delete )
+                
+            
+            if len( to_add ) > 0:
+                
+                tag_ids_to_add_implied_by[ tag_id ] = to_add
+                
+                all_tag_ids_altered.add( tag_id )
+                all_tag_ids_altered.update( to_add )
+                
+            
+        
+        if len( tag_ids_to_delete_implied_by ) + len( tag_ids_to_add_implied_by ) == 0:
+            
+            return all_tag_ids_altered
+            
+        
+        # if I am feeling very clever, I could potentially add tag_ids_to_migrate_implied_by, which would be an UPDATE
+        # this would only work for tag_ids that have the same current implied by in actual and ideal (e.g. moving a tag sibling from A->B to B->A)
+        
+        file_service_ids = self.modules_services.GetServiceIds( HC.FILE_SERVICES_WITH_SPECIFIC_MAPPING_CACHES )
+        
+        for file_service_id in file_service_ids:
+            
+            self.modules_mappings_cache_specific_display.DeleteImplicationsBatch( file_service_id, tag_service_id, tag_ids_to_delete_implied_by, tag_ids_to_after_implied_by )
+            self.modules_mappings_cache_specific_display.AddImplicationsBatch( file_service_id, tag_service_id, tag_ids_to_add_implied_by )
+            
+        
+        self.modules_mappings_cache_combined_files_display.DeleteImplicationsBatch( tag_service_id, tag_ids_to_delete_implied_by, tag_ids_to_after_implied_by )
+        self.modules_mappings_cache_combined_files_display.AddImplicationsBatch( tag_service_id, tag_ids_to_add_implied_by, tag_ids_to_previous_implied_by )
+        
+        return all_tag_ids_altered
+        
+    
     def _CacheTagDisplayForceFullSyncTagsOnSpecifics( self, tag_service_id, file_service_ids ):
         
         # this assumes the caches are empty. it is a 'quick' force repopulation for emergency fill-in maintenance
@@ -406,32 +530,40 @@ class DB( HydrusDB.HydrusDB ):
         tag_ids_in_dispute.update( self.modules_tag_siblings.GetAllTagIds( ClientTags.TAG_DISPLAY_DISPLAY_ACTUAL, tag_service_id ) )
         tag_ids_in_dispute.update( self.modules_tag_parents.GetAllTagIds( ClientTags.TAG_DISPLAY_DISPLAY_ACTUAL, tag_service_id ) )
         
-        for tag_id in tag_ids_in_dispute:
-            
-            storage_implication_tag_ids = { tag_id }
+        for block_of_tag_ids in HydrusData.SplitIteratorIntoChunks( tag_ids_in_dispute, 1024 ):
             
-            actual_implication_tag_ids = self.modules_tag_display.GetImpliedBy( ClientTags.TAG_DISPLAY_DISPLAY_ACTUAL, tag_service_id, tag_id )
+            tag_ids_to_actual_implication_tag_ids = self.modules_tag_display.GetTagsToImpliedBy( ClientTags.TAG_DISPLAY_DISPLAY_ACTUAL, tag_service_id, block_of_tag_ids )
             
-            add_implication_tag_ids = actual_implication_tag_ids.difference( storage_implication_tag_ids )
+            tag_ids_to_add_implication_tag_ids = {}
+            tag_ids_to_delete_implication_tag_ids = {}
             
-            if len( add_implication_tag_ids ) > 0:
+            for tag_id in block_of_tag_ids:
                 
-                for file_service_id in file_service_ids:
+                storage_implication_tag_ids = { tag_id }
+                
+                actual_implication_tag_ids = tag_ids_to_actual_implication_tag_ids[ tag_id ]
+                
+                add_implication_tag_ids = actual_implication_tag_ids.difference( storage_implication_tag_ids )
+                
+                if len( add_implication_tag_ids ) > 0:
                     
-                    self.modules_mappings_cache_specific_display.AddImplications( file_service_id, tag_service_id, add_implication_tag_ids, tag_id )
+                    tag_ids_to_add_implication_tag_ids[ tag_id ] = add_implication_tag_ids
                     
                 
-            
-            delete_implication_tag_ids = storage_implication_tag_ids.difference( actual_implication_tag_ids )
-            
-            if len( delete_implication_tag_ids ) > 0:
+                delete_implication_tag_ids = storage_implication_tag_ids.difference( actual_implication_tag_ids )
                 
-                for file_service_id in file_service_ids:
+                if len( delete_implication_tag_ids ) > 0:
                     
-                    self.modules_mappings_cache_specific_display.DeleteImplications( file_service_id, tag_service_id, delete_implication_tag_ids, tag_id )
+                    tag_ids_to_delete_implication_tag_ids[ tag_id ] = delete_implication_tag_ids
                     
                 
             
+            for file_service_id in file_service_ids:
+                
+                self.modules_mappings_cache_specific_display.AddImplicationsBatch( file_service_id, tag_service_id, tag_ids_to_add_implication_tag_ids )
+                self.modules_mappings_cache_specific_display.DeleteImplicationsBatch( file_service_id, tag_service_id, tag_ids_to_delete_implication_tag_ids, tag_ids_to_actual_implication_tag_ids )
+                
+            
         
         for block_of_tag_ids in HydrusData.SplitIteratorIntoChunks( tag_ids_in_dispute, 1024 ):
             
@@ -486,8 +618,18 @@ class DB( HydrusDB.HydrusDB ):
         
         tag_service_id = self.modules_services.GetServiceId( service_key )
         
+        # the weighting and implication lookups below hit the same chains many times over, so we hold them in memory while we work
+        self.modules_tag_display.LoadLookupIndices( tag_service_id )
+        
         all_tag_ids_altered = set()
         
+        # display tags whose implications have changed this batch, and what they were implied by before
+        batch_tag_ids_to_previous_implied_by = {}
+        
+        # roughly how many display mappings the batch will touch
+        batch_weight = 0
+        max_batch_weight = 250000
+        
         ( sibling_rows_to_add, sibling_rows_to_remove, parent_rows_to_add, parent_rows_to_remove, num_actual_rows, num_ideal_rows ) = self.modules_tag_display.GetApplicationStatus( tag_service_id )
         
         while len( sibling_rows_to_add ) + len( sibling_rows_to_remove ) + len( parent_rows_to_add ) + len( parent_rows_to_remove ) > 0 and not HydrusTime.TimeHasPassedFloat( time_started + work_time ):
@@ -655,6 +797,8 @@ class DB( HydrusDB.HydrusDB ):
                     
                     # the only things changed here are those implied by or that imply one of these values
                     
+                    row_weight = smallest_sibling_weight
+                    
                     ( a, b ) = smallest_sibling_row
                     
                     possibly_affected_tag_ids = { a, b }
@@ -670,9 +814,6 @@ class DB( HydrusDB.HydrusDB ):
                     previous_chain_tag_ids_to_implied_by = self.modules_tag_display.GetTagsToImpliedBy( ClientTags.TAG_DISPLAY_DISPLAY_ACTUAL, tag_service_id, possibly_affected_tag_ids )
                     
                     self._Execute( 'DELETE FROM {} WHERE bad_tag_id = ? AND ideal_tag_id = ?;'.format( cache_actual_tag_siblings_lookup_table_name ), smallest_sibling_row )
-                    
-                    after_chain_tag_ids_to_implied_by = self.modules_tag_display.GetTagsToImpliedBy( ClientTags.TAG_DISPLAY_DISPLAY_ACTUAL, tag_service_id, possibly_affected_tag_ids )
-                    
                     self.modules_tag_siblings.NotifySiblingDeleteRowSynced( tag_service_id, smallest_sibling_row )
                     
                 
@@ -680,6 +821,8 @@ class DB( HydrusDB.HydrusDB ):
                     
                     # the only things changed here are those implied by or that imply one of these values
                     
+                    row_weight = smallest_parent_weight
+                    
                     ( a, b ) = smallest_parent_row
                     
                     possibly_affected_tag_ids = { a, b }
@@ -692,9 +835,6 @@ class DB( HydrusDB.HydrusDB ):
                     previous_chain_tag_ids_to_implied_by = self.modules_tag_display.GetTagsToImpliedBy( ClientTags.TAG_DISPLAY_DISPLAY_ACTUAL, tag_service_id, possibly_affected_tag_ids )
                     
                     self._Execute( 'DELETE FROM {} WHERE child_tag_id = ? AND ancestor_tag_id = ?;'.format( cache_actual_tag_parents_lookup_table_name ), smallest_parent_row )
-                    
-                    after_chain_tag_ids_to_implied_by = self.modules_tag_display.GetTagsToImpliedBy( ClientTags.TAG_DISPLAY_DISPLAY_ACTUAL, tag_service_id, possibly_affected_tag_ids )
-                    
                     self.modules_tag_parents.NotifyParentDeleteRowSynced( tag_service_id, smallest_parent_row )
                     
                 
@@ -740,6 +880,8 @@ class DB( HydrusDB.HydrusDB ):
                         
                         # the only things changed here are those implied by or that imply one of these values
                         
+                        row_weight = largest_sibling_weight
+                        
                         ( a, b ) = largest_sibling_row
                         
                         possibly_affected_tag_ids = { a, b }
@@ -752,9 +894,6 @@ class DB( HydrusDB.HydrusDB ):
                         previous_chain_tag_ids_to_implied_by = self.modules_tag_display.GetTagsToImpliedBy( ClientTags.TAG_DISPLAY_DISPLAY_ACTUAL, tag_service_id, possibly_affected_tag_ids )
                         
                         self._Execute( 'INSERT OR IGNORE INTO {} ( bad_tag_id, ideal_tag_id ) VALUES ( ?, ? );'.format( cache_actual_tag_siblings_lookup_table_name ), largest_sibling_row )
-                        
-                        after_chain_tag_ids_to_implied_by = self.modules_tag_display.GetTagsToImpliedBy( ClientTags.TAG_DISPLAY_DISPLAY_ACTUAL, tag_service_id, possibly_affected_tag_ids )
-                        
                         self.modules_tag_siblings.NotifySiblingAddRowSynced( tag_service_id, largest_sibling_row )
                         
                     
@@ -762,6 +901,8 @@ class DB( HydrusDB.HydrusDB ):
                         
                         # the only things changed here are those implied by or that imply one of these values
                         
+                        row_weight = largest_parent_weight
+                        
                         ( a, b ) = largest_parent_row
                         
                         possibly_affected_tag_ids = { a, b }
@@ -774,9 +915,6 @@ class DB( HydrusDB.HydrusDB ):
                         previous_chain_tag_ids_to_implied_by = self.modules_tag_display.GetTagsToImpliedBy( ClientTags.TAG_DISPLAY_DISPLAY_ACTUAL, tag_service_id, possibly_affected_tag_ids )
                         
                         self._Execute( 'INSERT OR IGNORE INTO {} ( child_tag_id, ancestor_tag_id ) VALUES ( ?, ? );'.format( cache_actual_tag_parents_lookup_table_name ), largest_parent_row )
-                        
-                        after_chain_tag_ids_to_implied_by = self.modules_tag_display.GetTagsToImpliedBy( ClientTags.TAG_DISPLAY_DISPLAY_ACTUAL, tag_service_id, possibly_affected_tag_ids )
-                        
                         self.modules_tag_parents.NotifyParentAddRowSynced( tag_service_id, largest_parent_row )
                         
                     
@@ -788,66 +926,32 @@ class DB( HydrusDB.HydrusDB ):
             
             #
             
-            tag_ids_to_delete_implied_by = collections.defaultdict( set )
-            tag_ids_to_add_implied_by = collections.defaultdict( set )
+            # we don't touch the display mappings yet. we remember where these tags' implications started, and once we have a decent batch, we do them all at once
             
             for tag_id in possibly_affected_tag_ids:
                 
-                previous_implied_by = previous_chain_tag_ids_to_implied_by[ tag_id ]
-                after_implied_by = after_chain_tag_ids_to_implied_by[ tag_id ]
-                
-                to_delete = previous_implied_by.difference( after_implied_by )
-                to_add = after_implied_by.difference( previous_implied_by )
-                
-                if len( to_delete ) > 0:
-                    
-                    tag_ids_to_delete_implied_by[ tag_id ] = to_delete
-                    
-                    all_tag_ids_altered.add( tag_id )
-                    all_tag_ids_altered.update( to_delete )
-                    
-                
-                if len( to_add ) > 0:
+                if tag_id not in batch_tag_ids_to_previous_implied_by:
                     
-                    tag_ids_to_add_implied_by[ tag_id ] = to_add
-                    
-                    all_tag_ids_altered.add( tag_id )
-                    all_tag_ids_altered.update( to_add )
+                    batch_tag_ids_to_previous_implied_by[ tag_id ] = previous_chain_tag_ids_to_implied_by[ tag_id ]
                     
                 
             
-            # now do the implications
-            
-            # if I am feeling very clever, I could potentially add tag_ids_to_migrate_implied_by, which would be an UPDATE
-            # this would only work for tag_ids that have the same current implied by in actual and ideal (e.g. moving a tag sibling from A->B to B->A)
-            # may be better to do this in a merged add/deleteimplication function that would be able to well detect this with 'same current implied' of count > 0 for that domain
+            batch_weight += row_weight
             
-            file_service_ids = self.modules_services.GetServiceIds( HC.FILE_SERVICES_WITH_SPECIFIC_MAPPING_CACHES )
-            
-            for file_service_id in file_service_ids:
+            if batch_weight >= max_batch_weight:
                 
-                for ( tag_id, implication_tag_ids ) in tag_ids_to_delete_implied_by.items():
-                    
-                    self.modules_mappings_cache_specific_display.DeleteImplications( file_service_id, tag_service_id, implication_tag_ids, tag_id )
-                    
+                all_tag_ids_altered.update( self._CacheTagDisplayApplyImplicationChanges( tag_service_id, batch_tag_ids_to_previous_implied_by ) )
                 
-                for ( tag_id, implication_tag_ids ) in tag_ids_to_add_implied_by.items():
-                    
-                    self.modules_mappings_cache_specific_display.AddImplications( file_service_id, tag_service_id, implication_tag_ids, tag_id )
-                    
+                batch_tag_ids_to_previous_implied_by = {}
+                batch_weight = 0
                 
             
-            for ( tag_id, implication_tag_ids ) in tag_ids_to_delete_implied_by.items():
-                
-                self.modules_mappings_cache_combined_files_display.DeleteImplications( tag_service_id, implication_tag_ids, tag_id )
-                
+            ( sibling_rows_to_add, sibling_rows_to_remove, parent_rows_to_add, parent_rows_to_remove, num_actual_rows, num_ideal_rows ) = self.modules_tag_display.GetApplicationStatus( tag_service_id )
             
-            for ( tag_id, implication_tag_ids ) in tag_ids_to_add_implied_by.items():
-                
-                self.modules_mappings_cache_combined_files_display.AddImplications( tag_service_id, implication_tag_ids, tag_id )
-                
+        
+        if len( batch_tag_ids_to_previous_implied_by ) > 0:
             
-            ( sibling_rows_to_add, sibling_rows_to_remove, parent_rows_to_add, parent_rows_to_remove, num_actual_rows, num_ideal_rows ) = self.modules_tag_display.GetApplicationStatus( tag_service_id )
+            all_tag_ids_altered.update( self._CacheTagDisplayApplyImplicationChanges( tag_service_id, batch_tag_ids_to_previous_implied_by ) )
             
         
         if len( all_tag_ids_altered ) > 0:
@@ -861,6 +965,11 @@ class DB( HydrusDB.HydrusDB ):
         
         still_needs_work = len( sibling_rows_to_add ) + len( sibling_rows_to_remove ) + len( parent_rows_to_add ) + len( parent_rows_to_remove ) > 0
         
+        if not still_needs_work:
+            
+            self.modules_tag_display.ClearLookupIndices( tag_service_id = tag_service_id )
+            
+        
         return still_needs_work
         
     
@@ -1532,6 +1641,8 @@ class DB( HydrusDB.HydrusDB ):
                 
             
         
+        self._file_search_result_cache.ReapplyInvalidationsAfterJob()
+        
         HydrusDB.HydrusDB._DoAfterJobWork( self )
         
     
@@ -3763,7 +3874,7 @@ class DB( HydrusDB.HydrusDB ):
         
         try:
             
-            HydrusSerialisable.CreateFromNetworkBytes( update_network_bytes )
+            HydrusNetworkBinaryUpdates.CreateUpdateFromNetworkBytes( update_network_bytes )
             
         except:
             
@@ -3835,6 +3946,7 @@ class DB( HydrusDB.HydrusDB ):
         self._read_commands_to_methods.update(
             {
                 'autocomplete_predicates' : self.modules_tag_search.GetAutocompletePredicates,
+                'autocomplete_top_predicates' : self.modules_tag_search.GetAutocompleteTopPredicates,
                 'client_files_subfolders' : self.modules_files_physical_storage.GetClientFilesSubfolders,
                 'deferred_delete_data' : self.modules_db_maintenance.GetDeferredDeleteTableData,
                 'deferred_physical_delete' : self.modules_files_storage.GetDeferredPhysicalDelete,
@@ -4205,7 +4317,7 @@ class DB( HydrusDB.HydrusDB ):
         
         #
         
-        self.modules_similar_files = ClientDBSimilarFiles.ClientDBSimilarFiles( self._c, self.modules_services, self.modules_hashes, self.modules_files_storage )
+        self.modules_similar_files = ClientDBSimilarFiles.ClientDBSimilarFiles( self._c, self.modules_services, self.modules_hashes, self.modules_files_storage, self._perceptual_hash_search_index_cache, not self._is_read_pool_reader )
         
         self._modules.append( self.modules_similar_files )
         
@@ -4266,6 +4378,7 @@ class DB( HydrusDB.HydrusDB ):
             self._cursor_transaction_wrapper,
             self._after_job_content_update_packages,
             self._regen_tags_managers_hash_ids,
+            self._file_search_result_cache,
             self.modules_services,
             self.modules_tags,
             self.modules_texts,
@@ -4333,7 +4446,8 @@ class DB( HydrusDB.HydrusDB ):
             self.modules_tag_search,
             self.modules_similar_files,
             self.modules_files_duplicates,
-            self.modules_files_search_tags
+            self.modules_files_search_tags,
+            self._file_search_result_cache
         )
         
         self._modules.append( self.modules_files_query )
@@ -4380,6 +4494,26 @@ class DB( HydrusDB.HydrusDB ):
     
     def _ManageDBError( self, job, e ):
         
+        # we are about to roll back, and searches may have seen the writes we are undoing
+        self._file_search_result_cache.InvalidateAll()
+        
+        # same for the in-memory sibling and parent lookups and autocomplete indices
+        if hasattr( self, 'modules_tag_display' ):
+            
+            self.modules_tag_display.ClearLookupIndices()
+            
+        
+        if hasattr( self, 'modules_mappings_counts' ):
+            
+            self.modules_mappings_counts.ClearAutocompleteIndices()
+            
+        
+        # the similar files index is shared with the read pool, and only the main connection changes it
+        if hasattr( self, 'modules_similar_files' ) and not self._is_read_pool_reader:
+            
+            self.modules_similar_files.ClearSearchIndex()
+            
+        
         if isinstance( e, MemoryError ):
             
             HydrusData.ShowText( 'The client is running out of memory! Restart it ASAP!' )
@@ -4853,7 +4987,10 @@ class DB( HydrusDB.HydrusDB ):
         num_done = 0
         still_work_to_do = True
         
-        group_of_hash_ids = self._STL( self._Execute( 'SELECT hash_id FROM shape_search_cache WHERE searched_distance IS NULL or searched_distance < ?;', ( search_distance, ) ).fetchmany( 10 ) )
+        # the similar files search does a whole batch in one go, so we start small and grow the batch to fit our work time
+        batch_size = 16
+        
+        group_of_hash_ids = self._STL( self._Execute( 'SELECT hash_id FROM shape_search_cache WHERE searched_distance IS NULL or searched_distance < ?;', ( search_distance, ) ).fetchmany( batch_size ) )
         
         while len( group_of_hash_ids ) > 0:
             
@@ -4861,42 +4998,72 @@ class DB( HydrusDB.HydrusDB ):
             
             CG.client_controller.frame_splash_status.SetSubtext( text )
             
-            for ( i, hash_id ) in enumerate( group_of_hash_ids ):
+            if work_time_float is not None and HydrusTime.TimeHasPassedFloat( time_started_float + work_time_float ):
                 
-                if work_time_float is not None and HydrusTime.TimeHasPassedFloat( time_started_float + work_time_float ):
-                    
-                    return ( still_work_to_do, num_done )
-                    
+                return ( still_work_to_do, num_done )
                 
-                if job_status is not None:
-                    
-                    ( i_paused, should_stop ) = job_status.WaitIfNeeded()
-                    
-                    if should_stop:
-                        
-                        return ( still_work_to_do, num_done )
-                        
-                    
+            
+            if job_status is not None:
                 
-                should_stop = CG.client_controller.ShouldStopThisWork( maintenance_mode, stop_time = stop_time )
+                ( i_paused, should_stop ) = job_status.WaitIfNeeded()
                 
                 if should_stop:
                     
                     return ( still_work_to_do, num_done )
                     
                 
-                media_id = self.modules_files_duplicates.GetMediaId( hash_id )
+            
+            should_stop = CG.client_controller.ShouldStopThisWork( maintenance_mode, stop_time = stop_time )
+            
+            if should_stop:
+                
+                return ( still_work_to_do, num_done )
+                
+            
+            time_batch_started = HydrusTime.GetNowPrecise()
+            
+            hash_ids_to_similar_hash_ids_and_distances = self.modules_similar_files.SearchFiles( group_of_hash_ids, search_distance )
+            
+            all_hash_ids = set( hash_ids_to_similar_hash_ids_and_distances.keys() )
+            
+            for similar_hash_ids_and_distances in hash_ids_to_similar_hash_ids_and_distances.values():
+                
+                all_hash_ids.update( ( similar_hash_id for ( similar_hash_id, distance ) in similar_hash_ids_and_distances ) )
                 
-                potential_duplicate_media_ids_and_distances = [ ( self.modules_files_duplicates.GetMediaId( duplicate_hash_id ), distance ) for ( duplicate_hash_id, distance ) in self.modules_similar_files.SearchFile( hash_id, search_distance ) if duplicate_hash_id != hash_id ]
+            
+            hash_ids_to_media_ids = self.modules_files_duplicates.GetHashIdsToMediaIds( all_hash_ids )
+            
+            media_id_pairs_and_distances = []
+            
+            for ( hash_id, similar_hash_ids_and_distances ) in hash_ids_to_similar_hash_ids_and_distances.items():
                 
-                self.modules_files_duplicates.AddPotentialDuplicates( media_id, potential_duplicate_media_ids_and_distances )
+                media_id = hash_ids_to_media_ids[ hash_id ]
                 
-                self._Execute( 'UPDATE shape_search_cache SET searched_distance = ? WHERE hash_id = ?;', ( search_distance, hash_id ) )
+                media_id_pairs_and_distances.extend( ( ( media_id, hash_ids_to_media_ids[ similar_hash_id ], distance ) for ( similar_hash_id, distance ) in similar_hash_ids_and_distances if similar_hash_id != hash_id ) )
+                
+            
+            self.modules_files_duplicates.AddPotentialDuplicatePairs( media_id_pairs_and_distances )
+            
+            self._ExecuteMany( 'UPDATE shape_search_cache SET searched_distance = ? WHERE hash_id = ?;', ( ( search_distance, hash_id ) for hash_id in group_of_hash_ids ) )
+            
+            num_done += len( group_of_hash_ids )
+            
+            # aim for the rest of our work time, or about a second per batch so we still check for stop/pause regularly
+            
+            batch_time = max( HydrusTime.GetNowPrecise() - time_batch_started, 0.001 )
+            
+            files_per_second = len( group_of_hash_ids ) / batch_time
+            
+            target_time = 1.0
+            
+            if work_time_float is not None:
                 
-                num_done += 1
+                target_time = min( target_time, max( 0.0, time_started_float + work_time_float - HydrusTime.GetNowFloat() ) )
                 
             
-            group_of_hash_ids = self._STL( self._Execute( 'SELECT hash_id FROM shape_search_cache WHERE searched_distance IS NULL or searched_distance < ?;', ( search_distance, ) ).fetchmany( 10 ) )
+            batch_size = max( 1, min( batch_size * 4, int( target_time * files_per_second ), 4096 ) )
+            
+            group_of_hash_ids = self._STL( self._Execute( 'SELECT hash_id FROM shape_search_cache WHERE searched_distance IS NULL or searched_distance < ?;', ( search_distance, ) ).fetchmany( batch_size ) )
             
         
         still_work_to_do = False
@@ -6723,6 +6890,8 @@ class DB( HydrusDB.HydrusDB ):
                 # do not delete from actual!
                 self._Execute( 'DELETE FROM {};'.format( cache_ideal_tag_parents_lookup_table_name ) )
                 
+                self.modules_tag_parents.ClearLookupIndices( tag_service_id = service_id )
+                
             
             if HC.CONTENT_TYPE_TAG_SIBLINGS in content_types:
                 
@@ -6742,6 +6911,8 @@ class DB( HydrusDB.HydrusDB ):
                 
                 self._Execute( 'DELETE FROM {};'.format( cache_ideal_tag_siblings_lookup_table_name ) )
                 
+                self.modules_tag_siblings.ClearLookupIndices( tag_service_id = service_id )
+                
             
             #
             
@@ -9190,6 +9361,16 @@ class DB( HydrusDB.HydrusDB ):
                 
             
         
+        if version == 622:
+            
+            # session pages now record the import log blocks they refer to when saved. older pages are filled in by the next hashed storage maintenance
+            
+            if not self._TableExists( 'main.json_dumps_hashed_block_hashes' ):
+                
+                self._Execute( 'CREATE TABLE IF NOT EXISTS main.json_dumps_hashed_block_hashes ( hash BLOB_BYTES PRIMARY KEY, block_hashes BLOB_BYTES );' )
+                
+            
+        
         self._controller.frame_splash_status.SetTitleText( 'updated db to v{}'.format( HydrusNumbers.ToHumanInt( version + 1 ) ) )
         
         self._Execute( 'UPDATE version SET version = ?;', ( version + 1, ) )
@@ -9452,6 +9633,17 @@ class DB( HydrusDB.HydrusDB ):
             
         
     
+    def _Write( self, action, *args, **kwargs ):
+        
+        # content updates tell the search cache exactly what they touch. everything else that could change a search result clears it
+        if action not in self.FILE_SEARCH_RESULT_CACHE_SAFE_WRITE_ACTIONS:
+            
+            self._file_search_result_cache.InvalidateAll()
+            
+        
+        return HydrusDB.HydrusDB._Write( self, action, *args, **kwargs )
+        
+    
     def pub_content_update_package_after_commit( self, content_update_package ):
         
         self._after_job_content_update_packages.append( content_update_package )
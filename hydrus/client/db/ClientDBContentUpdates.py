@@ -41,6 +41,7 @@ from hydrus.client.db import ClientDBURLMap
 from hydrus.client.media import ClientMediaFileFilter # don't remove this without care, it initialises serialised object early
 from hydrus.client.metadata import ClientContentUpdates
 from hydrus.client.metadata import ClientTags
+from hydrus.client.search import ClientSearchResultCache
 
 # TODO: Ok I transplanted this giant list of modules here, and some of that is apprporiate, but we can consolidate. best candidates to start seem to be:
 # file add/delete/undelete
@@ -53,6 +54,7 @@ class ClientDBContentUpdates( ClientDBModule.ClientDBModule ):
         cursor_transaction_wrapper: HydrusDBBase.DBCursorTransactionWrapper,
         after_job_content_update_packages: list,
         regen_tags_managers_hash_ids: set,
+        file_search_result_cache: ClientSearchResultCache.FileSearchResultCache,
         modules_services: ClientDBServices.ClientDBMasterServices,
         modules_tags: ClientDBMaster.ClientDBMasterTags,
         modules_texts: ClientDBMaster.ClientDBMasterTexts,
@@ -84,6 +86,7 @@ class ClientDBContentUpdates( ClientDBModule.ClientDBModule ):
         self._cursor_transaction_wrapper = cursor_transaction_wrapper
         self._after_job_content_update_packages = after_job_content_update_packages
         self._regen_tags_managers_hash_ids = regen_tags_managers_hash_ids
+        self._file_search_result_cache = file_search_result_cache
         self.modules_services = modules_services
         self.modules_tags = modules_tags
         self.modules_texts = modules_texts
@@ -414,6 +417,8 @@ class ClientDBContentUpdates( ClientDBModule.ClientDBModule ):
             
             valid_content_update_package.AddContentUpdates( service_key, content_updates )
             
+            self._file_search_result_cache.Invalidate( service_key, content_updates )
+            
             service = self.modules_services.GetService( service_id )
             
             service_type = service.GetServiceType()
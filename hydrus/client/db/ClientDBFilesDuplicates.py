@@ -192,31 +192,79 @@ class ClientDBFilesDuplicates( ClientDBModule.ClientDBModule ):
     
     def AddPotentialDuplicates( self, media_id, potential_duplicate_media_ids_and_distances ):
         
-        inserts = []
+        self.AddPotentialDuplicatePairs( [ ( media_id, potential_duplicate_media_id, distance ) for ( potential_duplicate_media_id, distance ) in potential_duplicate_media_ids_and_distances ] )
+        
+    
+    def AddPotentialDuplicatePairs( self, media_id_pairs_and_distances: typing.Collection[ typing.Tuple[ int, int, int ] ] ):
         
-        for ( potential_duplicate_media_id, distance ) in potential_duplicate_media_ids_and_distances:
+        pairs_to_distances = {}
+        
+        for ( media_id_a, media_id_b, distance ) in media_id_pairs_and_distances:
             
-            if potential_duplicate_media_id == media_id: # already duplicates!
+            if media_id_a == media_id_b: # already duplicates!
                 
                 continue
                 
             
-            if self.MediasAreFalsePositive( media_id, potential_duplicate_media_id ):
+            pair = ( min( media_id_a, media_id_b ), max( media_id_a, media_id_b ) )
+            
+            if pair not in pairs_to_distances or distance < pairs_to_distances[ pair ]:
                 
-                continue
+                pairs_to_distances[ pair ] = distance
+                
+            
+        
+        if len( pairs_to_distances ) == 0:
+            
+            return
+            
+        
+        all_media_ids = set( itertools.chain.from_iterable( pairs_to_distances.keys() ) )
+        
+        with self._MakeTemporaryIntegerTable( all_media_ids, 'media_id' ) as temp_media_ids_table_name:
+            
+            media_ids_to_alternates_group_ids = dict( self._Execute( f'SELECT media_id, alternates_group_id FROM {temp_media_ids_table_name} CROSS JOIN alternate_file_group_members USING ( media_id );' ) )
+            
+            # temp medias to confirmed alternates
+            confirmed_alternate_pairs = set( self._Execute( f'SELECT smaller_media_id, larger_media_id FROM {temp_media_ids_table_name} CROSS JOIN confirmed_alternate_pairs ON ( {temp_media_ids_table_name}.media_id = confirmed_alternate_pairs.smaller_media_id );' ) )
+            
+        
+        false_positive_pairs = set()
+        
+        all_alternates_group_ids = set( media_ids_to_alternates_group_ids.values() )
+        
+        if len( all_alternates_group_ids ) > 1:
+            
+            with self._MakeTemporaryIntegerTable( all_alternates_group_ids, 'alternates_group_id' ) as temp_alternates_group_ids_table_name:
+                
+                # temp alternates groups to false positives
+                false_positive_pairs = set( self._Execute( f'SELECT smaller_alternates_group_id, larger_alternates_group_id FROM {temp_alternates_group_ids_table_name} CROSS JOIN duplicate_false_positives ON ( {temp_alternates_group_ids_table_name}.alternates_group_id = duplicate_false_positives.smaller_alternates_group_id );' ) )
                 
             
-            if self.MediasAreConfirmedAlternates( media_id, potential_duplicate_media_id ):
+        
+        inserts = []
+        
+        for ( ( smaller_media_id, larger_media_id ), distance ) in pairs_to_distances.items():
+            
+            if ( smaller_media_id, larger_media_id ) in confirmed_alternate_pairs:
                 
                 continue
                 
             
+            alternates_group_id_a = media_ids_to_alternates_group_ids.get( smaller_media_id, None )
+            alternates_group_id_b = media_ids_to_alternates_group_ids.get( larger_media_id, None )
+            
+            if alternates_group_id_a is not None and alternates_group_id_b is not None and alternates_group_id_a != alternates_group_id_b:
+                
+                if ( min( alternates_group_id_a, alternates_group_id_b ), max( alternates_group_id_a, alternates_group_id_b ) ) in false_positive_pairs:
+                    
+                    continue
+                    
+                
+            
             # if they are alternates with different alt label and index, do not add
             # however this _could_ be folded into areconfirmedalts on the setalt event--any other alt with diff label/index also gets added
             
-            smaller_media_id = min( media_id, potential_duplicate_media_id )
-            larger_media_id = max( media_id, potential_duplicate_media_id )
-            
             inserts.append( ( smaller_media_id, larger_media_id, distance ) )
             
         
@@ -1051,6 +1099,24 @@ class ClientDBFilesDuplicates( ClientDBModule.ClientDBModule ):
         return media_id
         
     
+    def GetHashIdsToMediaIds( self, hash_ids: typing.Collection[ int ] ) -> typing.Dict[ int, int ]:
+        
+        with self._MakeTemporaryIntegerTable( hash_ids, 'hash_id' ) as temp_hash_ids_table_name:
+            
+            hash_ids_to_media_ids = dict( self._Execute( f'SELECT hash_id, media_id FROM {temp_hash_ids_table_name} CROSS JOIN duplicate_file_members USING ( hash_id );' ) )
+            
+        
+        for hash_id in hash_ids:
+            
+            if hash_id not in hash_ids_to_media_ids:
+                
+                hash_ids_to_media_ids[ hash_id ] = self.GetMediaId( hash_id )
+                
+            
+        
+        return hash_ids_to_media_ids
+        
+    
     def GetPotentialDuplicatePairsTableJoinGetInitialTablesAndPreds( self, pixel_dupes_preference: int, max_hamming_distance: int, master_potential_duplicate_pairs_table_name = 'potential_duplicate_pairs' ):
         
         # little note but the 'master_potential_duplicate_pairs_table_name' needs a distance column! not just the media pair
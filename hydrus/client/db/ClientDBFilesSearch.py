@@ -33,6 +33,7 @@ from hydrus.client.metadata import ClientTags
 from hydrus.client.search import ClientNumberTest
 from hydrus.client.search import ClientSearchFileSearchContext
 from hydrus.client.search import ClientSearchPredicate
+from hydrus.client.search import ClientSearchResultCache
 from hydrus.client.search import ClientSearchTagContext
 
 def intersection_update_qhi( query_hash_ids: typing.Optional[ typing.Set[ int ] ], some_hash_ids: typing.Collection[ int ], force_create_new_set = False ) -> typing.Set[ int ]:
@@ -54,6 +55,23 @@ def intersection_update_qhi( query_hash_ids: typing.Optional[ typing.Set[ int ]
         
     
 
+# sorts that TryToSortHashIds does on a single indexed column, so a search with a limit can walk the index in sort order
+PROGRESSIVE_SORTS_TO_TABLES_AND_COLUMNS = {
+    CC.SORT_FILES_BY_FILESIZE : ( 'files_info', 'size' ),
+    CC.SORT_FILES_BY_DURATION : ( 'files_info', 'duration' ),
+    CC.SORT_FILES_BY_NUM_FRAMES : ( 'files_info', 'num_frames' ),
+    CC.SORT_FILES_BY_WIDTH : ( 'files_info', 'width' ),
+    CC.SORT_FILES_BY_HEIGHT : ( 'files_info', 'height' ),
+    CC.SORT_FILES_BY_ARCHIVED_TIMESTAMP : ( 'archive_timestamps', 'archived_timestamp_ms' )
+}
+
+def GetTagSearchSortKey( tag: str, estimated_count: typing.Optional[ int ] ):
+    
+    # most selective first. if the counts cache can't tell us, we guess that long namespaced tags are rarer
+    
+    return ( estimated_count is None, 0 if estimated_count is None else estimated_count, 1 if HydrusTags.IsUnnamespaced( tag ) else 0, -len( tag ) )
+    
+
 def GetFilesInfoPredicates( system_predicates: ClientSearchFileSearchContext.FileSystemPredicates ):
     
     simple_preds = system_predicates.GetSimpleInfo()
@@ -1010,6 +1028,55 @@ class ClientDBFilesSearchTags( ClientDBModule.ClientDBModule ):
         return tables_and_columns
         
     
+    def GetTagCountEstimate( self, tag_display_type: int, location_context: ClientLocation.LocationContext, tag_context: ClientSearchTagContext.TagContext, tag: str ) -> typing.Optional[ int ]:
+        
+        # an upper bound on how many files GetHashIdsFromTag will give, straight from the counts cache. None if we can't say
+        
+        if not self.modules_tags.TagExists( tag ):
+            
+            return 0
+            
+        
+        if tag_context.service_key == CC.COMBINED_TAG_SERVICE_KEY:
+            
+            search_tag_service_ids = self.modules_services.GetServiceIds( HC.REAL_TAG_SERVICES )
+            
+        else:
+            
+            search_tag_service_ids = ( self.modules_services.GetServiceId( tag_context.service_key ), )
+            
+        
+        ( file_service_keys, file_location_is_cross_referenced ) = location_context.GetCoveringCurrentFileServiceKeys()
+        
+        tag_id = self.modules_tags.GetTagId( tag )
+        
+        estimate = 0
+        
+        for file_service_key in file_service_keys:
+            
+            file_service_id = self.modules_services.GetServiceId( file_service_key )
+            
+            if file_service_id != self.modules_services.combined_file_service_id and self.modules_services.GetService( file_service_id ).GetServiceType() not in HC.FILE_SERVICES_WITH_SPECIFIC_MAPPING_CACHES:
+                
+                return None
+                
+            
+            for search_tag_service_id in search_tag_service_ids:
+                
+                ideal_tag_id = self.modules_tag_siblings.GetIdealTagId( tag_display_type, search_tag_service_id, tag_id )
+                
+                ids_to_count = self.modules_mappings_counts.GetCounts( tag_display_type, search_tag_service_id, file_service_id, ( ideal_tag_id, ), tag_context.include_current_tags, tag_context.include_pending_tags )
+                
+                for ( current_min, current_max, pending_min, pending_max ) in ids_to_count.values():
+                    
+                    estimate += current_max + pending_max
+                    
+                
+            
+        
+        return estimate
+        
+    
 
 
 class ClientDBFilesQuery( ClientDBModule.ClientDBModule ):
@@ -1032,7 +1099,8 @@ class ClientDBFilesQuery( ClientDBModule.ClientDBModule ):
         modules_tag_search: ClientDBTagSearch.ClientDBTagSearch,
         modules_similar_files: ClientDBSimilarFiles.ClientDBSimilarFiles,
         modules_files_duplicates: ClientDBFilesDuplicates.ClientDBFilesDuplicates,
-        modules_files_search_tags: ClientDBFilesSearchTags
+        modules_files_search_tags: ClientDBFilesSearchTags,
+        file_search_result_cache: ClientSearchResultCache.FileSearchResultCache
     ):
         
         # this is obviously a monster, so the solution is going to be to merge the sub-modules into 'search' modules like the 'tags' one above. this guy doesn't have to do search, it can farm that work out
@@ -1054,6 +1122,8 @@ class ClientDBFilesQuery( ClientDBModule.ClientDBModule ):
         self.modules_files_duplicates = modules_files_duplicates
         self.modules_files_search_tags = modules_files_search_tags
         
+        self._file_search_result_cache = file_search_result_cache
+        
         super().__init__( 'client file query', cursor )
         
     
@@ -1407,6 +1477,49 @@ class ClientDBFilesQuery( ClientDBModule.ClientDBModule ):
                 
             
         
+        return query_hash_ids
+        
+    
+    def _DoTagPreds( self, file_search_context: ClientSearchFileSearchContext.FileSearchContext, job_status: ClientThreading.JobStatus, tags_to_include: typing.Collection[ str ], tags_to_count_estimates: typing.Dict[ str, typing.Optional[ int ] ], query_hash_ids: typing.Optional[ typing.Set[ int ] ] ) -> typing.Optional[ typing.Set[ int ] ]:
+        
+        location_context = file_search_context.GetLocationContext()
+        tag_context = file_search_context.GetTagContext()
+        
+        is_inbox = file_search_context.GetSystemPredicates().MustBeInbox()
+        
+        for tag in tags_to_include:
+            
+            estimated_count = tags_to_count_estimates.get( tag, None )
+            
+            if query_hash_ids is None:
+                
+                tag_query_hash_ids = self.modules_files_search_tags.GetHashIdsFromTag( ClientTags.TAG_DISPLAY_DISPLAY_ACTUAL, location_context, tag_context, tag, job_status = job_status )
+                
+            elif estimated_count is not None and not ClientDBMappingsStorage.DoingAFileJoinTagSearchIsFaster( len( query_hash_ids ), estimated_count ):
+                
+                # the tag is small next to what we have so far, so reading it off its own index and intersecting here beats copying all our results into a temp table
+                tag_query_hash_ids = self.modules_files_search_tags.GetHashIdsFromTag( ClientTags.TAG_DISPLAY_DISPLAY_ACTUAL, location_context, tag_context, tag, job_status = job_status )
+                
+            elif is_inbox and len( query_hash_ids ) == len( self.modules_files_inbox.inbox_hash_ids ):
+                
+                tag_query_hash_ids = self.modules_files_search_tags.GetHashIdsFromTag( ClientTags.TAG_DISPLAY_DISPLAY_ACTUAL, location_context, tag_context, tag, hash_ids = self.modules_files_inbox.inbox_hash_ids, hash_ids_table_name = 'file_inbox', job_status = job_status )
+                
+            else:
+                
+                with self._MakeTemporaryIntegerTable( query_hash_ids, 'hash_id' ) as temp_table_name:
+                    
+                    tag_query_hash_ids = self.modules_files_search_tags.GetHashIdsFromTag( ClientTags.TAG_DISPLAY_DISPLAY_ACTUAL, location_context, tag_context, tag, hash_ids = query_hash_ids, hash_ids_table_name = temp_table_name, job_status = job_status )
+                    
+                
+            
+            query_hash_ids = intersection_update_qhi( query_hash_ids, tag_query_hash_ids )
+            
+            if len( query_hash_ids ) == 0 or job_status.IsCancelled():
+                
+                break
+                
+            
+        
         return query_hash_ids
         
     
@@ -1510,20 +1623,7 @@ class ClientDBFilesQuery( ClientDBModule.ClientDBModule ):
         return ( query_hash_ids, have_cross_referenced_file_locations )
         
     
-    def GetHashIdsFromQuery(
-        self,
-        file_search_context: ClientSearchFileSearchContext.FileSearchContext,
-        job_status: typing.Optional[ ClientThreading.JobStatus ] = None,
-        query_hash_ids: typing.Optional[ set ] = None,
-        apply_implicit_limit: bool = True,
-        sort_by: typing.Optional[ ClientMedia.MediaSort ] = None,
-        limit_sort_by: typing.Optional[ ClientMedia.MediaSort ] = None
-    ) -> typing.List[ int ]:
-        
-        if job_status is None:
-            
-            job_status = ClientThreading.JobStatus( cancellable = True )
-            
+    def _GetHashIdsFromQuery( self, file_search_context: ClientSearchFileSearchContext.FileSearchContext, job_status: ClientThreading.JobStatus, query_hash_ids: typing.Optional[ set ] ) -> typing.List[ int ]:
         
         if query_hash_ids is not None:
             
@@ -1534,13 +1634,6 @@ class ClientDBFilesQuery( ClientDBModule.ClientDBModule ):
         
         system_predicates = file_search_context.GetSystemPredicates()
         
-        system_limit = system_predicates.GetLimit( apply_implicit_limit = apply_implicit_limit )
-        
-        if system_limit == 0:
-            
-            return []
-            
-        
         location_context = file_search_context.GetLocationContext()
         tag_context = file_search_context.GetTagContext()
         
@@ -1618,6 +1711,15 @@ class ClientDBFilesQuery( ClientDBModule.ClientDBModule ):
         not_all_known_files = not location_context.IsAllKnownFiles()
         there_are_tags_to_search = len( tags_to_include ) > 0 or len( namespaces_to_include ) > 0 or len( wildcards_to_include ) > 0
         
+        # the counts cache tells us roughly how many files each tag has, so we can do the most selective first
+        
+        tags_to_count_estimates = { tag : self.modules_files_search_tags.GetTagCountEstimate( ClientTags.TAG_DISPLAY_DISPLAY_ACTUAL, location_context, tag_context, tag ) for tag in tags_to_include }
+        
+        tags_to_include = sorted( tags_to_include, key = lambda t: GetTagSearchSortKey( t, tags_to_count_estimates[ t ] ) )
+        
+        # when we know the counts, tags go before the system predicates. a rare tag then makes the later intersections cheap, and a tag nothing has ends the search right away
+        do_tags_first = len( tags_to_include ) > 0 and None not in tags_to_count_estimates.values()
+        
         # ok, let's set up the big list of simple search preds
         
         files_info_predicates = GetFilesInfoPredicates( system_predicates )
@@ -1669,6 +1771,24 @@ class ClientDBFilesQuery( ClientDBModule.ClientDBModule ):
                 
             
         
+        #
+        
+        done_tags_to_include = False
+        
+        if do_tags_first:
+            
+            query_hash_ids = self._DoTagPreds( file_search_context, job_status, tags_to_include, tags_to_count_estimates, query_hash_ids )
+            
+            have_cross_referenced_file_locations = True
+            
+            done_tags_to_include = True
+            
+            if len( query_hash_ids ) == 0 or job_status.IsCancelled():
+                
+                return []
+                
+            
+        
         #
 
         ( query_hash_ids, have_cross_referenced_file_locations ) = self._DoTimestampPreds( file_search_context, query_hash_ids, have_cross_referenced_file_locations, job_status = job_status )
@@ -1836,34 +1956,9 @@ class ClientDBFilesQuery( ClientDBModule.ClientDBModule ):
         
         if there_are_tags_to_search:
             
-            def sort_longest_tag_first_key( s ):
-                
-                return ( 1 if HydrusTags.IsUnnamespaced( s ) else 0, -len( s ) )
-                
-            
-            tags_to_include = list( tags_to_include )
-            
-            tags_to_include.sort( key = sort_longest_tag_first_key )
-            
-            for tag in tags_to_include:
-                
-                if query_hash_ids is None:
-                    
-                    tag_query_hash_ids = self.modules_files_search_tags.GetHashIdsFromTag( ClientTags.TAG_DISPLAY_DISPLAY_ACTUAL, location_context, tag_context, tag, job_status = job_status )
-                    
-                elif is_inbox and len( query_hash_ids ) == len( self.modules_files_inbox.inbox_hash_ids ):
-                    
-                    tag_query_hash_ids = self.modules_files_search_tags.GetHashIdsFromTag( ClientTags.TAG_DISPLAY_DISPLAY_ACTUAL, location_context, tag_context, tag, hash_ids = self.modules_files_inbox.inbox_hash_ids, hash_ids_table_name = 'file_inbox', job_status = job_status )
-                    
-                else:
-                    
-                    with self._MakeTemporaryIntegerTable( query_hash_ids, 'hash_id' ) as temp_table_name:
-                        
-                        tag_query_hash_ids = self.modules_files_search_tags.GetHashIdsFromTag( ClientTags.TAG_DISPLAY_DISPLAY_ACTUAL, location_context, tag_context, tag, hash_ids = query_hash_ids, hash_ids_table_name = temp_table_name, job_status = job_status )
-                        
-                    
+            if not done_tags_to_include and len( tags_to_include ) > 0:
                 
-                query_hash_ids = intersection_update_qhi( query_hash_ids, tag_query_hash_ids )
+                query_hash_ids = self._DoTagPreds( file_search_context, job_status, tags_to_include, tags_to_count_estimates, query_hash_ids )
                 
                 have_cross_referenced_file_locations = True
                 
@@ -2586,7 +2681,196 @@ class ClientDBFilesQuery( ClientDBModule.ClientDBModule ):
         
         #
         
-        query_hash_ids = list( query_hash_ids )
+        return list( query_hash_ids )
+        
+    
+    def _GetHashIdsFromQueryProgressively( self, file_search_context: ClientSearchFileSearchContext.FileSearchContext, job_status: ClientThreading.JobStatus, sort_by: ClientMedia.MediaSort, limit: int ) -> typing.Optional[ typing.List[ int ] ]:
+        
+        # for 'the newest 500 files that match x', we walk the sort column's index in order, search each chunk, and stop when we have enough
+        # returns None if the sort can't be walked or the matches are too rare to be worth it, in which case do a normal search
+        
+        location_context = file_search_context.GetLocationContext()
+        
+        if not sort_by.CanSortAtDBLevel( location_context ):
+            
+            return None
+            
+        
+        ( sort_metadata, sort_data ) = sort_by.sort_type
+        
+        if sort_metadata != 'system':
+            
+            return None
+            
+        
+        if sort_data == CC.SORT_FILES_BY_IMPORT_TIME:
+            
+            # same table as TryToSortHashIds
+            
+            if location_context.IsOneDomain() and location_context.IncludesCurrent():
+                
+                file_service_key = list( location_context.current_service_keys )[0]
+                
+            else:
+                
+                file_service_key = CC.COMBINED_LOCAL_FILE_SERVICE_KEY
+                
+            
+            file_service_id = self.modules_services.GetServiceId( file_service_key )
+            
+            table_name = ClientDBFilesStorage.GenerateFilesTableName( file_service_id, HC.CONTENT_STATUS_CURRENT )
+            column_name = 'timestamp_ms'
+            
+        elif sort_data in PROGRESSIVE_SORTS_TO_TABLES_AND_COLUMNS:
+            
+            ( table_name, column_name ) = PROGRESSIVE_SORTS_TO_TABLES_AND_COLUMNS[ sort_data ]
+            
+        else:
+            
+            return None
+            
+        
+        # sqlite puts NULL first ascending and last descending, just like the -1 that TryToSortHashIds gives them
+        # hash_id breaks ties, so every chunk picks up exactly where the last left off
+        
+        order = 'DESC' if sort_by.sort_order == CC.SORT_DESC else 'ASC'
+        
+        query = 'SELECT hash_id FROM {} ORDER BY {} {}, hash_id {} LIMIT ? OFFSET ?;'.format( table_name, column_name, order, order )
+        
+        # we double the chunk every time, so rare matches cost us a handful of rounds, not a round per file
+        
+        chunk_size = max( limit * 4, 256 )
+        max_num_walked = max( limit * 64, 65536 )
+        
+        num_walked = 0
+        
+        result_hash_ids = []
+        
+        while len( result_hash_ids ) < limit:
+            
+            if num_walked >= max_num_walked:
+                
+                # the matches are rare, so a normal search will be quicker
+                
+                return None
+                
+            
+            chunk_hash_ids = self._STL( self._Execute( query, ( chunk_size, num_walked ) ) )
+            
+            if len( chunk_hash_ids ) == 0:
+                
+                # files with no row in the sort table go at the end of a normal sort, so let the normal search sort that out
+                
+                return None
+                
+            
+            num_walked += len( chunk_hash_ids )
+            
+            matching_hash_ids = set( self._GetHashIdsFromQuery( file_search_context, job_status, set( chunk_hash_ids ) ) )
+            
+            if job_status.IsCancelled():
+                
+                return []
+                
+            
+            result_hash_ids.extend( ( hash_id for hash_id in chunk_hash_ids if hash_id in matching_hash_ids ) )
+            
+            chunk_size *= 2
+            
+        
+        return result_hash_ids[ : limit ]
+        
+    
+    def GetHashIdsFromQuery(
+        self,
+        file_search_context: ClientSearchFileSearchContext.FileSearchContext,
+        job_status: typing.Optional[ ClientThreading.JobStatus ] = None,
+        query_hash_ids: typing.Optional[ set ] = None,
+        apply_implicit_limit: bool = True,
+        sort_by: typing.Optional[ ClientMedia.MediaSort ] = None,
+        limit_sort_by: typing.Optional[ ClientMedia.MediaSort ] = None,
+        progressive: bool = False
+    ) -> typing.List[ int ]:
+        
+        if job_status is None:
+            
+            job_status = ClientThreading.JobStatus( cancellable = True )
+            
+        
+        system_limit = file_search_context.GetSystemPredicates().GetLimit( apply_implicit_limit = apply_implicit_limit )
+        
+        if system_limit == 0:
+            
+            return []
+            
+        
+        location_context = file_search_context.GetLocationContext()
+        
+        # sub-searches that are handed a set of files to filter are a different question every time, so they always go to the db
+        
+        dependencies = None
+        
+        if query_hash_ids is None:
+            
+            dependencies = ClientSearchResultCache.GetDependencies( file_search_context )
+            
+        
+        cache_key = None
+        cached_hash_ids = None
+        
+        if dependencies is not None:
+            
+            cache_key = ClientSearchResultCache.GetCacheKey( file_search_context )
+            
+            cached_hash_ids = self._file_search_result_cache.GetResult( cache_key )
+            
+        
+        if progressive and cached_hash_ids is None and query_hash_ids is None and system_limit is not None:
+            
+            # a cached full result is always quicker, but otherwise we can walk the sort index and stop as soon as we have enough
+            
+            progressive_sort_by = sort_by if sort_by is not None else limit_sort_by
+            
+            if progressive_sort_by is not None:
+                
+                progressive_hash_ids = self._GetHashIdsFromQueryProgressively( file_search_context, job_status, progressive_sort_by, system_limit )
+                
+                if job_status.IsCancelled():
+                    
+                    return []
+                    
+                
+                if progressive_hash_ids is not None:
+                    
+                    return progressive_hash_ids
+                    
+                
+            
+        
+        if cached_hash_ids is not None:
+            
+            query_hash_ids = cached_hash_ids
+            
+        elif dependencies is None:
+            
+            query_hash_ids = self._GetHashIdsFromQuery( file_search_context, job_status, query_hash_ids )
+            
+        else:
+            
+            generation = self._file_search_result_cache.GetGeneration()
+            
+            query_hash_ids = self._GetHashIdsFromQuery( file_search_context, job_status, None )
+            
+            if not job_status.IsCancelled():
+                
+                self._file_search_result_cache.SetResult( cache_key, generation, query_hash_ids, dependencies )
+                
+            
+        
+        if job_status.IsCancelled():
+            
+            return []
+            
         
         #
         
@@ -29,6 +29,43 @@ class ClientDBMappingsCacheCombinedFilesDisplay( ClientDBModule.ClientDBModule )
         super().__init__( 'client combined files display mappings cache', cursor )
         
     
+    def _GetWithAndWithoutTagsFileCountsCombinedBatch( self, tag_service_id, tag_ids_to_with_tag_ids, tag_ids_to_without_tag_ids ):
+        
+        # GetWithAndWithoutTagsFileCountCombined for many display tags at once. one grouped query per status rather than a pair of queries per tag
+        
+        with_pairs = [ ( tag_id, with_tag_id ) for ( tag_id, with_tag_ids ) in tag_ids_to_with_tag_ids.items() for with_tag_id in with_tag_ids ]
+        without_pairs = [ ( tag_id, without_tag_id ) for ( tag_id, without_tag_ids ) in tag_ids_to_without_tag_ids.items() if tag_id in tag_ids_to_with_tag_ids for without_tag_id in without_tag_ids ]
+        
+        if len( with_pairs ) == 0:
+            
+            return []
+            
+        
+        statuses_to_tag_ids_to_count = collections.defaultdict( collections.Counter )
+        
+        ( current_mappings_table_name, deleted_mappings_table_name, pending_mappings_table_name, petitioned_mappings_table_name ) = ClientDBMappingsStorage.GenerateMappingsTableNames( tag_service_id )
+        
+        with self._MakeTemporaryIntegerTable( with_pairs, ( 'tag_id', 'implication_tag_id' ) ) as temp_with_table_name:
+            
+            with self._MakeTemporaryIntegerTable( without_pairs, ( 'tag_id', 'implication_tag_id' ) ) as temp_without_table_name:
+                
+                for ( status, mappings_table_name ) in ( ( HC.CONTENT_STATUS_CURRENT, current_mappings_table_name ), ( HC.CONTENT_STATUS_PENDING, pending_mappings_table_name ) ):
+                    
+                    query = f'SELECT with_pairs.tag_id, COUNT( DISTINCT mappings.hash_id ) FROM {temp_with_table_name} AS with_pairs CROSS JOIN {mappings_table_name} AS mappings ON ( mappings.tag_id = with_pairs.implication_tag_id ) WHERE NOT EXISTS ( SELECT 1 FROM {temp_without_table_name} AS without_pairs CROSS JOIN {mappings_table_name} AS without_mappings ON ( without_mappings.hash_id = mappings.hash_id AND without_mappings.tag_id = without_pairs.implication_tag_id ) WHERE without_pairs.tag_id = with_pairs.tag_id ) GROUP BY with_pairs.tag_id;'
+                    
+                    statuses_to_tag_ids_to_count[ status ].update( dict( self._Execute( query ) ) )
+                    
+                
+            
+        
+        current_counts = statuses_to_tag_ids_to_count[ HC.CONTENT_STATUS_CURRENT ]
+        pending_counts = statuses_to_tag_ids_to_count[ HC.CONTENT_STATUS_PENDING ]
+        
+        tag_ids = set( current_counts.keys() ).union( pending_counts.keys() )
+        
+        return [ ( tag_id, current_counts[ tag_id ], pending_counts[ tag_id ] ) for tag_id in tag_ids if current_counts[ tag_id ] > 0 or pending_counts[ tag_id ] > 0 ]
+        
+    
     def AddImplications( self, tag_service_id, implication_tag_ids, tag_id, status_hook = None ):
         
         if len( implication_tag_ids ) == 0:
@@ -48,6 +85,18 @@ class ClientDBMappingsCacheCombinedFilesDisplay( ClientDBModule.ClientDBModule )
             
         
     
+    def AddImplicationsBatch( self, tag_service_id, tag_ids_to_implication_tag_ids, tag_ids_to_previous_implication_tag_ids ):
+        
+        # a file gets the display tag if it has a new implication and had none of the old ones
+        
+        counts_cache_changes = self._GetWithAndWithoutTagsFileCountsCombinedBatch( tag_service_id, tag_ids_to_implication_tag_ids, tag_ids_to_previous_implication_tag_ids )
+        
+        if len( counts_cache_changes ) > 0:
+            
+            self.modules_mappings_counts_update.AddCounts( ClientTags.TAG_DISPLAY_DISPLAY_ACTUAL, self.modules_services.combined_file_service_id, tag_service_id, counts_cache_changes )
+            
+        
+    
     def AddMappingsForChained( self, tag_service_id, storage_tag_id, hash_ids ):
         
         ac_current_counts = collections.Counter()
@@ -122,6 +171,18 @@ class ClientDBMappingsCacheCombinedFilesDisplay( ClientDBModule.ClientDBModule )
             
         
     
+    def DeleteImplicationsBatch( self, tag_service_id, tag_ids_to_implication_tag_ids, tag_ids_to_remaining_implication_tag_ids ):
+        
+        # a file loses the display tag if it has a removed implication and none of the remaining ones
+        
+        counts_cache_changes = self._GetWithAndWithoutTagsFileCountsCombinedBatch( tag_service_id, tag_ids_to_implication_tag_ids, tag_ids_to_remaining_implication_tag_ids )
+        
+        if len( counts_cache_changes ) > 0:
+            
+            self.modules_mappings_counts_update.ReduceCounts( ClientTags.TAG_DISPLAY_DISPLAY_ACTUAL, self.modules_services.combined_file_service_id, tag_service_id, counts_cache_changes )
+            
+        
+    
     def DeleteMappingsForChained( self, tag_service_id, storage_tag_id, hash_ids ):
         
         ac_counts = collections.Counter()
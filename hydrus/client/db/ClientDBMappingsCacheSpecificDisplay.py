@@ -35,6 +35,16 @@ class ClientDBMappingsCacheSpecificDisplay( ClientDBModule.ClientDBModule ):
         super().__init__( 'client specific display mappings cache', cursor )
         
     
+    def _GetCountsCacheChanges( self, statuses_to_tag_ids_to_count_delta ):
+        
+        current_deltas = statuses_to_tag_ids_to_count_delta[ HC.CONTENT_STATUS_CURRENT ]
+        pending_deltas = statuses_to_tag_ids_to_count_delta[ HC.CONTENT_STATUS_PENDING ]
+        
+        tag_ids = set( current_deltas.keys() ).union( pending_deltas.keys() )
+        
+        return [ ( tag_id, current_deltas[ tag_id ], pending_deltas[ tag_id ] ) for tag_id in tag_ids ]
+        
+    
     def _GetServiceIndexGenerationDictSingle( self, file_service_id, tag_service_id ):
         
         ( cache_display_current_mappings_table_name, cache_display_pending_mappings_table_name ) = ClientDBMappingsStorage.GenerateSpecificDisplayMappingsCacheTableNames( file_service_id, tag_service_id )
@@ -270,6 +280,58 @@ class ClientDBMappingsCacheSpecificDisplay( ClientDBModule.ClientDBModule ):
             
         
     
+    def AddImplicationsBatch( self, file_service_id, tag_service_id, tag_ids_to_implication_tag_ids ):
+        
+        # this is AddImplications for a whole batch of chain changes at once
+        # rather than a query and a counts update per display tag, we do one insert per status and one counts update for the lot
+        
+        implication_pairs = [ ( tag_id, implication_tag_id ) for ( tag_id, implication_tag_ids ) in tag_ids_to_implication_tag_ids.items() for implication_tag_id in implication_tag_ids ]
+        
+        if len( implication_pairs ) == 0:
+            
+            return
+            
+        
+        ( cache_current_mappings_table_name, cache_deleted_mappings_table_name, cache_pending_mappings_table_name ) = ClientDBMappingsStorage.GenerateSpecificMappingsCacheTableNames( file_service_id, tag_service_id )
+        ( cache_display_current_mappings_table_name, cache_display_pending_mappings_table_name ) = ClientDBMappingsStorage.GenerateSpecificDisplayMappingsCacheTableNames( file_service_id, tag_service_id )
+        
+        statuses_to_tag_ids_to_count_delta = collections.defaultdict( collections.Counter )
+        
+        jobs = []
+        
+        jobs.append( ( HC.CONTENT_STATUS_CURRENT, cache_display_current_mappings_table_name, cache_current_mappings_table_name ) )
+        jobs.append( ( HC.CONTENT_STATUS_PENDING, cache_display_pending_mappings_table_name, cache_pending_mappings_table_name ) )
+        
+        with self._MakeTemporaryIntegerTable( implication_pairs, ( 'tag_id', 'implication_tag_id' ) ) as temp_implications_table_name:
+            
+            for ( status, cache_display_mappings_table_name, cache_mappings_table_name ) in jobs:
+                
+                with self._MakeTemporaryIntegerTable( [], ( 'hash_id', 'tag_id' ) ) as temp_addees_table_name:
+                    
+                    # every display row the new implications make, less what is already there
+                    
+                    self._Execute( f'INSERT INTO {temp_addees_table_name} ( hash_id, tag_id ) SELECT DISTINCT mappings.hash_id, implications.tag_id FROM {temp_implications_table_name} AS implications CROSS JOIN {cache_mappings_table_name} AS mappings ON ( mappings.tag_id = implications.implication_tag_id ) WHERE NOT EXISTS ( SELECT 1 FROM {cache_display_mappings_table_name} AS display_mappings WHERE display_mappings.hash_id = mappings.hash_id AND display_mappings.tag_id = implications.tag_id );' )
+                    
+                    if self._GetRowCount() == 0:
+                        
+                        continue
+                        
+                    
+                    statuses_to_tag_ids_to_count_delta[ status ].update( dict( self._Execute( f'SELECT tag_id, COUNT( * ) FROM {temp_addees_table_name} GROUP BY tag_id;' ) ) )
+                    
+                    self._Execute( f'INSERT OR IGNORE INTO {cache_display_mappings_table_name} ( hash_id, tag_id ) SELECT hash_id, tag_id FROM {temp_addees_table_name};' )
+                    
+                
+            
+        
+        counts_cache_changes = self._GetCountsCacheChanges( statuses_to_tag_ids_to_count_delta )
+        
+        if len( counts_cache_changes ) > 0:
+            
+            self.modules_mappings_counts_update.AddCounts( ClientTags.TAG_DISPLAY_DISPLAY_ACTUAL, file_service_id, tag_service_id, counts_cache_changes )
+            
+        
+    
     def AddMappings( self, file_service_id, tag_service_id, tag_id, hash_ids ):
         
         # this guy doesn't do rescind pend because of storage calculation issues that need that to occur before deletes to storage tables
@@ -481,6 +543,63 @@ class ClientDBMappingsCacheSpecificDisplay( ClientDBModule.ClientDBModule ):
             
         
     
+    def DeleteImplicationsBatch( self, file_service_id, tag_service_id, tag_ids_to_implication_tag_ids, tag_ids_to_remaining_implication_tag_ids ):
+        
+        # this is DeleteImplications for a whole batch of chain changes at once
+        # we delete all display mappings with hash_ids that have a storage mapping for a removee tag and no storage mappings for a remaining tag, for every display tag in one go
+        
+        removee_pairs = [ ( tag_id, implication_tag_id ) for ( tag_id, implication_tag_ids ) in tag_ids_to_implication_tag_ids.items() for implication_tag_id in implication_tag_ids ]
+        
+        if len( removee_pairs ) == 0:
+            
+            return
+            
+        
+        keep_pairs = [ ( tag_id, implication_tag_id ) for ( tag_id, implication_tag_ids ) in tag_ids_to_remaining_implication_tag_ids.items() if tag_id in tag_ids_to_implication_tag_ids for implication_tag_id in implication_tag_ids ]
+        
+        ( cache_current_mappings_table_name, cache_deleted_mappings_table_name, cache_pending_mappings_table_name ) = ClientDBMappingsStorage.GenerateSpecificMappingsCacheTableNames( file_service_id, tag_service_id )
+        ( cache_display_current_mappings_table_name, cache_display_pending_mappings_table_name ) = ClientDBMappingsStorage.GenerateSpecificDisplayMappingsCacheTableNames( file_service_id, tag_service_id )
+        
+        statuses_to_tag_ids_to_count_delta = collections.defaultdict( collections.Counter )
+        
+        jobs = []
+        
+        jobs.append( ( HC.CONTENT_STATUS_CURRENT, cache_display_current_mappings_table_name, cache_current_mappings_table_name ) )
+        jobs.append( ( HC.CONTENT_STATUS_PENDING, cache_display_pending_mappings_table_name, cache_pending_mappings_table_name ) )
+        
+        with self._MakeTemporaryIntegerTable( removee_pairs, ( 'tag_id', 'implication_tag_id' ) ) as temp_removees_table_name:
+            
+            with self._MakeTemporaryIntegerTable( keep_pairs, ( 'tag_id', 'implication_tag_id' ) ) as temp_keeps_table_name:
+                
+                for ( status, cache_display_mappings_table_name, cache_mappings_table_name ) in jobs:
+                    
+                    with self._MakeTemporaryIntegerTable( [], ( 'hash_id', 'tag_id' ) ) as temp_deletees_table_name:
+                        
+                        # we go removee tags to their files to the display rows that actually exist, and then check each of those files for a remaining tag
+                        
+                        self._Execute( f'INSERT INTO {temp_deletees_table_name} ( hash_id, tag_id ) SELECT DISTINCT display_mappings.hash_id, display_mappings.tag_id FROM {temp_removees_table_name} AS removees CROSS JOIN {cache_mappings_table_name} AS mappings ON ( mappings.tag_id = removees.implication_tag_id ) CROSS JOIN {cache_display_mappings_table_name} AS display_mappings ON ( display_mappings.hash_id = mappings.hash_id AND display_mappings.tag_id = removees.tag_id ) WHERE NOT EXISTS ( SELECT 1 FROM {temp_keeps_table_name} AS keeps CROSS JOIN {cache_mappings_table_name} AS keep_mappings ON ( keep_mappings.hash_id = mappings.hash_id AND keep_mappings.tag_id = keeps.implication_tag_id ) WHERE keeps.tag_id = removees.tag_id );' )
+                        
+                        if self._GetRowCount() == 0:
+                            
+                            continue
+                            
+                        
+                        statuses_to_tag_ids_to_count_delta[ status ].update( dict( self._Execute( f'SELECT tag_id, COUNT( * ) FROM {temp_deletees_table_name} GROUP BY tag_id;' ) ) )
+                        
+                        self._Execute( f'DELETE FROM {cache_display_mappings_table_name} WHERE ( hash_id, tag_id ) IN ( SELECT hash_id, tag_id FROM {temp_deletees_table_name} );' )
+                        
+                    
+                
+            
+        
+        counts_cache_changes = self._GetCountsCacheChanges( statuses_to_tag_ids_to_count_delta )
+        
+        if len( counts_cache_changes ) > 0:
+            
+            self.modules_mappings_counts_update.ReduceCounts( ClientTags.TAG_DISPLAY_DISPLAY_ACTUAL, file_service_id, tag_service_id, counts_cache_changes )
+            
+        
+    
     def DeleteMappings( self, file_service_id, tag_service_id, storage_tag_id, hash_ids ):
         
         ( cache_display_current_mappings_table_name, cache_display_pending_mappings_table_name ) = ClientDBMappingsStorage.GenerateSpecificDisplayMappingsCacheTableNames( file_service_id, tag_service_id )
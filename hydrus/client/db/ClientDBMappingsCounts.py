@@ -10,12 +10,19 @@ from hydrus.client.db import ClientDBMaintenance
 from hydrus.client.db import ClientDBModule
 from hydrus.client.db import ClientDBServices
 from hydrus.client.metadata import ClientTags
+from hydrus.client.metadata import ClientTagsAutocompleteIndex
 
 FILES_COMBINED_AC_CACHE_PREFIX = 'combined_files_ac_cache_'
 FILES_COMBINED_DISPLAY_AC_CACHE_PREFIX = 'combined_files_display_ac_cache_'
 FILES_SPECIFIC_AC_CACHE_PREFIX = 'specific_ac_cache_'
 FILES_SPECIFIC_DISPLAY_AC_CACHE_PREFIX = 'specific_display_ac_cache_'
 
+# past this many changes, it is faster to fetch the existing rows in one go than to test every tag with its own query
+BULK_COUNTS_CHANGE_THRESHOLD = 64
+
+# each autocomplete index is a few tens of MB, so we only hold the most recently searched few
+MAX_AUTOCOMPLETE_INDICES = 4
+
 def GenerateCombinedFilesMappingsCountsCacheTableName( tag_display_type, tag_service_id ):
     
     if tag_display_type == ClientTags.TAG_DISPLAY_STORAGE:
@@ -74,6 +81,40 @@ class ClientDBMappingsCounts( ClientDBModule.ClientDBModule ):
         self._missing_storage_tag_service_pairs = set()
         self._missing_display_tag_service_pairs = set()
         
+        # ( tag_display_type, file_service_id, tag_service_id ) to in-memory autocomplete indices, most recently used last
+        self._autocomplete_indices = collections.OrderedDict()
+        
+    
+    def _DiscardAutocompleteIndex( self, tag_display_type, file_service_id, tag_service_id ):
+        
+        key = ( tag_display_type, file_service_id, tag_service_id )
+        
+        if key in self._autocomplete_indices:
+            
+            del self._autocomplete_indices[ key ]
+            
+        
+    
+    def _GetAutocompleteIndex( self, tag_display_type, file_service_id, tag_service_id ) -> typing.Optional[ ClientTagsAutocompleteIndex.TagAutocompleteIndex ]:
+        
+        return self._autocomplete_indices.get( ( tag_display_type, file_service_id, tag_service_id ), None )
+        
+    
+    def _GetExistingCounts( self, counts_cache_table_name, tag_ids ):
+        
+        with self._MakeTemporaryIntegerTable( tag_ids, 'tag_id' ) as temp_tag_ids_table_name:
+            
+            return { tag_id : ( current_count, pending_count ) for ( tag_id, current_count, pending_count ) in self._Execute( 'SELECT tag_id, current_count, pending_count FROM {} CROSS JOIN {} USING ( tag_id );'.format( temp_tag_ids_table_name, counts_cache_table_name ) ) }
+            
+        
+    
+    def _GetExistingTagIds( self, counts_cache_table_name, tag_ids ):
+        
+        with self._MakeTemporaryIntegerTable( tag_ids, 'tag_id' ) as temp_tag_ids_table_name:
+            
+            return self._STS( self._Execute( 'SELECT tag_id FROM {} CROSS JOIN {} USING ( tag_id );'.format( temp_tag_ids_table_name, counts_cache_table_name ) ) )
+            
+        
     
     def _GetServiceTableGenerationDictSingle( self, tag_display_type, file_service_id, tag_service_id ):
         
@@ -165,17 +206,35 @@ class ClientDBMappingsCounts( ClientDBModule.ClientDBModule ):
         new_tag_ids = set()
         new_local_tag_ids = set()
         
-        for ( tag_id, current_delta, pending_delta ) in ac_cache_changes:
+        if len( ac_cache_changes ) >= BULK_COUNTS_CHANGE_THRESHOLD:
+            
+            existing_tag_ids = self._GetExistingTagIds( counts_cache_table_name, ( tag_id for ( tag_id, current_delta, pending_delta ) in ac_cache_changes ) )
+            
+            new_rows = [ row for row in ac_cache_changes if row[0] not in existing_tag_ids ]
+            
+            self._ExecuteMany( 'INSERT OR IGNORE INTO {} ( tag_id, current_count, pending_count ) VALUES ( ?, ?, ? );'.format( counts_cache_table_name ), new_rows )
             
-            self._Execute( 'INSERT OR IGNORE INTO {} ( tag_id, current_count, pending_count ) VALUES ( ?, ?, ? );'.format( counts_cache_table_name ), ( tag_id, current_delta, pending_delta ) )
+            new_tag_ids = { tag_id for ( tag_id, current_delta, pending_delta ) in new_rows }
+            
+            if file_service_id == self.modules_services.combined_local_file_service_id: # and tag_service_id = all known tags
+                
+                new_local_tag_ids = set( new_tag_ids )
+                
+            
+        else:
             
-            if self._GetRowCount() > 0:
+            for ( tag_id, current_delta, pending_delta ) in ac_cache_changes:
                 
-                new_tag_ids.add( tag_id )
+                self._Execute( 'INSERT OR IGNORE INTO {} ( tag_id, current_count, pending_count ) VALUES ( ?, ?, ? );'.format( counts_cache_table_name ), ( tag_id, current_delta, pending_delta ) )
                 
-                if file_service_id == self.modules_services.combined_local_file_service_id: # and tag_service_id = all known tags
+                if self._GetRowCount() > 0:
                     
-                    new_local_tag_ids.add( tag_id )
+                    new_tag_ids.add( tag_id )
+                    
+                    if file_service_id == self.modules_services.combined_local_file_service_id: # and tag_service_id = all known tags
+                        
+                        new_local_tag_ids.add( tag_id )
+                        
                     
                 
             
@@ -185,13 +244,34 @@ class ClientDBMappingsCounts( ClientDBModule.ClientDBModule ):
             self._ExecuteMany( 'UPDATE {} SET current_count = current_count + ?, pending_count = pending_count + ? WHERE tag_id = ?;'.format( counts_cache_table_name ), ( ( num_current, num_pending, tag_id ) for ( tag_id, num_current, num_pending ) in ac_cache_changes if tag_id not in new_tag_ids ) )
             
         
+        autocomplete_index = self._GetAutocompleteIndex( tag_display_type, file_service_id, tag_service_id )
+        
+        if autocomplete_index is not None:
+            
+            autocomplete_index.AddCounts( ac_cache_changes )
+            
+            if autocomplete_index.GetNumTagIdsToCheck() > ClientTagsAutocompleteIndex.MAX_TAG_IDS_TO_CHECK:
+                
+                self._DiscardAutocompleteIndex( tag_display_type, file_service_id, tag_service_id )
+                
+            
+        
         return ( new_tag_ids, new_local_tag_ids )
         
     
+    def ClearAutocompleteIndices( self ):
+        
+        # the in-memory indices are only good while they match the tables, so if we aren't sure, we throw them away
+        
+        self._autocomplete_indices = collections.OrderedDict()
+        
+    
     def ClearCounts( self, tag_display_type, file_service_id, tag_service_id, keep_current = False, keep_pending = False, tag_ids = None ):
         
         table_name = self.GetCountsCacheTableName( tag_display_type, file_service_id, tag_service_id )
         
+        self._DiscardAutocompleteIndex( tag_display_type, file_service_id, tag_service_id )
+        
         if tag_ids is None:
             
             if keep_current:
@@ -241,6 +321,8 @@ class ClientDBMappingsCounts( ClientDBModule.ClientDBModule ):
             self._CreateTable( create_query_without_name, table_name )
             
         
+        self._DiscardAutocompleteIndex( tag_display_type, file_service_id, tag_service_id )
+        
         #
         
         if tag_display_type == ClientTags.TAG_DISPLAY_DISPLAY_ACTUAL and populate_from_storage:
@@ -258,6 +340,8 @@ class ClientDBMappingsCounts( ClientDBModule.ClientDBModule ):
         
         self.modules_db_maintenance.DeferredDropTable( table_name )
         
+        self._DiscardAutocompleteIndex( tag_display_type, file_service_id, tag_service_id )
+        
     
     def FilterExistingTagIds( self, tag_display_type, file_service_id, tag_service_id, tag_ids_table_name ):
         
@@ -309,6 +393,20 @@ class ClientDBMappingsCounts( ClientDBModule.ClientDBModule ):
         return ( current_count, pending_count )
         
     
+    def GetAutocompleteIndex( self, tag_display_type, file_service_id, tag_service_id ) -> typing.Optional[ ClientTagsAutocompleteIndex.TagAutocompleteIndex ]:
+        
+        key = ( tag_display_type, file_service_id, tag_service_id )
+        
+        if key not in self._autocomplete_indices:
+            
+            return None
+            
+        
+        self._autocomplete_indices.move_to_end( key )
+        
+        return self._autocomplete_indices[ key ]
+        
+    
     def GetCounts( self, tag_display_type, tag_service_id, file_service_id, tag_ids, include_current, include_pending, domain_is_cross_referenced = True, zero_count_ok = False, job_status = None, tag_ids_table_name = None ):
         
         if len( tag_ids ) == 0:
@@ -585,6 +683,22 @@ class ClientDBMappingsCounts( ClientDBModule.ClientDBModule ):
         return count
         
     
+    def LoadAutocompleteIndex( self, tag_display_type, file_service_id, tag_service_id, autocomplete_index: ClientTagsAutocompleteIndex.TagAutocompleteIndex ):
+        
+        # the caller built this from our table in this transaction, so from now on it gets the same deltas we do
+        
+        key = ( tag_display_type, file_service_id, tag_service_id )
+        
+        self._autocomplete_indices[ key ] = autocomplete_index
+        
+        self._autocomplete_indices.move_to_end( key )
+        
+        while len( self._autocomplete_indices ) > MAX_AUTOCOMPLETE_INDICES:
+            
+            self._autocomplete_indices.popitem( last = False )
+            
+        
+    
     def ReduceCounts( self, tag_display_type, file_service_id, tag_service_id, ac_cache_changes ):
         
         # this takes positive counts, despite ultimately being a reduce guy
@@ -594,17 +708,35 @@ class ClientDBMappingsCounts( ClientDBModule.ClientDBModule ):
         deleted_tag_ids = set()
         deleted_local_tag_ids = set()
         
-        for ( tag_id, current_delta, pending_delta ) in ac_cache_changes:
+        if len( ac_cache_changes ) >= BULK_COUNTS_CHANGE_THRESHOLD:
+            
+            # the rows that are going to zero are the ones whose counts exactly match the reduction
             
-            self._Execute( 'DELETE FROM {} WHERE tag_id = ? AND current_count = ? AND pending_count = ?;'.format( counts_cache_table_name ), ( tag_id, current_delta, pending_delta ) )
+            tag_ids_to_counts = self._GetExistingCounts( counts_cache_table_name, ( tag_id for ( tag_id, current_delta, pending_delta ) in ac_cache_changes ) )
             
-            if self._GetRowCount() > 0:
+            deleted_tag_ids = { tag_id for ( tag_id, current_delta, pending_delta ) in ac_cache_changes if tag_ids_to_counts.get( tag_id, None ) == ( current_delta, pending_delta ) }
+            
+            self._ExecuteMany( 'DELETE FROM {} WHERE tag_id = ?;'.format( counts_cache_table_name ), ( ( tag_id, ) for tag_id in deleted_tag_ids ) )
+            
+            if file_service_id == self.modules_services.combined_local_file_service_id: # and tag_service_id = all known tags
                 
-                deleted_tag_ids.add( tag_id )
+                deleted_local_tag_ids = set( deleted_tag_ids )
                 
-                if file_service_id == self.modules_services.combined_local_file_service_id: # and tag_service_id = all known tags
+            
+        else:
+            
+            for ( tag_id, current_delta, pending_delta ) in ac_cache_changes:
+                
+                self._Execute( 'DELETE FROM {} WHERE tag_id = ? AND current_count = ? AND pending_count = ?;'.format( counts_cache_table_name ), ( tag_id, current_delta, pending_delta ) )
+                
+                if self._GetRowCount() > 0:
+                    
+                    deleted_tag_ids.add( tag_id )
                     
-                    deleted_local_tag_ids.add( tag_id )
+                    if file_service_id == self.modules_services.combined_local_file_service_id: # and tag_service_id = all known tags
+                        
+                        deleted_local_tag_ids.add( tag_id )
+                        
                     
                 
             
@@ -614,5 +746,12 @@ class ClientDBMappingsCounts( ClientDBModule.ClientDBModule ):
             self._ExecuteMany( 'UPDATE {} SET current_count = current_count - ?, pending_count = pending_count - ? WHERE tag_id = ?;'.format( counts_cache_table_name ), ( ( current_delta, pending_delta, tag_id ) for ( tag_id, current_delta, pending_delta ) in ac_cache_changes if tag_id not in deleted_tag_ids ) )
             
         
+        autocomplete_index = self._GetAutocompleteIndex( tag_display_type, file_service_id, tag_service_id )
+        
+        if autocomplete_index is not None:
+            
+            autocomplete_index.ReduceCounts( ac_cache_changes )
+            
+        
         return ( deleted_tag_ids, deleted_local_tag_ids )
         
@@ -72,6 +72,55 @@ class ClientDBMediaResults( ClientDBModule.ClientDBModule ):
         super().__init__( 'client media results', cursor )
         
     
+    def _GetHashIdsToServiceKeysToStatusesToTagIdArrays( self, tag_data, db_tag_ids_to_table_tag_ids, service_ids_to_service_keys, hash_ids_to_service_keys_to_statuses_to_shareable_tag_ids = None ):
+        
+        # one pass over the flat rows to group them, one pass over the groups to make the arrays
+        
+        keys_to_table_tag_ids = collections.defaultdict( list )
+        
+        for ( hash_id, tag_service_id, status, tag_id ) in tag_data:
+            
+            keys_to_table_tag_ids[ ( hash_id, tag_service_id, status ) ].append( db_tag_ids_to_table_tag_ids[ tag_id ] )
+            
+        
+        if hash_ids_to_service_keys_to_statuses_to_shareable_tag_ids is None:
+            
+            hash_ids_to_service_keys_to_statuses_to_shareable_tag_ids = {}
+            
+        
+        hash_ids_to_service_keys_to_statuses_to_tag_ids = collections.defaultdict( dict )
+        
+        for ( ( hash_id, tag_service_id, status ), table_tag_ids ) in keys_to_table_tag_ids.items():
+            
+            service_key = service_ids_to_service_keys[ tag_service_id ]
+            
+            # computed display rows can have the same implied tag more than once
+            tag_ids = ClientMediaManagers.ConvertTagIdsToTagIdArray( set( table_tag_ids ) )
+            
+            # most files have no siblings or parents, so display is usually the same as storage and can share its arrays
+            if hash_id in hash_ids_to_service_keys_to_statuses_to_shareable_tag_ids:
+                
+                shareable_tag_ids = hash_ids_to_service_keys_to_statuses_to_shareable_tag_ids[ hash_id ].get( service_key, {} ).get( status, None )
+                
+                if shareable_tag_ids is not None and shareable_tag_ids == tag_ids:
+                    
+                    tag_ids = shareable_tag_ids
+                    
+                
+            
+            service_keys_to_statuses_to_tag_ids = hash_ids_to_service_keys_to_statuses_to_tag_ids[ hash_id ]
+            
+            if service_key not in service_keys_to_statuses_to_tag_ids:
+                
+                service_keys_to_statuses_to_tag_ids[ service_key ] = {}
+                
+            
+            service_keys_to_statuses_to_tag_ids[ service_key ][ status ] = tag_ids
+            
+        
+        return hash_ids_to_service_keys_to_statuses_to_tag_ids
+        
+    
     def ClearMediaResultCache( self ):
         
         self._weakref_media_result_cache = ClientMediaResultCache.MediaResultCache()
@@ -290,45 +339,41 @@ class ClientDBMediaResults( ClientDBModule.ClientDBModule ):
             display_tag_data.extend( batch_of_display_tag_data )
             
         
-        seen_tag_ids = { tag_id for ( hash_id, ( tag_service_id, status, tag_id ) ) in storage_tag_data }
-        seen_tag_ids.update( ( tag_id for ( hash_id, ( tag_service_id, status, tag_id ) ) in display_tag_data ) )
+        seen_tag_ids = { tag_id for ( hash_id, tag_service_id, status, tag_id ) in storage_tag_data }
+        seen_tag_ids.update( ( tag_id for ( hash_id, tag_service_id, status, tag_id ) in display_tag_data ) )
         
         tag_ids_to_tags = self.modules_tags_local_cache.GetTagIdsToTags( tag_ids = seen_tag_ids )
         
+        # tags managers hold ids from the shared in-memory tag table, not our db ids, so we translate each distinct tag once rather than every mapping
+        
+        tag_id_table = ClientMediaManagers.TagIdTable.instance()
+        
+        db_tag_ids_to_table_tag_ids = { tag_id : tag_id_table.GetTagId( tag ) for ( tag_id, tag ) in tag_ids_to_tags.items() }
+        
         service_ids_to_service_keys = self.modules_services.GetServiceIdsToServiceKeys()
         
-        hash_ids_to_raw_storage_tag_data = HydrusData.BuildKeyToListDict( storage_tag_data )
-        hash_ids_to_raw_display_tag_data = HydrusData.BuildKeyToListDict( display_tag_data )
+        hash_ids_to_service_keys_to_statuses_to_storage_tag_ids = self._GetHashIdsToServiceKeysToStatusesToTagIdArrays( storage_tag_data, db_tag_ids_to_table_tag_ids, service_ids_to_service_keys )
+        hash_ids_to_service_keys_to_statuses_to_display_tag_ids = self._GetHashIdsToServiceKeysToStatusesToTagIdArrays( display_tag_data, db_tag_ids_to_table_tag_ids, service_ids_to_service_keys, hash_ids_to_service_keys_to_statuses_to_shareable_tag_ids = hash_ids_to_service_keys_to_statuses_to_storage_tag_ids )
         
         hash_ids_to_tag_managers = {}
         
         for hash_id in hash_ids:
             
-            # service_id, status, tag_id
-            raw_storage_tag_data = hash_ids_to_raw_storage_tag_data[ hash_id ]
+            # each manager owns its dicts, so no sharing the empty ones
+            service_keys_to_statuses_to_storage_tag_ids = hash_ids_to_service_keys_to_statuses_to_storage_tag_ids.get( hash_id, None )
+            service_keys_to_statuses_to_display_tag_ids = hash_ids_to_service_keys_to_statuses_to_display_tag_ids.get( hash_id, None )
             
-            # service_id -> ( status, tag )
-            service_ids_to_storage_tag_data = HydrusData.BuildKeyToListDict( ( ( tag_service_id, ( status, tag_ids_to_tags[ tag_id ] ) ) for ( tag_service_id, status, tag_id ) in raw_storage_tag_data ) )
-            
-            service_keys_to_statuses_to_storage_tags = collections.defaultdict(
-                HydrusData.default_dict_set,
-                { service_ids_to_service_keys[ tag_service_id ] : HydrusData.BuildKeyToSetDict( status_and_tag ) for ( tag_service_id, status_and_tag ) in service_ids_to_storage_tag_data.items() }
-            )
-            
-            # service_id, status, tag_id
-            raw_display_tag_data = hash_ids_to_raw_display_tag_data[ hash_id ]
-            
-            # service_id -> ( status, tag )
-            service_ids_to_display_tag_data = HydrusData.BuildKeyToListDict( ( ( tag_service_id, ( status, tag_ids_to_tags[ tag_id ] ) ) for ( tag_service_id, status, tag_id ) in raw_display_tag_data ) )
-            
-            service_keys_to_statuses_to_display_tags = collections.defaultdict(
-                HydrusData.default_dict_set,
-                { service_ids_to_service_keys[ tag_service_id ] : HydrusData.BuildKeyToSetDict( status_and_tag ) for ( tag_service_id, status_and_tag ) in service_ids_to_display_tag_data.items() }
-            )
+            if service_keys_to_statuses_to_storage_tag_ids is None:
+                
+                service_keys_to_statuses_to_storage_tag_ids = {}
+                
             
-            tags_manager = ClientMediaManagers.TagsManager( service_keys_to_statuses_to_storage_tags, service_keys_to_statuses_to_display_tags )
+            if service_keys_to_statuses_to_display_tag_ids is None:
+                
+                service_keys_to_statuses_to_display_tag_ids = {}
+                
             
-            hash_ids_to_tag_managers[ hash_id ] = tags_manager
+            hash_ids_to_tag_managers[ hash_id ] = ClientMediaManagers.TagsManager.STATICGenerateFromTagIds( service_keys_to_statuses_to_storage_tag_ids, service_keys_to_statuses_to_display_tag_ids )
             
         
         return hash_ids_to_tag_managers
@@ -336,6 +381,8 @@ class ClientDBMediaResults( ClientDBModule.ClientDBModule ):
     
     def GetForceRefreshTagsManagersWithTableHashIdsTagData( self, common_file_service_id, tag_service_ids, hash_ids_table_name ) -> typing.Tuple:
         
+        # rows are flat ( hash_id, tag_service_id, status, tag_id ), straight out of sqlite with no per-row python
+        
         storage_tag_data = []
         display_tag_data = []
         
@@ -346,7 +393,7 @@ class ClientDBMediaResults( ClientDBModule.ClientDBModule ):
             for ( status, mappings_table_name ) in statuses_to_table_names.items():
                 
                 # temp hashes to mappings
-                storage_tag_data.extend( ( hash_id, ( tag_service_id, status, tag_id ) ) for ( hash_id, tag_id ) in self._Execute( 'SELECT hash_id, tag_id FROM {} CROSS JOIN {} USING ( hash_id );'.format( hash_ids_table_name, mappings_table_name ) ) )
+                storage_tag_data.extend( self._Execute( 'SELECT hash_id, {}, {}, tag_id FROM {} CROSS JOIN {} USING ( hash_id );'.format( tag_service_id, status, hash_ids_table_name, mappings_table_name ) ) )
                 
             
             if common_file_service_id != self.modules_services.combined_file_service_id:
@@ -354,8 +401,8 @@ class ClientDBMediaResults( ClientDBModule.ClientDBModule ):
                 ( cache_current_display_mappings_table_name, cache_pending_display_mappings_table_name ) = ClientDBMappingsStorage.GenerateSpecificDisplayMappingsCacheTableNames( common_file_service_id, tag_service_id )
                 
                 # temp hashes to mappings
-                display_tag_data.extend( ( hash_id, ( tag_service_id, HC.CONTENT_STATUS_CURRENT, tag_id ) ) for ( hash_id, tag_id ) in self._Execute( 'SELECT hash_id, tag_id FROM {} CROSS JOIN {} USING ( hash_id );'.format( hash_ids_table_name, cache_current_display_mappings_table_name ) ) )
-                display_tag_data.extend( ( hash_id, ( tag_service_id, HC.CONTENT_STATUS_PENDING, tag_id ) ) for ( hash_id, tag_id ) in self._Execute( 'SELECT hash_id, tag_id FROM {} CROSS JOIN {} USING ( hash_id );'.format( hash_ids_table_name, cache_pending_display_mappings_table_name ) ) )
+                display_tag_data.extend( self._Execute( 'SELECT hash_id, {}, {}, tag_id FROM {} CROSS JOIN {} USING ( hash_id );'.format( tag_service_id, HC.CONTENT_STATUS_CURRENT, hash_ids_table_name, cache_current_display_mappings_table_name ) ) )
+                display_tag_data.extend( self._Execute( 'SELECT hash_id, {}, {}, tag_id FROM {} CROSS JOIN {} USING ( hash_id );'.format( tag_service_id, HC.CONTENT_STATUS_PENDING, hash_ids_table_name, cache_pending_display_mappings_table_name ) ) )
                 
             
         
@@ -364,17 +411,17 @@ class ClientDBMediaResults( ClientDBModule.ClientDBModule ):
             # this is likely a 'all known files' query, which means we are in deep water without a cache
             # time to compute manually, which is semi hell mode, but not dreadful
             
-            current_and_pending_storage_tag_data = [ ( hash_id, ( tag_service_id, status, tag_id ) ) for ( hash_id, ( tag_service_id, status, tag_id ) ) in storage_tag_data if status in ( HC.CONTENT_STATUS_CURRENT, HC.CONTENT_STATUS_PENDING ) ]
+            current_and_pending_storage_tag_data = [ ( hash_id, tag_service_id, status, tag_id ) for ( hash_id, tag_service_id, status, tag_id ) in storage_tag_data if status in ( HC.CONTENT_STATUS_CURRENT, HC.CONTENT_STATUS_PENDING ) ]
             
-            seen_service_ids_to_seen_tag_ids = HydrusData.BuildKeyToSetDict( ( ( tag_service_id, tag_id ) for ( hash_id, ( tag_service_id, status, tag_id ) ) in current_and_pending_storage_tag_data ) )
+            seen_service_ids_to_seen_tag_ids = HydrusData.BuildKeyToSetDict( ( ( tag_service_id, tag_id ) for ( hash_id, tag_service_id, status, tag_id ) in current_and_pending_storage_tag_data ) )
             
             seen_service_ids_to_tag_ids_to_implied_tag_ids = { tag_service_id : self.modules_tag_display.GetTagsToImplies( ClientTags.TAG_DISPLAY_DISPLAY_ACTUAL, tag_service_id, tag_ids ) for ( tag_service_id, tag_ids ) in seen_service_ids_to_seen_tag_ids.items() }
             
             display_tag_data = []
             
-            for ( hash_id, ( tag_service_id, status, tag_id ) ) in current_and_pending_storage_tag_data:
+            for ( hash_id, tag_service_id, status, tag_id ) in current_and_pending_storage_tag_data:
                 
-                display_tag_data.extend( ( ( hash_id, ( tag_service_id, status, implied_tag_id ) ) for implied_tag_id in seen_service_ids_to_tag_ids_to_implied_tag_ids[ tag_service_id ][ tag_id ] ) )
+                display_tag_data.extend( ( ( hash_id, tag_service_id, status, implied_tag_id ) for implied_tag_id in seen_service_ids_to_tag_ids_to_implied_tag_ids[ tag_service_id ][ tag_id ] ) )
                 
             
         
@@ -436,6 +483,8 @@ class ClientDBMediaResults( ClientDBModule.ClientDBModule ):
             
             service_ids_to_service_keys = self.modules_services.GetServiceIdsToServiceKeys()
             
+            inbox_hash_ids = self.modules_files_inbox.inbox_hash_ids
+            
             missing_media_results = []
             
             for hash_id in missing_hash_ids:
@@ -455,7 +504,7 @@ class ClientDBMediaResults( ClientDBModule.ClientDBModule ):
                 
                 petitioned_file_service_keys = { service_ids_to_service_keys[ service_id ] for service_id in hash_ids_to_petitioned_file_service_ids[ hash_id ] }
                 
-                inbox = hash_id in self.modules_files_inbox.inbox_hash_ids
+                inbox = hash_id in inbox_hash_ids
                 
                 urls = hash_ids_to_urls[ hash_id ]
                 
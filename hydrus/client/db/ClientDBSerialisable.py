@@ -4,6 +4,7 @@ import sqlite3
 import time
 import typing
 
+from hydrus.core import HydrusCompression
 from hydrus.core import HydrusData
 from hydrus.core import HydrusDBBase
 from hydrus.core import HydrusExceptions
@@ -24,6 +25,9 @@ YAML_DUMP_ID_EXPORT_FOLDER = 6
 YAML_DUMP_ID_SUBSCRIPTION = 7
 YAML_DUMP_ID_LOCAL_BOORU = 8
 
+# named objects that get big and change a little at a time. their import logs are saved as content-addressed blocks in json_dumps_hashed
+BLOCK_STORED_NAMED_DUMP_TYPES = { HydrusSerialisable.SERIALISABLE_TYPE_SUBSCRIPTION_QUERY_LOG_CONTAINER }
+
 def ExportBrokenHashedJSONDump( db_dir, dump, dump_descriptor ):
     
     timestamp_string = time.strftime( '%Y-%m-%d %H-%M-%S' )
@@ -162,16 +166,136 @@ class ClientDBSerialisable( ClientDBModule.ClientDBModule ):
         }
         
     
+    def _DeleteHashedJSONDumps( self, hashes ):
+        
+        self._ExecuteMany( 'DELETE FROM json_dumps_hashed WHERE hash = ?;', ( ( sqlite3.Binary( hash ), ) for hash in hashes ) )
+        self._ExecuteMany( 'DELETE FROM json_dumps_hashed_block_hashes WHERE hash = ?;', ( ( sqlite3.Binary( hash ), ) for hash in hashes ) )
+        
+    
+    def _GetHashedJSONBlockHashes( self, hashes ):
+        
+        # what each hashed object refers to, as recorded when it was saved. objects saved before we recorded this are absent
+        
+        hashes_to_block_hashes = {}
+        
+        for hash in hashes:
+            
+            result = self._Execute( 'SELECT block_hashes FROM json_dumps_hashed_block_hashes WHERE hash = ?;', ( sqlite3.Binary( hash ), ) ).fetchone()
+            
+            if result is None:
+                
+                continue
+                
+            
+            ( block_hashes_bytes, ) = result
+            
+            hashes_to_block_hashes[ hash ] = { block_hashes_bytes[ i : i + 32 ] for i in range( 0, len( block_hashes_bytes ), 32 ) }
+            
+        
+        return hashes_to_block_hashes
+        
+    
+    def _GetHashedJSONSerialisableInfos( self, hashes ):
+        
+        hashes_to_serialisable_infos = {}
+        
+        for hash in hashes:
+            
+            result = self._Execute( 'SELECT dump_type, version, dump FROM json_dumps_hashed WHERE hash = ?;', ( sqlite3.Binary( hash ), ) ).fetchone()
+            
+            if result is None:
+                
+                continue
+                
+            
+            ( dump_type, version, dump ) = result
+            
+            try:
+                
+                if isinstance( dump, bytes ):
+                    
+                    if HydrusCompression.IsFramedBytes( dump ):
+                        
+                        dump = HydrusCompression.DecompressFramedBytesToBytes( dump )
+                        
+                    
+                    dump = str( dump, 'utf-8' )
+                    
+                
+                serialisable_info = json.loads( dump )
+                
+            except HydrusExceptions.UnsupportedCompressionException:
+                
+                # the object is fine, we just can't read it right now. the caller has to know, or it may think the blocks it refers to are orphans
+                raise
+                
+            except:
+                
+                HydrusData.Print( 'Hashed JSON object "{}" was malformed!'.format( hash.hex() ) )
+                
+                continue
+                
+            
+            hashes_to_serialisable_infos[ hash ] = ( dump_type, version, serialisable_info )
+            
+        
+        return hashes_to_serialisable_infos
+        
+    
     def _GetInitialTableGenerationDict( self ) -> dict:
         
         return {
             'main.json_dict' : ( 'CREATE TABLE IF NOT EXISTS {} ( name TEXT PRIMARY KEY, dump BLOB_BYTES );', 400 ),
             'main.json_dumps' : ( 'CREATE TABLE IF NOT EXISTS {} ( dump_type INTEGER PRIMARY KEY, version INTEGER, dump BLOB_BYTES );', 400 ),
             'main.json_dumps_named' : ( 'CREATE TABLE IF NOT EXISTS {} ( dump_type INTEGER, dump_name TEXT, version INTEGER, timestamp_ms INTEGER, dump BLOB_BYTES, PRIMARY KEY ( dump_type, dump_name, timestamp_ms ) );', 400 ),
-            'main.json_dumps_hashed' : ( 'CREATE TABLE IF NOT EXISTS {} ( hash BLOB_BYTES PRIMARY KEY, dump_type INTEGER, version INTEGER, dump BLOB_BYTES );', 442 )
+            'main.json_dumps_hashed' : ( 'CREATE TABLE IF NOT EXISTS {} ( hash BLOB_BYTES PRIMARY KEY, dump_type INTEGER, version INTEGER, dump BLOB_BYTES );', 442 ),
+            'main.json_dumps_hashed_block_hashes' : ( 'CREATE TABLE IF NOT EXISTS {} ( hash BLOB_BYTES PRIMARY KEY, block_hashes BLOB_BYTES );', 623 )
         }
         
     
+    def _GetSerialisableBlockStore( self ) -> HydrusSerialisable.SerialisableBlockStore:
+        
+        def block_fetcher( block_hashes ):
+            
+            hashes_to_serialisable_infos = self._GetHashedJSONSerialisableInfos( block_hashes )
+            
+            return { hash : serialisable_info for ( hash, ( dump_type, version, serialisable_info ) ) in hashes_to_serialisable_infos.items() if dump_type == HydrusSerialisable.SERIALISABLE_TYPE_SERIALISABLE_LIST_BLOCKS }
+            
+        
+        return HydrusSerialisable.SerialisableBlockStore( block_fetcher = block_fetcher )
+        
+    
+    def _SetHashedJSONBlockHashes( self, hash, block_hashes ):
+        
+        # an object with no blocks still gets a row, so we know it has been looked at
+        
+        block_hashes_bytes = b''.join( sorted( block_hashes ) )
+        
+        self._Execute( 'REPLACE INTO json_dumps_hashed_block_hashes ( hash, block_hashes ) VALUES ( ?, ? );', ( sqlite3.Binary( hash ), sqlite3.Binary( block_hashes_bytes ) ) )
+        
+    
+    def _SetSerialisableListBlocks( self, block_store: HydrusSerialisable.SerialisableBlockStore ):
+        
+        maintenance_tracker = MaintenanceTracker.instance()
+        
+        for ( block_hash, block_dump ) in block_store.GetNewBlockDumps().items():
+            
+            # the same block is often shared by many saves, and most of a big log will not have changed since last time
+            if self.HaveHashedJSONDump( block_hash ):
+                
+                continue
+                
+            
+            maintenance_tracker.RegisterNewHashedSerialisable( len( block_dump ) )
+            
+            dump_buffer = GenerateBigSQLiteDumpBuffer( block_dump )
+            
+            dump_buffer = sqlite3.Binary( HydrusCompression.CompressBytesToFramedBytes( dump_buffer, dictionary_id = HydrusCompression.DICTIONARY_IMPORT_LOGS ) )
+            
+            self._Execute( 'INSERT INTO json_dumps_hashed ( hash, dump_type, version, dump ) VALUES ( ?, ?, ?, ? );', ( sqlite3.Binary( block_hash ), HydrusSerialisable.SERIALISABLE_TYPE_SERIALISABLE_LIST_BLOCKS, 1, dump_buffer ) )
+            
+        
+    
     def DeleteJSONDump( self, dump_type ):
         
         self._Execute( 'DELETE FROM json_dumps WHERE dump_type = ?;', ( dump_type, ) )
@@ -200,11 +324,63 @@ class ClientDBSerialisable( ClientDBModule.ClientDBModule ):
         # not the GetJSONDumpNamesToBackupTimestampsMS call, which excludes the latest save!
         names_and_timestamps_ms = self._Execute( 'SELECT dump_name, timestamp_ms FROM json_dumps_named WHERE dump_type = ?;', ( HydrusSerialisable.SERIALISABLE_TYPE_GUI_SESSION_CONTAINER, ) ).fetchall()
         
+        page_hashes = set()
+        
         for ( name, timestamp_ms ) in names_and_timestamps_ms:
             
             session_container = self.GetJSONDumpNamed( HydrusSerialisable.SERIALISABLE_TYPE_GUI_SESSION_CONTAINER, dump_name = name, timestamp_ms = timestamp_ms )
             
-            all_expected_hashes.update( session_container.GetPageDataHashes() )
+            page_hashes.update( session_container.GetPageDataHashes() )
+            
+        
+        all_expected_hashes.update( page_hashes )
+        
+        # the import log blocks those pages refer to. we recorded these when the pages were saved
+        
+        hashes_to_block_hashes = self._GetHashedJSONBlockHashes( page_hashes )
+        
+        for block_hashes in hashes_to_block_hashes.values():
+            
+            all_expected_hashes.update( block_hashes )
+            
+        
+        # pages saved before we recorded them have to be read the slow way, but only the once
+        
+        unrecorded_page_hashes = page_hashes.difference( hashes_to_block_hashes.keys() )
+        
+        hashes_to_serialisable_infos = self._GetHashedJSONSerialisableInfos( unrecorded_page_hashes )
+        
+        for ( hash, ( dump_type, version, serialisable_info ) ) in hashes_to_serialisable_infos.items():
+            
+            block_hashes = HydrusSerialisable.GetBlockHashesFromSerialisableInfo( serialisable_info )
+            
+            self._SetHashedJSONBlockHashes( hash, block_hashes )
+            
+            all_expected_hashes.update( block_hashes )
+            
+        
+        # and the blocks our other block-stored objects refer to
+        
+        for dump_type in BLOCK_STORED_NAMED_DUMP_TYPES:
+            
+            for ( dump, ) in self._Execute( 'SELECT dump FROM json_dumps_named WHERE dump_type = ?;', ( dump_type, ) ):
+                
+                try:
+                    
+                    if isinstance( dump, bytes ):
+                        
+                        dump = str( dump, 'utf-8' )
+                        
+                    
+                    serialisable_info = json.loads( dump )
+                    
+                except:
+                    
+                    continue
+                    
+                
+                all_expected_hashes.update( HydrusSerialisable.GetBlockHashesFromSerialisableInfo( serialisable_info ) )
+                
             
         
         return all_expected_hashes
@@ -214,6 +390,7 @@ class ClientDBSerialisable( ClientDBModule.ClientDBModule ):
         
         shown_missing_dump_message = False
         shown_broken_dump_message = False
+        shown_unsupported_dump_message = False
         
         hashes_to_objs = {}
         
@@ -249,14 +426,40 @@ class ClientDBSerialisable( ClientDBModule.ClientDBModule ):
                 
                 if isinstance( dump, bytes ):
                     
+                    if HydrusCompression.IsFramedBytes( dump ):
+                        
+                        dump = HydrusCompression.DecompressFramedBytesToBytes( dump )
+                        
+                    
                     dump = str( dump, 'utf-8' )
                     
                 
                 serialisable_info = json.loads( dump )
                 
+            except HydrusExceptions.UnsupportedCompressionException as e:
+                
+                # not broken, so we leave it alone. it'll load once the user fixes their environment
+                
+                if not shown_unsupported_dump_message:
+                    
+                    message = 'A hashed serialised object could not be read! Its hash is "{}".'.format( hash.hex() )
+                    message += '\n' * 2
+                    message += 'The object itself is fine, but this client cannot decompress it: {}'.format( e )
+                    message += '\n' * 2
+                    message += 'Nothing has been deleted. Your client may be missing one or more session pages until this is fixed.'
+                    
+                    HydrusData.ShowText( message )
+                    
+                    shown_unsupported_dump_message = True
+                    
+                
+                HydrusData.Print( 'Was asked to fetch named JSON object "{}", but could not decompress it: {}'.format( hash.hex(), e ) )
+                
+                continue
+                
             except:
                 
-                self._Execute( 'DELETE FROM json_dumps_hashed WHERE hash = ?;', ( sqlite3.Binary( hash ), ) )
+                self._DeleteHashedJSONDumps( ( hash, ) )
                 
                 self._cursor_transaction_wrapper.CommitAndBegin()
                 
@@ -279,8 +482,23 @@ class ClientDBSerialisable( ClientDBModule.ClientDBModule ):
                 
                 HydrusData.Print( 'Was asked to fetch named JSON object "{}", but it was malformed!'.format( hash.hex() ) )
                 
+                continue
+                
             
-            obj = HydrusSerialisable.CreateFromSerialisableTuple( ( dump_type, version, serialisable_info ) )
+            try:
+                
+                with self._GetSerialisableBlockStore():
+                    
+                    obj = HydrusSerialisable.CreateFromSerialisableTuple( ( dump_type, version, serialisable_info ) )
+                    
+                
+            except HydrusExceptions.SerialisationException as e:
+                
+                HydrusData.ShowText( 'A hashed serialised object, "{}", could not load one of its parts! Your client may have lost a session page. The error has been written to the log.'.format( hash.hex() ) )
+                HydrusData.PrintException( e, do_wait = False )
+                
+                continue
+                
             
             hashes_to_objs[ hash ] = obj
             
@@ -374,7 +592,10 @@ class ClientDBSerialisable( ClientDBModule.ClientDBModule ):
                     
                     serialisable_info = json.loads( dump )
                     
-                    objs.append( HydrusSerialisable.CreateFromSerialisableTuple( ( dump_type, dump_name, version, serialisable_info ) ) )
+                    with self._GetSerialisableBlockStore():
+                        
+                        objs.append( HydrusSerialisable.CreateFromSerialisableTuple( ( dump_type, dump_name, version, serialisable_info ) ) )
+                        
                     
                 except:
                     
@@ -424,7 +645,10 @@ class ClientDBSerialisable( ClientDBModule.ClientDBModule ):
                 DealWithBrokenJSONDump( self._db_dir, dump, ( dump_type, dump_name, version, object_timestamp_ms ), 'dump_type {} dump_name {} version {} timestamp_ms {}'.format( dump_type, dump_name[:10], version, object_timestamp_ms ) )
                 
             
-            return HydrusSerialisable.CreateFromSerialisableTuple( ( dump_type, dump_name, version, serialisable_info ) )
+            with self._GetSerialisableBlockStore():
+                
+                return HydrusSerialisable.CreateFromSerialisableTuple( ( dump_type, dump_name, version, serialisable_info ) )
+                
             
         
     
@@ -510,7 +734,25 @@ class ClientDBSerialisable( ClientDBModule.ClientDBModule ):
                 
             
         
-        all_expected_hashes = self.GetAllExpectedHashedJSONHashes()
+        try:
+            
+            all_expected_hashes = self.GetAllExpectedHashedJSONHashes()
+            
+        except HydrusExceptions.UnsupportedCompressionException as e:
+            
+            # we can't see everything that is in use, so we can't say what is an orphan
+            
+            HydrusData.Print( 'Could not clear out orphan hashed serialised objects, since one could not be decompressed: {}'.format( e ) )
+            
+            if force_start:
+                
+                raise
+                
+            
+            maintenance_tracker.NotifyHashedSerialisableMaintenanceDone()
+            
+            return 0
+            
         
         all_stored_hashes = self._STS( self._Execute( 'SELECT hash FROM json_dumps_hashed;' ) )
         
@@ -518,7 +760,7 @@ class ClientDBSerialisable( ClientDBModule.ClientDBModule ):
         
         if len( all_deletee_hashes ) > 0:
             
-            self._ExecuteMany( 'DELETE FROM json_dumps_hashed WHERE hash = ?;', ( ( sqlite3.Binary( hash ), ) for hash in all_deletee_hashes ) )
+            self._DeleteHashedJSONDumps( all_deletee_hashes )
             
         
         maintenance_tracker.NotifyHashedSerialisableMaintenanceDone()
@@ -548,7 +790,14 @@ class ClientDBSerialisable( ClientDBModule.ClientDBModule ):
                 continue
                 
             
-            ( dump_type, version, serialisable_info ) = obj.GetSerialisableTuple()
+            block_store = self._GetSerialisableBlockStore()
+            
+            with block_store:
+                
+                ( dump_type, version, serialisable_info ) = obj.GetSerialisableTuple()
+                
+            
+            self._SetSerialisableListBlocks( block_store )
             
             try:
                 
@@ -569,10 +818,16 @@ class ClientDBSerialisable( ClientDBModule.ClientDBModule ):
             
             dump_buffer = GenerateBigSQLiteDumpBuffer( dump )
             
+            # hashed dumps are session pages and subscription logs. there are lots of them, they are big, and they all look alike
+            # a fast codec with the import log dictionary costs almost nothing here and cuts the write a lot. old uncompressed dumps still load fine
+            dump_buffer = sqlite3.Binary( HydrusCompression.CompressBytesToFramedBytes( dump_buffer, dictionary_id = HydrusCompression.DICTIONARY_IMPORT_LOGS ) )
+            
             try:
                 
                 self._Execute( 'INSERT INTO json_dumps_hashed ( hash, dump_type, version, dump ) VALUES ( ?, ?, ?, ? );', ( sqlite3.Binary( hash ), dump_type, version, dump_buffer ) )
                 
+                self._SetHashedJSONBlockHashes( hash, HydrusSerialisable.GetBlockHashesFromSerialisableInfo( serialisable_info ) )
+                
             except:
                 
                 HydrusData.DebugPrint( dump )
@@ -596,7 +851,21 @@ class ClientDBSerialisable( ClientDBModule.ClientDBModule ):
         
         if isinstance( obj, HydrusSerialisable.SerialisableBaseNamed ):
             
-            ( dump_type, dump_name, version, serialisable_info ) = obj.GetSerialisableTuple()
+            if obj.SERIALISABLE_TYPE in BLOCK_STORED_NAMED_DUMP_TYPES:
+                
+                block_store = self._GetSerialisableBlockStore()
+                
+                with block_store:
+                    
+                    ( dump_type, dump_name, version, serialisable_info ) = obj.GetSerialisableTuple()
+                    
+                
+                self._SetSerialisableListBlocks( block_store )
+                
+            else:
+                
+                ( dump_type, dump_name, version, serialisable_info ) = obj.GetSerialisableTuple()
+                
             
             store_backups = False
             backup_depth = 1
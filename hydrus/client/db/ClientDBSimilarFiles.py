@@ -1,11 +1,14 @@
 import collections
+import numpy
 import random
 import sqlite3
+import threading
 import typing
 
 from hydrus.core import HydrusConstants as HC
 from hydrus.core import HydrusData
 from hydrus.core import HydrusDBBase
+from hydrus.core import HydrusExceptions
 from hydrus.core import HydrusGlobals as HG
 from hydrus.core import HydrusNumbers
 from hydrus.core import HydrusTime
@@ -17,9 +20,278 @@ from hydrus.client.db import ClientDBModule
 from hydrus.client.db import ClientDBMaster
 from hydrus.client.db import ClientDBServices
 
+# the xor matrix for a batch of queries is ( num_queries x chunk size ) uint64s, so keep it to about 32MB at a time
+PERCEPTUAL_HASH_SEARCH_CHUNK_CELLS = 4 * 1024 * 1024
+
+def PerceptualHashesToNumPy( perceptual_hashes: typing.Collection[ bytes ] ) -> numpy.ndarray:
+    
+    # big endian so the int matches int.from_bytes( phash, 'big' ). hamming distance does not care, but it is nicer to debug
+    return numpy.frombuffer( b''.join( perceptual_hashes ), dtype = '>u8' ).astype( numpy.uint64 )
+    
+
+class PerceptualHashSearchIndex( object ):
+    
+    def __init__( self, perceptual_hash_ids_and_perceptual_hashes: typing.Iterable[ typing.Tuple[ int, bytes ] ] = () ):
+        
+        self._perceptual_hash_ids = numpy.empty( 0, dtype = numpy.int64 )
+        self._perceptual_hashes = numpy.empty( 0, dtype = numpy.uint64 )
+        self._alive = numpy.empty( 0, dtype = numpy.bool_ )
+        
+        self._num_dead = 0
+        
+        self._pending_perceptual_hash_ids_to_perceptual_hashes = {}
+        
+        self.AddPerceptualHashes( perceptual_hash_ids_and_perceptual_hashes )
+        
+        self._Consolidate()
+        
+    
+    def __len__( self ):
+        
+        return len( self._perceptual_hash_ids ) - self._num_dead + len( self._pending_perceptual_hash_ids_to_perceptual_hashes )
+        
+    
+    def _Consolidate( self ):
+        
+        if len( self._pending_perceptual_hash_ids_to_perceptual_hashes ) > 0:
+            
+            pending_perceptual_hash_ids = numpy.fromiter( self._pending_perceptual_hash_ids_to_perceptual_hashes.keys(), dtype = numpy.int64, count = len( self._pending_perceptual_hash_ids_to_perceptual_hashes ) )
+            pending_perceptual_hashes = PerceptualHashesToNumPy( list( self._pending_perceptual_hash_ids_to_perceptual_hashes.values() ) )
+            
+            self._pending_perceptual_hash_ids_to_perceptual_hashes = {}
+            
+            self._perceptual_hash_ids = numpy.concatenate( ( self._perceptual_hash_ids, pending_perceptual_hash_ids ) )
+            self._perceptual_hashes = numpy.concatenate( ( self._perceptual_hashes, pending_perceptual_hashes ) )
+            self._alive = numpy.concatenate( ( self._alive, numpy.ones( len( pending_perceptual_hash_ids ), dtype = numpy.bool_ ) ) )
+            
+            # new ids are almost always bigger than the old, so this is usually already sorted and cheap
+            if len( self._perceptual_hash_ids ) > 1 and not numpy.all( self._perceptual_hash_ids[:-1] < self._perceptual_hash_ids[1:] ):
+                
+                order = numpy.argsort( self._perceptual_hash_ids, kind = 'stable' )
+                
+                self._perceptual_hash_ids = self._perceptual_hash_ids[ order ]
+                self._perceptual_hashes = self._perceptual_hashes[ order ]
+                self._alive = self._alive[ order ]
+                
+            
+        
+        if self._num_dead > 0 and self._num_dead > len( self._perceptual_hash_ids ) // 4:
+            
+            self._perceptual_hash_ids = self._perceptual_hash_ids[ self._alive ]
+            self._perceptual_hashes = self._perceptual_hashes[ self._alive ]
+            self._alive = numpy.ones( len( self._perceptual_hash_ids ), dtype = numpy.bool_ )
+            
+            self._num_dead = 0
+            
+        
+    
+    def _GetIndex( self, perceptual_hash_id: int ) -> typing.Optional[ int ]:
+        
+        index = int( numpy.searchsorted( self._perceptual_hash_ids, perceptual_hash_id ) )
+        
+        if index < len( self._perceptual_hash_ids ) and self._perceptual_hash_ids[ index ] == perceptual_hash_id:
+            
+            return index
+            
+        
+        return None
+        
+    
+    def AddPerceptualHashes( self, perceptual_hash_ids_and_perceptual_hashes: typing.Iterable[ typing.Tuple[ int, bytes ] ] ):
+        
+        for ( perceptual_hash_id, perceptual_hash ) in perceptual_hash_ids_and_perceptual_hashes:
+            
+            if not isinstance( perceptual_hash, bytes ) or len( perceptual_hash ) != 8:
+                
+                continue
+                
+            
+            index = self._GetIndex( perceptual_hash_id )
+            
+            if index is None:
+                
+                self._pending_perceptual_hash_ids_to_perceptual_hashes[ perceptual_hash_id ] = perceptual_hash
+                
+            else:
+                
+                # an id can come back after its phash was orphaned and cleared out, so we refresh the value too
+                self._perceptual_hashes[ index ] = PerceptualHashesToNumPy( ( perceptual_hash, ) )[0]
+                
+                if not self._alive[ index ]:
+                    
+                    self._alive[ index ] = True
+                    
+                    self._num_dead -= 1
+                    
+                
+            
+        
+    
+    def RemovePerceptualHashIds( self, perceptual_hash_ids: typing.Iterable[ int ] ):
+        
+        for perceptual_hash_id in perceptual_hash_ids:
+            
+            if perceptual_hash_id in self._pending_perceptual_hash_ids_to_perceptual_hashes:
+                
+                del self._pending_perceptual_hash_ids_to_perceptual_hashes[ perceptual_hash_id ]
+                
+            
+            index = self._GetIndex( perceptual_hash_id )
+            
+            if index is not None and self._alive[ index ]:
+                
+                self._alive[ index ] = False
+                
+                self._num_dead += 1
+                
+            
+        
+    
+    def Search( self, search_perceptual_hashes: typing.Sequence[ bytes ], max_hamming_distance: int ) -> typing.List[ typing.Dict[ int, int ] ]:
+        # we give one perceptual_hash_id->distance dict back for each search perceptual hash, in order
+        
+        self._Consolidate()
+        
+        results = [ {} for search_perceptual_hash in search_perceptual_hashes ]
+        
+        num_indexed = len( self._perceptual_hash_ids )
+        
+        if num_indexed == 0 or len( search_perceptual_hashes ) == 0:
+            
+            return results
+            
+        
+        search_array = PerceptualHashesToNumPy( search_perceptual_hashes )
+        
+        num_queries = len( search_array )
+        
+        chunk_size = max( 1024, PERCEPTUAL_HASH_SEARCH_CHUNK_CELLS // num_queries )
+        
+        for chunk_start in range( 0, num_indexed, chunk_size ):
+            
+            chunk_end = min( chunk_start + chunk_size, num_indexed )
+            
+            distances = numpy.bitwise_count( numpy.bitwise_xor( search_array[ :, None ], self._perceptual_hashes[ None, chunk_start : chunk_end ] ) )
+            
+            matches = distances <= max_hamming_distance
+            
+            if self._num_dead > 0:
+                
+                matches &= self._alive[ None, chunk_start : chunk_end ]
+                
+            
+            ( query_indices, chunk_indices ) = numpy.nonzero( matches )
+            
+            if len( query_indices ) == 0:
+                
+                continue
+                
+            
+            match_perceptual_hash_ids = self._perceptual_hash_ids[ chunk_start + chunk_indices ]
+            match_distances = distances[ query_indices, chunk_indices ]
+            
+            for ( query_index, perceptual_hash_id, distance ) in zip( query_indices.tolist(), match_perceptual_hash_ids.tolist(), match_distances.tolist() ):
+                
+                results[ query_index ][ perceptual_hash_id ] = distance
+                
+            
+        
+        return results
+        
+    
+
+class PerceptualHashSearchIndexCache( object ):
+    
+    # one search index for the main connection and all the read pool readers, so we only hold it in memory once
+    # the main connection keeps it up to date as it writes, so it can be a commit ahead of a read pool reader. that reader just finds no files for the new ids
+    
+    def __init__( self ):
+        
+        self._perceptual_hash_search_index = None
+        
+        self._lock = threading.Lock()
+        
+    
+    def __len__( self ):
+        
+        with self._lock:
+            
+            if self._perceptual_hash_search_index is None:
+                
+                return 0
+                
+            
+            return len( self._perceptual_hash_search_index )
+            
+        
+    
+    def AddPerceptualHashes( self, perceptual_hash_ids_and_perceptual_hashes: typing.Iterable[ typing.Tuple[ int, bytes ] ] ):
+        
+        with self._lock:
+            
+            if self._perceptual_hash_search_index is not None:
+                
+                self._perceptual_hash_search_index.AddPerceptualHashes( perceptual_hash_ids_and_perceptual_hashes )
+                
+            
+        
+    
+    def Clear( self ):
+        
+        with self._lock:
+            
+            self._perceptual_hash_search_index = None
+            
+        
+    
+    def Load( self, perceptual_hash_ids_and_perceptual_hashes: typing.Iterable[ typing.Tuple[ int, bytes ] ] ):
+        
+        perceptual_hash_search_index = PerceptualHashSearchIndex( perceptual_hash_ids_and_perceptual_hashes )
+        
+        with self._lock:
+            
+            self._perceptual_hash_search_index = perceptual_hash_search_index
+            
+        
+    
+    def RemovePerceptualHashIds( self, perceptual_hash_ids: typing.Iterable[ int ] ):
+        
+        with self._lock:
+            
+            if self._perceptual_hash_search_index is not None:
+                
+                self._perceptual_hash_search_index.RemovePerceptualHashIds( perceptual_hash_ids )
+                
+            
+        
+    
+    def Search( self, search_perceptual_hashes: typing.Sequence[ bytes ], max_hamming_distance: int ) -> typing.Optional[ typing.List[ typing.Dict[ int, int ] ] ]:
+        
+        # None if it is not loaded
+        
+        with self._lock:
+            
+            if self._perceptual_hash_search_index is None:
+                
+                return None
+                
+            
+            return self._perceptual_hash_search_index.Search( search_perceptual_hashes, max_hamming_distance )
+            
+        
+    
+
 class ClientDBSimilarFiles( ClientDBModule.ClientDBModule ):
     
-    def __init__( self, cursor: sqlite3.Cursor, modules_services: ClientDBServices.ClientDBMasterServices, modules_hashes: ClientDBMaster.ClientDBMasterHashes, modules_files_storage: ClientDBFilesStorage.ClientDBFilesStorage ):
+    def __init__(
+        self,
+        cursor: sqlite3.Cursor,
+        modules_services: ClientDBServices.ClientDBMasterServices,
+        modules_hashes: ClientDBMaster.ClientDBMasterHashes,
+        modules_files_storage: ClientDBFilesStorage.ClientDBFilesStorage,
+        perceptual_hash_search_index_cache: PerceptualHashSearchIndexCache,
+        can_load_search_index: bool
+    ):
         
         self.modules_services = modules_services
         self.modules_hashes = modules_hashes
@@ -29,9 +301,8 @@ class ClientDBSimilarFiles( ClientDBModule.ClientDBModule ):
         
         super().__init__( 'client similar files', cursor )
         
-        self._perceptual_hash_id_to_vp_tree_node_cache = {}
-        self._non_vp_treed_perceptual_hash_ids = set()
-        self._root_node_perceptual_hash_id = None
+        self._perceptual_hash_search_index_cache = perceptual_hash_search_index_cache
+        self._can_load_search_index = can_load_search_index
         
     
     def _AddLeaf( self, perceptual_hash_id, perceptual_hash ):
@@ -94,8 +365,6 @@ class ClientDBSimilarFiles( ClientDBModule.ClientDBModule ):
                         
                         self._Execute( 'UPDATE shape_vptree SET inner_id = ?, radius = ? WHERE phash_id = ?;', ( perceptual_hash_id, distance_to_ancestor, ancestor_id ) )
                         
-                        self._ClearPerceptualHashesFromVPTreeNodeCache( ( ancestor_id, ) )
-                        
                         parent_id = ancestor_id
                         
                     
@@ -109,8 +378,6 @@ class ClientDBSimilarFiles( ClientDBModule.ClientDBModule ):
                         
                         self._Execute( 'UPDATE shape_vptree SET outer_id = ? WHERE phash_id = ?;', ( perceptual_hash_id, ancestor_id ) )
                         
-                        self._ClearPerceptualHashesFromVPTreeNodeCache( ( ancestor_id, ) )
-                        
                         parent_id = ancestor_id
                         
                     
@@ -136,9 +403,6 @@ class ClientDBSimilarFiles( ClientDBModule.ClientDBModule ):
             self._ExecuteMany( 'UPDATE shape_vptree SET inner_population = inner_population + 1 WHERE phash_id = ?;', ( ( ancestor_id, ) for ancestor_id in ancestors_we_are_inside ) )
             self._ExecuteMany( 'UPDATE shape_vptree SET outer_population = outer_population + 1 WHERE phash_id = ?;', ( ( ancestor_id, ) for ancestor_id in ancestors_we_are_outside ) )
             
-            self._ClearPerceptualHashesFromVPTreeNodeCache( ancestors_we_are_inside )
-            self._ClearPerceptualHashesFromVPTreeNodeCache( ancestors_we_are_outside )
-            
         
         radius = None
         inner_id = None
@@ -148,8 +412,6 @@ class ClientDBSimilarFiles( ClientDBModule.ClientDBModule ):
         
         self._Execute( 'INSERT OR REPLACE INTO shape_vptree ( phash_id, parent_id, radius, inner_id, inner_population, outer_id, outer_population ) VALUES ( ?, ?, ?, ?, ?, ?, ? );', ( perceptual_hash_id, parent_id, radius, inner_id, inner_population, outer_id, outer_population ) )
         
-        self._ClearPerceptualHashesFromVPTreeNodeCache( ( perceptual_hash_id, ) )
-        
     
     def _GenerateBranch( self, job_status, parent_id, perceptual_hash_id, perceptual_hash, children ):
         
@@ -162,8 +424,6 @@ class ClientDBSimilarFiles( ClientDBModule.ClientDBModule ):
         num_done = 0
         num_to_do = len( children ) + 1
         
-        all_altered_phash_ids = set()
-        
         while len( process_queue ) > 0:
             
             job_status.SetStatusText( 'generating new branch -- ' + HydrusNumbers.ValueRangeToPrettyString( num_done, num_to_do ), 2 )
@@ -222,8 +482,6 @@ class ClientDBSimilarFiles( ClientDBModule.ClientDBModule ):
             
             insert_rows.append( ( perceptual_hash_id, parent_id, radius, inner_id, inner_population, outer_id, outer_population ) )
             
-            all_altered_phash_ids.add( perceptual_hash_id )
-            
             if inner_id is not None:
                 
                 process_queue.append( ( perceptual_hash_id, inner_id, inner_perceptual_hash, inner_children ) )
@@ -241,8 +499,6 @@ class ClientDBSimilarFiles( ClientDBModule.ClientDBModule ):
         
         self._ExecuteMany( 'INSERT OR REPLACE INTO shape_vptree ( phash_id, parent_id, radius, inner_id, inner_population, outer_id, outer_population ) VALUES ( ?, ?, ?, ?, ?, ?, ? );', insert_rows )
         
-        self._ClearPerceptualHashesFromVPTreeNodeCache( all_altered_phash_ids )
-        
     
     def _GetHashIdsWithPixelHashId( self, pixel_hash_id: int ) -> typing.Set[ int ]:
         
@@ -282,16 +538,6 @@ class ClientDBSimilarFiles( ClientDBModule.ClientDBModule ):
         }
         
     
-    def _GetPerceptualHashes( self, perceptual_hash_ids: typing.Collection[ int ] ) -> typing.Set[ bytes ]:
-        
-        with self._MakeTemporaryIntegerTable( perceptual_hash_ids, 'phash_id' ) as temp_table_name:
-            
-            perceptual_hashes = self._STS( self._Execute( f'SELECT phash FROM shape_perceptual_hashes NATURAL JOIN {temp_table_name};' ) )
-            
-        
-        return perceptual_hashes
-        
-    
     def _GetPerceptualHashId( self, perceptual_hash, do_not_create = False ):
         
         result = self._Execute( 'SELECT phash_id FROM shape_perceptual_hashes WHERE phash = ?;', ( sqlite3.Binary( perceptual_hash ), ) ).fetchone()
@@ -317,27 +563,32 @@ class ClientDBSimilarFiles( ClientDBModule.ClientDBModule ):
         return perceptual_hash_id
         
     
-    def _GetPerceptualHashIdsFromHashId( self, hash_id: int ) -> typing.Set[ int ]:
-        
-        perceptual_hash_ids = self._STS( self._Execute( 'SELECT phash_id FROM shape_perceptual_hash_map WHERE hash_id = ?;', ( hash_id, ) ) )
-        
-        return perceptual_hash_ids
-        
-    
-    def _GetPixelHashId( self, hash_id: int ) -> typing.Optional[ int ]:
+    def _GetPerceptualHashSearchIndexResults( self, search_perceptual_hashes: typing.Sequence[ bytes ], max_hamming_distance: int ) -> typing.List[ typing.Dict[ int, int ] ]:
         
-        result = self._Execute( 'SELECT pixel_hash_id FROM pixel_hash_map WHERE hash_id = ?;', ( hash_id, ) ).fetchone()
+        search_results = self._perceptual_hash_search_index_cache.Search( search_perceptual_hashes, max_hamming_distance )
         
-        if result is None:
+        if search_results is None:
             
-            return None
+            if not self._can_load_search_index:
+                
+                # a read pool reader only sees the last commit, so if it loaded the shared index, it could miss what the main connection is doing right now, forever
+                raise HydrusExceptions.DBReadPoolCannotServeException( 'The similar files search index is not loaded.' )
+                
             
-        else:
+            # orphan phashes hang around in the table until a branch regen clears them, so only load what maps to files
+            rows = self._Execute( 'SELECT phash_id, phash FROM shape_perceptual_hashes WHERE EXISTS ( SELECT 1 FROM shape_perceptual_hash_map WHERE shape_perceptual_hash_map.phash_id = shape_perceptual_hashes.phash_id );' ).fetchall()
             
-            ( pixel_hash_id, ) = result
+            self._perceptual_hash_search_index_cache.Load( rows )
             
-            return pixel_hash_id
+            if HG.db_report_mode:
+                
+                HydrusData.ShowText( 'Similar files search index loaded {} perceptual hashes.'.format( HydrusNumbers.ToHumanInt( len( self._perceptual_hash_search_index_cache ) ) ) )
+                
             
+            search_results = self._perceptual_hash_search_index_cache.Search( search_perceptual_hashes, max_hamming_distance )
+            
+        
+        return search_results
         
     
     def _PopBestRootNode( self, node_rows ):
@@ -456,8 +707,6 @@ class ClientDBSimilarFiles( ClientDBModule.ClientDBModule ):
         
         self._ExecuteMany( 'DELETE FROM shape_vptree WHERE phash_id = ?;', ( ( p_id, ) for p_id in unbalanced_perceptual_hash_ids ) )
         
-        self._ClearPerceptualHashesFromVPTreeNodeCache( unbalanced_perceptual_hash_ids )
-        
         self._ExecuteMany( 'DELETE FROM shape_maintenance_branch_regen WHERE phash_id = ?;', ( ( p_id, ) for p_id in unbalanced_perceptual_hash_ids ) )
         
         # let's take this chance to clear out any nodes that don't actually map to any files
@@ -526,8 +775,6 @@ class ClientDBSimilarFiles( ClientDBModule.ClientDBModule ):
             
             self._Execute( query, ( new_perceptual_hash_id, num_useful_population, parent_id ) )
             
-            self._ClearPerceptualHashesFromVPTreeNodeCache( ( parent_id, ) )
-            
         
         if num_useful_population > 0:
             
@@ -535,24 +782,6 @@ class ClientDBSimilarFiles( ClientDBModule.ClientDBModule ):
             
         
     
-    def _ClearPerceptualHashesFromVPTreeNodeCache( self, perceptual_hash_ids: typing.Collection[ int ] ):
-        
-        for perceptual_hash_id in perceptual_hash_ids:
-            
-            if perceptual_hash_id in self._perceptual_hash_id_to_vp_tree_node_cache:
-                
-                del self._perceptual_hash_id_to_vp_tree_node_cache[ perceptual_hash_id ]
-                
-            
-            self._non_vp_treed_perceptual_hash_ids.discard( perceptual_hash_id )
-            
-            if self._root_node_perceptual_hash_id == perceptual_hash_id:
-                
-                self._root_node_perceptual_hash_id = None
-                
-            
-        
-    
     def _RepairRepopulateTables( self, repopulate_table_names, cursor_transaction_wrapper: HydrusDBBase.DBCursorTransactionWrapper ):
         
         if 'main.shape_vptree' in repopulate_table_names or 'main.shape_maintenance_branch_regen' in repopulate_table_names:
@@ -561,58 +790,46 @@ class ClientDBSimilarFiles( ClientDBModule.ClientDBModule ):
             
         
     
-    def _TryToPopulatePerceptualHashToVPTreeNodeCache( self, perceptual_hash_ids: typing.Collection[ int ] ):
+    def _SearchPerceptualHashIndex( self, search_perceptual_hashes: typing.Collection[ bytes ], max_hamming_distance: int ) -> typing.Dict[ int, int ]:
         
-        # the node cache used to limit itself to 1,000,000 nodes, but on clients with 13m files it was churning
-        # if you got a big client, I'm going to eat some ram, simple as
+        search_perceptual_hashes = [ search_perceptual_hash for search_perceptual_hash in search_perceptual_hashes if isinstance( search_perceptual_hash, bytes ) and len( search_perceptual_hash ) == 8 ]
         
-        uncached_perceptual_hash_ids = { perceptual_hash_id for perceptual_hash_id in perceptual_hash_ids if perceptual_hash_id not in self._perceptual_hash_id_to_vp_tree_node_cache and perceptual_hash_id not in self._non_vp_treed_perceptual_hash_ids }
+        similar_perceptual_hash_ids_to_distances = {}
         
-        if len( uncached_perceptual_hash_ids ) > 0:
+        for perceptual_hash_ids_to_distances in self._GetPerceptualHashSearchIndexResults( search_perceptual_hashes, max_hamming_distance ):
             
-            if len( uncached_perceptual_hash_ids ) == 1:
-                
-                ( uncached_perceptual_hash_id, ) = uncached_perceptual_hash_ids
-                
-                rows = self._Execute( 'SELECT phash_id, phash, radius, inner_id, outer_id FROM shape_perceptual_hashes CROSS JOIN shape_vptree USING ( phash_id ) WHERE phash_id = ?;', ( uncached_perceptual_hash_id, ) ).fetchall()
-                
-            else:
+            for ( perceptual_hash_id, distance ) in perceptual_hash_ids_to_distances.items():
                 
-                with self._MakeTemporaryIntegerTable( uncached_perceptual_hash_ids, 'phash_id' ) as temp_table_name:
+                if perceptual_hash_id not in similar_perceptual_hash_ids_to_distances or distance < similar_perceptual_hash_ids_to_distances[ perceptual_hash_id ]:
                     
-                    # temp perceptual_hash_ids to actual perceptual_hashes and tree info
-                    rows = self._Execute( 'SELECT phash_id, phash, radius, inner_id, outer_id FROM {} CROSS JOIN shape_perceptual_hashes USING ( phash_id ) CROSS JOIN shape_vptree USING ( phash_id );'.format( temp_table_name ) ).fetchall()
+                    similar_perceptual_hash_ids_to_distances[ perceptual_hash_id ] = distance
                     
                 
             
-            uncached_perceptual_hash_ids_to_vp_tree_nodes = { perceptual_hash_id : ( phash, radius, inner_id, outer_id ) for ( perceptual_hash_id, phash, radius, inner_id, outer_id ) in rows }
-            
-            if len( uncached_perceptual_hash_ids_to_vp_tree_nodes ) < len( uncached_perceptual_hash_ids ):
-                
-                for perceptual_hash_id in uncached_perceptual_hash_ids:
-                    
-                    if perceptual_hash_id not in uncached_perceptual_hash_ids_to_vp_tree_nodes:
-                        
-                        self._non_vp_treed_perceptual_hash_ids.add( perceptual_hash_id )
-                        
-                    
-                
+        
+        if HG.db_report_mode:
             
-            self._perceptual_hash_id_to_vp_tree_node_cache.update( uncached_perceptual_hash_ids_to_vp_tree_nodes )
+            HydrusData.ShowText( 'Similar file search scanned {} perceptual hashes for {} search hashes.'.format( HydrusNumbers.ToHumanInt( len( self._perceptual_hash_search_index_cache ) ), HydrusNumbers.ToHumanInt( len( search_perceptual_hashes ) ) ) )
             
         
+        return similar_perceptual_hash_ids_to_distances
+        
     
     def AssociatePerceptualHashes( self, hash_id, perceptual_hashes ):
         
         perceptual_hash_ids = set()
+        perceptual_hash_ids_and_perceptual_hashes = []
         
         for perceptual_hash in perceptual_hashes:
             
             perceptual_hash_id = self._GetPerceptualHashId( perceptual_hash )
             
             perceptual_hash_ids.add( perceptual_hash_id )
+            perceptual_hash_ids_and_perceptual_hashes.append( ( perceptual_hash_id, perceptual_hash ) )
             
         
+        self._perceptual_hash_search_index_cache.AddPerceptualHashes( perceptual_hash_ids_and_perceptual_hashes )
+        
         self._ExecuteMany( 'INSERT OR IGNORE INTO shape_perceptual_hash_map ( phash_id, hash_id ) VALUES ( ?, ? );', ( ( perceptual_hash_id, hash_id ) for perceptual_hash_id in perceptual_hash_ids ) )
         
         if self._GetRowCount() > 0:
@@ -634,6 +851,12 @@ class ClientDBSimilarFiles( ClientDBModule.ClientDBModule ):
         self._Execute( 'DELETE FROM pixel_hash_map WHERE hash_id = ?;', ( hash_id, ) )
         
     
+    def ClearSearchIndex( self ):
+        
+        # the in-memory index is updated as we write, so if those writes are rolled back, it has to go
+        self._perceptual_hash_search_index_cache.Clear()
+        
+    
     def DisassociatePerceptualHashes( self, hash_id, perceptual_hash_ids ):
         
         self._ExecuteMany( 'DELETE FROM shape_perceptual_hash_map WHERE phash_id = ? AND hash_id = ?;', ( ( perceptual_hash_id, hash_id ) for perceptual_hash_id in perceptual_hash_ids ) )
@@ -642,6 +865,8 @@ class ClientDBSimilarFiles( ClientDBModule.ClientDBModule ):
         
         useless_perceptual_hash_ids = perceptual_hash_ids.difference( useful_perceptual_hash_ids )
         
+        self._perceptual_hash_search_index_cache.RemovePerceptualHashIds( useless_perceptual_hash_ids )
+        
         self._ExecuteMany( 'INSERT OR IGNORE INTO shape_maintenance_branch_regen ( phash_id ) VALUES ( ? );', ( ( perceptual_hash_id, ) for perceptual_hash_id in useless_perceptual_hash_ids ) )
         
     
@@ -800,9 +1025,7 @@ class ClientDBSimilarFiles( ClientDBModule.ClientDBModule ):
             
             self._Execute( 'DELETE FROM shape_vptree;' )
             
-            self._perceptual_hash_id_to_vp_tree_node_cache = {}
-            self._non_vp_treed_perceptual_hash_ids = set()
-            self._root_node_perceptual_hash_id = None
+            self._perceptual_hash_search_index_cache.Clear()
             
             all_nodes = self._Execute( 'SELECT phash_id, phash FROM shape_perceptual_hashes;' ).fetchall()
             
@@ -899,33 +1122,98 @@ class ClientDBSimilarFiles( ClientDBModule.ClientDBModule ):
     
     def SearchFile( self, hash_id: int, max_hamming_distance: int ) -> typing.List:
         
-        similar_hash_ids_and_distances = [ ( hash_id, 0 ) ]
+        return self.SearchFiles( ( hash_id, ), max_hamming_distance )[ hash_id ]
         
-        pixel_hash_id = self._GetPixelHashId( hash_id )
+    
+    def SearchFiles( self, hash_ids: typing.Collection[ int ], max_hamming_distance: int ) -> typing.Dict[ int, typing.List[ typing.Tuple[ int, int ] ] ]:
+        
+        # the bulk SearchFile. a few temp table queries and one pass over the search index, however many files we are given
+        # each file gets itself at distance 0 first, then everything else it matched, with the smallest distance we found
         
-        if pixel_hash_id is not None:
+        hash_ids_to_similar_hash_ids_to_distances = { hash_id : { hash_id : 0 } for hash_id in hash_ids }
+        
+        if len( hash_ids_to_similar_hash_ids_to_distances ) == 0:
             
-            similar_hash_ids_and_distances.extend( self.SearchPixelHashes( ( pixel_hash_id, ) ) )
+            return {}
             
         
-        if max_hamming_distance == 0:
+        def add_result( hash_id, similar_hash_id, distance ):
             
-            exact_match_hash_ids = self._STL( self._Execute( 'SELECT hash_id FROM shape_perceptual_hash_map WHERE phash_id IN ( SELECT phash_id FROM shape_perceptual_hash_map WHERE hash_id = ? );', ( hash_id, ) ) )
+            similar_hash_ids_to_distances = hash_ids_to_similar_hash_ids_to_distances[ hash_id ]
             
-            similar_hash_ids_and_distances.extend( [ ( exact_match_hash_id, 0 ) for exact_match_hash_id in exact_match_hash_ids ] )
-            
-        else:
+            if similar_hash_id not in similar_hash_ids_to_distances or distance < similar_hash_ids_to_distances[ similar_hash_id ]:
+                
+                similar_hash_ids_to_distances[ similar_hash_id ] = distance
+                
             
-            perceptual_hash_ids = self._GetPerceptualHashIdsFromHashId( hash_id )
+        
+        with self._MakeTemporaryIntegerTable( hash_ids_to_similar_hash_ids_to_distances.keys(), 'hash_id' ) as temp_hash_ids_table_name:
             
-            perceptual_hashes = self._GetPerceptualHashes( perceptual_hash_ids )
+            # temp hashes to pixel hashes to files with the same pixel hash
+            for ( hash_id, pixel_dupe_hash_id ) in self._Execute( f'SELECT {temp_hash_ids_table_name}.hash_id, pixel_dupes.hash_id FROM {temp_hash_ids_table_name} CROSS JOIN pixel_hash_map ON ( {temp_hash_ids_table_name}.hash_id = pixel_hash_map.hash_id ) CROSS JOIN pixel_hash_map AS pixel_dupes ON ( pixel_hash_map.pixel_hash_id = pixel_dupes.pixel_hash_id );' ).fetchall():
+                
+                add_result( hash_id, pixel_dupe_hash_id, 0 )
+                
             
-            similar_hash_ids_and_distances.extend( self.SearchPerceptualHashes( perceptual_hashes, max_hamming_distance ) )
+            if max_hamming_distance == 0:
+                
+                # temp hashes to perceptual hashes to files with the same perceptual hash
+                for ( hash_id, exact_match_hash_id ) in self._Execute( f'SELECT {temp_hash_ids_table_name}.hash_id, exact_matches.hash_id FROM {temp_hash_ids_table_name} CROSS JOIN shape_perceptual_hash_map ON ( {temp_hash_ids_table_name}.hash_id = shape_perceptual_hash_map.hash_id ) CROSS JOIN shape_perceptual_hash_map AS exact_matches ON ( shape_perceptual_hash_map.phash_id = exact_matches.phash_id );' ).fetchall():
+                    
+                    add_result( hash_id, exact_match_hash_id, 0 )
+                    
+                
+                hash_ids_and_perceptual_hashes = []
+                
+            else:
+                
+                # temp hashes to perceptual hashes
+                hash_ids_and_perceptual_hashes = self._Execute( f'SELECT {temp_hash_ids_table_name}.hash_id, phash FROM {temp_hash_ids_table_name} CROSS JOIN shape_perceptual_hash_map ON ( {temp_hash_ids_table_name}.hash_id = shape_perceptual_hash_map.hash_id ) CROSS JOIN shape_perceptual_hashes USING ( phash_id );' ).fetchall()
+                
             
         
-        similar_hash_ids_and_distances = HydrusData.DedupeList( similar_hash_ids_and_distances )
+        perceptual_hashes_to_hash_ids = HydrusData.BuildKeyToListDict( ( ( perceptual_hash, hash_id ) for ( hash_id, perceptual_hash ) in hash_ids_and_perceptual_hashes if isinstance( perceptual_hash, bytes ) and len( perceptual_hash ) == 8 ) )
         
-        return similar_hash_ids_and_distances
+        if len( perceptual_hashes_to_hash_ids ) > 0:
+            
+            search_perceptual_hashes = list( perceptual_hashes_to_hash_ids.keys() )
+            
+            search_results = self._GetPerceptualHashSearchIndexResults( search_perceptual_hashes, max_hamming_distance )
+            
+            all_similar_perceptual_hash_ids = set()
+            
+            for perceptual_hash_ids_to_distances in search_results:
+                
+                all_similar_perceptual_hash_ids.update( perceptual_hash_ids_to_distances.keys() )
+                
+            
+            with self._MakeTemporaryIntegerTable( all_similar_perceptual_hash_ids, 'phash_id' ) as temp_perceptual_hash_ids_table_name:
+                
+                # temp perceptual hashes to hash map
+                similar_perceptual_hash_ids_to_hash_ids = HydrusData.BuildKeyToListDict( self._Execute( f'SELECT phash_id, hash_id FROM {temp_perceptual_hash_ids_table_name} CROSS JOIN shape_perceptual_hash_map USING ( phash_id );' ) )
+                
+            
+            for ( search_perceptual_hash, perceptual_hash_ids_to_distances ) in zip( search_perceptual_hashes, search_results ):
+                
+                for hash_id in perceptual_hashes_to_hash_ids[ search_perceptual_hash ]:
+                    
+                    for ( perceptual_hash_id, distance ) in perceptual_hash_ids_to_distances.items():
+                        
+                        for similar_hash_id in similar_perceptual_hash_ids_to_hash_ids.get( perceptual_hash_id, () ):
+                            
+                            add_result( hash_id, similar_hash_id, distance )
+                            
+                        
+                    
+                
+            
+            if HG.db_report_mode:
+                
+                HydrusData.ShowText( 'Similar files bulk search scanned {} perceptual hashes for {} search hashes from {} files.'.format( HydrusNumbers.ToHumanInt( len( self._perceptual_hash_search_index_cache ) ), HydrusNumbers.ToHumanInt( len( search_perceptual_hashes ) ), HydrusNumbers.ToHumanInt( len( hash_ids_to_similar_hash_ids_to_distances ) ) ) )
+                
+            
+        
+        return { hash_id : list( similar_hash_ids_to_distances.items() ) for ( hash_id, similar_hash_ids_to_distances ) in hash_ids_to_similar_hash_ids_to_distances.items() }
         
     
     def SearchPixelHashes( self, search_pixel_hash_ids: typing.Collection[ int ] ):
@@ -979,116 +1267,7 @@ class ClientDBSimilarFiles( ClientDBModule.ClientDBModule ):
             
         else:
             
-            search_radius = max_hamming_distance
-            
-            if self._root_node_perceptual_hash_id is None:
-                
-                top_node_result = self._Execute( 'SELECT phash_id FROM shape_vptree WHERE parent_id IS NULL;' ).fetchone()
-                
-                if top_node_result is None:
-                    
-                    return similar_hash_ids_and_distances
-                    
-                
-                ( self._root_node_perceptual_hash_id, ) = top_node_result
-                
-            
-            similar_perceptual_hash_ids_to_distances = {}
-            
-            num_cycles = 0
-            total_nodes_searched = 0
-            
-            for search_perceptual_hash in search_perceptual_hashes:
-                
-                next_potentials = [ self._root_node_perceptual_hash_id ]
-                
-                while len( next_potentials ) > 0:
-                    
-                    current_potentials = next_potentials
-                    next_potentials = []
-                    
-                    num_cycles += 1
-                    total_nodes_searched += len( current_potentials )
-                    
-                    # this is no longer an iterable inside the main node SELECT because it was causing crashes on linux!!
-                    # after investigation, it seemed to be SQLite having a problem with part of Get64BitHammingDistance touching perceptual_hashes it presumably was still hanging on to
-                    # the crash was in sqlite code, again presumably on subsequent fetch
-                    # adding a fake delay in seemed to fix it also. guess it was some memory maintenance buffer/bytes thing
-                    # anyway, we now just get the whole lot of results first and then work on the whole lot
-                    # UPDATE: we moved to a cache finally, so the iteration danger is less worrying, but leaving the above up anyway
-                    
-                    self._TryToPopulatePerceptualHashToVPTreeNodeCache( current_potentials )
-                    
-                    for node_perceptual_hash_id in current_potentials:
-                        
-                        result = self._perceptual_hash_id_to_vp_tree_node_cache.get( node_perceptual_hash_id, None )
-                        
-                        if result is None:
-                            
-                            # something crazy happened, probably a broken tree branch, move on
-                            continue
-                            
-                        
-                        ( node_perceptual_hash, node_radius, inner_perceptual_hash_id, outer_perceptual_hash_id ) = result
-                        
-                        # first check the node itself--is it similar?
-                        
-                        node_hamming_distance = HydrusData.Get64BitHammingDistance( search_perceptual_hash, node_perceptual_hash )
-                        
-                        if node_hamming_distance <= search_radius:
-                            
-                            if node_perceptual_hash_id in similar_perceptual_hash_ids_to_distances:
-                                
-                                current_distance = similar_perceptual_hash_ids_to_distances[ node_perceptual_hash_id ]
-                                
-                                similar_perceptual_hash_ids_to_distances[ node_perceptual_hash_id ] = min( node_hamming_distance, current_distance )
-                                
-                            else:
-                                
-                                similar_perceptual_hash_ids_to_distances[ node_perceptual_hash_id ] = node_hamming_distance
-                                
-                            
-                        
-                        # now how about its children--where should we search next?
-                        
-                        if node_radius is not None:
-                            
-                            # we have two spheres--node and search--their centers separated by node_hamming_distance
-                            # we want to search inside/outside the node_sphere if the search_sphere intersects with those spaces
-                            # there are four possibles:
-                            # (----N----)-(--S--)    intersects with outer only - distance between N and S > their radii
-                            # (----N---(-)-S--)      intersects with both
-                            # (----N-(--S-)-)        intersects with both
-                            # (---(-N-S--)-)         intersects with inner only - distance between N and S + radius_S does not exceed radius_N
-                            
-                            if inner_perceptual_hash_id is not None:
-                                
-                                spheres_disjoint = node_hamming_distance > ( node_radius + search_radius )
-                                
-                                if not spheres_disjoint: # i.e. they intersect at some point
-                                    
-                                    next_potentials.append( inner_perceptual_hash_id )
-                                    
-                                
-                            
-                            if outer_perceptual_hash_id is not None:
-                                
-                                search_sphere_subset_of_node_sphere = ( node_hamming_distance + search_radius ) <= node_radius
-                                
-                                if not search_sphere_subset_of_node_sphere: # i.e. search sphere intersects with non-node sphere space at some point
-                                    
-                                    next_potentials.append( outer_perceptual_hash_id )
-                                    
-                                
-                            
-                        
-                    
-                
-            
-            if HG.db_report_mode:
-                
-                HydrusData.ShowText( 'Similar file search touched {} nodes over {} cycles.'.format( HydrusNumbers.ToHumanInt( total_nodes_searched ), HydrusNumbers.ToHumanInt( num_cycles ) ) )
-                
+            similar_perceptual_hash_ids_to_distances = self._SearchPerceptualHashIndex( search_perceptual_hashes, max_hamming_distance )
             
             # so, now we have perceptual_hash_ids and distances. let's map that to actual files.
             # files can have multiple perceptual_hashes, and perceptual_hashes can refer to multiple files, so let's make sure we are setting the smallest distance we found
@@ -45,6 +45,12 @@ class ClientDBTagDisplay( ClientDBModule.ClientDBModule ):
         super().__init__( 'client tag display', cursor )
         
     
+    def ClearLookupIndices( self, tag_service_id = None ):
+        
+        self.modules_tag_siblings.ClearLookupIndices( tag_service_id = tag_service_id )
+        self.modules_tag_parents.ClearLookupIndices( tag_service_id = tag_service_id )
+        
+    
     def FilterChained( self, display_type, tag_service_id, tag_ids ) -> typing.Set[ int ]:
         
         # we are not passing ideal_tag_ids here, but that's ok, we are testing sibling chains in one second
@@ -649,6 +655,17 @@ class ClientDBTagDisplay( ClientDBModule.ClientDBModule ):
         return self.modules_tag_parents.IsChained( display_type, tag_service_id, tag_id ) or self.modules_tag_siblings.IsChained( display_type, tag_service_id, tag_id )
         
     
+    def LoadLookupIndices( self, tag_service_id ):
+        
+        # sync maintenance asks about the same chains over and over, so it is worth holding them in memory while it works
+        
+        for display_type in ( ClientTags.TAG_DISPLAY_DISPLAY_IDEAL, ClientTags.TAG_DISPLAY_DISPLAY_ACTUAL ):
+            
+            self.modules_tag_siblings.LoadLookupIndex( display_type, tag_service_id )
+            self.modules_tag_parents.LoadLookupIndex( display_type, tag_service_id )
+            
+        
+    
     def NotifyParentsChanged( self, tag_service_id_that_changed, tag_ids_that_changed ):
         
         if len( tag_ids_that_changed ) == 0:
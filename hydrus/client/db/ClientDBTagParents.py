@@ -14,6 +14,7 @@ from hydrus.client.db import ClientDBServices
 from hydrus.client.db import ClientDBTagSiblings
 from hydrus.client.metadata import ClientTags
 from hydrus.client.metadata import ClientTagsHandling
+from hydrus.client.metadata import ClientTagsLookupIndex
 
 def GenerateTagParentsLookupCacheTableName( display_type: int, service_id: int ):
     
@@ -82,6 +83,9 @@ class ClientDBTagParents( ClientDBModule.ClientDBModule ):
         self._service_ids_to_applicable_service_ids = None
         self._service_ids_to_interested_service_ids = None
         
+        # ( display_type, tag_service_id ) to in-memory mirrors of the lookup tables, only while something has loaded them
+        self._lookup_indices = {}
+        
         super().__init__( 'client tag parents', cursor )
         
     
@@ -99,6 +103,11 @@ class ClientDBTagParents( ClientDBModule.ClientDBModule ):
         }
         
     
+    def _GetLookupIndex( self, display_type, tag_service_id ) -> typing.Optional[ ClientTagsLookupIndex.TagParentsLookupIndex ]:
+        
+        return self._lookup_indices.get( ( display_type, tag_service_id ), None )
+        
+    
     def _GetServiceIndexGenerationDict( self, service_id ) -> dict:
         
         ( cache_ideal_tag_parents_lookup_table_name, cache_actual_tag_parents_lookup_table_name ) = GenerateTagParentsLookupCacheTableNames( service_id )
@@ -211,12 +220,46 @@ class ClientDBTagParents( ClientDBModule.ClientDBModule ):
             self._ExecuteMany( f'DELETE FROM {cache_actual_tag_parents_lookup_table_name} WHERE child_tag_id = ? OR ancestor_tag_id = ?;', ( ( tag_id, tag_id ) for tag_id in tag_ids ) )
             
         
+        lookup_index = self._GetLookupIndex( ClientTags.TAG_DISPLAY_DISPLAY_ACTUAL, service_id )
+        
+        if lookup_index is not None:
+            
+            if tag_ids is None:
+                
+                self._lookup_indices[ ( ClientTags.TAG_DISPLAY_DISPLAY_ACTUAL, service_id ) ] = ClientTagsLookupIndex.TagParentsLookupIndex()
+                
+            else:
+                
+                lookup_index.DeleteTagIds( tag_ids )
+                
+            
+        
         if service_id in self._service_ids_to_display_application_status:
             
             del self._service_ids_to_display_application_status[ service_id ]
             
         
     
+    def ClearLookupIndices( self, tag_service_id = None ):
+        
+        # the in-memory lookups are only good while they match the tables, so if we aren't sure, we throw them away
+        
+        if tag_service_id is None:
+            
+            self._lookup_indices = {}
+            
+        else:
+            
+            for display_type in ( ClientTags.TAG_DISPLAY_DISPLAY_IDEAL, ClientTags.TAG_DISPLAY_DISPLAY_ACTUAL ):
+                
+                if ( display_type, tag_service_id ) in self._lookup_indices:
+                    
+                    del self._lookup_indices[ ( display_type, tag_service_id ) ]
+                    
+                
+            
+        
+    
     def DeletePending( self, service_id ):
         
         statuses_to_storage_table_names = GenerateTagParentsStorageTableNames( service_id )
@@ -247,6 +290,8 @@ class ClientDBTagParents( ClientDBModule.ClientDBModule ):
         self.modules_db_maintenance.DeferredDropTable( cache_actual_tag_parents_lookup_table_name )
         self.modules_db_maintenance.DeferredDropTable( cache_ideal_tag_parents_lookup_table_name )
         
+        self.ClearLookupIndices( tag_service_id )
+        
         self._Execute( 'DELETE FROM tag_parent_application WHERE master_service_id = ? OR application_service_id = ?;', ( tag_service_id, tag_service_id ) )
         
         self._service_ids_to_applicable_service_ids = None
@@ -273,6 +318,13 @@ class ClientDBTagParents( ClientDBModule.ClientDBModule ):
                 
             
         
+        lookup_index = self._GetLookupIndex( display_type, tag_service_id )
+        
+        if lookup_index is not None:
+            
+            return lookup_index.FilterChained( ideal_tag_ids )
+            
+        
         # get the tag_ids that are part of a parent chain
         
         cache_tag_parents_lookup_table_name = GenerateTagParentsLookupCacheTableName( display_type, tag_service_id )
@@ -334,6 +386,13 @@ class ClientDBTagParents( ClientDBModule.ClientDBModule ):
     
     def GetAllTagIds( self, display_type, tag_service_id ):
         
+        lookup_index = self._GetLookupIndex( display_type, tag_service_id )
+        
+        if lookup_index is not None:
+            
+            return lookup_index.GetAllTagIds()
+            
+        
         cache_tag_parents_lookup_table_name = GenerateTagParentsLookupCacheTableName( display_type, tag_service_id )
         
         tag_ids = set()
@@ -346,6 +405,13 @@ class ClientDBTagParents( ClientDBModule.ClientDBModule ):
     
     def GetAncestors( self, display_type: int, tag_service_id: int, ideal_tag_id: int ):
         
+        lookup_index = self._GetLookupIndex( display_type, tag_service_id )
+        
+        if lookup_index is not None:
+            
+            return lookup_index.GetAncestors( ideal_tag_id )
+            
+        
         cache_tag_parents_lookup_table_name = GenerateTagParentsLookupCacheTableName( display_type, tag_service_id )
         
         ancestor_ids = self._STS( self._Execute( 'SELECT ancestor_tag_id FROM {} WHERE child_tag_id = ?;'.format( cache_tag_parents_lookup_table_name ), ( ideal_tag_id, ) ) )
@@ -419,6 +485,13 @@ class ClientDBTagParents( ClientDBModule.ClientDBModule ):
             return set()
             
         
+        lookup_index = self._GetLookupIndex( display_type, tag_service_id )
+        
+        if lookup_index is not None:
+            
+            return lookup_index.GetChainsMembers( ideal_tag_ids )
+            
+        
         cache_tag_parents_lookup_table_name = GenerateTagParentsLookupCacheTableName( display_type, tag_service_id )
         
         chain_tag_ids = set( ideal_tag_ids )
@@ -501,6 +574,13 @@ class ClientDBTagParents( ClientDBModule.ClientDBModule ):
     
     def GetDescendants( self, display_type: int, tag_service_id: int, ideal_tag_id: int ):
         
+        lookup_index = self._GetLookupIndex( display_type, tag_service_id )
+        
+        if lookup_index is not None:
+            
+            return lookup_index.GetDescendants( ideal_tag_id )
+            
+        
         cache_tag_parents_lookup_table_name = GenerateTagParentsLookupCacheTableName( display_type, tag_service_id )
         
         descendant_ids = self._STS( self._Execute( 'SELECT child_tag_id FROM {} WHERE ancestor_tag_id = ?;'.format( cache_tag_parents_lookup_table_name ), ( ideal_tag_id, ) ) )
@@ -712,6 +792,13 @@ class ClientDBTagParents( ClientDBModule.ClientDBModule ):
             return { ideal_tag_id : ancestors }
             
         
+        lookup_index = self._GetLookupIndex( display_type, tag_service_id )
+        
+        if lookup_index is not None:
+            
+            return lookup_index.GetTagsToAncestors( ideal_tag_ids )
+            
+        
         cache_tag_parents_lookup_table_name = GenerateTagParentsLookupCacheTableName( display_type, tag_service_id )
         
         with self._MakeTemporaryIntegerTable( ideal_tag_ids, 'child_tag_id' ) as temp_table_name:
@@ -745,6 +832,13 @@ class ClientDBTagParents( ClientDBModule.ClientDBModule ):
             return { ideal_tag_id : descendants }
             
         
+        lookup_index = self._GetLookupIndex( display_type, tag_service_id )
+        
+        if lookup_index is not None:
+            
+            return lookup_index.GetTagsToDescendants( ideal_tag_ids )
+            
+        
         cache_tag_parents_lookup_table_name = GenerateTagParentsLookupCacheTableName( display_type, tag_service_id )
         
         with self._MakeTemporaryIntegerTable( ideal_tag_ids, 'ancestor_tag_id' ) as temp_table_name:
@@ -783,13 +877,39 @@ class ClientDBTagParents( ClientDBModule.ClientDBModule ):
     
     def IsChained( self, display_type, tag_service_id, ideal_tag_id ):
         
+        lookup_index = self._GetLookupIndex( display_type, tag_service_id )
+        
+        if lookup_index is not None:
+            
+            return lookup_index.IsChained( ideal_tag_id )
+            
+        
         cache_tag_parents_lookup_table_name = GenerateTagParentsLookupCacheTableName( display_type, tag_service_id )
         
         return self._Execute( 'SELECT 1 FROM {} WHERE child_tag_id = ? OR ancestor_tag_id = ?;'.format( cache_tag_parents_lookup_table_name ), ( ideal_tag_id, ideal_tag_id ) ).fetchone() is not None
         
     
+    def LoadLookupIndex( self, display_type, tag_service_id ):
+        
+        if self._GetLookupIndex( display_type, tag_service_id ) is not None:
+            
+            return
+            
+        
+        cache_tag_parents_lookup_table_name = GenerateTagParentsLookupCacheTableName( display_type, tag_service_id )
+        
+        self._lookup_indices[ ( display_type, tag_service_id ) ] = ClientTagsLookupIndex.TagParentsLookupIndex( self._Execute( 'SELECT child_tag_id, ancestor_tag_id FROM {};'.format( cache_tag_parents_lookup_table_name ) ) )
+        
+    
     def NotifyParentAddRowSynced( self, tag_service_id, row ):
         
+        lookup_index = self._GetLookupIndex( ClientTags.TAG_DISPLAY_DISPLAY_ACTUAL, tag_service_id )
+        
+        if lookup_index is not None:
+            
+            lookup_index.AddPairs( ( row, ) )
+            
+        
         if tag_service_id in self._service_ids_to_display_application_status:
             
             ( actual_parent_rows, ideal_parent_rows, parent_rows_to_add, parent_rows_to_remove ) = self._service_ids_to_display_application_status[ tag_service_id ]
@@ -803,6 +923,13 @@ class ClientDBTagParents( ClientDBModule.ClientDBModule ):
     
     def NotifyParentDeleteRowSynced( self, tag_service_id, row ):
         
+        lookup_index = self._GetLookupIndex( ClientTags.TAG_DISPLAY_DISPLAY_ACTUAL, tag_service_id )
+        
+        if lookup_index is not None:
+            
+            lookup_index.DeletePairs( ( row, ) )
+            
+        
         if tag_service_id in self._service_ids_to_display_application_status:
             
             ( actual_parent_rows, ideal_parent_rows, parent_rows_to_add, parent_rows_to_remove ) = self._service_ids_to_display_application_status[ tag_service_id ]
@@ -884,6 +1011,11 @@ class ClientDBTagParents( ClientDBModule.ClientDBModule ):
             
             self._ExecuteMany( 'INSERT OR IGNORE INTO {} ( child_tag_id, ancestor_tag_id ) VALUES ( ?, ? );'.format( cache_tag_parents_lookup_table_name ), tps.IterateDescendantAncestorPairs() )
             
+            if self._GetLookupIndex( ClientTags.TAG_DISPLAY_DISPLAY_IDEAL, tag_service_id ) is not None:
+                
+                self._lookup_indices[ ( ClientTags.TAG_DISPLAY_DISPLAY_IDEAL, tag_service_id ) ] = ClientTagsLookupIndex.TagParentsLookupIndex( tps.IterateDescendantAncestorPairs() )
+                
+            
             if tag_service_id in self._service_ids_to_display_application_status:
                 
                 del self._service_ids_to_display_application_status[ tag_service_id ]
@@ -973,6 +1105,14 @@ class ClientDBTagParents( ClientDBModule.ClientDBModule ):
             
             self._ExecuteMany( 'INSERT OR IGNORE INTO {} ( child_tag_id, ancestor_tag_id ) VALUES ( ?, ? );'.format( cache_tag_parents_lookup_table_name ), stuff_added )
             
+            lookup_index = self._GetLookupIndex( ClientTags.TAG_DISPLAY_DISPLAY_IDEAL, tag_service_id )
+            
+            if lookup_index is not None:
+                
+                lookup_index.DeleteTagIds( tag_ids_to_clear_and_regen )
+                lookup_index.AddPairs( stuff_added )
+                
+            
             if tag_service_id in self._service_ids_to_display_application_status:
                 
                 stuff_no_changes = stuff_deleted.intersection( stuff_added )
@@ -23,6 +23,7 @@ from hydrus.client.db import ClientDBServices
 from hydrus.client.db import ClientDBTagDisplay
 from hydrus.client.db import ClientDBTagSiblings
 from hydrus.client.metadata import ClientTags
+from hydrus.client.metadata import ClientTagsAutocompleteIndex
 from hydrus.client.search import ClientSearchAutocomplete
 from hydrus.client.search import ClientSearchFileSearchContext
 from hydrus.client.search import ClientSearchPredicate
@@ -37,6 +38,9 @@ def CanCacheInteger( num ):
     return MIN_CACHED_INTEGER <= num <= MAX_CACHED_INTEGER
     
 
+# how many results the fast autocomplete index read gives, before the full search catches up
+AUTOCOMPLETE_TOP_PREDICATES_LIMIT = 12
+
 def ConvertWildcardToSQLiteLikeParameter( wildcard ):
     
     like_param = wildcard.replace( '*', '%' )
@@ -164,6 +168,57 @@ class ClientDBTagSearch( ClientDBModule.ClientDBModule ):
         self._missing_tag_search_service_pairs = set()
         
     
+    def _GetAutocompleteIndex( self, tag_display_type: int, leaf: ClientDBServices.FileSearchContextLeaf ) -> ClientTagsAutocompleteIndex.TagAutocompleteIndex:
+        
+        autocomplete_index = self.modules_mappings_counts.GetAutocompleteIndex( tag_display_type, leaf.file_service_id, leaf.tag_service_id )
+        
+        counts_cache_table_name = self.modules_mappings_counts.GetCountsCacheTableName( tag_display_type, leaf.file_service_id, leaf.tag_service_id )
+        
+        if autocomplete_index is None:
+            
+            # we only index the most used tags, so first figure out where the line is
+            
+            result = self._Execute( 'SELECT current_count + pending_count AS rank FROM {} ORDER BY rank DESC LIMIT 1 OFFSET ?;'.format( counts_cache_table_name ), ( ClientTagsAutocompleteIndex.MAX_INDEXED_TAGS, ) ).fetchone()
+            
+            if result is None:
+                
+                min_rank = 1
+                
+            else:
+                
+                ( rank, ) = result
+                
+                min_rank = rank + 1
+                
+            
+            cursor = self._Execute( 'SELECT tag_id, namespace_id, subtag, current_count, pending_count FROM {} CROSS JOIN tags USING ( tag_id ) CROSS JOIN subtags USING ( subtag_id ) WHERE current_count + pending_count >= ?;'.format( counts_cache_table_name ), ( min_rank, ) )
+            
+            rows = ( ( tag_id, namespace_id, ClientSearchTagContext.ConvertSubtagToSearchable( subtag ), current_count, pending_count ) for ( tag_id, namespace_id, subtag, current_count, pending_count ) in cursor )
+            
+            autocomplete_index = ClientTagsAutocompleteIndex.TagAutocompleteIndex( rows = rows, min_rank = min_rank )
+            
+            self.modules_mappings_counts.LoadAutocompleteIndex( tag_display_type, leaf.file_service_id, leaf.tag_service_id, autocomplete_index )
+            
+        else:
+            
+            # the counts path tells the index when a tag it doesn't have goes up, but not what its total is or what it says
+            
+            tag_ids_to_check = autocomplete_index.GetTagIdsToCheck()
+            
+            if len( tag_ids_to_check ) > 0:
+                
+                with self._MakeTemporaryIntegerTable( tag_ids_to_check, 'tag_id' ) as temp_tag_ids_table_name:
+                    
+                    rows = self._Execute( 'SELECT tag_id, namespace_id, subtag, current_count, pending_count FROM {} CROSS JOIN {} USING ( tag_id ) CROSS JOIN tags USING ( tag_id ) CROSS JOIN subtags USING ( subtag_id );'.format( temp_tag_ids_table_name, counts_cache_table_name ) ).fetchall()
+                    
+                
+                autocomplete_index.AddCheckedRows( tag_ids_to_check, ( ( tag_id, namespace_id, ClientSearchTagContext.ConvertSubtagToSearchable( subtag ), current_count, pending_count ) for ( tag_id, namespace_id, subtag, current_count, pending_count ) in rows ) )
+                
+            
+        
+        return autocomplete_index
+        
+    
     def _GetServiceIndexGenerationDictSingle( self, file_service_id, tag_service_id ) -> dict:
         
         tags_table_name = self.GetTagsTableName( file_service_id, tag_service_id )
@@ -696,6 +751,93 @@ class ClientDBTagSearch( ClientDBModule.ClientDBModule ):
         return tag_ids
         
     
+    def GetAutocompleteTopPredicates(
+        self,
+        tag_display_type: int,
+        file_search_context: ClientSearchFileSearchContext.FileSearchContext,
+        search_text: str = '',
+        inclusive = True,
+        limit = AUTOCOMPLETE_TOP_PREDICATES_LIMIT,
+        job_status = None
+    ):
+        
+        # the first few results by count for a simple 'samus ar*' search, from the in-memory prefix indices
+        # this is not the full result! the normal autocomplete search does wildcards, siblings and all the zero-count stuff
+        
+        ( namespace, half_complete_searchable_subtag ) = HydrusTags.SplitTag( search_text )
+        
+        if '*' in namespace or not half_complete_searchable_subtag.endswith( '*' ) or ClientSearchAutocomplete.IsComplexWildcard( half_complete_searchable_subtag ):
+            
+            return []
+            
+        
+        prefix = ClientTagsAutocompleteIndex.ConvertSearchableSubtagToPrefixKey( half_complete_searchable_subtag[ : -1 ] )
+        
+        if prefix is None:
+            
+            return []
+            
+        
+        if namespace == '':
+            
+            namespace_id = None
+            
+        else:
+            
+            if not self.modules_tags.NamespaceExists( namespace ):
+                
+                return []
+                
+            
+            namespace_id = self.modules_tags.GetNamespaceId( namespace )
+            
+        
+        location_context = file_search_context.GetLocationContext()
+        tag_context = file_search_context.GetTagContext()
+        
+        if tag_context.IsAllKnownTags() and location_context.IsAllKnownFiles():
+            
+            return []
+            
+        
+        display_tag_service_id = self.modules_services.GetServiceId( tag_context.display_service_key )
+        
+        all_predicates = []
+        
+        file_search_context_branch = self.modules_services.GetFileSearchContextBranch( file_search_context )
+        
+        for leaf in file_search_context_branch.IterateLeaves():
+            
+            if job_status is not None and job_status.IsCancelled():
+                
+                return []
+                
+            
+            autocomplete_index = self._GetAutocompleteIndex( tag_display_type, leaf )
+            
+            tag_ids = autocomplete_index.GetTopTagIds( prefix, namespace_id = namespace_id, limit = limit )
+            
+            domain_is_cross_referenced = leaf.file_service_id != self.modules_services.combined_deleted_file_service_id
+            
+            ids_to_count = self.modules_mappings_counts.GetCounts( tag_display_type, leaf.tag_service_id, leaf.file_service_id, tag_ids, tag_context.include_current_tags, tag_context.include_pending_tags, domain_is_cross_referenced = domain_is_cross_referenced, job_status = job_status )
+            
+            if len( ids_to_count ) == 0:
+                
+                continue
+                
+            
+            predicates = self.modules_tag_display.GeneratePredicatesFromTagIdsAndCounts( tag_display_type, display_tag_service_id, ids_to_count, inclusive, job_status = job_status )
+            
+            all_predicates.extend( predicates )
+            
+        
+        predicates = ClientSearchPredicate.MergePredicates( all_predicates )
+        
+        predicates = ClientSearchPredicate.SortPredicates( predicates )
+        
+        return predicates[ : limit ]
+        
+    
     def GetIntegerSubtagsTableName( self, file_service_id, tag_service_id ):
         
         if file_service_id == self.modules_services.combined_file_service_id:
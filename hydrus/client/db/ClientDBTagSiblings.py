@@ -15,6 +15,7 @@ from hydrus.client.db import ClientDBModule
 from hydrus.client.db import ClientDBServices
 from hydrus.client.metadata import ClientTags
 from hydrus.client.metadata import ClientTagsHandling
+from hydrus.client.metadata import ClientTagsLookupIndex
 
 def GenerateTagSiblingsLookupCacheTableName( display_type: int, service_id: int ):
     
@@ -76,6 +77,9 @@ class ClientDBTagSiblings( ClientDBModule.ClientDBModule ):
         self._service_ids_to_applicable_service_ids = None
         self._service_ids_to_interested_service_ids = None
         
+        # ( display_type, tag_service_id ) to in-memory mirrors of the lookup tables, only while something has loaded them
+        self._lookup_indices = {}
+        
         super().__init__( 'client tag siblings', cursor )
         
     
@@ -112,6 +116,11 @@ class ClientDBTagSiblings( ClientDBModule.ClientDBModule ):
         }
         
     
+    def _GetLookupIndex( self, display_type, tag_service_id ) -> typing.Optional[ ClientTagsLookupIndex.TagSiblingsLookupIndex ]:
+        
+        return self._lookup_indices.get( ( display_type, tag_service_id ), None )
+        
+    
     def _GetServiceIndexGenerationDict( self, service_id ) -> dict:
         
         ( cache_ideal_tag_siblings_lookup_table_name, cache_actual_tag_siblings_lookup_table_name ) = GenerateTagSiblingsLookupCacheTableNames( service_id )
@@ -224,12 +233,46 @@ class ClientDBTagSiblings( ClientDBModule.ClientDBModule ):
             self._ExecuteMany( f'DELETE FROM {cache_actual_tag_sibling_lookup_table_name} WHERE bad_tag_id = ? OR ideal_tag_id = ?;', ( ( tag_id, tag_id ) for tag_id in tag_ids ) )
             
         
+        lookup_index = self._GetLookupIndex( ClientTags.TAG_DISPLAY_DISPLAY_ACTUAL, service_id )
+        
+        if lookup_index is not None:
+            
+            if tag_ids is None:
+                
+                self._lookup_indices[ ( ClientTags.TAG_DISPLAY_DISPLAY_ACTUAL, service_id ) ] = ClientTagsLookupIndex.TagSiblingsLookupIndex()
+                
+            else:
+                
+                lookup_index.DeleteTagIds( tag_ids )
+                
+            
+        
         if service_id in self._service_ids_to_display_application_status:
             
             del self._service_ids_to_display_application_status[ service_id ]
             
         
     
+    def ClearLookupIndices( self, tag_service_id = None ):
+        
+        # the in-memory lookups are only good while they match the tables, so if we aren't sure, we throw them away
+        
+        if tag_service_id is None:
+            
+            self._lookup_indices = {}
+            
+        else:
+            
+            for display_type in ( ClientTags.TAG_DISPLAY_DISPLAY_IDEAL, ClientTags.TAG_DISPLAY_DISPLAY_ACTUAL ):
+                
+                if ( display_type, tag_service_id ) in self._lookup_indices:
+                    
+                    del self._lookup_indices[ ( display_type, tag_service_id ) ]
+                    
+                
+            
+        
+    
     def DeletePending( self, service_id ):
         
         statuses_to_storage_table_names = GenerateTagSiblingsStorageTableNames( service_id )
@@ -260,6 +303,8 @@ class ClientDBTagSiblings( ClientDBModule.ClientDBModule ):
         self.modules_db_maintenance.DeferredDropTable( cache_actual_tag_siblings_lookup_table_name )
         self.modules_db_maintenance.DeferredDropTable( cache_ideal_tag_siblings_lookup_table_name )
         
+        self.ClearLookupIndices( tag_service_id )
+        
         self._Execute( 'DELETE FROM tag_sibling_application WHERE master_service_id = ? OR application_service_id = ?;', ( tag_service_id, tag_service_id ) )
         
         self._service_ids_to_applicable_service_ids = None
@@ -286,6 +331,13 @@ class ClientDBTagSiblings( ClientDBModule.ClientDBModule ):
                 
             
         
+        lookup_index = self._GetLookupIndex( display_type, tag_service_id )
+        
+        if lookup_index is not None:
+            
+            return lookup_index.FilterChained( tag_ids )
+            
+        
         # get the tag_ids that are part of a sibling chain
         
         cache_tag_siblings_lookup_table_name = GenerateTagSiblingsLookupCacheTableName( display_type, tag_service_id )
@@ -354,6 +406,13 @@ class ClientDBTagSiblings( ClientDBModule.ClientDBModule ):
     
     def GetAllTagIds( self, display_type, tag_service_id ):
         
+        lookup_index = self._GetLookupIndex( display_type, tag_service_id )
+        
+        if lookup_index is not None:
+            
+            return lookup_index.GetAllTagIds()
+            
+        
         cache_tag_siblings_lookup_table_name = GenerateTagSiblingsLookupCacheTableName( display_type, tag_service_id )
         
         tag_ids = set()
@@ -425,6 +484,13 @@ class ClientDBTagSiblings( ClientDBModule.ClientDBModule ):
     
     def GetChainMembersFromIdeal( self, display_type, tag_service_id, ideal_tag_id ) -> typing.Set[ int ]:
         
+        lookup_index = self._GetLookupIndex( display_type, tag_service_id )
+        
+        if lookup_index is not None:
+            
+            return lookup_index.GetChainsMembersFromIdeals( ( ideal_tag_id, ) )
+            
+        
         cache_tag_siblings_lookup_table_name = GenerateTagSiblingsLookupCacheTableName( display_type, tag_service_id )
         
         sibling_tag_ids = self._STS( self._Execute( 'SELECT bad_tag_id FROM {} WHERE ideal_tag_id = ?;'.format( cache_tag_siblings_lookup_table_name ), ( ideal_tag_id, ) ) )
@@ -447,6 +513,13 @@ class ClientDBTagSiblings( ClientDBModule.ClientDBModule ):
             return self.GetChainMembersFromIdeal( display_type, tag_service_id, ideal_tag_id )
             
         
+        lookup_index = self._GetLookupIndex( display_type, tag_service_id )
+        
+        if lookup_index is not None:
+            
+            return lookup_index.GetChainsMembersFromIdeals( ideal_tag_ids )
+            
+        
         cache_tag_siblings_lookup_table_name = GenerateTagSiblingsLookupCacheTableName( display_type, tag_service_id )
         
         with self._MakeTemporaryIntegerTable( ideal_tag_ids, 'ideal_tag_id' ) as temp_table_name:
@@ -511,6 +584,13 @@ class ClientDBTagSiblings( ClientDBModule.ClientDBModule ):
     
     def GetIdealTagId( self, display_type, tag_service_id, tag_id ) -> int:
         
+        lookup_index = self._GetLookupIndex( display_type, tag_service_id )
+        
+        if lookup_index is not None:
+            
+            return lookup_index.GetIdealTagId( tag_id )
+            
+        
         cache_tag_siblings_lookup_table_name = GenerateTagSiblingsLookupCacheTableName( display_type, tag_service_id )
         
         result = self._Execute( 'SELECT ideal_tag_id FROM {} WHERE bad_tag_id = ?;'.format( cache_tag_siblings_lookup_table_name ), ( tag_id, ) ).fetchone()
@@ -545,6 +625,13 @@ class ClientDBTagSiblings( ClientDBModule.ClientDBModule ):
             return { self.GetIdealTagId( display_type, tag_service_id, tag_id ) }
             
         
+        lookup_index = self._GetLookupIndex( display_type, tag_service_id )
+        
+        if lookup_index is not None:
+            
+            return lookup_index.GetIdealTagIds( tag_ids )
+            
+        
         cache_tag_siblings_lookup_table_name = GenerateTagSiblingsLookupCacheTableName( display_type, tag_service_id )
         
         with self._MakeTemporaryIntegerTable( tag_ids, 'tag_id' ) as temp_tag_ids_table_name:
@@ -617,6 +704,13 @@ class ClientDBTagSiblings( ClientDBModule.ClientDBModule ):
             return { ideal_tag_id : chain_tag_ids }
             
         
+        lookup_index = self._GetLookupIndex( display_type, tag_service_id )
+        
+        if lookup_index is not None:
+            
+            return lookup_index.GetIdealTagIdsToChains( ideal_tag_ids )
+            
+        
         cache_tag_siblings_lookup_table_name = GenerateTagSiblingsLookupCacheTableName( display_type, tag_service_id )
         
         with self._MakeTemporaryIntegerTable( ideal_tag_ids, 'ideal_tag_id' ) as temp_table_name:
@@ -706,6 +800,13 @@ class ClientDBTagSiblings( ClientDBModule.ClientDBModule ):
             return { tag_id : self.GetIdealTagId( display_type, tag_service_id, tag_id ) }
             
         
+        lookup_index = self._GetLookupIndex( display_type, tag_service_id )
+        
+        if lookup_index is not None:
+            
+            return lookup_index.GetTagIdsToIdealTagIds( tag_ids )
+            
+        
         cache_tag_siblings_lookup_table_name = GenerateTagSiblingsLookupCacheTableName( display_type, tag_service_id )
         
         no_ideal_found_tag_ids = set( tag_ids )
@@ -920,13 +1021,39 @@ class ClientDBTagSiblings( ClientDBModule.ClientDBModule ):
     
     def IsChained( self, display_type, tag_service_id, tag_id ):
         
+        lookup_index = self._GetLookupIndex( display_type, tag_service_id )
+        
+        if lookup_index is not None:
+            
+            return lookup_index.IsChained( tag_id )
+            
+        
         cache_tag_siblings_lookup_table_name = GenerateTagSiblingsLookupCacheTableName( display_type, tag_service_id )
         
         return self._Execute( 'SELECT 1 FROM {} WHERE bad_tag_id = ? OR ideal_tag_id = ?;'.format( cache_tag_siblings_lookup_table_name ), ( tag_id, tag_id ) ).fetchone() is not None
         
     
+    def LoadLookupIndex( self, display_type, tag_service_id ):
+        
+        if self._GetLookupIndex( display_type, tag_service_id ) is not None:
+            
+            return
+            
+        
+        cache_tag_siblings_lookup_table_name = GenerateTagSiblingsLookupCacheTableName( display_type, tag_service_id )
+        
+        self._lookup_indices[ ( display_type, tag_service_id ) ] = ClientTagsLookupIndex.TagSiblingsLookupIndex( self._Execute( 'SELECT bad_tag_id, ideal_tag_id FROM {};'.format( cache_tag_siblings_lookup_table_name ) ) )
+        
+    
     def NotifySiblingAddRowSynced( self, tag_service_id, row ):
         
+        lookup_index = self._GetLookupIndex( ClientTags.TAG_DISPLAY_DISPLAY_ACTUAL, tag_service_id )
+        
+        if lookup_index is not None:
+            
+            lookup_index.AddPairs( ( row, ) )
+            
+        
         if tag_service_id in self._service_ids_to_display_application_status:
             
             ( actual_sibling_rows, ideal_sibling_rows, sibling_rows_to_add, sibling_rows_to_remove ) = self._service_ids_to_display_application_status[ tag_service_id ]
@@ -940,6 +1067,13 @@ class ClientDBTagSiblings( ClientDBModule.ClientDBModule ):
     
     def NotifySiblingDeleteRowSynced( self, tag_service_id, row ):
         
+        lookup_index = self._GetLookupIndex( ClientTags.TAG_DISPLAY_DISPLAY_ACTUAL, tag_service_id )
+        
+        if lookup_index is not None:
+            
+            lookup_index.DeletePairs( ( row, ) )
+            
+        
         if tag_service_id in self._service_ids_to_display_application_status:
             
             ( actual_sibling_rows, ideal_sibling_rows, sibling_rows_to_add, sibling_rows_to_remove ) = self._service_ids_to_display_application_status[ tag_service_id ]
@@ -1015,6 +1149,11 @@ class ClientDBTagSiblings( ClientDBModule.ClientDBModule ):
             
             self._ExecuteMany( 'INSERT OR IGNORE INTO {} ( bad_tag_id, ideal_tag_id ) VALUES ( ?, ? );'.format( cache_tag_siblings_lookup_table_name ), tss.GetBadTagsToIdealTags().items() )
             
+            if self._GetLookupIndex( ClientTags.TAG_DISPLAY_DISPLAY_IDEAL, tag_service_id ) is not None:
+                
+                self._lookup_indices[ ( ClientTags.TAG_DISPLAY_DISPLAY_IDEAL, tag_service_id ) ] = ClientTagsLookupIndex.TagSiblingsLookupIndex( tss.GetBadTagsToIdealTags().items() )
+                
+            
             if tag_service_id in self._service_ids_to_display_application_status:
                 
                 del self._service_ids_to_display_application_status[ tag_service_id ]
@@ -1091,6 +1230,14 @@ class ClientDBTagSiblings( ClientDBModule.ClientDBModule ):
             
             self._ExecuteMany( 'INSERT OR IGNORE INTO {} ( bad_tag_id, ideal_tag_id ) VALUES ( ?, ? );'.format( cache_tag_siblings_lookup_table_name ), stuff_added )
             
+            lookup_index = self._GetLookupIndex( ClientTags.TAG_DISPLAY_DISPLAY_IDEAL, tag_service_id )
+            
+            if lookup_index is not None:
+                
+                lookup_index.DeleteTagIds( tag_ids_to_clear_and_regen )
+                lookup_index.AddPairs( stuff_added )
+                
+            
             if tag_service_id in self._service_ids_to_display_application_status:
                 
                 stuff_no_changes = stuff_deleted.intersection( stuff_added )
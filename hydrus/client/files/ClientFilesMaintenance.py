@@ -150,6 +150,9 @@ All missing/incorrect files will also have their hashes, tags, and URLs exported
 
 NORMALISED_BIG_JOB_WEIGHT = 100
 
+# only the 32x32 greyscale shrinks are held, so this is cheap on memory. it is about giving the dct a decent vector to work on
+SIMILAR_FILES_METADATA_BATCH_SIZE = 64
+
 regen_file_enum_to_job_weight_lookup = {
     REGENERATE_FILE_DATA_JOB_FILE_METADATA : 100,
     REGENERATE_FILE_DATA_JOB_FORCE_THUMBNAIL : 50,
@@ -1024,7 +1027,7 @@ class FilesMaintenanceManager( ClientDaemons.ManagerWithMainLoop ):
         
         try:
             
-            thumbnail_path = self._controller.client_files_manager.GetThumbnailPath( media_result )
+            thumbnail_bytes = self._controller.client_files_manager.GetThumbnailBytes( media_result )
             
         except HydrusExceptions.FileMissingException as e:
             
@@ -1033,9 +1036,9 @@ class FilesMaintenanceManager( ClientDaemons.ManagerWithMainLoop ):
         
         try:
             
-            thumbnail_mime = HydrusFileHandling.GetThumbnailMime( thumbnail_path )
+            thumbnail_mime = HydrusFileHandling.GetThumbnailMimeFromBytes( thumbnail_bytes )
             
-            numpy_image = HydrusImageHandling.GenerateNumPyImage( thumbnail_path, thumbnail_mime )
+            numpy_image = HydrusImageHandling.GenerateNumPyImageFromBytes( thumbnail_bytes, thumbnail_mime )
             
             return HydrusBlurhash.GetBlurhashFromNumPy( numpy_image )
             
@@ -1072,6 +1075,42 @@ class FilesMaintenanceManager( ClientDaemons.ManagerWithMainLoop ):
         return perceptual_hashes
         
     
+    def _RegenSimilarFilesMetadataBatch( self, media_results ):
+        
+        # files still load and shrink one at a time, but the dct and hash work is done for the whole batch at once
+        # anything we can't do here, like a missing file, is left for _RegenSimilarFilesMetadata to sort out as normal
+        
+        hashes = []
+        paths_and_mimes = []
+        
+        for media_result in media_results:
+            
+            hash = media_result.GetHash()
+            mime = media_result.GetMime()
+            
+            if mime not in HC.FILES_THAT_HAVE_PERCEPTUAL_HASH:
+                
+                continue
+                
+            
+            try:
+                
+                path = self._controller.client_files_manager.GetFilePath( hash, mime )
+                
+            except HydrusExceptions.FileMissingException:
+                
+                continue
+                
+            
+            hashes.append( hash )
+            paths_and_mimes.append( ( path, mime ) )
+            
+        
+        list_of_perceptual_hashes = ClientImagePerceptualHashes.GenerateShapePerceptualHashesBatch( paths_and_mimes )
+        
+        return dict( zip( hashes, list_of_perceptual_hashes ) )
+        
+    
     def _ReInitialiseWorkRules( self ):
         
         file_maintenance_idle_throttle_files = self._controller.new_options.GetInteger( 'file_maintenance_idle_throttle_files' )
@@ -1104,6 +1143,11 @@ class FilesMaintenanceManager( ClientDaemons.ManagerWithMainLoop ):
             
             last_time_jobs_were_cleared = HydrusTime.GetNow()
             
+            # similar files regen is done in chunks as we get to them, so the vectorised hash generation gets a decent batch
+            similar_files_media_results = [ media_result for ( media_result, job_types ) in media_results_to_job_types.items() if REGENERATE_FILE_DATA_JOB_SIMILAR_FILES_METADATA in job_types ]
+            similar_files_batch_index = 0
+            hashes_to_prefetched_perceptual_hashes = {}
+            
             for ( media_result, job_types ) in media_results_to_job_types.items():
                 
                 big_pauser.Pause()
@@ -1202,7 +1246,23 @@ class FilesMaintenanceManager( ClientDaemons.ManagerWithMainLoop ):
                             
                         elif job_type == REGENERATE_FILE_DATA_JOB_SIMILAR_FILES_METADATA:
                             
-                            additional_data = self._RegenSimilarFilesMetadata( media_result )
+                            if hash not in hashes_to_prefetched_perceptual_hashes and similar_files_batch_index < len( similar_files_media_results ):
+                                
+                                batch_of_media_results = similar_files_media_results[ similar_files_batch_index : similar_files_batch_index + SIMILAR_FILES_METADATA_BATCH_SIZE ]
+                                
+                                similar_files_batch_index += SIMILAR_FILES_METADATA_BATCH_SIZE
+                                
+                                hashes_to_prefetched_perceptual_hashes.update( self._RegenSimilarFilesMetadataBatch( batch_of_media_results ) )
+                                
+                            
+                            if hash in hashes_to_prefetched_perceptual_hashes:
+                                
+                                additional_data = hashes_to_prefetched_perceptual_hashes.pop( hash )
+                                
+                            else:
+                                
+                                additional_data = self._RegenSimilarFilesMetadata( media_result )
+                                
                             
                         elif job_type == REGENERATE_FILE_DATA_JOB_FIX_PERMISSIONS:
                             
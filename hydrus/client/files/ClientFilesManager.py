@@ -47,6 +47,9 @@ class ClientFilesManager( object ):
         self._bad_error_occurred = False
         self._missing_subfolders = set()
         
+        self._thumbnail_packs_lock = threading.Lock()
+        self._thumbnail_pack_paths_to_thumbnail_packs = {}
+        
         self._Reinit()
         
         self._controller.sub( self, 'Reinit', 'new_ideal_client_files_locations' )
@@ -104,13 +107,36 @@ class ClientFilesManager( object ):
             HydrusData.ShowText( 'Adding thumbnail: ' + str( ( len( thumbnail_bytes ), dest_path ) ) )
             
         
+        thumbnail_pack = self._GetThumbnailPackForFile( hash )
+        
         try:
             
-            HydrusPaths.TryToGiveFileNicePermissionBits( dest_path )
+            # we only ever want one copy of a thumbnail, so writing to one storage type clears out the other
             
-            with open( dest_path, 'wb' ) as f:
+            if self._ThumbnailPacksEnabled():
+                
+                thumbnail_pack.AddThumbnails( [ ( hash, thumbnail_bytes ) ] )
                 
-                f.write( thumbnail_bytes )
+                if os.path.exists( dest_path ):
+                    
+                    ClientPaths.DeletePath( dest_path, always_delete_fully = True )
+                    
+                
+            else:
+                
+                HydrusPaths.TryToGiveFileNicePermissionBits( dest_path )
+                
+                with open( dest_path, 'wb' ) as f:
+                    
+                    f.write( thumbnail_bytes )
+                    
+                
+                thumbnail_pack.DeleteThumbnails( [ hash ] )
+                
+            
+            if thumbnail_pack.NeedsCompaction():
+                
+                thumbnail_pack.Compact()
                 
             
         except Exception as e:
@@ -281,6 +307,19 @@ class ClientFilesManager( object ):
         return subfolder.GetFilePath( f'{hash_encoded}.thumbnail' )
         
     
+    def _CloseThumbnailPacks( self ):
+        
+        with self._thumbnail_packs_lock:
+            
+            for thumbnail_pack in self._thumbnail_pack_paths_to_thumbnail_packs.values():
+                
+                thumbnail_pack.Close()
+                
+            
+            self._thumbnail_pack_paths_to_thumbnail_packs = {}
+            
+        
+    
     def _GenerateThumbnailBytes( self, file_path, media_result ):
         
         hash = media_result.GetHash()
@@ -663,6 +702,28 @@ class ClientFilesManager( object ):
         return None
         
     
+    def _GetThumbnailPack( self, subfolder: ClientFilesPhysical.FilesStorageSubfolder ) -> ClientFilesPhysical.ThumbnailPack:
+        
+        thumbnail_pack_path = subfolder.GetThumbnailPackPath()
+        
+        with self._thumbnail_packs_lock:
+            
+            if thumbnail_pack_path not in self._thumbnail_pack_paths_to_thumbnail_packs:
+                
+                self._thumbnail_pack_paths_to_thumbnail_packs[ thumbnail_pack_path ] = ClientFilesPhysical.ThumbnailPack( thumbnail_pack_path )
+                
+            
+            return self._thumbnail_pack_paths_to_thumbnail_packs[ thumbnail_pack_path ]
+            
+        
+    
+    def _GetThumbnailPackForFile( self, hash: bytes ) -> ClientFilesPhysical.ThumbnailPack:
+        
+        subfolder = self._GetSubfolderForFile( hash, 't' )
+        
+        return self._GetThumbnailPack( subfolder )
+        
+    
     def _GetSubfolderForFile( self, hash: bytes, prefix_type: str ) -> ClientFilesPhysical.FilesStorageSubfolder:
         
         # TODO: So this will be a crux of the more complicated system
@@ -689,6 +750,18 @@ class ClientFilesManager( object ):
         self._controller.pub( 'notify_refresh_network_menu' )
         
     
+    def _HasThumbnail( self, hash ):
+        
+        path = self._GenerateExpectedThumbnailPath( hash )
+        
+        if HG.file_report_mode:
+            
+            HydrusData.ShowText( 'Thumbnail path test: ' + path )
+            
+        
+        return os.path.exists( path ) or self._GetThumbnailPackForFile( hash ).HasThumbnail( hash )
+        
+    
     def _LookForFilePath( self, hash ):
         
         for potential_mime in HC.ALLOWED_MIMES:
@@ -714,8 +787,106 @@ class ClientFilesManager( object ):
         raise HydrusExceptions.FileMissingException( 'File for ' + hash.hex() + ' not found!' )
         
     
+    def _PackThumbnails( self, subfolder: ClientFilesPhysical.FilesStorageSubfolder, job_status: ClientThreading.JobStatus ):
+        
+        thumbnail_pack = self._GetThumbnailPack( subfolder )
+        
+        paths = [ path for path in subfolder.IterateAllFiles() if path.endswith( '.thumbnail' ) and os.path.isfile( path ) ]
+        
+        num_done = 0
+        
+        for block_of_paths in HydrusLists.SplitListIntoChunks( paths, 256 ):
+            
+            ( i_paused, should_quit ) = job_status.WaitIfNeeded()
+            
+            if should_quit:
+                
+                break
+                
+            
+            hashes_and_thumbnail_bytes = []
+            packed_paths = []
+            
+            for path in block_of_paths:
+                
+                ( directory, filename ) = os.path.split( path )
+                
+                try:
+                    
+                    hash = bytes.fromhex( filename[:64] )
+                    
+                except ValueError:
+                    
+                    continue
+                    
+                
+                with open( path, 'rb' ) as f:
+                    
+                    thumbnail_bytes = f.read()
+                    
+                
+                hashes_and_thumbnail_bytes.append( ( hash, thumbnail_bytes ) )
+                packed_paths.append( path )
+                
+            
+            thumbnail_pack.AddThumbnails( hashes_and_thumbnail_bytes )
+            
+            # the pack is synced to disk now, so the loose files can go
+            
+            for path in packed_paths:
+                
+                ClientPaths.DeletePath( path, always_delete_fully = True )
+                
+            
+            num_done += len( hashes_and_thumbnail_bytes )
+            
+        
+        if thumbnail_pack.NeedsCompaction():
+            
+            thumbnail_pack.Compact()
+            
+        
+        return num_done
+        
+    
+    def _ReadThumbnailBytes( self, hash ) -> typing.Optional[ bytes ]:
+        
+        path = self._GenerateExpectedThumbnailPath( hash )
+        
+        thumbnail_pack = self._GetThumbnailPackForFile( hash )
+        
+        thumbnail_packs_enabled = self._ThumbnailPacksEnabled()
+        
+        if thumbnail_packs_enabled:
+            
+            thumbnail_bytes = thumbnail_pack.GetThumbnailBytes( hash )
+            
+            if thumbnail_bytes is not None:
+                
+                return thumbnail_bytes
+                
+            
+        
+        if os.path.exists( path ):
+            
+            with open( path, 'rb' ) as f:
+                
+                return f.read()
+                
+            
+        
+        if not thumbnail_packs_enabled:
+            
+            return thumbnail_pack.GetThumbnailBytes( hash )
+            
+        
+        return None
+        
+    
     def _Reinit( self ):
         
+        self._CloseThumbnailPacks()
+        
         self._ReinitSubfolders()
         
         if CG.client_controller.IsFirstStart():
@@ -862,6 +1033,53 @@ class ClientFilesManager( object ):
             
         
     
+    def _ThumbnailPacksEnabled( self ):
+        
+        return self._controller.new_options.GetBoolean( 'store_thumbnails_in_pack_files' )
+        
+    
+    def _UnpackThumbnails( self, subfolder: ClientFilesPhysical.FilesStorageSubfolder, job_status: ClientThreading.JobStatus ):
+        
+        thumbnail_pack = self._GetThumbnailPack( subfolder )
+        
+        hashes = thumbnail_pack.GetHashes()
+        
+        num_done = 0
+        
+        for block_of_hashes in HydrusLists.SplitListIntoChunks( hashes, 256 ):
+            
+            ( i_paused, should_quit ) = job_status.WaitIfNeeded()
+            
+            if should_quit:
+                
+                break
+                
+            
+            for hash in block_of_hashes:
+                
+                dest_path = subfolder.GetFilePath( f'{hash.hex()}.thumbnail' )
+                
+                HydrusPaths.TryToGiveFileNicePermissionBits( dest_path )
+                
+                with open( dest_path, 'wb' ) as f:
+                    
+                    f.write( thumbnail_pack.GetThumbnailBytes( hash ) )
+                    
+                
+            
+            thumbnail_pack.DeleteThumbnails( block_of_hashes )
+            
+            num_done += len( block_of_hashes )
+            
+        
+        if thumbnail_pack.NeedsCompaction():
+            
+            thumbnail_pack.Compact()
+            
+        
+        return num_done
+        
+    
     def _WaitOnWakeup( self ):
         
         if CG.client_controller.new_options.GetBoolean( 'file_system_waits_on_wakeup' ):
@@ -975,6 +1193,7 @@ class ClientFilesManager( object ):
             
             orphan_paths = []
             orphan_thumbnails = []
+            orphan_packed_thumbnails = []
             
             num_files_reviewed = 0
             num_thumbnails_reviewed = 0
@@ -1089,6 +1308,44 @@ class ClientFilesManager( object ):
                                 
                             
                         
+                        if not subfolder.IsForFiles():
+                            
+                            thumbnail_pack = self._GetThumbnailPack( subfolder )
+                            
+                            for hash in thumbnail_pack.GetHashes():
+                                
+                                ( i_paused, should_quit ) = job_status.WaitIfNeeded()
+                                
+                                if should_quit:
+                                    
+                                    return
+                                    
+                                
+                                is_an_orphan = CG.client_controller.Read( 'is_an_orphan', 'thumbnail', hash )
+                                
+                                if is_an_orphan:
+                                    
+                                    if move_location is not None:
+                                        
+                                        dest = HydrusPaths.AppendPathUntilNoConflicts( os.path.join( thumbnails_move_location, f'{hash.hex()}.thumbnail' ) )
+                                        
+                                        HydrusData.Print( f'Moving the orphan {hash.hex()} out of {thumbnail_pack.GetPath()} to {dest}' )
+                                        
+                                        with open( dest, 'wb' ) as f:
+                                            
+                                            f.write( thumbnail_pack.GetThumbnailBytes( hash ) )
+                                            
+                                        
+                                        thumbnail_pack.DeleteThumbnails( [ hash ] )
+                                        
+                                    
+                                    orphan_packed_thumbnails.append( ( thumbnail_pack, hash ) )
+                                    
+                                
+                                num_thumbnails_reviewed += 1
+                                
+                            
+                        
                     
                 
             
@@ -1153,14 +1410,38 @@ class ClientFilesManager( object ):
                         
                     
                 
+                if len( orphan_packed_thumbnails ) > 0:
+                    
+                    job_status.SetStatusText( 'deleting orphan thumbnails from thumbnail pack files' )
+                    
+                    thumbnail_packs_to_hashes = HydrusData.BuildKeyToListDict( orphan_packed_thumbnails )
+                    
+                    for ( thumbnail_pack, hashes ) in thumbnail_packs_to_hashes.items():
+                        
+                        HydrusData.Print( f'Deleting {HydrusNumbers.ToHumanInt( len( hashes ) )} orphans from {thumbnail_pack.GetPath()}' )
+                        
+                        thumbnail_pack.DeleteThumbnails( hashes )
+                        
+                    
+                
+            
+            for thumbnail_pack in { thumbnail_pack for ( thumbnail_pack, hash ) in orphan_packed_thumbnails }:
+                
+                if thumbnail_pack.NeedsCompaction():
+                    
+                    thumbnail_pack.Compact()
+                    
+                
+            
+            num_orphan_thumbnails = len( orphan_thumbnails ) + len( orphan_packed_thumbnails )
             
-            if len( orphan_paths ) == 0 and len( orphan_thumbnails ) == 0:
+            if len( orphan_paths ) == 0 and num_orphan_thumbnails == 0:
                 
                 final_text = 'no orphans found!'
                 
             else:
                 
-                final_text = HydrusNumbers.ToHumanInt( len( orphan_paths ) ) + ' orphan files and ' + HydrusNumbers.ToHumanInt( len( orphan_thumbnails ) ) + ' orphan thumbnails cleared!'
+                final_text = HydrusNumbers.ToHumanInt( len( orphan_paths ) ) + ' orphan files and ' + HydrusNumbers.ToHumanInt( num_orphan_thumbnails ) + ' orphan thumbnails cleared!'
                 
             
             job_status.SetStatusText( final_text )
@@ -1253,6 +1534,8 @@ class ClientFilesManager( object ):
                             
                             num_files_deleted += 1
                             
+                            self._controller.pub( 'clear_render_disk_cache', { file_hash } )
+                            
                         except HydrusExceptions.FileMissingException:
                             
                             HydrusData.Print( 'Wanted to physically delete the "{}" file, with expected mime "{}", but it was not found!'.format( file_hash.hex(), HC.mime_string_lookup[ expected_mime ] ) )
@@ -1266,10 +1549,29 @@ class ClientFilesManager( object ):
                         
                         path = self._GenerateExpectedThumbnailPath( thumbnail_hash )
                         
+                        thumbnail_deleted = False
+                        
                         if os.path.exists( path ):
                             
                             ClientPaths.DeletePath( path, always_delete_fully = True )
                             
+                            thumbnail_deleted = True
+                            
+                        
+                        thumbnail_pack = self._GetThumbnailPackForFile( thumbnail_hash )
+                        
+                        if thumbnail_pack.DeleteThumbnails( [ thumbnail_hash ] ) > 0:
+                            
+                            thumbnail_deleted = True
+                            
+                            if thumbnail_pack.NeedsCompaction():
+                                
+                                thumbnail_pack.Compact()
+                                
+                            
+                        
+                        if thumbnail_deleted:
+                            
                             num_thumbnails_deleted += 1
                             
                         
@@ -1390,6 +1692,11 @@ class ClientFilesManager( object ):
                 
                 thumb_missing = not os.path.exists( path )
                 
+                if thumb_missing and self._GetThumbnailPackForFile( hash ).HasThumbnail( hash ):
+                    
+                    raise HydrusExceptions.FileMissingException( f'The thumbnail for file {hash.hex()} is stored in a thumbnail pack file, so it does not have a path of its own.' )
+                    
+                
             
         
         if thumb_missing:
@@ -1400,6 +1707,45 @@ class ClientFilesManager( object ):
         return path
         
     
+    def GetThumbnailBytes( self, media_result ) -> bytes:
+        
+        hash = media_result.GetHash()
+        mime = media_result.GetMime()
+        
+        if HG.file_report_mode:
+            
+            HydrusData.ShowText( 'Thumbnail bytes request: ' + str( ( hash, mime ) ) )
+            
+        
+        with self._master_locations_rwlock.read:
+            
+            with self._GetPrefixUmbrellaRWLock( hash, 't' ).read:
+                
+                thumbnail_bytes = self._ReadThumbnailBytes( hash )
+                
+            
+        
+        if thumbnail_bytes is None:
+            
+            self.RegenerateThumbnail( media_result )
+            
+            with self._master_locations_rwlock.read:
+                
+                with self._GetPrefixUmbrellaRWLock( hash, 't' ).read:
+                    
+                    thumbnail_bytes = self._ReadThumbnailBytes( hash )
+                    
+                
+            
+            if thumbnail_bytes is None:
+                
+                raise HydrusExceptions.FileMissingException( f'The thumbnail for file {hash.hex()} was not found!' )
+                
+            
+        
+        return thumbnail_bytes
+        
+    
     def LocklessHasFile( self, hash, mime ):
         
         path = self._GenerateExpectedFilePath( hash, mime )
@@ -1414,14 +1760,81 @@ class ClientFilesManager( object ):
     
     def LocklessHasThumbnail( self, hash ):
         
-        path = self._GenerateExpectedThumbnailPath( hash )
+        return self._HasThumbnail( hash )
         
-        if HG.file_report_mode:
+    
+    def MigrateThumbnailStorage( self, to_thumbnail_packs: bool ):
+        
+        # new thumbnails go to the new format immediately, and until we are done, reads fall back to the other format
+        self._controller.new_options.SetBoolean( 'store_thumbnails_in_pack_files', to_thumbnail_packs )
+        
+        job_status = ClientThreading.JobStatus( cancellable = True )
+        
+        if to_thumbnail_packs:
             
-            HydrusData.ShowText( 'Thumbnail path test: ' + path )
+            job_status.SetStatusTitle( 'moving thumbnails into pack files' )
+            
+        else:
+            
+            job_status.SetStatusTitle( 'moving thumbnails out of pack files' )
             
         
-        return os.path.exists( path )
+        self._controller.pub( 'message', job_status )
+        
+        num_thumbnails_moved = 0
+        
+        try:
+            
+            with self._master_locations_rwlock.read:
+                
+                thumbnail_subfolders_in_order = sorted( ( prefix_umbrella, subfolders ) for ( prefix_umbrella, subfolders ) in self._prefix_umbrellas_to_client_files_subfolders.items() if prefix_umbrella.startswith( 't' ) )
+                
+                num_to_do = len( thumbnail_subfolders_in_order )
+                
+                for ( i, ( prefix_umbrella, subfolders ) ) in enumerate( thumbnail_subfolders_in_order ):
+                    
+                    ( i_paused, should_quit ) = job_status.WaitIfNeeded()
+                    
+                    if should_quit:
+                        
+                        return
+                        
+                    
+                    job_status.SetStatusText( f'working on {prefix_umbrella}: {HydrusNumbers.ValueRangeToPrettyString( i + 1, num_to_do )}' )
+                    job_status.SetVariable( 'popup_gauge_1', ( i, num_to_do ) )
+                    
+                    with self._prefix_umbrellas_to_rwlocks[ prefix_umbrella ].write:
+                        
+                        for subfolder in subfolders:
+                            
+                            if not subfolder.PathExists():
+                                
+                                continue
+                                
+                            
+                            if to_thumbnail_packs:
+                                
+                                num_thumbnails_moved += self._PackThumbnails( subfolder, job_status )
+                                
+                            else:
+                                
+                                num_thumbnails_moved += self._UnpackThumbnails( subfolder, job_status )
+                                
+                            
+                        
+                    
+                
+            
+        finally:
+            
+            job_status.DeleteVariable( 'popup_gauge_1' )
+            
+            job_status.SetStatusText( f'done! {HydrusNumbers.ToHumanInt( num_thumbnails_moved )} thumbnails moved' )
+            
+            HydrusData.Print( job_status.ToString() )
+            
+            job_status.Finish()
+            
         
     
     def Rebalance( self, job_status ):
@@ -1454,6 +1867,9 @@ class ClientFilesManager( object ):
                     
                     job_status.SetStatusText( text )
                     
+                    # the folder may be about to move, so let go of any open pack files
+                    self._CloseThumbnailPacks()
+                    
                     # these two lines can cause a deadlock because the db sometimes calls stuff in here.
                     self._controller.WriteSynchronous( 'relocate_client_files', source_subfolder, dest_subfolder )
                     
@@ -1536,16 +1952,16 @@ class ClientFilesManager( object ):
             
             ( media_width, media_height ) = media_result.GetResolution()
             
-            path = self._GenerateExpectedThumbnailPath( hash )
+            thumbnail_bytes = self._ReadThumbnailBytes( hash )
             
-            if not os.path.exists( path ):
+            if thumbnail_bytes is None:
                 
                 raise Exception()
                 
             
-            thumbnail_mime = HydrusFileHandling.GetThumbnailMime( path )
+            thumbnail_mime = HydrusFileHandling.GetThumbnailMimeFromBytes( thumbnail_bytes )
             
-            numpy_image = HydrusImageHandling.GenerateNumPyImage( path, thumbnail_mime )
+            numpy_image = HydrusImageHandling.GenerateNumPyImageFromBytes( thumbnail_bytes, thumbnail_mime )
             
             ( current_width, current_height ) = HydrusImageHandling.GetResolutionNumPy( numpy_image )
             
@@ -1617,4 +2033,6 @@ class ClientFilesManager( object ):
         
         self._physical_file_delete_wait.set()
         
+        self._CloseThumbnailPacks()
+        
     
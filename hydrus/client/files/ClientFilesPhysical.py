@@ -1,4 +1,7 @@
+import mmap
 import os
+import struct
+import threading
 import typing
 
 from hydrus.core import HydrusData
@@ -7,6 +10,8 @@ from hydrus.core import HydrusExceptions
 
 from hydrus.client import ClientThreading
 
+THUMBNAIL_PACK_FILENAME = 'thumbnails.hydrus_pack'
+
 def CheckFullPrefixCoverage( merge_target, prefixes ):
     
     missing_prefixes = GetMissingPrefixes( merge_target, prefixes )
@@ -331,6 +336,11 @@ class FilesStorageSubfolder( object ):
         return os.path.join( self.path, filename )
         
     
+    def GetThumbnailPackPath( self ) -> str:
+        
+        return os.path.join( self.path, THUMBNAIL_PACK_FILENAME )
+        
+    
     def IsForFiles( self ):
         
         return self.prefix[0] == 'f'
@@ -342,6 +352,11 @@ class FilesStorageSubfolder( object ):
         
         for filename in filenames:
             
+            if filename == THUMBNAIL_PACK_FILENAME:
+                
+                continue
+                
+            
             yield os.path.join( self.path, filename )
             
         
@@ -356,3 +371,385 @@ class FilesStorageSubfolder( object ):
         return os.path.exists( self.path ) and os.path.isdir( self.path )
         
     
+    
+
+THUMBNAIL_PACK_MAGIC = b'HYDTHUMBPACK0001'
+THUMBNAIL_PACK_RECORD_HEADER = struct.Struct( '>32sI' )
+
+class ThumbnailPack( object ):
+    
+    # one append-only file holding all the thumbnails for a subfolder
+    # the file is a magic header and then records of [ sha256 hash, length, thumbnail bytes ]. a zero length record is a deletion
+    # a thumbnail that is rewritten just gets a new record at the end, and the old one is dead space until the next compaction
+    # we do not keep a separate index file. the offset index is rebuilt by walking the record headers, so a half-written record from a crash is just trimmed off
+    
+    def __init__( self, path: str ):
+        
+        self._path = path
+        
+        self._lock = threading.Lock()
+        
+        self._hashes_to_offsets_and_lengths = None
+        self._end_of_good_data = 0
+        self._num_dead_bytes = 0
+        
+        self._read_file = None
+        self._mmap = None
+        
+    
+    def _CloseMMap( self ):
+        
+        if self._mmap is not None:
+            
+            self._mmap.close()
+            
+            self._mmap = None
+            
+        
+        if self._read_file is not None:
+            
+            self._read_file.close()
+            
+            self._read_file = None
+            
+        
+    
+    def _InitialiseIndex( self ):
+        
+        if self._hashes_to_offsets_and_lengths is not None:
+            
+            return
+            
+        
+        if not os.path.exists( self._path ):
+            
+            self._hashes_to_offsets_and_lengths = {}
+            self._end_of_good_data = 0
+            self._num_dead_bytes = 0
+            
+            return
+            
+        
+        hashes_to_offsets_and_lengths = {}
+        num_dead_bytes = 0
+        
+        file_size = os.path.getsize( self._path )
+        
+        if file_size < len( THUMBNAIL_PACK_MAGIC ):
+            
+            # we crashed while making it
+            
+            self._hashes_to_offsets_and_lengths = {}
+            self._end_of_good_data = 0
+            self._num_dead_bytes = 0
+            
+            return
+            
+        
+        with open( self._path, 'rb' ) as f:
+            
+            magic = f.read( len( THUMBNAIL_PACK_MAGIC ) )
+            
+            if magic != THUMBNAIL_PACK_MAGIC:
+                
+                raise HydrusExceptions.DataMissing( f'The thumbnail pack file at "{self._path}" did not have the correct header! It may be damaged.' )
+                
+            
+            offset = len( THUMBNAIL_PACK_MAGIC )
+            
+            while offset + THUMBNAIL_PACK_RECORD_HEADER.size <= file_size:
+                
+                f.seek( offset )
+                
+                ( hash, length ) = THUMBNAIL_PACK_RECORD_HEADER.unpack( f.read( THUMBNAIL_PACK_RECORD_HEADER.size ) )
+                
+                data_offset = offset + THUMBNAIL_PACK_RECORD_HEADER.size
+                
+                if data_offset + length > file_size:
+                    
+                    break
+                    
+                
+                if hash in hashes_to_offsets_and_lengths:
+                    
+                    ( old_data_offset, old_length ) = hashes_to_offsets_and_lengths[ hash ]
+                    
+                    num_dead_bytes += THUMBNAIL_PACK_RECORD_HEADER.size + old_length
+                    
+                
+                if length == 0:
+                    
+                    hashes_to_offsets_and_lengths.pop( hash, None )
+                    
+                    num_dead_bytes += THUMBNAIL_PACK_RECORD_HEADER.size
+                    
+                else:
+                    
+                    hashes_to_offsets_and_lengths[ hash ] = ( data_offset, length )
+                    
+                
+                offset = data_offset + length
+                
+            
+        
+        self._hashes_to_offsets_and_lengths = hashes_to_offsets_and_lengths
+        self._end_of_good_data = offset
+        self._num_dead_bytes = num_dead_bytes
+        
+        if self._end_of_good_data < file_size:
+            
+            HydrusData.Print( f'The thumbnail pack file at "{self._path}" had {HydrusData.ToHumanBytes( file_size - self._end_of_good_data )} of incomplete data at the end, which will be discarded.' )
+            
+        
+    
+    def _WriteRecords( self, hashes_and_thumbnail_bytes ):
+        
+        self._InitialiseIndex()
+        
+        if self._end_of_good_data == 0:
+            
+            with open( self._path, 'wb' ) as f:
+                
+                f.write( THUMBNAIL_PACK_MAGIC )
+                
+            
+            self._end_of_good_data = len( THUMBNAIL_PACK_MAGIC )
+            
+        
+        with open( self._path, 'r+b' ) as f:
+            
+            if os.path.getsize( self._path ) > self._end_of_good_data:
+                
+                # clear out anything a crash left behind
+                
+                self._CloseMMap()
+                
+                f.truncate( self._end_of_good_data )
+                
+            
+            f.seek( self._end_of_good_data )
+            
+            offset = self._end_of_good_data
+            
+            for ( hash, thumbnail_bytes ) in hashes_and_thumbnail_bytes:
+                
+                length = len( thumbnail_bytes )
+                
+                f.write( THUMBNAIL_PACK_RECORD_HEADER.pack( hash, length ) )
+                f.write( thumbnail_bytes )
+                
+                data_offset = offset + THUMBNAIL_PACK_RECORD_HEADER.size
+                
+                if hash in self._hashes_to_offsets_and_lengths:
+                    
+                    ( old_data_offset, old_length ) = self._hashes_to_offsets_and_lengths[ hash ]
+                    
+                    self._num_dead_bytes += THUMBNAIL_PACK_RECORD_HEADER.size + old_length
+                    
+                
+                if length == 0:
+                    
+                    self._hashes_to_offsets_and_lengths.pop( hash, None )
+                    
+                    self._num_dead_bytes += THUMBNAIL_PACK_RECORD_HEADER.size
+                    
+                else:
+                    
+                    self._hashes_to_offsets_and_lengths[ hash ] = ( data_offset, length )
+                    
+                
+                offset = data_offset + length
+                
+            
+            f.flush()
+            
+            os.fsync( f.fileno() )
+            
+        
+        self._end_of_good_data = offset
+        
+    
+    def AddThumbnails( self, hashes_and_thumbnail_bytes ):
+        
+        hashes_and_thumbnail_bytes = [ ( hash, thumbnail_bytes ) for ( hash, thumbnail_bytes ) in hashes_and_thumbnail_bytes if len( thumbnail_bytes ) > 0 ]
+        
+        if len( hashes_and_thumbnail_bytes ) == 0:
+            
+            return
+            
+        
+        with self._lock:
+            
+            self._WriteRecords( hashes_and_thumbnail_bytes )
+            
+        
+    
+    def Close( self ):
+        
+        with self._lock:
+            
+            self._CloseMMap()
+            
+            self._hashes_to_offsets_and_lengths = None
+            
+        
+    
+    def Compact( self ):
+        
+        with self._lock:
+            
+            self._InitialiseIndex()
+            
+            if self._num_dead_bytes == 0:
+                
+                return
+                
+            
+            self._CloseMMap()
+            
+            if len( self._hashes_to_offsets_and_lengths ) == 0:
+                
+                if os.path.exists( self._path ):
+                    
+                    os.remove( self._path )
+                    
+                
+                self._hashes_to_offsets_and_lengths = None
+                
+                return
+                
+            
+            temp_path = self._path + '.compacting'
+            
+            new_hashes_to_offsets_and_lengths = {}
+            
+            # write in current file order, which is roughly import order, so reads of similar-aged files stay close together
+            sorted_items = sorted( self._hashes_to_offsets_and_lengths.items(), key = lambda item: item[1][0] )
+            
+            with open( self._path, 'rb' ) as source_f:
+                
+                with open( temp_path, 'wb' ) as dest_f:
+                    
+                    dest_f.write( THUMBNAIL_PACK_MAGIC )
+                    
+                    offset = len( THUMBNAIL_PACK_MAGIC )
+                    
+                    for ( hash, ( data_offset, length ) ) in sorted_items:
+                        
+                        source_f.seek( data_offset )
+                        
+                        thumbnail_bytes = source_f.read( length )
+                        
+                        dest_f.write( THUMBNAIL_PACK_RECORD_HEADER.pack( hash, length ) )
+                        dest_f.write( thumbnail_bytes )
+                        
+                        new_data_offset = offset + THUMBNAIL_PACK_RECORD_HEADER.size
+                        
+                        new_hashes_to_offsets_and_lengths[ hash ] = ( new_data_offset, length )
+                        
+                        offset = new_data_offset + length
+                        
+                    
+                    dest_f.flush()
+                    
+                    os.fsync( dest_f.fileno() )
+                    
+                
+            
+            os.replace( temp_path, self._path )
+            
+            self._hashes_to_offsets_and_lengths = new_hashes_to_offsets_and_lengths
+            self._end_of_good_data = offset
+            self._num_dead_bytes = 0
+            
+        
+    
+    def DeleteThumbnails( self, hashes ):
+        
+        with self._lock:
+            
+            self._InitialiseIndex()
+            
+            hashes = [ hash for hash in hashes if hash in self._hashes_to_offsets_and_lengths ]
+            
+            if len( hashes ) == 0:
+                
+                return 0
+                
+            
+            self._WriteRecords( [ ( hash, b'' ) for hash in hashes ] )
+            
+            return len( hashes )
+            
+        
+    
+    def GetHashes( self ) -> typing.List[ bytes ]:
+        
+        with self._lock:
+            
+            self._InitialiseIndex()
+            
+            return list( self._hashes_to_offsets_and_lengths.keys() )
+            
+        
+    
+    def GetPath( self ) -> str:
+        
+        return self._path
+        
+    
+    def GetThumbnailBytes( self, hash: bytes ) -> typing.Optional[ bytes ]:
+        
+        with self._lock:
+            
+            self._InitialiseIndex()
+            
+            if hash not in self._hashes_to_offsets_and_lengths:
+                
+                return None
+                
+            
+            ( data_offset, length ) = self._hashes_to_offsets_and_lengths[ hash ]
+            
+            end = data_offset + length
+            
+            if self._mmap is None or len( self._mmap ) < end:
+                
+                # the file has grown since we last mapped it
+                
+                self._CloseMMap()
+                
+                self._read_file = open( self._path, 'rb' )
+                
+                self._mmap = mmap.mmap( self._read_file.fileno(), 0, access = mmap.ACCESS_READ )
+                
+            
+            return self._mmap[ data_offset : end ]
+            
+        
+    
+    def HasThumbnail( self, hash: bytes ) -> bool:
+        
+        with self._lock:
+            
+            self._InitialiseIndex()
+            
+            return hash in self._hashes_to_offsets_and_lengths
+            
+        
+    
+    def NeedsCompaction( self ) -> bool:
+        
+        with self._lock:
+            
+            self._InitialiseIndex()
+            
+            if len( self._hashes_to_offsets_and_lengths ) == 0:
+                
+                return self._num_dead_bytes > 0
+                
+            
+            return self._num_dead_bytes > 1024 * 1024 and self._num_dead_bytes * 2 > self._end_of_good_data
+            
+        
+    
@@ -55,12 +55,7 @@ def PILDCT( greyscale_numpy_image: numpy.array ):
     return numpy.real(numpy.multiply(Norm,dct_))
     
 
-def GenerateShapePerceptualHashesNumPy( numpy_image ):
-    
-    if HG.phash_generation_report_mode:
-        
-        HydrusData.ShowText( 'phash generation: image shape: {}'.format( numpy_image.shape ) )
-        
+def GenerateShapePerceptualHashTinyImage( numpy_image ):
     
     ( y, x, depth ) = numpy_image.shape
     
@@ -120,6 +115,18 @@ def GenerateShapePerceptualHashesNumPy( numpy_image ):
         HydrusData.ShowText( 'phash generation: tiny image shape: {}'.format( numpy_image_tiny.shape ) )
         
     
+    return numpy_image_tiny
+    
+
+def GenerateShapePerceptualHashesNumPy( numpy_image ):
+    
+    if HG.phash_generation_report_mode:
+        
+        HydrusData.ShowText( 'phash generation: image shape: {}'.format( numpy_image.shape ) )
+        
+    
+    numpy_image_tiny = GenerateShapePerceptualHashTinyImage( numpy_image )
+    
     # convert to float and calc dct
     
     numpy_image_tiny_float = numpy.float32( numpy_image_tiny )
@@ -220,3 +227,101 @@ def GenerateShapePerceptualHashesNumPy( numpy_image ):
     
     return perceptual_hashes
     
+
+PILDCT_NORMS_CACHE = {}
+
+def PILDCTBatch( greyscale_numpy_images: numpy.array ):
+    
+    # PILDCT for a stack of same-sized images, shape ( n, y, x ), all in one fft pass
+    # the Norm is the same for every image of a size, so we only make it once
+    
+    ( n, y, x ) = greyscale_numpy_images.shape
+    
+    w, h = 2 * y, 2 * x
+    
+    if ( w, h ) not in PILDCT_NORMS_CACHE:
+        
+        invsqrt2 = 1/math.sqrt(2)
+        W = lambda N, k: numpy.exp(-1j*k*math.pi/N)*(invsqrt2 if k == 0 else 1.0)
+        PILDCT_NORMS_CACHE[ ( w, h ) ] = numpy.fromfunction(numpy.vectorize(lambda i,j: W(w,i)*W(h,j)), (w//2,h//2), dtype=numpy.cdouble)
+        
+    
+    Norm = PILDCT_NORMS_CACHE[ ( w, h ) ]
+    
+    extended = numpy.zeros( ( n, w, h ), numpy.float64 )
+    extended[ :, 0:w//2, 0:h//2 ] = greyscale_numpy_images
+    extended[ :, 0:w//2, h//2:h ] = greyscale_numpy_images[ :, :, ::-1 ]
+    extended[ :, w//2:w, : ] = extended[ :, w//2 - 1::-1, : ]
+    
+    dct_ = numpy.fft.fft2( extended, norm = "ortho", axes = ( 1, 2 ) )[ :, 0:w//2, 0:h//2 ]
+    
+    return numpy.real( numpy.multiply( Norm[ None, :, : ], dct_ ) )
+    
+
+def GenerateShapePerceptualHashesFromTinyImages( numpy_images_tiny ):
+    
+    # the batch version of the back half of GenerateShapePerceptualHashesNumPy. give it 32x32 greyscale images from GenerateShapePerceptualHashTinyImage
+    # you get a list of perceptual_hash sets back in the same order, exactly as the one-at-a-time version would make them
+    
+    if len( numpy_images_tiny ) == 0:
+        
+        return []
+        
+    
+    numpy_images_tiny_float = numpy.float32( numpy.stack( numpy_images_tiny ) )
+    
+    dcts = PILDCTBatch( numpy_images_tiny_float )
+    
+    dcts_88 = dcts[ :, :8, :8 ]
+    
+    # exclude [0,0] from the median, as in the single version
+    medians = numpy.median( dcts_88.reshape( ( -1, 64 ) )[ :, 1: ], axis = 1 )
+    
+    dcts_88_boolean = dcts_88 > medians[ :, None, None ]
+    
+    # packbits is big-endian per row, so TTTFTFTF goes to 11101010 just like the reduce
+    perceptual_hashes_bytes = numpy.packbits( dcts_88_boolean.reshape( ( -1, 64 ) ), axis = 1 )
+    
+    list_of_perceptual_hashes = [ DiscardBlankPerceptualHashes( { perceptual_hash_bytes.tobytes() } ) for perceptual_hash_bytes in perceptual_hashes_bytes ]
+    
+    if HG.phash_generation_report_mode:
+        
+        HydrusData.ShowText( 'phash generation: batch of {} images produced {} perceptual_hashes'.format( len( list_of_perceptual_hashes ), sum( ( len( perceptual_hashes ) for perceptual_hashes in list_of_perceptual_hashes ) ) ) )
+        
+    
+    return list_of_perceptual_hashes
+    
+
+def GenerateShapePerceptualHashesBatch( paths_and_mimes ):
+    
+    # loading and shrinking has to happen one at a time, but then we do all the dct and bit work in one go
+    
+    list_of_perceptual_hashes = [ set() for ( path, mime ) in paths_and_mimes ]
+    
+    good_indices = []
+    numpy_images_tiny = []
+    
+    for ( i, ( path, mime ) ) in enumerate( paths_and_mimes ):
+        
+        try:
+            
+            numpy_image = HydrusImageHandling.GenerateNumPyImage( path, mime )
+            
+            numpy_image_tiny = GenerateShapePerceptualHashTinyImage( numpy_image )
+            
+        except:
+            
+            continue
+            
+        
+        good_indices.append( i )
+        numpy_images_tiny.append( numpy_image_tiny )
+        
+    
+    for ( i, perceptual_hashes ) in zip( good_indices, GenerateShapePerceptualHashesFromTinyImages( numpy_images_tiny ) ):
+        
+        list_of_perceptual_hashes[ i ] = perceptual_hashes
+        
+    
+    return list_of_perceptual_hashes
+    
@@ -36,6 +36,7 @@ from hydrus.core.files import HydrusOLEHandling
 from hydrus.core.files import HydrusFFMPEG
 from hydrus.core.files.images import HydrusImageHandling
 from hydrus.core.networking import HydrusNetwork
+from hydrus.core.networking import HydrusNetworkBinaryUpdates
 
 from hydrus.client import ClientApplicationCommand as CAC
 from hydrus.client import ClientConstants as CC
@@ -892,6 +893,7 @@ class FrameGUI( CAC.ApplicationCommandProcessorMixin, ClientGUITopLevelWindows.M
         availability_lines.append( 'pyopenssl present: {}'.format( HydrusEncryption.OPENSSL_OK ) )
         availability_lines.append( 'show-in-file-manager present: {}'.format( ClientPaths.SHOW_IN_FILE_MANAGER_OK ) )
         availability_lines.append( 'speedcopy (experimental test) present: {}'.format( HydrusFileHandling.SPEEDCOPY_OK ) )
+        availability_lines.append( 'zstandard present: {}'.format( HydrusCompression.ZSTD_OK ) )
         
         description_availability = '\n'.join( availability_lines )
         
@@ -1763,6 +1765,30 @@ class FrameGUI( CAC.ApplicationCommandProcessorMixin, ClientGUITopLevelWindows.M
         HydrusMemory.PrintCurrentMemoryUse( ( QW.QWidget, ) )
         
     
+    def _DebugShowRenderingCacheStatistics( self ):
+        
+        for cache in ( self._controller.images_cache, self._controller.image_tiles_cache, self._controller.thumbnails_cache, self._controller.render_disk_cache ):
+            
+            statistics = cache.GetStatistics()
+            
+            num_lookups = statistics[ 'hits' ] + statistics[ 'misses' ]
+            
+            hit_rate = HydrusNumbers.FloatToPercentage( statistics[ 'hits' ] / num_lookups ) if num_lookups > 0 else 'n/a'
+            
+            HydrusData.ShowText( '{} ({}): {} items, {} | {} hits, {} misses ({} hit rate) | {} evictions, {} expirations'.format(
+                statistics[ 'name' ],
+                statistics[ 'eviction_policy' ],
+                HydrusNumbers.ToHumanInt( statistics[ 'num_items' ] ),
+                HydrusData.ConvertValueRangeToBytes( statistics[ 'size' ], statistics[ 'size_limit' ] ),
+                HydrusNumbers.ToHumanInt( statistics[ 'hits' ] ),
+                HydrusNumbers.ToHumanInt( statistics[ 'misses' ] ),
+                hit_rate,
+                HydrusNumbers.ToHumanInt( statistics[ 'evictions' ] ),
+                HydrusNumbers.ToHumanInt( statistics[ 'expirations' ] )
+            ) )
+            
+        
+    
     def _DebugShowScheduledJobs( self ):
         
         self._controller.DebugShowScheduledJobs()
@@ -2316,7 +2342,7 @@ ATTACH "client.mappings.db" as external_mappings;'''
                         
                         try:
                             
-                            update = HydrusSerialisable.CreateFromNetworkBytes( update_network_bytes )
+                            update = HydrusNetworkBinaryUpdates.CreateUpdateFromNetworkBytes( update_network_bytes )
                             
                         except:
                             
@@ -3184,6 +3210,8 @@ ATTACH "client.mappings.db" as external_mappings;'''
                         
                         ClientGUIMenus.AppendMenuItem( submenu, 'change anonymisation period' + HC.UNICODE_ELLIPSIS, 'Change the account history nullification period for this service.', self._ManageServiceOptionsNullificationPeriod, service_key )
                         
+                        ClientGUIMenus.AppendMenuItem( submenu, 'change update file format' + HC.UNICODE_ELLIPSIS, 'Change the format this service writes its update files in.', self._ManageServiceOptionsUpdateFormat, service_key )
+                        
                         if service_type == HC.TAG_REPOSITORY:
                             
                             ClientGUIMenus.AppendSeparator( submenu )
@@ -3376,6 +3404,7 @@ ATTACH "client.mappings.db" as external_mappings;'''
         ClientGUIMenus.AppendSeparator( file_maintenance_menu )
         
         ClientGUIMenus.AppendMenuItem( file_maintenance_menu, 'clear orphan files' + HC.UNICODE_ELLIPSIS, 'Clear out surplus files that have found their way into the file structure.', self._ClearOrphanFiles )
+        ClientGUIMenus.AppendMenuItem( file_maintenance_menu, 'change thumbnail storage format' + HC.UNICODE_ELLIPSIS, 'Move your thumbnails into or out of thumbnail pack files.', self._MigrateThumbnailStorage )
         
         ClientGUIMenus.AppendSeparator( file_maintenance_menu )
         
@@ -3709,6 +3738,7 @@ ATTACH "client.mappings.db" as external_mappings;'''
         ClientGUIMenus.AppendMenuItem( memory_actions, 'run slow memory maintenance', 'Tell all the slow caches to maintain themselves.', self._controller.MaintainMemorySlow )
         ClientGUIMenus.AppendMenuItem( memory_actions, 'clear all rendering caches', 'Tell the image rendering system to forget all current images, tiles, and thumbs. This will often free up a bunch of memory immediately.', self._controller.ClearCaches )
         ClientGUIMenus.AppendMenuItem( memory_actions, 'clear thumbnail cache', 'Tell the thumbnail cache to forget everything and redraw all current thumbs.', self._controller.pub, 'clear_thumbnail_cache' )
+        ClientGUIMenus.AppendMenuItem( memory_actions, 'print rendering cache statistics', 'Show hit, miss, and eviction counts for the image, tile, thumbnail, and render disk caches.', self._DebugShowRenderingCacheStatistics )
         
         if HydrusMemory.PYMPLER_OK:
             
@@ -4866,6 +4896,58 @@ ATTACH "client.mappings.db" as external_mappings;'''
             
         
     
+    def _ManageServiceOptionsUpdateFormat( self, service_key ):
+        
+        service = self._controller.services_manager.GetService( service_key )
+        
+        update_format = service.GetUpdateFormat()
+        
+        choice_tuples = [ ( HydrusNetwork.update_format_string_lookup[ f ], f ) for f in ( HydrusNetwork.UPDATE_FORMAT_JSON, HydrusNetwork.UPDATE_FORMAT_BINARY ) ]
+        
+        try:
+            
+            update_format = ClientGUIDialogsQuick.SelectFromList( self, 'edit update file format', choice_tuples, value_to_select = update_format, sort_tuples = False )
+            
+        except HydrusExceptions.CancelledException:
+            
+            return
+            
+        
+        job_status = ClientThreading.JobStatus()
+        
+        job_status.SetStatusTitle( 'setting update file format' )
+        job_status.SetStatusText( 'uploading' + HC.UNICODE_ELLIPSIS )
+        
+        self._controller.pub( 'message', job_status )
+        
+        def work_callable():
+            
+            service.Request( HC.POST, 'options_update_format', { 'update_format' : update_format } )
+            
+            return 1
+            
+        
+        def publish_callable( gumpf ):
+            
+            job_status.SetStatusText( 'done!' )
+            
+            job_status.FinishAndDismiss( 5 )
+            
+            service.SetAccountRefreshDueNow()
+            
+        
+        def errback_ui_cleanup_callable():
+            
+            job_status.SetStatusText( 'error!' )
+            
+            job_status.Finish()
+            
+        
+        job = ClientGUIAsync.AsyncQtJob( self, work_callable, publish_callable, errback_ui_cleanup_callable = errback_ui_cleanup_callable )
+        
+        job.start()
+        
+    
     def _ManageServiceOptionsUpdatePeriod( self, service_key ):
         
         service = self._controller.services_manager.GetService( service_key )
@@ -5264,6 +5346,40 @@ ATTACH "client.mappings.db" as external_mappings;'''
         self._menu_updater_database.update()
         
     
+    def _MigrateThumbnailStorage( self ):
+        
+        if self._controller.new_options.GetBoolean( 'store_thumbnails_in_pack_files' ):
+            
+            current_storage = 'in large pack files, one per thumbnail subfolder'
+            
+        else:
+            
+            current_storage = 'as individual files'
+            
+        
+        text = f'Your thumbnails are currently stored {current_storage}.'
+        text += '\n' * 2
+        text += 'Pack files mean far fewer files on disk, which can make thumbnail loading and backups much faster on slow or spinning drives. Individual files are simpler and what most hydrus tools expect, and the Client API cannot give a path for a packed thumbnail.'
+        text += '\n' * 2
+        text += 'This job moves every thumbnail into the format you choose. It may take a while, and access to thumbnails will be slightly limited while it runs. If you cancel it, thumbnails left in the old format will still load.'
+        
+        yes_tuples = []
+        
+        yes_tuples.append( ( 'move them into pack files', 'pack' ) )
+        yes_tuples.append( ( 'move them out to individual files', 'unpack' ) )
+        
+        try:
+            
+            result = ClientGUIDialogsQuick.GetYesYesNo( self, text, yes_tuples = yes_tuples, no_label = 'forget it' )
+            
+        except HydrusExceptions.CancelledException:
+            
+            return
+            
+        
+        self._controller.CallToThread( self._controller.client_files_manager.MigrateThumbnailStorage, result == 'pack' )
+        
+    
     def _MigrateTags( self ):
         
         default_tag_service_key = self._controller.new_options.GetKey( 'default_tag_service_tab' )
@@ -5392,8 +5508,7 @@ ATTACH "client.mappings.db" as external_mappings;'''
             idle_tooltip = None
             
         
-        hydrus_busy_status = self._controller.GetThreadPoolBusyStatus()
-        hydrus_busy_tooltip = 'just a simple measure of how much hydrus wants to do atm'
+        ( hydrus_busy_status, hydrus_busy_tooltip ) = self._controller.GetThreadPoolBusyStatus()
         
         if self._controller.SystemBusy():
             
@@ -3074,11 +3074,13 @@ class EmbedButton( QW.QWidget ):
         
         if needs_thumb:
             
-            thumbnail_path = CG.client_controller.client_files_manager.GetThumbnailPath( self._media.GetDisplayMedia().GetMediaResult() )
+            thumbnail_bytes = CG.client_controller.client_files_manager.GetThumbnailBytes( self._media.GetDisplayMedia().GetMediaResult() )
             
-            thumbnail_mime = HydrusFileHandling.GetThumbnailMime( thumbnail_path )
+            thumbnail_mime = HydrusFileHandling.GetThumbnailMimeFromBytes( thumbnail_bytes )
             
-            self._thumbnail_qt_pixmap = ClientRendering.GenerateHydrusBitmap( thumbnail_path, thumbnail_mime ).GetQtPixmap()
+            numpy_image = HydrusImageHandling.GenerateNumPyImageFromBytes( thumbnail_bytes, thumbnail_mime )
+            
+            self._thumbnail_qt_pixmap = ClientRendering.GenerateHydrusBitmapFromNumPyImage( numpy_image ).GetQtPixmap()
             
             self.update()
             
@@ -3791,6 +3793,28 @@ class StaticImage( CAC.ApplicationCommandProcessorMixin, QW.QWidget ):
         return list( i )
         
     
+    def _TilesAreAvailable( self, tile_coordinates ):
+        
+        media_result = self._media.GetMediaResult()
+        
+        for tile_coordinate in tile_coordinates:
+            
+            if tile_coordinate in self._canvas_tiles:
+                
+                continue
+                
+            
+            ( native_clip_rect, raw_canvas_clip_rect ) = self._GetRawClipRectsFromTileCoordinates( tile_coordinate )
+            
+            if not self._image_tiles_cache.HasTile( media_result, native_clip_rect, raw_canvas_clip_rect.size() ):
+                
+                return False
+                
+            
+        
+        return True
+        
+    
     def ClearMedia( self ):
         
         self._media = None
@@ -3810,16 +3834,24 @@ class StaticImage( CAC.ApplicationCommandProcessorMixin, QW.QWidget ):
         
         painter = QG.QPainter( self )
         
-        if self._image_renderer is None or not self._image_renderer.IsReady():
+        if self._image_renderer is None:
             
             self._DrawBackground( painter )
             
             return
             
         
-        try:
+        dirty_tile_coordinates = self._GetTileCoordinatesInView( event.rect() )
+        
+        # if we saw this file at this zoom before, the tiles may be on disk, and we can show them while the renderer is still loading
+        if not self._image_renderer.IsReady() and not self._TilesAreAvailable( dirty_tile_coordinates ):
             
-            dirty_tile_coordinates = self._GetTileCoordinatesInView( event.rect() )
+            self._DrawBackground( painter )
+            
+            return
+            
+        
+        try:
             
             for dirty_tile_coordinate in dirty_tile_coordinates:
                 
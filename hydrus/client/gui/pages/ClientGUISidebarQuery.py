@@ -129,7 +129,7 @@ class SidebarQuery( ClientGUISidebarCore.Sidebar ):
             
             sort_by = self._media_sort_widget.GetSort()
             
-            CG.client_controller.CallToThread( self.THREADDoQuery, self._page_manager, self._page_key, self._query_job_status, file_search_context, sort_by )
+            CG.client_controller.CallToThreadInteractive( self.THREADDoQuery, self._page_manager, self._page_key, self._query_job_status, file_search_context, sort_by )
             
             panel = ClientGUIMediaResultsPanelLoading.MediaResultsPanelLoading( self._page, self._page_key, self._page_manager )
             
@@ -2413,8 +2413,17 @@ class ManageOptionsPanel( ClientGUIScrolledPanels.ManagePanel ):
             
             #
             
+            performance = ClientGUICommon.StaticBox( self, 'performance' )
+            
+            self._file_import_worker_processes = ClientGUICommon.BetterSpinBox( performance, min = 0, max = 64 )
+            self._file_import_worker_processes.setToolTip( ClientGUIFunctions.WrapToolTip( 'When importing files from your hard drive, have this many background processes calculate hashes, thumbnails and other metadata for the next files in the queue while the current one is imported. Each process needs its own memory, so only go up to your number of cpu cores. Set 0 to do all this work in the normal import thread.' ) )
+            
+            #
+            
             self._show_destination_page_when_dnd_url.setChecked( self._new_options.GetBoolean( 'show_destination_page_when_dnd_url' ) )
             
+            self._file_import_worker_processes.setValue( self._new_options.GetInteger( 'file_import_worker_processes' ) )
+            
             #
             
             rows = []
@@ -2444,10 +2453,21 @@ class ManageOptionsPanel( ClientGUIScrolledPanels.ManagePanel ):
             
             #
             
+            rows = []
+            
+            rows.append( ( 'Local file import worker processes:', self._file_import_worker_processes ) )
+            
+            gridbox = ClientGUICommon.WrapInGrid( performance, rows )
+            
+            performance.Add( gridbox, CC.FLAGS_EXPAND_SIZER_PERPENDICULAR )
+            
+            #
+            
             vbox = QP.VBoxLayout()
             
             QP.AddToLayout( vbox, default_fios, CC.FLAGS_EXPAND_PERPENDICULAR )
             QP.AddToLayout( vbox, drag_and_drop, CC.FLAGS_EXPAND_PERPENDICULAR )
+            QP.AddToLayout( vbox, performance, CC.FLAGS_EXPAND_PERPENDICULAR )
             vbox.addStretch( 0 )
             
             self.setLayout( vbox )
@@ -2460,6 +2480,8 @@ class ManageOptionsPanel( ClientGUIScrolledPanels.ManagePanel ):
             self._new_options.SetDefaultFileImportOptions( FileImportOptions.IMPORT_TYPE_QUIET, self._quiet_fios.GetFileImportOptions() )
             self._new_options.SetDefaultFileImportOptions( FileImportOptions.IMPORT_TYPE_LOUD, self._loud_fios.GetFileImportOptions() )
             
+            self._new_options.SetInteger( 'file_import_worker_processes', self._file_import_worker_processes.value() )
+            
         
     
     class _CommandPalettePanel( OptionsPagePanel ):
@@ -2611,6 +2633,10 @@ class ManageOptionsPanel( ClientGUIScrolledPanels.ManagePanel ):
             tt = 'DO NOT CHANGE UNLESS YOU KNOW WHAT YOU ARE DOING. Repository processing operates on a work-rest cycle. This setting determines how long it should wait before starting a new work packet, in multiples of the last work time. This is for when you force-start work from review services.'
             self._repository_processing_rest_percentage_normal.setToolTip( ClientGUIFunctions.WrapToolTip( tt ) )
             
+            self._repository_processing_num_updates_to_prefetch = ClientGUICommon.BetterSpinBox( self._repository_processing_panel, min = 0, max = 16 )
+            tt = 'Update files are read off disk, and older-format ones are parsed, in background threads while the database is busy with the previous one. Newer-format updates are decoded a little ahead of the database, a bit at a time, in the same threads. This is how many updates to get ready ahead of time. Each one takes some memory while it waits. Set 0 to do it all in one thread.'
+            self._repository_processing_num_updates_to_prefetch.setToolTip( ClientGUIFunctions.WrapToolTip( tt ) )
+            
             #
             
             self._tag_display_processing_panel = ClientGUICommon.StaticBox( self, 'sibling/parent sync processing', can_expand = True, start_expanded = False )
@@ -2726,6 +2752,8 @@ class ManageOptionsPanel( ClientGUIScrolledPanels.ManagePanel ):
             self._repository_processing_work_time_normal.SetValue( HydrusTime.SecondiseMSFloat( self._new_options.GetInteger( 'repository_processing_work_time_ms_normal' ) ) )
             self._repository_processing_rest_percentage_normal.setValue( self._new_options.GetInteger( 'repository_processing_rest_percentage_normal' ) )
             
+            self._repository_processing_num_updates_to_prefetch.setValue( self._new_options.GetInteger( 'repository_processing_num_updates_to_prefetch' ) )
+            
             self._tag_display_maintenance_during_idle.setChecked( self._new_options.GetBoolean( 'tag_display_maintenance_during_idle' ) )
             self._tag_display_maintenance_during_active.setChecked( self._new_options.GetBoolean( 'tag_display_maintenance_during_active' ) )
             
@@ -2851,6 +2879,7 @@ class ManageOptionsPanel( ClientGUIScrolledPanels.ManagePanel ):
             rows.append( ( '"Idle" rest time percentage: ', self._repository_processing_rest_percentage_idle ) )
             rows.append( ( '"Normal" ideal work packet time: ', self._repository_processing_work_time_normal ) )
             rows.append( ( '"Normal" rest time percentage: ', self._repository_processing_rest_percentage_normal ) )
+            rows.append( ( 'Number of update files to prepare ahead: ', self._repository_processing_num_updates_to_prefetch ) )
             
             gridbox = ClientGUICommon.WrapInGrid( self._repository_processing_panel, rows )
             
@@ -3002,6 +3031,8 @@ class ManageOptionsPanel( ClientGUIScrolledPanels.ManagePanel ):
             self._new_options.SetInteger( 'repository_processing_work_time_ms_normal', int( self._repository_processing_work_time_normal.GetValue() * 1000 ) )
             self._new_options.SetInteger( 'repository_processing_rest_percentage_normal', self._repository_processing_rest_percentage_normal.value() )
             
+            self._new_options.SetInteger( 'repository_processing_num_updates_to_prefetch', self._repository_processing_num_updates_to_prefetch.value() )
+            
             self._new_options.SetBoolean( 'tag_display_maintenance_during_idle', self._tag_display_maintenance_during_idle.isChecked() )
             self._new_options.SetBoolean( 'tag_display_maintenance_during_active', self._tag_display_maintenance_during_active.isChecked() )
             
@@ -4262,6 +4293,12 @@ class ManageOptionsPanel( ClientGUIScrolledPanels.ManagePanel ):
             
             self._ideal_tile_dimension.setToolTip( ClientGUIFunctions.WrapToolTip( tt ) )
             
+            self._render_disk_cache_size = ClientGUIBytes.NoneableBytesControl( image_tile_cache_panel, 2 * ( 1024 ** 3 ), none_label = 'disabled' )
+            
+            tt = 'If set, rendered image tiles and Client API resized renders are also saved to a folder in your db directory, up to this size. When you come back to a big image, even after a restart, its tiles can be loaded from there instead of decoding and scaling the whole file again. The least recently used renders are deleted first.'
+            
+            self._render_disk_cache_size.setToolTip( ClientGUIFunctions.WrapToolTip( tt ) )
+            
             #
             
             pages_panel = ClientGUICommon.StaticBox( self, 'download pages update', can_expand = True, start_expanded = False )
@@ -4292,6 +4329,7 @@ class ManageOptionsPanel( ClientGUIScrolledPanels.ManagePanel ):
             self._image_tile_cache_timeout.SetValue( self._new_options.GetInteger( 'image_tile_cache_timeout' ) )
             
             self._ideal_tile_dimension.setValue( self._new_options.GetInteger( 'ideal_tile_dimension' ) )
+            self._render_disk_cache_size.SetValue( self._new_options.GetNoneableInteger( 'render_disk_cache_size' ) )
             
             self._gallery_page_status_update_time_minimum.SetValue( HydrusTime.SecondiseMSFloat( self._new_options.GetInteger( 'gallery_page_status_update_time_minimum_ms' ) ) )
             self._gallery_page_status_update_time_ratio_denominator.setValue( self._new_options.GetInteger( 'gallery_page_status_update_time_ratio_denominator' ) )
@@ -4424,6 +4462,7 @@ class ManageOptionsPanel( ClientGUIScrolledPanels.ManagePanel ):
             rows.append( ( 'Memory reserved for image tile cache:', image_tiles_sizer ) )
             rows.append( ( 'Image tile cache timeout:', self._image_tile_cache_timeout ) )
             rows.append( ( 'Ideal tile width/height px:', self._ideal_tile_dimension ) )
+            rows.append( ( 'Disk space reserved for rendered tile cache:', self._render_disk_cache_size ) )
             
             gridbox = ClientGUICommon.WrapInGrid( image_tile_cache_panel, rows )
             
@@ -4615,6 +4654,7 @@ class ManageOptionsPanel( ClientGUIScrolledPanels.ManagePanel ):
             self._new_options.SetInteger( 'image_tile_cache_timeout', self._image_tile_cache_timeout.GetValue() )
             
             self._new_options.SetInteger( 'ideal_tile_dimension', self._ideal_tile_dimension.value() )
+            self._new_options.SetNoneableInteger( 'render_disk_cache_size', self._render_disk_cache_size.GetValue() )
             
             self._new_options.SetInteger( 'media_viewer_prefetch_delay_base_ms', self._media_viewer_prefetch_delay_base_ms.value() )
             self._new_options.SetInteger( 'media_viewer_prefetch_num_previous', self._media_viewer_prefetch_num_previous.value() )
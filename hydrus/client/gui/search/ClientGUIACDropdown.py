@@ -148,6 +148,69 @@ def InsertTagPredicates( predicates: typing.MutableSequence[ ClientSearchPredica
         
     
 
+def PublishReadPrefetch(
+    win: QW.QWidget,
+    job_status: ClientThreading.JobStatus,
+    prefetch_callable,
+    parsed_autocomplete_text: ClientSearchAutocomplete.ParsedAutocompleteText,
+    tag_service_key: bytes,
+    prefetch_predicates: typing.List[ ClientSearchPredicate.Predicate ],
+    include_unusual_predicate_types: bool,
+    under_construction_or_predicate: typing.Optional[ ClientSearchPredicate.Predicate ]
+):
+    
+    autocomplete_search_text = parsed_autocomplete_text.GetSearchText( True )
+    
+    prefetch_matches = ClientSearchAutocomplete.FilterPredicatesBySearchText( tag_service_key, autocomplete_search_text, prefetch_predicates )
+    
+    prefetch_matches = ClientSearchPredicate.SortPredicates( prefetch_matches )
+    
+    allow_auto_wildcard_conversion = True
+    
+    InsertTagPredicates( prefetch_matches, tag_service_key, parsed_autocomplete_text, allow_auto_wildcard_conversion, insert_if_does_not_exist = False )
+    
+    InsertOtherPredicatesForRead( prefetch_matches, parsed_autocomplete_text, include_unusual_predicate_types, under_construction_or_predicate )
+    
+    AppendLoadingPredicate( prefetch_matches, 'loading full results' )
+    
+    CG.client_controller.CallAfterQtSafe( win, 'read a/c exact match results', prefetch_callable, job_status, prefetch_matches, parsed_autocomplete_text )
+    
+
+def ReadFetchTopPredicates(
+    win: QW.QWidget,
+    job_status: ClientThreading.JobStatus,
+    prefetch_callable,
+    parsed_autocomplete_text: ClientSearchAutocomplete.ParsedAutocompleteText,
+    file_search_context: ClientSearchFileSearchContext.FileSearchContext,
+    tag_service_key: bytes,
+    exact_match_predicates: typing.List[ ClientSearchPredicate.Predicate ],
+    include_unusual_predicate_types: bool,
+    under_construction_or_predicate: typing.Optional[ ClientSearchPredicate.Predicate ]
+):
+    
+    if job_status.IsCancelled():
+        
+        return
+        
+    
+    autocomplete_search_text = parsed_autocomplete_text.GetSearchText( True )
+    
+    top_predicates = CG.client_controller.Read( 'autocomplete_top_predicates', ClientTags.TAG_DISPLAY_DISPLAY_ACTUAL, file_search_context, search_text = autocomplete_search_text, inclusive = parsed_autocomplete_text.inclusive, job_status = job_status )
+    
+    # if the full results beat us here, the job is done and the widget will ignore this
+    if job_status.IsCancelled() or len( top_predicates ) == 0:
+        
+        return
+        
+    
+    exact_match_predicates_set = set( exact_match_predicates )
+    
+    prefetch_predicates = list( exact_match_predicates )
+    prefetch_predicates.extend( ( predicate for predicate in top_predicates if predicate not in exact_match_predicates_set ) )
+    
+    PublishReadPrefetch( win, job_status, prefetch_callable, parsed_autocomplete_text, tag_service_key, prefetch_predicates, include_unusual_predicate_types, under_construction_or_predicate )
+    
+
 def ReadFetch(
     win: QW.QWidget,
     job_status: ClientThreading.JobStatus,
@@ -270,19 +333,16 @@ def ReadFetch(
                     
                 else:
                     
-                    exact_match_matches = ClientSearchAutocomplete.FilterPredicatesBySearchText( tag_service_key, autocomplete_search_text, exact_match_predicates )
-                    
-                    exact_match_matches = ClientSearchPredicate.SortPredicates( exact_match_matches )
+                    PublishReadPrefetch( win, job_status, prefetch_callable, parsed_autocomplete_text, tag_service_key, exact_match_predicates, include_unusual_predicate_types, under_construction_or_predicate )
                     
-                    allow_auto_wildcard_conversion = True
+                    # the top few results by count come out of an in-memory index quickly, so we can show them while the full search works
+                    # that read is on the main db connection and may have to build its index, so it goes on its own thread and the full search never waits on it
+                    # if the db is busy, we don't add to its queue for a preview
                     
-                    InsertTagPredicates( exact_match_matches, tag_service_key, parsed_autocomplete_text, allow_auto_wildcard_conversion, insert_if_does_not_exist = False )
-                    
-                    InsertOtherPredicatesForRead( exact_match_matches, parsed_autocomplete_text, include_unusual_predicate_types, under_construction_or_predicate )
-                    
-                    AppendLoadingPredicate( exact_match_matches, 'loading full results' )
-                    
-                    CG.client_controller.CallAfterQtSafe( win, 'read a/c exact match results', prefetch_callable, job_status, exact_match_matches, parsed_autocomplete_text )
+                    if not CG.client_controller.DBCurrentlyDoingJob():
+                        
+                        CG.client_controller.CallToThreadInteractive( ReadFetchTopPredicates, win, job_status, prefetch_callable, parsed_autocomplete_text, file_search_context, tag_service_key, exact_match_predicates, include_unusual_predicate_types, under_construction_or_predicate )
+                        
                     
                     #
                     
@@ -2859,7 +2919,7 @@ class AutoCompleteDropdownTagsRead( AutoCompleteDropdownTagsFileSearchContext ):
             under_construction_or_predicate = self._under_construction_or_predicate.Duplicate()
             
         
-        CG.client_controller.CallToThread( ReadFetch, self, job_status, self.SetPrefetchResults, self.SetFetchedResults, parsed_autocomplete_text, self._media_callable, fsc, self._search_pause_play.IsOn(), self._include_unusual_predicate_types, self._results_cache, under_construction_or_predicate, self._force_system_everything )
+        CG.client_controller.CallToThreadInteractive( ReadFetch, self, job_status, self.SetPrefetchResults, self.SetFetchedResults, parsed_autocomplete_text, self._media_callable, fsc, self._search_pause_play.IsOn(), self._include_unusual_predicate_types, self._results_cache, under_construction_or_predicate, self._force_system_everything )
         
     
     def _SynchronisedChanged( self, value ):
@@ -3534,7 +3594,7 @@ class AutoCompleteDropdownTagsWrite( AutoCompleteDropdownTags ):
         
         file_search_context = ClientSearchFileSearchContext.FileSearchContext( location_context = self._location_context_button.GetValue(), tag_context = self._tag_context_button.GetValue() )
         
-        CG.client_controller.CallToThread( WriteFetch, self, job_status, self.SetPrefetchResults, self.SetFetchedResults, parsed_autocomplete_text, file_search_context, self._results_cache )
+        CG.client_controller.CallToThreadInteractive( WriteFetch, self, job_status, self.SetPrefetchResults, self.SetFetchedResults, parsed_autocomplete_text, file_search_context, self._results_cache )
         
     
     def _TryToProcessAPasteEvent( self ) -> bool:
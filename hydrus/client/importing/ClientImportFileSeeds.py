@@ -1117,14 +1117,14 @@ class FileSeed( HydrusSerialisable.SerialisableBase ):
         return self.GetHash() is not None
         
     
-    def Import( self, temp_path: str, file_import_options: FileImportOptions.FileImportOptions, status_hook = None ):
+    def Import( self, temp_path: str, file_import_options: FileImportOptions.FileImportOptions, status_hook = None, source_path = None ):
         
         if file_import_options.IsDefault():
             
             file_import_options = FileImportOptions.GetRealFileImportOptions( file_import_options, FileImportOptions.IMPORT_TYPE_LOUD )
             
         
-        file_import_job = ClientImportFiles.FileImportJob( temp_path, file_import_options, human_file_description = self.file_seed_data )
+        file_import_job = ClientImportFiles.FileImportJob( temp_path, file_import_options, human_file_description = self.file_seed_data, source_path = source_path )
         
         file_import_status = file_import_job.DoWork( status_hook = status_hook )
         
@@ -1161,7 +1161,7 @@ class FileSeed( HydrusSerialisable.SerialisableBase ):
                 
                 HydrusPaths.MirrorFile( path, temp_path )
                 
-                self.Import( temp_path, file_import_options, status_hook = status_hook )
+                self.Import( temp_path, file_import_options, status_hook = status_hook, source_path = path )
                 
             finally:
                 
@@ -2471,7 +2471,8 @@ class FileSeedCache( HydrusSerialisable.SerialisableBase ):
             self._file_seeds = HydrusSerialisable.SerialisableList( self._file_seeds )
             
         
-        return self._file_seeds.GetSerialisableTuple()
+        # when the db is saving us, this comes out as content-addressed blocks, so only the changed bits get written
+        return HydrusSerialisable.GetBlockableListSerialisableTuple( self._file_seeds )
         
     
     def _GetSourceTimestampForVelocityCalculations( self, file_seed: FileSeed ):
@@ -2561,7 +2562,7 @@ class FileSeedCache( HydrusSerialisable.SerialisableBase ):
         
         with self._lock:
             
-            self._file_seeds = HydrusSerialisable.CreateFromSerialisableTuple( serialisable_info )
+            self._file_seeds = HydrusSerialisable.CreateFromBlockableListSerialisableTuple( serialisable_info )
             
         
     
@@ -3159,6 +3160,61 @@ class FileSeedCache( HydrusSerialisable.SerialisableBase ):
             
         
     
+    def GetNextFileSeeds( self, status: int, num_to_get: int ) -> typing.List[ FileSeed ]:
+        
+        with self._lock:
+            
+            # the observed next file seed is the earliest with this status, so we only have to walk forward from there
+            
+            first_file_seed = self._GetNextFileSeed( status )
+            
+            if first_file_seed is None:
+                
+                return []
+                
+            
+            file_seeds_to_indices = self._GetFileSeedsToIndices()
+            
+            index = file_seeds_to_indices[ first_file_seed ]
+            
+            next_file_seeds = []
+            
+            while index < len( self._file_seeds ) and len( next_file_seeds ) < num_to_get:
+                
+                file_seed = self._file_seeds[ index ]
+                
+                if file_seed.status == status:
+                    
+                    next_file_seeds.append( file_seed )
+                    
+                
+                index += 1
+                
+            
+            return next_file_seeds
+            
+        
+    
+    def PrefetchLocalFileImportInfo( self, prefetch_owner, file_import_options: FileImportOptions.FileImportOptions, loud_or_quiet: int ):
+        
+        # if the user has set up worker processes, get them going on the next few paths while we do the current one
+        
+        pool = ClientImportFiles.GetFileImportWorkerPool()
+        
+        if pool is None:
+            
+            return
+            
+        
+        file_import_options = FileImportOptions.GetRealFileImportOptions( file_import_options, loud_or_quiet )
+        
+        file_seeds = self.GetNextFileSeeds( CC.STATUS_UNKNOWN, pool.GetMaxOutstanding() )
+        
+        paths = [ file_seed.file_seed_data for file_seed in file_seeds if file_seed.file_seed_type == FILE_SEED_TYPE_HDD ]
+        
+        pool.Prefetch( prefetch_owner, paths, ClientImportFiles.GetFileImportInfoSettings( file_import_options ) )
+        
+    
     def GetNumNewFilesSince( self, since: int ):
         
         num_files = 0
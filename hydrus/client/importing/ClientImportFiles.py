@@ -1,12 +1,23 @@
+import collections
+import concurrent.futures
+import multiprocessing
+import os
+import threading
+import typing
+
+from PIL import ImageFile as PILImageFile
+
 from hydrus.core import HydrusConstants as HC
 from hydrus.core import HydrusData
 from hydrus.core import HydrusExceptions
 from hydrus.core import HydrusGlobals as HG
+from hydrus.core.files import HydrusFFMPEG
 from hydrus.core.files import HydrusFileHandling
 from hydrus.core.files import HydrusPSDHandling
 from hydrus.core.files.images import HydrusBlurhash
 from hydrus.core.files.images import HydrusImageHandling
 from hydrus.core.files.images import HydrusImageMetadata
+from hydrus.core.files.images import HydrusImageNormalisation
 from hydrus.core.files.images import HydrusImageOpening
 
 from hydrus.client import ClientConstants as CC
@@ -102,9 +113,477 @@ def CheckFileImportStatus( file_import_status: FileImportStatus ) -> FileImportS
     
     return file_import_status
     
+
+def GenerateFileImportInfo( path: str, hash: bytes, mime, file_import_info_settings, human_file_description = None, status_hook = None ) -> dict:
+    
+    # this is the CPU-heavy part of a file import. it does not talk to the controller, so it is safe to run in a worker process
+    
+    if mime is None:
+        
+        if status_hook is not None:
+            
+            status_hook( 'generating filetype' )
+            
+        
+        mime = HydrusFileHandling.GetMime( path )
+        
+    
+    info = {
+        'mime' : mime,
+        'file_info' : None,
+        'thumbnail_bytes' : None,
+        'blurhash' : None,
+        'perceptual_hashes' : None,
+        'extra_hashes' : None,
+        'has_transparency' : None,
+        'has_exif' : None,
+        'has_human_readable_embedded_metadata' : None,
+        'has_icc_profile' : None,
+        'pixel_hash' : None
+    }
+    
+    if HG.file_import_report_mode:
+        
+        HydrusData.ShowText( 'File import job mime: {}'.format( HC.mime_string_lookup[ mime ] ) )
+        
+    
+    ( allows_decompression_bombs, bounding_dimensions, thumbnail_scale_type, thumbnail_dpr_percent, percentage_in ) = file_import_info_settings
+    
+    if mime in HC.DECOMPRESSION_BOMB_IMAGES and not allows_decompression_bombs:
+        
+        if HG.file_import_report_mode:
+            
+            HydrusData.ShowText( 'File import job testing for decompression bomb' )
+            
+        
+        if HydrusImageHandling.IsDecompressionBomb( path ):
+            
+            if HG.file_import_report_mode:
+                
+                HydrusData.ShowText( 'File import job: it was a decompression bomb' )
+                
+            
+            raise HydrusExceptions.DecompressionBombException( 'Image seems to be a Decompression Bomb!' )
+            
+        
+    
+    if status_hook is not None:
+        
+        status_hook( 'generating file metadata' )
+        
+    
+    file_info = HydrusFileHandling.GetFileInfo( path, mime = mime )
+    
+    info[ 'file_info' ] = file_info
+    
+    ( size, mime, width, height, duration_ms, num_frames, has_audio, num_words ) = file_info
+    
+    if HG.file_import_report_mode:
+        
+        HydrusData.ShowText( 'File import job file info: {}'.format( file_info ) )
+        
+    
+    if mime in HC.MIMES_WITH_THUMBNAILS:
+        
+        if status_hook is not None:
+            
+            status_hook( 'generating thumbnail' )
+            
+        
+        if HG.file_import_report_mode:
+            
+            HydrusData.ShowText( 'File import job generating thumbnail' )
+            
+        
+        target_resolution = HydrusImageHandling.GetThumbnailResolution( ( width, height ), bounding_dimensions, thumbnail_scale_type, thumbnail_dpr_percent )
+        
+        extra_description = f'File with hash "{hash.hex()}".'
+        
+        thumbnail_numpy = HydrusFileHandling.GenerateThumbnailNumPy( path, target_resolution, mime, duration_ms, num_frames, percentage_in = percentage_in, extra_description = extra_description )
+
+        # this guy handles almost all his own exceptions now, so no need for clever catching. if it fails, we are prob talking an I/O failure, which is not a 'thumbnail failed' error
+        info[ 'thumbnail_bytes' ] = HydrusImageHandling.GenerateThumbnailBytesFromNumPy( thumbnail_numpy )
+        
+        try:
+            
+            info[ 'blurhash' ] = HydrusBlurhash.GetBlurhashFromNumPy( thumbnail_numpy )
+            
+        except:
+            
+            pass
+            
+        
+    
+    if mime in HC.FILES_THAT_HAVE_PERCEPTUAL_HASH:
+        
+        if status_hook is not None:
+            
+            status_hook( 'generating similar files metadata' )
+            
+        
+        if HG.file_import_report_mode:
+            
+            HydrusData.ShowText( 'File import job generating perceptual_hashes' )
+            
+        
+        perceptual_hashes = ClientImagePerceptualHashes.GenerateShapePerceptualHashes( path, mime )
+        
+        info[ 'perceptual_hashes' ] = perceptual_hashes
+        
+        if HG.file_import_report_mode:
+            
+            HydrusData.ShowText( 'File import job generated {} perceptual_hashes: {}'.format( len( perceptual_hashes ), [ perceptual_hash.hex() for perceptual_hash in perceptual_hashes ] ) )
+            
+        
+    
+    if HG.file_import_report_mode:
+        
+        HydrusData.ShowText( 'File import job generating other hashes' )
+        
+    
+    if status_hook is not None:
+        
+        status_hook( 'generating additional hashes' )
+        
+    
+    info[ 'extra_hashes' ] = HydrusFileHandling.GetExtraHashesFromPath( path )
+    
+    #
+    
+    info[ 'has_transparency' ] = ClientFiles.HasTransparency( path, mime, duration_ms = duration_ms, num_frames = num_frames, resolution = ( width, height ) )
+    
+    has_exif = False
+    
+    raw_pil_image = None
+    
+    if mime in HC.FILES_THAT_CAN_HAVE_EXIF:
+        
+        try:
+            
+            if raw_pil_image is None:
+                
+                raw_pil_image = HydrusImageOpening.RawOpenPILImage( path, human_file_description = human_file_description )
+                
+            
+            has_exif = HydrusImageMetadata.HasEXIF( raw_pil_image )
+            
+        except:
+            
+            pass
+            
+        
+    
+    info[ 'has_exif' ] = has_exif
+    
+    info[ 'has_human_readable_embedded_metadata' ] = ClientFiles.HasHumanReadableEmbeddedMetadata( path, mime )
+    
+    has_icc_profile = False
+    
+    if mime in HC.FILES_THAT_CAN_HAVE_ICC_PROFILE:
+        
+        try:
+            
+            if mime == HC.APPLICATION_PSD:
+                
+                has_icc_profile = HydrusPSDHandling.PSDHasICCProfile( path )
+                
+            else:
+                
+                if raw_pil_image is None:
+                    
+                    raw_pil_image = HydrusImageOpening.RawOpenPILImage( path, human_file_description = human_file_description )
+                    
+                
+                has_icc_profile = HydrusImageMetadata.HasICCProfile( raw_pil_image )
+                
+            
+        except:
+            
+            pass
+            
+        
+    
+    info[ 'has_icc_profile' ] = has_icc_profile
+    
+    #
+    
+    if mime in HC.FILES_THAT_CAN_HAVE_PIXEL_HASH and duration_ms is None:
+        
+        try:
+            
+            info[ 'pixel_hash' ] = HydrusImageHandling.GetImagePixelHash( path, mime )
+            
+        except:
+            
+            pass
+            
+        
+    
+    return info
+    
+
+def GetFileImportInfoSettings( file_import_options: FileImportOptions.FileImportOptions ):
+    
+    new_options = CG.client_controller.new_options
+    
+    allows_decompression_bombs = file_import_options.AllowsDecompressionBombs()
+    bounding_dimensions = CG.client_controller.options[ 'thumbnail_dimensions' ]
+    thumbnail_scale_type = new_options.GetInteger( 'thumbnail_scale_type' )
+    thumbnail_dpr_percent = new_options.GetInteger( 'thumbnail_dpr_percent' )
+    percentage_in = new_options.GetInteger( 'video_thumbnail_percentage_in' )
+    
+    return ( allows_decompression_bombs, tuple( bounding_dimensions ), thumbnail_scale_type, thumbnail_dpr_percent, percentage_in )
+    
+
+def GetFileImportWorkerGlobalSettings():
+    
+    return (
+        HydrusFFMPEG.FFMPEG_PATH,
+        PILImageFile.LOAD_TRUNCATED_IMAGES,
+        HydrusImageNormalisation.DO_ICC_PROFILE_NORMALISATION,
+        HydrusImageHandling.FORCE_PIL_ALWAYS
+    )
+    
+
+def InitialiseFileImportWorkerProcess( global_settings ):
+    
+    # a spawned worker process starts with a fresh interpreter, so it needs the few module-level settings the client sets up at boot
+    
+    ( ffmpeg_path, load_truncated_images, do_icc_profile_normalisation, force_pil_always ) = global_settings
+    
+    HydrusFFMPEG.FFMPEG_PATH = ffmpeg_path
+    PILImageFile.LOAD_TRUNCATED_IMAGES = load_truncated_images
+    HydrusImageNormalisation.DO_ICC_PROFILE_NORMALISATION = do_icc_profile_normalisation
+    HydrusImageHandling.FORCE_PIL_ALWAYS = force_pil_always
+    
+
+def WorkerGenerateFileImportInfo( path: str, file_import_info_settings, human_file_description = None ):
+    
+    hash = HydrusFileHandling.GetHashFromPath( path )
+    
+    try:
+        
+        info = GenerateFileImportInfo( path, hash, None, file_import_info_settings, human_file_description = human_file_description )
+        
+        return ( hash, info, None )
+        
+    except Exception as e:
+        
+        return ( hash, None, e )
+        
+    
+
+def GetPathSignature( path: str ):
+    
+    try:
+        
+        stat_result = os.stat( path )
+        
+    except OSError:
+        
+        return None
+        
+    
+    return ( stat_result.st_size, stat_result.st_mtime_ns )
+    
+
+class FileImportWorkerPool( object ):
+    
+    def __init__( self, num_workers: int, global_settings ):
+        
+        self._num_workers = num_workers
+        self._global_settings = global_settings
+        
+        self._lock = threading.Lock()
+        
+        # spawn, not fork. we are a big threaded Qt process and forking that is asking for trouble
+        self._executor = concurrent.futures.ProcessPoolExecutor(
+            max_workers = num_workers,
+            mp_context = multiprocessing.get_context( 'spawn' ),
+            initializer = InitialiseFileImportWorkerProcess,
+            initargs = ( global_settings, )
+        )
+        
+        self._prefetch_owners_to_jobs = collections.defaultdict( dict )
+        self._keys_to_prefetch_owners = {}
+        
+    
+    def GetMaxOutstanding( self ):
+        
+        return self._num_workers * 2
+        
+    
+    def GetSettings( self ):
+        
+        return ( self._num_workers, self._global_settings )
+        
+    
+    def PopResult( self, path: str, file_import_info_settings ):
+        
+        key = ( path, file_import_info_settings )
+        
+        with self._lock:
+            
+            if key not in self._keys_to_prefetch_owners:
+                
+                return None
+                
+            
+            prefetch_owner = self._keys_to_prefetch_owners.pop( key )
+            
+            jobs = self._prefetch_owners_to_jobs[ prefetch_owner ]
+            
+            ( path_signature, future ) = jobs.pop( key )
+            
+            if len( jobs ) == 0:
+                
+                del self._prefetch_owners_to_jobs[ prefetch_owner ]
+                
+            
+        
+        try:
+            
+            result = future.result()
+            
+        except Exception as e:
+            
+            # the worker died or the pool was shut down. we'll just do it ourselves
+            
+            if HG.file_import_report_mode:
+                
+                HydrusData.ShowText( f'File import worker failed on "{path}": {e}' )
+                
+            
+            return None
+            
+        
+        if GetPathSignature( path ) != path_signature:
+            
+            return None
+            
+        
+        return result
+        
+    
+    def Prefetch( self, prefetch_owner, paths, file_import_info_settings ):
+        
+        # the owner is an importer. each one keeps its own lookahead window, and anything it no longer wants is cancelled
+        
+        paths = list( paths )[ : self.GetMaxOutstanding() ]
+        
+        keys = [ ( path, file_import_info_settings ) for path in paths ]
+        
+        with self._lock:
+            
+            jobs = self._prefetch_owners_to_jobs[ prefetch_owner ]
+            
+            keys_set = set( keys )
+            
+            for stale_key in [ key for key in jobs.keys() if key not in keys_set ]:
+                
+                ( path_signature, future ) = jobs.pop( stale_key )
+                
+                future.cancel()
+                
+                del self._keys_to_prefetch_owners[ stale_key ]
+                
+            
+            for ( path, key ) in zip( paths, keys ):
+                
+                if key in jobs or key in self._keys_to_prefetch_owners:
+                    
+                    continue
+                    
+                
+                path_signature = GetPathSignature( path )
+                
+                if path_signature is None:
+                    
+                    continue
+                    
+                
+                try:
+                    
+                    future = self._executor.submit( WorkerGenerateFileImportInfo, path, file_import_info_settings, human_file_description = path )
+                    
+                except RuntimeError:
+                    
+                    # shut down
+                    
+                    return
+                    
+                
+                jobs[ key ] = ( path_signature, future )
+                self._keys_to_prefetch_owners[ key ] = prefetch_owner
+                
+            
+            if len( jobs ) == 0:
+                
+                del self._prefetch_owners_to_jobs[ prefetch_owner ]
+                
+            
+        
+    
+    def Shutdown( self ):
+        
+        with self._lock:
+            
+            self._prefetch_owners_to_jobs = collections.defaultdict( dict )
+            self._keys_to_prefetch_owners = {}
+            
+        
+        self._executor.shutdown( wait = False, cancel_futures = True )
+        
+    
+
+FILE_IMPORT_WORKER_POOL = None
+FILE_IMPORT_WORKER_POOL_LOCK = threading.Lock()
+
+def GetFileImportWorkerPool() -> typing.Optional[ FileImportWorkerPool ]:
+    
+    global FILE_IMPORT_WORKER_POOL
+    
+    num_workers = CG.client_controller.new_options.GetInteger( 'file_import_worker_processes' )
+    
+    with FILE_IMPORT_WORKER_POOL_LOCK:
+        
+        if FILE_IMPORT_WORKER_POOL is not None:
+            
+            if HG.started_shutdown or FILE_IMPORT_WORKER_POOL.GetSettings() != ( num_workers, GetFileImportWorkerGlobalSettings() ):
+                
+                FILE_IMPORT_WORKER_POOL.Shutdown()
+                
+                FILE_IMPORT_WORKER_POOL = None
+                
+            
+        
+        if FILE_IMPORT_WORKER_POOL is None and num_workers > 0 and not HG.started_shutdown:
+            
+            FILE_IMPORT_WORKER_POOL = FileImportWorkerPool( num_workers, GetFileImportWorkerGlobalSettings() )
+            
+        
+        return FILE_IMPORT_WORKER_POOL
+        
+    
+
+def ShutdownFileImportWorkerPool():
+    
+    global FILE_IMPORT_WORKER_POOL
+    
+    with FILE_IMPORT_WORKER_POOL_LOCK:
+        
+        if FILE_IMPORT_WORKER_POOL is not None:
+            
+            FILE_IMPORT_WORKER_POOL.Shutdown()
+            
+            FILE_IMPORT_WORKER_POOL = None
+            
+        
+    
+
 class FileImportJob( object ):
     
-    def __init__( self, temp_path: str, file_import_options: FileImportOptions.FileImportOptions, human_file_description = None ):
+    def __init__( self, temp_path: str, file_import_options: FileImportOptions.FileImportOptions, human_file_description = None, source_path = None ):
         
         if HG.file_import_report_mode:
             
@@ -135,6 +614,10 @@ class FileImportJob( object ):
         self._file_modified_timestamp_ms = None
         self._blurhash = None
         
+        # if we were copied from a local path, a worker process may have already done our hash and metadata from the original
+        self._source_path = source_path
+        self._prefetched_info = None
+        
     
     def CheckIsGoodToImport( self ):
         
@@ -223,7 +706,31 @@ class FileImportJob( object ):
             status_hook( 'calculating hash' )
             
         
-        hash = HydrusFileHandling.GetHashFromPath( self._temp_path )
+        hash = None
+        
+        if self._source_path is not None:
+            
+            pool = GetFileImportWorkerPool()
+            
+            if pool is not None:
+                
+                file_import_info_settings = GetFileImportInfoSettings( self._file_import_options )
+                
+                result = pool.PopResult( self._source_path, file_import_info_settings )
+                
+                if result is not None:
+                    
+                    ( hash, info, exception ) = result
+                    
+                    self._prefetched_info = ( file_import_info_settings, info, exception )
+                    
+                
+            
+        
+        if hash is None:
+            
+            hash = HydrusFileHandling.GetHashFromPath( self._temp_path )
+            
         
         if HG.file_import_report_mode:
             
@@ -252,201 +759,53 @@ class FileImportJob( object ):
     
     def GenerateInfo( self, status_hook = None ):
         
-        if self._pre_import_file_status.mime is None:
-            
-            if status_hook is not None:
-                
-                status_hook( 'generating filetype' )
-                
-            
-            mime = HydrusFileHandling.GetMime( self._temp_path )
-            
-            self._pre_import_file_status.mime = mime
-            
-        else:
-            
-            mime = self._pre_import_file_status.mime
-            
-        
-        if HG.file_import_report_mode:
-            
-            HydrusData.ShowText( 'File import job mime: {}'.format( HC.mime_string_lookup[ mime ] ) )
-            
-        
-        new_options = CG.client_controller.new_options
+        file_import_info_settings = GetFileImportInfoSettings( self._file_import_options )
         
-        if mime in HC.DECOMPRESSION_BOMB_IMAGES and not self._file_import_options.AllowsDecompressionBombs():
-            
-            if HG.file_import_report_mode:
-                
-                HydrusData.ShowText( 'File import job testing for decompression bomb' )
-                
-            
-            if HydrusImageHandling.IsDecompressionBomb( self._temp_path ):
-                
-                if HG.file_import_report_mode:
-                    
-                    HydrusData.ShowText( 'File import job: it was a decompression bomb' )
-                    
-                
-                raise HydrusExceptions.DecompressionBombException( 'Image seems to be a Decompression Bomb!' )
-                
-            
-        
-        if status_hook is not None:
-            
-            status_hook( 'generating file metadata' )
-            
-        
-        self._file_info = HydrusFileHandling.GetFileInfo( self._temp_path, mime = mime )
+        info = None
         
-        ( size, mime, width, height, duration_ms, num_frames, has_audio, num_words ) = self._file_info
-        
-        if HG.file_import_report_mode:
+        if self._prefetched_info is not None:
             
-            HydrusData.ShowText( 'File import job file info: {}'.format( self._file_info ) )
+            ( prefetched_file_import_info_settings, prefetched_info, prefetched_exception ) = self._prefetched_info
             
-        
-        if mime in HC.MIMES_WITH_THUMBNAILS:
+            self._prefetched_info = None
             
-            if status_hook is not None:
-                
-                status_hook( 'generating thumbnail' )
-                
-            
-            if HG.file_import_report_mode:
-                
-                HydrusData.ShowText( 'File import job generating thumbnail' )
-                
-            
-            bounding_dimensions = CG.client_controller.options[ 'thumbnail_dimensions' ]
-            thumbnail_scale_type = new_options.GetInteger( 'thumbnail_scale_type' )
-            thumbnail_dpr_percent = new_options.GetInteger( 'thumbnail_dpr_percent' )
-            
-            target_resolution = HydrusImageHandling.GetThumbnailResolution( ( width, height ), bounding_dimensions, thumbnail_scale_type, thumbnail_dpr_percent )
-            
-            percentage_in = new_options.GetInteger( 'video_thumbnail_percentage_in' )
-            
-            extra_description = f'File with hash "{self.GetHash().hex()}".'
-            
-            thumbnail_numpy = HydrusFileHandling.GenerateThumbnailNumPy( self._temp_path, target_resolution, mime, duration_ms, num_frames, percentage_in = percentage_in, extra_description = extra_description )
-
-            # this guy handles almost all his own exceptions now, so no need for clever catching. if it fails, we are prob talking an I/O failure, which is not a 'thumbnail failed' error
-            self._thumbnail_bytes = HydrusImageHandling.GenerateThumbnailBytesFromNumPy( thumbnail_numpy )
-            
-            try:
-                
-                self._blurhash = HydrusBlurhash.GetBlurhashFromNumPy( thumbnail_numpy )
-                
-            except:
-                
-                pass
-                
-            
-        
-        if mime in HC.FILES_THAT_HAVE_PERCEPTUAL_HASH:
-            
-            if status_hook is not None:
-                
-                status_hook( 'generating similar files metadata' )
-                
-            
-            if HG.file_import_report_mode:
-                
-                HydrusData.ShowText( 'File import job generating perceptual_hashes' )
+            if prefetched_file_import_info_settings == file_import_info_settings:
                 
-            
-            self._perceptual_hashes = ClientImagePerceptualHashes.GenerateShapePerceptualHashes( self._temp_path, mime )
-            
-            if HG.file_import_report_mode:
-                
-                HydrusData.ShowText( 'File import job generated {} perceptual_hashes: {}'.format( len( self._perceptual_hashes ), [ perceptual_hash.hex() for perceptual_hash in self._perceptual_hashes ] ) )
-                
-            
-        
-        if HG.file_import_report_mode:
-            
-            HydrusData.ShowText( 'File import job generating other hashes' )
-            
-        
-        if status_hook is not None:
-            
-            status_hook( 'generating additional hashes' )
-            
-        
-        self._extra_hashes = HydrusFileHandling.GetExtraHashesFromPath( self._temp_path )
-        
-        #
-        
-        self._has_transparency = ClientFiles.HasTransparency( self._temp_path, mime, duration_ms = duration_ms, num_frames = num_frames, resolution = ( width, height ) )
-        
-        has_exif = False
-        
-        raw_pil_image = None
-        
-        if mime in HC.FILES_THAT_CAN_HAVE_EXIF:
-            
-            try:
-                
-                if raw_pil_image is None:
+                if prefetched_exception is not None:
                     
-                    raw_pil_image = HydrusImageOpening.RawOpenPILImage( self._temp_path, human_file_description = self._human_file_description )
+                    raise prefetched_exception
                     
                 
-                has_exif = HydrusImageMetadata.HasEXIF( raw_pil_image )
-                
-            except:
-                
-                pass
-                
-            
-        
-        self._has_exif = has_exif
-        
-        self._has_human_readable_embedded_metadata = ClientFiles.HasHumanReadableEmbeddedMetadata( self._temp_path, mime )
-        
-        has_icc_profile = False
-        
-        if mime in HC.FILES_THAT_CAN_HAVE_ICC_PROFILE:
-            
-            try:
-                
-                if mime == HC.APPLICATION_PSD:
-                    
-                    has_icc_profile = HydrusPSDHandling.PSDHasICCProfile( self._temp_path )
+                if self._pre_import_file_status.mime in ( None, prefetched_info[ 'mime' ] ):
                     
-                else:
+                    info = prefetched_info
                     
-                    if raw_pil_image is None:
+                    if HG.file_import_report_mode:
                         
-                        raw_pil_image = HydrusImageOpening.RawOpenPILImage( self._temp_path, human_file_description = self._human_file_description )
+                        HydrusData.ShowText( 'File import job using info generated by a worker process' )
                         
                     
-                    has_icc_profile = HydrusImageMetadata.HasICCProfile( raw_pil_image )
-                    
-                
-            except:
-                
-                pass
                 
             
         
-        self._has_icc_profile = has_icc_profile
-        
-        #
-        
-        if mime in HC.FILES_THAT_CAN_HAVE_PIXEL_HASH and duration_ms is None:
+        if info is None:
             
-            try:
-                
-                self._pixel_hash = HydrusImageHandling.GetImagePixelHash( self._temp_path, mime )
-                
-            except:
-                
-                pass
-                
+            info = GenerateFileImportInfo( self._temp_path, self.GetHash(), self._pre_import_file_status.mime, file_import_info_settings, human_file_description = self._human_file_description, status_hook = status_hook )
             
         
+        self._pre_import_file_status.mime = info[ 'mime' ]
+        
+        self._file_info = info[ 'file_info' ]
+        self._thumbnail_bytes = info[ 'thumbnail_bytes' ]
+        self._blurhash = info[ 'blurhash' ]
+        self._perceptual_hashes = info[ 'perceptual_hashes' ]
+        self._extra_hashes = info[ 'extra_hashes' ]
+        self._has_transparency = info[ 'has_transparency' ]
+        self._has_exif = info[ 'has_exif' ]
+        self._has_human_readable_embedded_metadata = info[ 'has_human_readable_embedded_metadata' ]
+        self._has_icc_profile = info[ 'has_icc_profile' ]
+        self._pixel_hash = info[ 'pixel_hash' ]
+        
         self._file_modified_timestamp_ms = HydrusFileHandling.GetFileModifiedTimestampMS( self._temp_path )
         
     
@@ -816,7 +816,8 @@ class GallerySeedLog( HydrusSerialisable.SerialisableBase ):
             self._gallery_seeds = HydrusSerialisable.SerialisableList( self._gallery_seeds )
             
         
-        return self._gallery_seeds.GetSerialisableTuple()
+        # when the db is saving us, this comes out as content-addressed blocks, so only the changed bits get written
+        return HydrusSerialisable.GetBlockableListSerialisableTuple( self._gallery_seeds )
         
     
     def _GetStatusesToCounts( self ):
@@ -835,7 +836,7 @@ class GallerySeedLog( HydrusSerialisable.SerialisableBase ):
         
         with self._lock:
             
-            self._gallery_seeds = HydrusSerialisable.CreateFromSerialisableTuple( serialisable_info )
+            self._gallery_seeds = HydrusSerialisable.CreateFromBlockableListSerialisableTuple( serialisable_info )
             
             self._gallery_seeds_to_indices = { gallery_seed : index for ( index, gallery_seed ) in enumerate( self._gallery_seeds ) }
             
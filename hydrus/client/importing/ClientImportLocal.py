@@ -200,6 +200,8 @@ class HDDImport( HydrusSerialisable.SerialisableBase ):
                 
             
         
+        self._file_seed_cache.PrefetchLocalFileImportInfo( self, self._file_import_options, FileImportOptions.IMPORT_TYPE_LOUD )
+        
         file_seed.ImportPath( self._file_seed_cache, self._file_import_options, FileImportOptions.IMPORT_TYPE_LOUD, status_hook = status_hook )
         
         if file_seed.status in CC.SUCCESSFUL_IMPORT_STATES:
@@ -772,6 +774,8 @@ class ImportFolder( HydrusSerialisable.SerialisableBaseNamed ):
             
             try:
                 
+                self._file_seed_cache.PrefetchLocalFileImportInfo( self, self._file_import_options, FileImportOptions.IMPORT_TYPE_QUIET )
+                
                 file_seed.ImportPath( self._file_seed_cache, self._file_import_options, FileImportOptions.IMPORT_TYPE_QUIET )
                 
                 if file_seed.status in CC.SUCCESSFUL_IMPORT_STATES:
@@ -1,3 +1,5 @@
+import array
+import bisect
 import collections
 import itertools
 import threading
@@ -21,6 +23,8 @@ from hydrus.client.search import ClientSearchTagContext
 
 class FileDuplicatesManager( object ):
     
+    __slots__ = ( 'media_group_king_hash', 'alternates_group_id', 'dupe_statuses_to_count' )
+    
     def __init__( self, media_group_king_hash, alternates_group_id, dupe_statuses_to_counts ):
         
         self.media_group_king_hash = media_group_king_hash
@@ -47,6 +51,27 @@ class FileDuplicatesManager( object ):
     
 class FileInfoManager( object ):
     
+    # we make one of these and a handful of other managers for every file we load, so no instance dicts, thank you
+    __slots__ = (
+        'hash_id',
+        'hash',
+        'size',
+        'mime',
+        'width',
+        'height',
+        'duration_ms',
+        'num_frames',
+        'has_audio',
+        'num_words',
+        'original_mime',
+        'has_transparency',
+        'has_exif',
+        'has_human_readable_embedded_metadata',
+        'has_icc_profile',
+        'blurhash',
+        'pixel_hash'
+    )
+    
     def __init__(
         self,
         hash_id: int,
@@ -126,12 +151,21 @@ class FileInfoManager( object ):
 
 class TimesManager( object ):
     
+    __slots__ = (
+        '_simple_timestamp_types_to_timestamps_ms',
+        '_domains_to_modified_timestamps_ms',
+        '_timestamp_types_to_service_keys_to_timestamps_ms',
+        '_canvas_types_to_last_viewed_timestamps_ms',
+        '_aggregate_modified_is_generated'
+    )
+    
     def __init__( self ):
         
         self._simple_timestamp_types_to_timestamps_ms = {}
         self._domains_to_modified_timestamps_ms = {}
         
-        self._timestamp_types_to_service_keys_to_timestamps_ms = { timestamp_type : {} for timestamp_type in ClientTime.FILE_SERVICE_TIMESTAMP_TYPES }
+        # filled in as needed, since most files only ever have imported times
+        self._timestamp_types_to_service_keys_to_timestamps_ms = {}
         
         self._canvas_types_to_last_viewed_timestamps_ms = {}
         
@@ -151,7 +185,7 @@ class TimesManager( object ):
     
     def _ClearFileServiceTime( self, timestamp_type: int, service_key: bytes ):
         
-        service_keys_to_timestamps_ms = self._timestamp_types_to_service_keys_to_timestamps_ms[ timestamp_type ]
+        service_keys_to_timestamps_ms = self._timestamp_types_to_service_keys_to_timestamps_ms.get( timestamp_type, {} )
         
         if service_key in service_keys_to_timestamps_ms:
             
@@ -199,6 +233,11 @@ class TimesManager( object ):
     
     def _GetFileServiceTimestampMS( self, timestamp_type: int, service_key: bytes ) -> typing.Optional[ int ]:
         
+        if timestamp_type not in self._timestamp_types_to_service_keys_to_timestamps_ms:
+            
+            return None
+            
+        
         return self._timestamp_types_to_service_keys_to_timestamps_ms[ timestamp_type ].get( service_key, None )
         
     
@@ -231,6 +270,11 @@ class TimesManager( object ):
     
     def _SetFileServiceTimestampMS( self, timestamp_type: int, service_key: bytes, timestamp_ms: int ):
         
+        if timestamp_type not in self._timestamp_types_to_service_keys_to_timestamps_ms:
+            
+            self._timestamp_types_to_service_keys_to_timestamps_ms[ timestamp_type ] = {}
+            
+        
         self._timestamp_types_to_service_keys_to_timestamps_ms[ timestamp_type ][ service_key ] = timestamp_ms
         
     
@@ -535,6 +579,8 @@ class TimesManager( object ):
 
 class FileViewingStatsManager( object ):
     
+    __slots__ = ( '_times_manager', 'views', 'viewtimes_ms' )
+    
     def __init__(
         self,
         times_manager: TimesManager,
@@ -729,6 +775,18 @@ class FileViewingStatsManager( object ):
 
 class LocationsManager( object ):
     
+    __slots__ = (
+        '_current',
+        '_deleted',
+        '_pending',
+        '_petitioned',
+        '_times_manager',
+        'inbox',
+        '_urls',
+        '_service_keys_to_filenames',
+        '_local_file_deletion_reason'
+    )
+    
     def __init__(
         self,
         current: typing.Set[ bytes ],
@@ -1326,6 +1384,8 @@ class LocationsManager( object ):
     
 class NotesManager( object ):
     
+    __slots__ = ( '_names_to_notes', )
+    
     def __init__( self, names_to_notes: typing.Dict[ str, str ] ):
         
         self._names_to_notes = names_to_notes
@@ -1408,6 +1468,8 @@ class NotesManager( object ):
     
 class RatingsManager( object ):
     
+    __slots__ = ( '_service_keys_to_ratings', )
+    
     def __init__( self, service_keys_to_ratings: typing.Dict[ bytes, typing.Union[ None, float, int ] ] ):
         
         self._service_keys_to_ratings = service_keys_to_ratings
@@ -1527,17 +1589,123 @@ class RatingsManager( object ):
         
     
 
+class TagIdTable( object ):
+    
+    # a process-wide table of every tag our tags managers have seen. a manager stores small int arrays against this rather than its own sets of strings
+    # tags are never removed, but the table is bounded by the tags in the db and each one is held exactly once
+    
+    my_instance = None
+    
+    def __init__( self ):
+        
+        self._lock = threading.Lock()
+        
+        self._tags_to_tag_ids = {}
+        self._tag_ids_to_tags = []
+        
+    
+    @staticmethod
+    def instance() -> 'TagIdTable':
+        
+        if TagIdTable.my_instance is None:
+            
+            TagIdTable.my_instance = TagIdTable()
+            
+        
+        return TagIdTable.my_instance
+        
+    
+    def GetNumTags( self ):
+        
+        return len( self._tag_ids_to_tags )
+        
+    
+    def GetTagId( self, tag: str ) -> int:
+        
+        tag_id = self._tags_to_tag_ids.get( tag, None )
+        
+        if tag_id is None:
+            
+            with self._lock:
+                
+                tag_id = self._tags_to_tag_ids.get( tag, None )
+                
+                if tag_id is None:
+                    
+                    tag_id = len( self._tag_ids_to_tags )
+                    
+                    self._tag_ids_to_tags.append( tag )
+                    self._tags_to_tag_ids[ tag ] = tag_id
+                    
+                
+            
+        
+        return tag_id
+        
+    
+    def GetTagIdIfExists( self, tag: str ):
+        
+        return self._tags_to_tag_ids.get( tag, None )
+        
+    
+    def GetTagIds( self, tags: typing.Iterable[ str ] ) -> array.array:
+        
+        return array.array( 'I', sorted( { self.GetTagId( tag ) for tag in tags } ) )
+        
+    
+    def GetTags( self, tag_ids: typing.Iterable[ int ] ) -> typing.Set[ str ]:
+        
+        # the list only ever grows, so we can read it without the lock
+        
+        tag_ids_to_tags = self._tag_ids_to_tags
+        
+        return { tag_ids_to_tags[ tag_id ] for tag_id in tag_ids }
+        
+    
+
+def ConvertTagIdsToTagIdArray( tag_ids: typing.Iterable[ int ] ) -> array.array:
+    
+    return array.array( 'I', sorted( tag_ids ) )
+    
+
+def TagIdArrayHasTagId( tag_ids: array.array, tag_id: int ) -> bool:
+    
+    i = bisect.bisect_left( tag_ids, tag_id )
+    
+    return i < len( tag_ids ) and tag_ids[ i ] == tag_id
+    
+
+EMPTY_TAG_ID_ARRAY = array.array( 'I' )
+
 class TagsManager( object ):
     
+    __slots__ = (
+        '_tag_display_types_to_service_keys_to_statuses_to_tag_ids',
+        '_storage_cache_is_dirty',
+        '_display_cache_is_dirty',
+        '_single_media_cache_is_dirty',
+        '_selection_list_cache_is_dirty',
+        '_lock'
+    )
+    
+    # tags are stored as sorted arrays of TagIdTable ids, service_key : status : array, with empty statuses left out
+    # the combined service and the filtered display types are built from those on demand and cached as arrays too
+    # all arrays are treated as immutable, so caches and duplicates can share them
+    
     def __init__(
         self,
         service_keys_to_statuses_to_storage_tags: typing.Dict[ bytes, typing.Dict[ int, typing.Set[ str ] ] ],
         service_keys_to_statuses_to_display_tags: typing.Dict[ bytes, typing.Dict[ int, typing.Set[ str ] ] ]
         ):
         
-        self._tag_display_types_to_service_keys_to_statuses_to_tags = {
-            ClientTags.TAG_DISPLAY_STORAGE : service_keys_to_statuses_to_storage_tags,
-            ClientTags.TAG_DISPLAY_DISPLAY_ACTUAL : service_keys_to_statuses_to_display_tags
+        service_keys_to_statuses_to_storage_tag_ids = self._ConvertTagsToTagIds( service_keys_to_statuses_to_storage_tags )
+        
+        # most files have no siblings or parents, so display is usually the same as storage and can share its arrays
+        service_keys_to_statuses_to_display_tag_ids = self._ConvertTagsToTagIds( service_keys_to_statuses_to_display_tags, service_keys_to_statuses_to_shareable_tag_ids = service_keys_to_statuses_to_storage_tag_ids )
+        
+        self._tag_display_types_to_service_keys_to_statuses_to_tag_ids = {
+            ClientTags.TAG_DISPLAY_STORAGE : service_keys_to_statuses_to_storage_tag_ids,
+            ClientTags.TAG_DISPLAY_DISPLAY_ACTUAL : service_keys_to_statuses_to_display_tag_ids
         }
         
         self._storage_cache_is_dirty = True
@@ -1548,7 +1716,87 @@ class TagsManager( object ):
         self._lock = threading.Lock()
         
     
-    def _GetServiceKeysToStatusesToTags( self, tag_display_type ):
+    def _ConvertTagsToTagIds( self, service_keys_to_statuses_to_tags, service_keys_to_statuses_to_shareable_tag_ids = None ):
+        
+        tag_id_table = TagIdTable.instance()
+        
+        if service_keys_to_statuses_to_shareable_tag_ids is None:
+            
+            service_keys_to_statuses_to_shareable_tag_ids = {}
+            
+        
+        service_keys_to_statuses_to_tag_ids = {}
+        
+        for ( service_key, statuses_to_tags ) in service_keys_to_statuses_to_tags.items():
+            
+            if service_key == CC.COMBINED_TAG_SERVICE_KEY:
+                
+                continue
+                
+            
+            statuses_to_shareable_tag_ids = service_keys_to_statuses_to_shareable_tag_ids.get( service_key, {} )
+            
+            statuses_to_tag_ids = {}
+            
+            for ( status, tags ) in statuses_to_tags.items():
+                
+                if len( tags ) == 0:
+                    
+                    continue
+                    
+                
+                tag_ids = tag_id_table.GetTagIds( tags )
+                
+                if status in statuses_to_shareable_tag_ids and statuses_to_shareable_tag_ids[ status ] == tag_ids:
+                    
+                    tag_ids = statuses_to_shareable_tag_ids[ status ]
+                    
+                
+                statuses_to_tag_ids[ status ] = tag_ids
+                
+            
+            service_keys_to_statuses_to_tag_ids[ service_key ] = statuses_to_tag_ids
+            
+        
+        return service_keys_to_statuses_to_tag_ids
+        
+    
+    def _GetCombinedStatusesToTagIds( self, service_keys_to_statuses_to_tag_ids ):
+        
+        statuses_to_lists_of_tag_ids = collections.defaultdict( list )
+        
+        for ( service_key, statuses_to_tag_ids ) in service_keys_to_statuses_to_tag_ids.items():
+            
+            if service_key == CC.COMBINED_TAG_SERVICE_KEY:
+                
+                continue
+                
+            
+            for ( status, tag_ids ) in statuses_to_tag_ids.items():
+                
+                statuses_to_lists_of_tag_ids[ status ].append( tag_ids )
+                
+            
+        
+        combined_statuses_to_tag_ids = {}
+        
+        for ( status, lists_of_tag_ids ) in statuses_to_lists_of_tag_ids.items():
+            
+            if len( lists_of_tag_ids ) == 1:
+                
+                # only one service has this status, so we can share its array
+                combined_statuses_to_tag_ids[ status ] = lists_of_tag_ids[0]
+                
+            else:
+                
+                combined_statuses_to_tag_ids[ status ] = ConvertTagIdsToTagIdArray( set( itertools.chain.from_iterable( lists_of_tag_ids ) ) )
+                
+            
+        
+        return combined_statuses_to_tag_ids
+        
+    
+    def _GetServiceKeysToStatusesToTagIds( self, tag_display_type ):
         
         # this gets called a lot, so we are hardcoding some gubbins to avoid too many method calls
         
@@ -1570,31 +1818,77 @@ class TagsManager( object ):
             self._RecalcDisplayFilteredCache( ClientTags.TAG_DISPLAY_SINGLE_MEDIA )
             
         
-        return self._tag_display_types_to_service_keys_to_statuses_to_tags[ tag_display_type ]
+        return self._tag_display_types_to_service_keys_to_statuses_to_tag_ids[ tag_display_type ]
         
     
-    def _RecalcStorageCache( self ):
+    def _GetStatusesToTagIds( self, service_key, tag_display_type ):
         
-        service_keys_to_statuses_to_tags = self._tag_display_types_to_service_keys_to_statuses_to_tags[ ClientTags.TAG_DISPLAY_STORAGE ]
+        service_keys_to_statuses_to_tag_ids = self._GetServiceKeysToStatusesToTagIds( tag_display_type )
         
-        # just combined service merge calculation
+        return service_keys_to_statuses_to_tag_ids.get( service_key, {} )
+        
+    
+    def _GetStatusesToTagIdSets( self, service_key, tag_display_type ):
+        
+        # a mutable copy for editing. write it back with _SetStatusesToTagIdSets
+        
+        statuses_to_tag_ids = self._GetStatusesToTagIds( service_key, tag_display_type )
+        
+        return collections.defaultdict( set, { status : set( tag_ids ) for ( status, tag_ids ) in statuses_to_tag_ids.items() } )
         
-        combined_statuses_to_tags = HydrusData.default_dict_set()
+    
+    def _GetStatusesToTags( self, service_key, tag_display_type ):
+        
+        tag_id_table = TagIdTable.instance()
         
-        for ( service_key, source_statuses_to_tags ) in service_keys_to_statuses_to_tags.items():
+        statuses_to_tags = HydrusData.default_dict_set()
+        
+        for ( status, tag_ids ) in self._GetStatusesToTagIds( service_key, tag_display_type ).items():
             
-            if service_key == CC.COMBINED_TAG_SERVICE_KEY:
-                
-                continue
-                
+            statuses_to_tags[ status ] = tag_id_table.GetTags( tag_ids )
+            
+        
+        return statuses_to_tags
+        
+    
+    def _GetTags( self, service_key, tag_display_type, statuses ):
+        
+        tag_id_table = TagIdTable.instance()
+        
+        statuses_to_tag_ids = self._GetStatusesToTagIds( service_key, tag_display_type )
+        
+        if len( statuses ) == 1:
+            
+            ( status, ) = statuses
+            
+            return tag_id_table.GetTags( statuses_to_tag_ids.get( status, EMPTY_TAG_ID_ARRAY ) )
             
-            for ( status, tags ) in source_statuses_to_tags.items():
+        
+        return tag_id_table.GetTags( itertools.chain.from_iterable( ( statuses_to_tag_ids.get( status, EMPTY_TAG_ID_ARRAY ) for status in statuses ) ) )
+        
+    
+    def _HasTagId( self, tag_id, tag_display_type ):
+        
+        combined_statuses_to_tag_ids = self._GetStatusesToTagIds( CC.COMBINED_TAG_SERVICE_KEY, tag_display_type )
+        
+        for status in ( HC.CONTENT_STATUS_CURRENT, HC.CONTENT_STATUS_PENDING ):
+            
+            if status in combined_statuses_to_tag_ids and TagIdArrayHasTagId( combined_statuses_to_tag_ids[ status ], tag_id ):
                 
-                combined_statuses_to_tags[ status ].update( tags )
+                return True
                 
             
         
-        service_keys_to_statuses_to_tags[ CC.COMBINED_TAG_SERVICE_KEY ] = combined_statuses_to_tags
+        return False
+        
+    
+    def _RecalcStorageCache( self ):
+        
+        service_keys_to_statuses_to_tag_ids = self._tag_display_types_to_service_keys_to_statuses_to_tag_ids[ ClientTags.TAG_DISPLAY_STORAGE ]
+        
+        # just combined service merge calculation
+        
+        service_keys_to_statuses_to_tag_ids[ CC.COMBINED_TAG_SERVICE_KEY ] = self._GetCombinedStatusesToTagIds( service_keys_to_statuses_to_tag_ids )
         
         #
         
@@ -1610,41 +1904,36 @@ class TagsManager( object ):
         
         # display tags don't have petitioned or deleted, so we just copy from storage
         
-        source_service_keys_to_statuses_to_tags = self._tag_display_types_to_service_keys_to_statuses_to_tags[ ClientTags.TAG_DISPLAY_STORAGE ]
-        
-        destination_service_keys_to_statuses_to_tags = self._tag_display_types_to_service_keys_to_statuses_to_tags[ ClientTags.TAG_DISPLAY_DISPLAY_ACTUAL ]
+        source_service_keys_to_statuses_to_tag_ids = self._tag_display_types_to_service_keys_to_statuses_to_tag_ids[ ClientTags.TAG_DISPLAY_STORAGE ]
         
-        combined_statuses_to_tags = HydrusData.default_dict_set()
+        destination_service_keys_to_statuses_to_tag_ids = self._tag_display_types_to_service_keys_to_statuses_to_tag_ids[ ClientTags.TAG_DISPLAY_DISPLAY_ACTUAL ]
         
-        for ( service_key, source_statuses_to_tags ) in source_service_keys_to_statuses_to_tags.items():
+        for ( service_key, source_statuses_to_tag_ids ) in source_service_keys_to_statuses_to_tag_ids.items():
             
             if service_key == CC.COMBINED_TAG_SERVICE_KEY:
                 
                 continue
                 
             
-            destination_statuses_to_tags = destination_service_keys_to_statuses_to_tags[ service_key ]
+            destination_statuses_to_tag_ids = destination_service_keys_to_statuses_to_tag_ids.setdefault( service_key, {} )
             
             for status in ( HC.CONTENT_STATUS_DELETED, HC.CONTENT_STATUS_PETITIONED ):
                 
-                if status in destination_statuses_to_tags:
+                if status in destination_statuses_to_tag_ids:
                     
-                    del destination_statuses_to_tags[ status ]
+                    del destination_statuses_to_tag_ids[ status ]
                     
                 
-                if status in source_statuses_to_tags:
+                if status in source_statuses_to_tag_ids:
                     
-                    destination_statuses_to_tags[ status ] = set( source_statuses_to_tags[ status ] )
+                    destination_statuses_to_tag_ids[ status ] = source_statuses_to_tag_ids[ status ]
                     
                 
             
-            for ( status, tags ) in destination_statuses_to_tags.items():
-                
-                combined_statuses_to_tags[ status ].update( tags )
-                
-            
         
-        destination_service_keys_to_statuses_to_tags[ CC.COMBINED_TAG_SERVICE_KEY ] = combined_statuses_to_tags
+        # as before, the combined display only covers services that have storage tags
+        
+        destination_service_keys_to_statuses_to_tag_ids[ CC.COMBINED_TAG_SERVICE_KEY ] = self._GetCombinedStatusesToTagIds( { service_key : destination_service_keys_to_statuses_to_tag_ids[ service_key ] for service_key in source_service_keys_to_statuses_to_tag_ids.keys() if service_key != CC.COMBINED_TAG_SERVICE_KEY } )
         
         #
         
@@ -1662,13 +1951,13 @@ class TagsManager( object ):
         
         tag_display_manager = CG.client_controller.tag_display_manager
         
-        source_service_keys_to_statuses_to_tags = self._tag_display_types_to_service_keys_to_statuses_to_tags[ ClientTags.TAG_DISPLAY_DISPLAY_ACTUAL ]
+        tag_id_table = TagIdTable.instance()
         
-        destination_service_keys_to_statuses_to_tags = collections.defaultdict( HydrusData.default_dict_set )
+        source_service_keys_to_statuses_to_tag_ids = self._tag_display_types_to_service_keys_to_statuses_to_tag_ids[ ClientTags.TAG_DISPLAY_DISPLAY_ACTUAL ]
         
-        combined_statuses_to_tags = HydrusData.default_dict_set()
+        destination_service_keys_to_statuses_to_tag_ids = {}
         
-        for ( service_key, source_statuses_to_tags ) in source_service_keys_to_statuses_to_tags.items():
+        for ( service_key, source_statuses_to_tag_ids ) in source_service_keys_to_statuses_to_tag_ids.items():
             
             if service_key == CC.COMBINED_TAG_SERVICE_KEY:
                 
@@ -1677,9 +1966,11 @@ class TagsManager( object ):
             
             if tag_display_manager.FiltersTags( tag_display_type, service_key ):
                 
-                destination_statuses_to_tags = HydrusData.default_dict_set()
+                destination_statuses_to_tag_ids = {}
                 
-                for ( status, source_tags ) in source_statuses_to_tags.items():
+                for ( status, source_tag_ids ) in source_statuses_to_tag_ids.items():
+                    
+                    source_tags = tag_id_table.GetTags( source_tag_ids )
                     
                     dest_tags = tag_display_manager.FilterTags( tag_display_type, service_key, source_tags )
                     
@@ -1687,31 +1978,26 @@ class TagsManager( object ):
                         
                         if len( dest_tags ) > 0:
                             
-                            destination_statuses_to_tags[ status ] = dest_tags
+                            destination_statuses_to_tag_ids[ status ] = tag_id_table.GetTagIds( dest_tags )
                             
                         
                     else:
                         
-                        destination_statuses_to_tags[ status ] = source_tags
+                        destination_statuses_to_tag_ids[ status ] = source_tag_ids
                         
                     
                 
             else:
                 
-                destination_statuses_to_tags = source_statuses_to_tags
+                destination_statuses_to_tag_ids = source_statuses_to_tag_ids
                 
             
-            destination_service_keys_to_statuses_to_tags[ service_key ] = destination_statuses_to_tags
-            
-            for ( status, tags ) in destination_statuses_to_tags.items():
-                
-                combined_statuses_to_tags[ status ].update( tags )
-                
+            destination_service_keys_to_statuses_to_tag_ids[ service_key ] = destination_statuses_to_tag_ids
             
         
-        destination_service_keys_to_statuses_to_tags[ CC.COMBINED_TAG_SERVICE_KEY ] = combined_statuses_to_tags
+        destination_service_keys_to_statuses_to_tag_ids[ CC.COMBINED_TAG_SERVICE_KEY ] = self._GetCombinedStatusesToTagIds( destination_service_keys_to_statuses_to_tag_ids )
         
-        self._tag_display_types_to_service_keys_to_statuses_to_tags[ tag_display_type ] = destination_service_keys_to_statuses_to_tags
+        self._tag_display_types_to_service_keys_to_statuses_to_tag_ids[ tag_display_type ] = destination_service_keys_to_statuses_to_tag_ids
         
         #
         
@@ -1733,50 +2019,39 @@ class TagsManager( object ):
         self._selection_list_cache_is_dirty = True
         
     
-    @staticmethod
-    def MergeTagsManagers( tags_managers ):
-        
-        # we cheat here and just get display tags, since this is read only and storage exacts isn't super important
-        
-        def CurrentAndPendingFilter( items ):
-            
-            for ( service_key, statuses_to_tags ) in items:
-                
-                filtered = { status : tags for ( status, tags ) in list(statuses_to_tags.items()) if status in ( HC.CONTENT_STATUS_CURRENT, HC.CONTENT_STATUS_PENDING ) }
-                
-                yield ( service_key, filtered )
-                
-            
+    def _SetStatusesToTagIdSets( self, service_key, tag_display_type, statuses_to_tag_id_sets ):
         
-        # [[( service_key, statuses_to_tags )]]
-        s_k_s_t_t_tupled = ( CurrentAndPendingFilter( tags_manager.GetServiceKeysToStatusesToTags( ClientTags.TAG_DISPLAY_DISPLAY_ACTUAL ).items() ) for tags_manager in tags_managers )
+        service_keys_to_statuses_to_tag_ids = self._tag_display_types_to_service_keys_to_statuses_to_tag_ids[ tag_display_type ]
         
-        # [(service_key, statuses_to_tags)]
-        flattened_s_k_s_t_t = itertools.chain.from_iterable( s_k_s_t_t_tupled )
+        service_keys_to_statuses_to_tag_ids[ service_key ] = { status : ConvertTagIdsToTagIdArray( tag_ids ) for ( status, tag_ids ) in statuses_to_tag_id_sets.items() if len( tag_ids ) > 0 }
         
-        # service_key : [ statuses_to_tags ]
-        s_k_s_t_t_dict = HydrusData.BuildKeyToListDict( flattened_s_k_s_t_t )
+    
+    @staticmethod
+    def MergeTagsManagers( tags_managers ):
         
-        # now let's merge so we have service_key : statuses_to_tags
+        # we cheat here and just get display tags, since this is read only and storage exacts isn't super important
         
         merged_service_keys_to_statuses_to_tags = collections.defaultdict( HydrusData.default_dict_set )
         
-        for ( service_key, several_statuses_to_tags ) in list(s_k_s_t_t_dict.items()):
-            
-            # [[( status, tags )]]
-            s_t_t_tupled = ( list(s_t_t.items()) for s_t_t in several_statuses_to_tags )
-            
-            # [( status, tags )]
-            flattened_s_t_t = itertools.chain.from_iterable( s_t_t_tupled )
+        for tags_manager in tags_managers:
             
-            statuses_to_tags = HydrusData.default_dict_set()
-            
-            for ( status, tags ) in flattened_s_t_t:
+            for ( service_key, statuses_to_tags ) in tags_manager.GetServiceKeysToStatusesToTags( ClientTags.TAG_DISPLAY_DISPLAY_ACTUAL ).items():
                 
-                statuses_to_tags[ status ].update( tags )
+                if service_key == CC.COMBINED_TAG_SERVICE_KEY:
+                    
+                    continue
+                    
+                
+                merged_statuses_to_tags = merged_service_keys_to_statuses_to_tags[ service_key ]
+                
+                for status in ( HC.CONTENT_STATUS_CURRENT, HC.CONTENT_STATUS_PENDING ):
+                    
+                    if status in statuses_to_tags:
+                        
+                        merged_statuses_to_tags[ status ].update( statuses_to_tags[ status ] )
+                        
+                    
                 
-            
-            merged_service_keys_to_statuses_to_tags[ service_key ] = statuses_to_tags
             
         
         return TagsManager( merged_service_keys_to_statuses_to_tags, merged_service_keys_to_statuses_to_tags )
@@ -1786,14 +2061,16 @@ class TagsManager( object ):
         
         with self._lock:
             
-            service_keys_to_statuses_to_tags = self._GetServiceKeysToStatusesToTags( ClientTags.TAG_DISPLAY_STORAGE )
+            statuses_to_tag_ids = self._GetStatusesToTagIds( service_key, ClientTags.TAG_DISPLAY_STORAGE )
             
-            statuses_to_tags = service_keys_to_statuses_to_tags[ service_key ]
-            
-            if len( statuses_to_tags[ HC.CONTENT_STATUS_PENDING ] ) + len( statuses_to_tags[ HC.CONTENT_STATUS_PETITIONED ] ) > 0:
+            if HC.CONTENT_STATUS_PENDING in statuses_to_tag_ids or HC.CONTENT_STATUS_PETITIONED in statuses_to_tag_ids:
+                
+                statuses_to_tag_id_sets = self._GetStatusesToTagIdSets( service_key, ClientTags.TAG_DISPLAY_STORAGE )
                 
-                statuses_to_tags[ HC.CONTENT_STATUS_PENDING ] = set()
-                statuses_to_tags[ HC.CONTENT_STATUS_PETITIONED ] = set()
+                statuses_to_tag_id_sets[ HC.CONTENT_STATUS_PENDING ] = set()
+                statuses_to_tag_id_sets[ HC.CONTENT_STATUS_PETITIONED ] = set()
+                
+                self._SetStatusesToTagIdSets( service_key, ClientTags.TAG_DISPLAY_STORAGE, statuses_to_tag_id_sets )
                 
                 self._SetDirty()
                 
@@ -1806,28 +2083,19 @@ class TagsManager( object ):
             
             dupe_tags_manager = TagsManager( {}, {} )
             
-            dupe_tag_display_types_to_service_keys_to_statuses_to_tags = dict()
+            # the arrays are never edited in place, so we only need to copy the dicts that hold them
             
-            for ( tag_display_type, service_keys_to_statuses_to_tags ) in self._tag_display_types_to_service_keys_to_statuses_to_tags.items():
-                
-                dupe_service_keys_to_statuses_to_tags = collections.defaultdict( HydrusData.default_dict_set )
+            dupe_tag_display_types_to_service_keys_to_statuses_to_tag_ids = dict()
+            
+            for tag_display_type in ( ClientTags.TAG_DISPLAY_STORAGE, ClientTags.TAG_DISPLAY_DISPLAY_ACTUAL ):
                 
-                for ( service_key, statuses_to_tags ) in service_keys_to_statuses_to_tags.items():
-                    
-                    dupe_statuses_to_tags = HydrusData.default_dict_set()
-                    
-                    for ( status, tags ) in statuses_to_tags.items():
-                        
-                        dupe_statuses_to_tags[ status ] = set( tags )
-                        
-                    
-                    dupe_service_keys_to_statuses_to_tags[ service_key ] = dupe_statuses_to_tags
-                    
+                service_keys_to_statuses_to_tag_ids = self._tag_display_types_to_service_keys_to_statuses_to_tag_ids[ tag_display_type ]
                 
-                dupe_tag_display_types_to_service_keys_to_statuses_to_tags[ tag_display_type ] = dupe_service_keys_to_statuses_to_tags
+                dupe_tag_display_types_to_service_keys_to_statuses_to_tag_ids[ tag_display_type ] = { service_key : dict( statuses_to_tag_ids ) for ( service_key, statuses_to_tag_ids ) in service_keys_to_statuses_to_tag_ids.items() }
                 
             
-            dupe_tags_manager._tag_display_types_to_service_keys_to_statuses_to_tags = dupe_tag_display_types_to_service_keys_to_statuses_to_tags
+            dupe_tags_manager._tag_display_types_to_service_keys_to_statuses_to_tag_ids = dupe_tag_display_types_to_service_keys_to_statuses_to_tag_ids
+            dupe_tags_manager._storage_cache_is_dirty = self._storage_cache_is_dirty
             dupe_tags_manager._display_cache_is_dirty = self._display_cache_is_dirty
             
             return dupe_tags_manager
@@ -1838,11 +2106,7 @@ class TagsManager( object ):
         
         with self._lock:
             
-            service_keys_to_statuses_to_tags = self._GetServiceKeysToStatusesToTags( tag_display_type )
-            
-            statuses_to_tags = service_keys_to_statuses_to_tags[ service_key ]
-            
-            combined_tags = statuses_to_tags[ HC.CONTENT_STATUS_CURRENT ].union( statuses_to_tags[ HC.CONTENT_STATUS_PENDING ] )
+            combined_tags = self._GetTags( service_key, tag_display_type, ( HC.CONTENT_STATUS_CURRENT, HC.CONTENT_STATUS_PENDING ) )
             
             pairs = [ HydrusTags.SplitTag( tag ) for tag in combined_tags ]
             
@@ -1864,11 +2128,7 @@ class TagsManager( object ):
         
         with self._lock:
             
-            service_keys_to_statuses_to_tags = self._GetServiceKeysToStatusesToTags( tag_display_type )
-            
-            statuses_to_tags = service_keys_to_statuses_to_tags[ service_key ]
-            
-            return statuses_to_tags[ HC.CONTENT_STATUS_CURRENT ]
+            return self._GetTags( service_key, tag_display_type, ( HC.CONTENT_STATUS_CURRENT, ) )
             
         
     
@@ -1876,11 +2136,7 @@ class TagsManager( object ):
         
         with self._lock:
             
-            service_keys_to_statuses_to_tags = self._GetServiceKeysToStatusesToTags( tag_display_type )
-            
-            statuses_to_tags = service_keys_to_statuses_to_tags[ service_key ]
-            
-            return statuses_to_tags[ HC.CONTENT_STATUS_CURRENT ].union( statuses_to_tags[ HC.CONTENT_STATUS_PENDING ] )
+            return self._GetTags( service_key, tag_display_type, ( HC.CONTENT_STATUS_CURRENT, HC.CONTENT_STATUS_PENDING ) )
             
         
     
@@ -1888,11 +2144,7 @@ class TagsManager( object ):
         
         with self._lock:
             
-            service_keys_to_statuses_to_tags = self._GetServiceKeysToStatusesToTags( tag_display_type )
-            
-            statuses_to_tags = service_keys_to_statuses_to_tags[ service_key ]
-            
-            return statuses_to_tags[ HC.CONTENT_STATUS_DELETED ]
+            return self._GetTags( service_key, tag_display_type, ( HC.CONTENT_STATUS_DELETED, ) )
             
         
     
@@ -1900,11 +2152,7 @@ class TagsManager( object ):
         
         with self._lock:
             
-            service_keys_to_statuses_to_tags = self._GetServiceKeysToStatusesToTags( tag_display_type )
-            
-            statuses_to_tags = service_keys_to_statuses_to_tags[ service_key ]
-            
-            combined_tags = statuses_to_tags[ HC.CONTENT_STATUS_CURRENT ].union( statuses_to_tags[ HC.CONTENT_STATUS_PENDING ] )
+            combined_tags = self._GetTags( service_key, tag_display_type, ( HC.CONTENT_STATUS_CURRENT, HC.CONTENT_STATUS_PENDING ) )
             
             namespaces_with_colons = [ '{}:'.format( namespace ) for namespace in namespaces ]
             
@@ -1920,12 +2168,10 @@ class TagsManager( object ):
             
             num_tags = 0
             
-            service_keys_to_statuses_to_tags = self._GetServiceKeysToStatusesToTags( tag_display_type )
-            
-            statuses_to_tags = service_keys_to_statuses_to_tags[ tag_context.service_key ]
+            statuses_to_tag_ids = self._GetStatusesToTagIds( tag_context.service_key, tag_display_type )
             
-            if tag_context.include_current_tags: num_tags += len( statuses_to_tags[ HC.CONTENT_STATUS_CURRENT ] )
-            if tag_context.include_pending_tags: num_tags += len( statuses_to_tags[ HC.CONTENT_STATUS_PENDING ] )
+            if tag_context.include_current_tags: num_tags += len( statuses_to_tag_ids.get( HC.CONTENT_STATUS_CURRENT, EMPTY_TAG_ID_ARRAY ) )
+            if tag_context.include_pending_tags: num_tags += len( statuses_to_tag_ids.get( HC.CONTENT_STATUS_PENDING, EMPTY_TAG_ID_ARRAY ) )
             
             return num_tags
             
@@ -1935,11 +2181,7 @@ class TagsManager( object ):
         
         with self._lock:
             
-            service_keys_to_statuses_to_tags = self._GetServiceKeysToStatusesToTags( tag_display_type )
-            
-            statuses_to_tags = service_keys_to_statuses_to_tags[ service_key ]
-            
-            return statuses_to_tags[ HC.CONTENT_STATUS_PENDING ]
+            return self._GetTags( service_key, tag_display_type, ( HC.CONTENT_STATUS_PENDING, ) )
             
         
     
@@ -1947,11 +2189,7 @@ class TagsManager( object ):
         
         with self._lock:
             
-            service_keys_to_statuses_to_tags = self._GetServiceKeysToStatusesToTags( tag_display_type )
-            
-            statuses_to_tags = service_keys_to_statuses_to_tags[ service_key ]
-            
-            return statuses_to_tags[ HC.CONTENT_STATUS_PETITIONED ]
+            return self._GetTags( service_key, tag_display_type, ( HC.CONTENT_STATUS_PETITIONED, ) )
             
         
     
@@ -1959,7 +2197,12 @@ class TagsManager( object ):
         
         with self._lock:
             
-            service_keys_to_statuses_to_tags = self._GetServiceKeysToStatusesToTags( tag_display_type )
+            service_keys_to_statuses_to_tags = collections.defaultdict( HydrusData.default_dict_set )
+            
+            for service_key in list( self._GetServiceKeysToStatusesToTagIds( tag_display_type ).keys() ):
+                
+                service_keys_to_statuses_to_tags[ service_key ] = self._GetStatusesToTags( service_key, tag_display_type )
+                
             
             return service_keys_to_statuses_to_tags
             
@@ -1969,16 +2212,7 @@ class TagsManager( object ):
         
         with self._lock:
             
-            service_keys_to_statuses_to_tags = self._GetServiceKeysToStatusesToTags( tag_display_type )
-            
-            if service_key in service_keys_to_statuses_to_tags:
-                
-                return service_keys_to_statuses_to_tags[ service_key ]
-                
-            else:
-                
-                return collections.defaultdict( set )
-                
+            return self._GetStatusesToTags( service_key, tag_display_type )
             
         
     
@@ -1986,11 +2220,14 @@ class TagsManager( object ):
         
         with self._lock:
             
-            service_keys_to_statuses_to_tags = self._GetServiceKeysToStatusesToTags( tag_display_type )
+            tag_id = TagIdTable.instance().GetTagIdIfExists( tag )
             
-            combined_statuses_to_tags = service_keys_to_statuses_to_tags[ CC.COMBINED_TAG_SERVICE_KEY ]
+            if tag_id is None:
+                
+                return False
+                
             
-            return tag in combined_statuses_to_tags[ HC.CONTENT_STATUS_CURRENT ] or tag in combined_statuses_to_tags[ HC.CONTENT_STATUS_PENDING ]
+            return self._HasTagId( tag_id, tag_display_type )
             
         
     
@@ -1998,11 +2235,19 @@ class TagsManager( object ):
         
         with self._lock:
             
-            service_keys_to_statuses_to_tags = self._GetServiceKeysToStatusesToTags( tag_display_type )
+            tag_id_table = TagIdTable.instance()
             
-            combined_statuses_to_tags = service_keys_to_statuses_to_tags[ CC.COMBINED_TAG_SERVICE_KEY ]
+            for tag in tags:
+                
+                tag_id = tag_id_table.GetTagIdIfExists( tag )
+                
+                if tag_id is not None and self._HasTagId( tag_id, tag_display_type ):
+                    
+                    return True
+                    
+                
             
-            return True in ( tag in combined_statuses_to_tags[ HC.CONTENT_STATUS_CURRENT ] or tag in combined_statuses_to_tags[ HC.CONTENT_STATUS_PENDING ] for tag in tags )
+            return False
             
         
     
@@ -2018,98 +2263,96 @@ class TagsManager( object ):
         
         with self._lock:
             
-            service_keys_to_statuses_to_tags = self._GetServiceKeysToStatusesToTags( ClientTags.TAG_DISPLAY_STORAGE )
-            
-            statuses_to_tags = service_keys_to_statuses_to_tags[ service_key ]
-            
             ( data_type, action, row ) = content_update.ToTuple()
             
             ( tag, hashes ) = row
             
+            tag_id = TagIdTable.instance().GetTagId( tag )
+            
+            statuses_to_tag_ids = self._GetStatusesToTagIdSets( service_key, ClientTags.TAG_DISPLAY_STORAGE )
+            
             if action == HC.CONTENT_UPDATE_ADD:
                 
-                statuses_to_tags[ HC.CONTENT_STATUS_CURRENT ].add( tag )
+                statuses_to_tag_ids[ HC.CONTENT_STATUS_CURRENT ].add( tag_id )
                 
-                statuses_to_tags[ HC.CONTENT_STATUS_DELETED ].discard( tag )
-                statuses_to_tags[ HC.CONTENT_STATUS_PENDING ].discard( tag )
+                statuses_to_tag_ids[ HC.CONTENT_STATUS_DELETED ].discard( tag_id )
+                statuses_to_tag_ids[ HC.CONTENT_STATUS_PENDING ].discard( tag_id )
                 
             elif action == HC.CONTENT_UPDATE_DELETE:
                 
-                statuses_to_tags[ HC.CONTENT_STATUS_DELETED ].add( tag )
+                statuses_to_tag_ids[ HC.CONTENT_STATUS_DELETED ].add( tag_id )
                 
-                statuses_to_tags[ HC.CONTENT_STATUS_CURRENT ].discard( tag )
-                statuses_to_tags[ HC.CONTENT_STATUS_PETITIONED ].discard( tag )
+                statuses_to_tag_ids[ HC.CONTENT_STATUS_CURRENT ].discard( tag_id )
+                statuses_to_tag_ids[ HC.CONTENT_STATUS_PETITIONED ].discard( tag_id )
                 
             elif action == HC.CONTENT_UPDATE_PEND:
                 
-                if tag not in statuses_to_tags[ HC.CONTENT_STATUS_CURRENT ] and tag not in statuses_to_tags[ HC.CONTENT_STATUS_PETITIONED ]:
+                if tag_id not in statuses_to_tag_ids[ HC.CONTENT_STATUS_CURRENT ] and tag_id not in statuses_to_tag_ids[ HC.CONTENT_STATUS_PETITIONED ]:
                     
-                    statuses_to_tags[ HC.CONTENT_STATUS_PENDING ].add( tag )
+                    statuses_to_tag_ids[ HC.CONTENT_STATUS_PENDING ].add( tag_id )
                     
                 
             elif action == HC.CONTENT_UPDATE_RESCIND_PEND:
                 
-                statuses_to_tags[ HC.CONTENT_STATUS_PENDING ].discard( tag )
+                statuses_to_tag_ids[ HC.CONTENT_STATUS_PENDING ].discard( tag_id )
                 
             elif action == HC.CONTENT_UPDATE_PETITION:
                 
-                if tag not in statuses_to_tags[ HC.CONTENT_STATUS_PENDING ]:
+                if tag_id not in statuses_to_tag_ids[ HC.CONTENT_STATUS_PENDING ]:
                     
-                    statuses_to_tags[ HC.CONTENT_STATUS_PETITIONED ].add( tag )
+                    statuses_to_tag_ids[ HC.CONTENT_STATUS_PETITIONED ].add( tag_id )
                     
                 
             elif action == HC.CONTENT_UPDATE_RESCIND_PETITION:
                 
-                statuses_to_tags[ HC.CONTENT_STATUS_PETITIONED ].discard( tag )
+                statuses_to_tag_ids[ HC.CONTENT_STATUS_PETITIONED ].discard( tag_id )
                 
             elif action == HC.CONTENT_UPDATE_CLEAR_DELETE_RECORD:
                 
-                statuses_to_tags[ HC.CONTENT_STATUS_DELETED ].discard( tag )
+                statuses_to_tag_ids[ HC.CONTENT_STATUS_DELETED ].discard( tag_id )
                 
             
+            self._SetStatusesToTagIdSets( service_key, ClientTags.TAG_DISPLAY_STORAGE, statuses_to_tag_ids )
+            
             #
             
             # this does not need to do clever sibling collapse or parent gubbins, because in that case, the db forces tagsmanager refresh
             # so this is just handling things if the content update has no sibling/parent tags
             
-            service_keys_to_statuses_to_tags = self._GetServiceKeysToStatusesToTags( ClientTags.TAG_DISPLAY_DISPLAY_ACTUAL )
-            
-            statuses_to_tags = service_keys_to_statuses_to_tags[ service_key ]
-            
-            ( data_type, action, row ) = content_update.ToTuple()
-            
-            ( tag, hashes ) = row
+            statuses_to_tag_ids = self._GetStatusesToTagIdSets( service_key, ClientTags.TAG_DISPLAY_DISPLAY_ACTUAL )
             
             if action == HC.CONTENT_UPDATE_ADD:
                 
-                statuses_to_tags[ HC.CONTENT_STATUS_CURRENT ].add( tag )
+                statuses_to_tag_ids[ HC.CONTENT_STATUS_CURRENT ].add( tag_id )
                 
-                statuses_to_tags[ HC.CONTENT_STATUS_DELETED ].discard( tag )
-                statuses_to_tags[ HC.CONTENT_STATUS_PENDING ].discard( tag )
+                statuses_to_tag_ids[ HC.CONTENT_STATUS_DELETED ].discard( tag_id )
+                statuses_to_tag_ids[ HC.CONTENT_STATUS_PENDING ].discard( tag_id )
                 
             elif action == HC.CONTENT_UPDATE_DELETE:
                 
-                statuses_to_tags[ HC.CONTENT_STATUS_DELETED ].add( tag )
+                statuses_to_tag_ids[ HC.CONTENT_STATUS_DELETED ].add( tag_id )
                 
-                statuses_to_tags[ HC.CONTENT_STATUS_CURRENT ].discard( tag )
-                statuses_to_tags[ HC.CONTENT_STATUS_PETITIONED ].discard( tag )
+                statuses_to_tag_ids[ HC.CONTENT_STATUS_CURRENT ].discard( tag_id )
+                statuses_to_tag_ids[ HC.CONTENT_STATUS_PETITIONED ].discard( tag_id )
                 
             elif action == HC.CONTENT_UPDATE_PEND:
                 
-                if tag not in statuses_to_tags[ HC.CONTENT_STATUS_CURRENT ]:
+                if tag_id not in statuses_to_tag_ids[ HC.CONTENT_STATUS_CURRENT ]:
                     
-                    statuses_to_tags[ HC.CONTENT_STATUS_PENDING ].add( tag )
+                    statuses_to_tag_ids[ HC.CONTENT_STATUS_PENDING ].add( tag_id )
                     
                 
             elif action == HC.CONTENT_UPDATE_RESCIND_PEND:
                 
-                statuses_to_tags[ HC.CONTENT_STATUS_PENDING ].discard( tag )
+                statuses_to_tag_ids[ HC.CONTENT_STATUS_PENDING ].discard( tag_id )
                 
             elif action == HC.CONTENT_UPDATE_CLEAR_DELETE_RECORD:
                 
-                statuses_to_tags[ HC.CONTENT_STATUS_DELETED ].discard( tag )
+                statuses_to_tag_ids[ HC.CONTENT_STATUS_DELETED ].discard( tag_id )
                 
             
+            self._SetStatusesToTagIdSets( service_key, ClientTags.TAG_DISPLAY_DISPLAY_ACTUAL, statuses_to_tag_ids )
+            
             #
             
             self._SetDirty()
@@ -2120,14 +2363,32 @@ class TagsManager( object ):
         
         with self._lock:
             
-            service_keys_to_statuses_to_tags = self._GetServiceKeysToStatusesToTags( ClientTags.TAG_DISPLAY_STORAGE )
+            service_keys_to_statuses_to_tag_ids = self._GetServiceKeysToStatusesToTagIds( ClientTags.TAG_DISPLAY_STORAGE )
             
-            if service_key in service_keys_to_statuses_to_tags:
+            if service_key in service_keys_to_statuses_to_tag_ids:
                 
-                del service_keys_to_statuses_to_tags[ service_key ]
+                del service_keys_to_statuses_to_tag_ids[ service_key ]
                 
                 self._SetDirty()
                 
             
         
     
+    @staticmethod
+    def STATICGenerateFromTagIds(
+        service_keys_to_statuses_to_storage_tag_ids: typing.Dict[ bytes, typing.Dict[ int, array.array ] ],
+        service_keys_to_statuses_to_display_tag_ids: typing.Dict[ bytes, typing.Dict[ int, array.array ] ]
+        ):
+        
+        # for bulk loaders that have already made sorted TagIdTable arrays. we take ownership of the dicts and do no conversion
+        
+        tags_manager = TagsManager( {}, {} )
+        
+        tags_manager._tag_display_types_to_service_keys_to_statuses_to_tag_ids = {
+            ClientTags.TAG_DISPLAY_STORAGE : service_keys_to_statuses_to_storage_tag_ids,
+            ClientTags.TAG_DISPLAY_DISPLAY_ACTUAL : service_keys_to_statuses_to_display_tag_ids
+        }
+        
+        return tags_manager
+        
+    
@@ -7,6 +7,18 @@ from hydrus.client.media import ClientMediaManagers
 
 class MediaResult( object ):
     
+    # the cache holds these by weakref
+    __slots__ = (
+        '_file_info_manager',
+        '_tags_manager',
+        '_times_manager',
+        '_locations_manager',
+        '_ratings_manager',
+        '_notes_manager',
+        '_file_viewing_stats_manager',
+        '__weakref__'
+    )
+    
     def __init__(
         self,
         file_info_manager: ClientMediaManagers.FileInfoManager,
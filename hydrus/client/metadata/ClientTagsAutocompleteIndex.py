@@ -0,0 +1,484 @@
+import array
+import bisect
+import heapq
+import re
+import typing
+
+# an in-memory prefix index over one tag/file domain's counts cache, for the first few autocomplete results
+# the counts cache and the fts4 subtag tables are always the truth. this is loaded from the counts cache and gets the same count deltas as it
+# a PTR domain has millions of tags, mostly with a count of one or two, so we only index the tags above a floor. the top results above that floor are exact
+
+# fts4's simple tokeniser splits on anything that isn't ascii alphanumeric or unicode, so we do the same to find our word starts
+re_fts4_word = re.compile( '[0-9a-z\u0080-\U0010ffff]+' )
+
+DEFAULT_TOP_K = 50
+
+# about a second to build, the first time a domain is searched
+MAX_INDEXED_TAGS = 100000
+
+# if a big sync pushes more unindexed tags up than this, it is cheaper to throw the index away and rebuild it when next asked
+MAX_TAG_IDS_TO_CHECK = 100000
+
+# a 'sam*' can match at any word of 'character:samus aran', so each tag gets a key per word start. long titles would explode, so we cap it
+MAX_WORD_STARTS = 8
+MAX_KEY_LENGTH = 64
+
+# the top-k cache is for the short prefixes that cover a lot of tags. longer prefixes are a small range and quick to scan
+MAX_CACHED_PREFIX_LENGTH = 6
+PRECOMPUTED_PREFIX_LENGTH = 2
+
+def ConvertSearchableSubtagToPrefixKey( searchable_subtag: str ) -> typing.Optional[ str ]:
+    
+    # 'samus ar' -> 'samus ar', 'samus_ar' -> 'samus ar'
+    
+    words = re_fts4_word.findall( searchable_subtag.lower() )
+    
+    if len( words ) == 0:
+        
+        return None
+        
+    
+    key = ' '.join( words )
+    
+    if len( key ) > MAX_KEY_LENGTH:
+        
+        return None
+        
+    
+    return key
+    
+
+def GenerateKeys( searchable_subtag: str ) -> typing.List[ str ]:
+    
+    words = re_fts4_word.findall( searchable_subtag.lower() )
+    
+    if len( words ) == 1:
+        
+        return [ words[0][ : MAX_KEY_LENGTH ] ]
+        
+    
+    keys = []
+    
+    for i in range( min( len( words ), MAX_WORD_STARTS ) ):
+        
+        key = ' '.join( words[ i : ] )[ : MAX_KEY_LENGTH ]
+        
+        if key not in keys:
+            
+            keys.append( key )
+            
+        
+    
+    return keys
+    
+
+class TagAutocompleteIndex( object ):
+    
+    def __init__( self, rows: typing.Optional[ typing.Iterable[ typing.Tuple[ int, int, str, int, int ] ] ] = None, min_rank = 1, top_k = DEFAULT_TOP_K ):
+        
+        # rows are ( tag_id, namespace_id, searchable_subtag, current_count, pending_count ) for every tag in the domain with current + pending >= min_rank
+        
+        self._min_rank = min_rank
+        self._top_k = top_k
+        
+        self._tag_ids_to_ranks = {}
+        self._tag_ids_to_namespace_ids = {}
+        self._tag_ids_to_keys = {}
+        
+        # a flattened trie: the keys sorted and bucketed by first character, so an insert only moves one bucket's worth of memory
+        self._first_characters_to_keys = {}
+        self._first_characters_to_tag_ids = {}
+        
+        # tags we don't index that have gone up. we only get deltas, so the owner looks up their real counts before the next lookup
+        self._tag_ids_to_check = set()
+        
+        # ( prefix, namespace_id or None ) -> [ top tag_ids by rank descending, whether that is every live tag in the range ]
+        self._prefixes_to_top_tag_ids = {}
+        
+        if rows is not None:
+            
+            first_characters_to_pairs = {}
+            
+            for ( tag_id, namespace_id, searchable_subtag, current_count, pending_count ) in rows:
+                
+                self._tag_ids_to_ranks[ tag_id ] = current_count + pending_count
+                self._tag_ids_to_namespace_ids[ tag_id ] = namespace_id
+                
+                keys = GenerateKeys( searchable_subtag )
+                
+                self._tag_ids_to_keys[ tag_id ] = keys
+                
+                for key in keys:
+                    
+                    if key[0] not in first_characters_to_pairs:
+                        
+                        first_characters_to_pairs[ key[0] ] = []
+                        
+                    
+                    first_characters_to_pairs[ key[0] ].append( ( key, tag_id ) )
+                    
+                
+            
+            for ( first_character, pairs ) in first_characters_to_pairs.items():
+                
+                pairs.sort()
+                
+                self._first_characters_to_keys[ first_character ] = [ key for ( key, tag_id ) in pairs ]
+                self._first_characters_to_tag_ids[ first_character ] = array.array( 'q', ( tag_id for ( key, tag_id ) in pairs ) )
+                
+            
+            self._PrecomputeShortPrefixes()
+            
+        
+    
+    def _ChangeRank( self, tag_id: int, new_rank: int ):
+        
+        old_rank = self._GetRank( tag_id )
+        
+        if new_rank <= 0:
+            
+            new_rank = 0
+            
+            if tag_id in self._tag_ids_to_ranks:
+                
+                # we keep the keys, so if it comes back we don't have to look its text up again
+                del self._tag_ids_to_ranks[ tag_id ]
+                
+            
+        else:
+            
+            self._tag_ids_to_ranks[ tag_id ] = new_rank
+            
+        
+        if new_rank != old_rank:
+            
+            self._UpdateCachedPrefixes( tag_id, old_rank, new_rank )
+            
+        
+    
+    def _GetCachedPrefixes( self, tag_id: int ):
+        
+        namespace_id = self._tag_ids_to_namespace_ids[ tag_id ]
+        
+        prefixes = set()
+        
+        for key in self._tag_ids_to_keys[ tag_id ]:
+            
+            for i in range( 1, min( len( key ), MAX_CACHED_PREFIX_LENGTH ) + 1 ):
+                
+                prefixes.add( key[ : i ] )
+                
+            
+        
+        for prefix in prefixes:
+            
+            for prefix_key in ( ( prefix, None ), ( prefix, namespace_id ) ):
+                
+                if prefix_key in self._prefixes_to_top_tag_ids:
+                    
+                    yield prefix_key
+                    
+                
+            
+        
+    
+    def _GetPrefixRange( self, keys: typing.List[ str ], prefix: str, lo = 0 ):
+        
+        start = bisect.bisect_left( keys, prefix, lo )
+        
+        last_character = ord( prefix[-1] )
+        
+        if last_character == 0x10ffff:
+            
+            end = len( keys )
+            
+        else:
+            
+            end = bisect.bisect_left( keys, prefix[ : -1 ] + chr( last_character + 1 ), start )
+            
+        
+        return ( start, end )
+        
+    
+    def _GetRank( self, tag_id: int ) -> int:
+        
+        return self._tag_ids_to_ranks.get( tag_id, 0 )
+        
+    
+    def _GetSortKey( self, tag_id: int ):
+        
+        # ties go to the lower tag_id, so the top lists are deterministic
+        
+        return ( self._GetRank( tag_id ), - tag_id )
+        
+    
+    def _GetTopTagIds( self, prefix: str, namespace_id: typing.Optional[ int ], n: int ) -> typing.List[ int ]:
+        
+        first_character = prefix[0]
+        
+        if first_character not in self._first_characters_to_keys:
+            
+            return []
+            
+        
+        keys = self._first_characters_to_keys[ first_character ]
+        tag_ids = self._first_characters_to_tag_ids[ first_character ]
+        
+        ( start, end ) = self._GetPrefixRange( keys, prefix )
+        
+        return self._GetTopTagIdsInRange( tag_ids, start, end, namespace_id, n )
+        
+    
+    def _GetTopTagIdsInRange( self, tag_ids: array.array, start: int, end: int, namespace_id: typing.Optional[ int ], n: int ) -> typing.List[ int ]:
+        
+        # a tag can have several keys in one range, and it may have gone to zero since it was added
+        # this is all set and sort and filter on builtins, so a range of a hundred thousand is still quick
+        
+        live_tag_ids = filter( self._tag_ids_to_ranks.__contains__, sorted( set( tag_ids[ start : end ] ) ) )
+        
+        if namespace_id is not None:
+            
+            live_tag_ids = ( tag_id for tag_id in live_tag_ids if self._tag_ids_to_namespace_ids[ tag_id ] == namespace_id )
+            
+        
+        # nlargest is stable, and our candidates are in tag_id order, so ties go to the lower tag_id
+        return heapq.nlargest( n, live_tag_ids, key = self._tag_ids_to_ranks.__getitem__ )
+        
+    
+    def _PrecomputeShortPrefixes( self ):
+        
+        # each bucket is sorted, so every short prefix is a contiguous run we can walk in order. the first couple of keystrokes never have to scan
+        
+        for ( first_character, keys ) in self._first_characters_to_keys.items():
+            
+            tag_ids = self._first_characters_to_tag_ids[ first_character ]
+            
+            for prefix_length in range( 1, PRECOMPUTED_PREFIX_LENGTH + 1 ):
+                
+                i = 0
+                
+                while i < len( keys ):
+                    
+                    if len( keys[ i ] ) < prefix_length:
+                        
+                        i += 1
+                        
+                        continue
+                        
+                    
+                    prefix = keys[ i ][ : prefix_length ]
+                    
+                    ( start, end ) = self._GetPrefixRange( keys, prefix, lo = i )
+                    
+                    # we get one extra so we know if the range has more live tags than we are storing
+                    top_tag_ids = self._GetTopTagIdsInRange( tag_ids, start, end, None, self._top_k + 1 )
+                    
+                    complete = len( top_tag_ids ) <= self._top_k
+                    
+                    self._prefixes_to_top_tag_ids[ ( prefix, None ) ] = [ top_tag_ids[ : self._top_k ], complete ]
+                    
+                    i = end
+                    
+                
+            
+        
+    
+    def _SortTopTagIds( self, top_tag_ids: typing.List[ int ] ):
+        
+        top_tag_ids.sort( key = self._GetSortKey, reverse = True )
+        
+    
+    def _UpdateCachedPrefixes( self, tag_id: int, old_rank: int, new_rank: int ):
+        
+        for prefix_key in list( self._GetCachedPrefixes( tag_id ) ):
+            
+            ( top_tag_ids, complete ) = self._prefixes_to_top_tag_ids[ prefix_key ]
+            
+            if tag_id in top_tag_ids:
+                
+                if new_rank == 0:
+                    
+                    top_tag_ids.remove( tag_id )
+                    
+                    if not complete:
+                        
+                        # something outside the list should move up, but we don't know what
+                        del self._prefixes_to_top_tag_ids[ prefix_key ]
+                        
+                    
+                    continue
+                    
+                
+                if new_rank < old_rank and not complete:
+                    
+                    others_min_sort_key = min( ( self._GetSortKey( other_tag_id ) for other_tag_id in top_tag_ids if other_tag_id != tag_id ), default = ( 0, 0 ) )
+                    
+                    if self._GetSortKey( tag_id ) < others_min_sort_key:
+                        
+                        # it may have dropped below something we aren't storing
+                        del self._prefixes_to_top_tag_ids[ prefix_key ]
+                        
+                        continue
+                        
+                    
+                
+                self._SortTopTagIds( top_tag_ids )
+                
+            else:
+                
+                if new_rank == 0:
+                    
+                    continue
+                    
+                
+                if complete:
+                    
+                    top_tag_ids.append( tag_id )
+                    
+                    self._SortTopTagIds( top_tag_ids )
+                    
+                    if len( top_tag_ids ) > self._top_k:
+                        
+                        del top_tag_ids[ self._top_k : ]
+                        
+                        self._prefixes_to_top_tag_ids[ prefix_key ][1] = False
+                        
+                    
+                elif len( top_tag_ids ) > 0 and self._GetSortKey( tag_id ) > self._GetSortKey( top_tag_ids[-1] ):
+                    
+                    top_tag_ids[-1] = tag_id
+                    
+                    self._SortTopTagIds( top_tag_ids )
+                    
+                
+            
+        
+    
+    def AddCheckedRows( self, tag_ids: typing.Collection[ int ], rows: typing.Iterable[ typing.Tuple[ int, int, str, int, int ] ] ):
+        
+        # tag_ids are what the owner looked up, and rows are the same as the constructor's for those still in the counts cache
+        
+        self._tag_ids_to_check.difference_update( tag_ids )
+        
+        for ( tag_id, namespace_id, searchable_subtag, current_count, pending_count ) in rows:
+            
+            rank = current_count + pending_count
+            
+            if tag_id in self._tag_ids_to_keys:
+                
+                self._ChangeRank( tag_id, rank )
+                
+                continue
+                
+            
+            if rank < self._min_rank:
+                
+                continue
+                
+            
+            keys = GenerateKeys( searchable_subtag )
+            
+            self._tag_ids_to_ranks[ tag_id ] = rank
+            self._tag_ids_to_namespace_ids[ tag_id ] = namespace_id
+            self._tag_ids_to_keys[ tag_id ] = keys
+            
+            for key in keys:
+                
+                first_character = key[0]
+                
+                if first_character not in self._first_characters_to_keys:
+                    
+                    self._first_characters_to_keys[ first_character ] = []
+                    self._first_characters_to_tag_ids[ first_character ] = array.array( 'q' )
+                    
+                
+                i = bisect.bisect_right( self._first_characters_to_keys[ first_character ], key )
+                
+                self._first_characters_to_keys[ first_character ].insert( i, key )
+                self._first_characters_to_tag_ids[ first_character ].insert( i, tag_id )
+                
+            
+            self._UpdateCachedPrefixes( tag_id, 0, rank )
+            
+        
+    
+    def AddCounts( self, ac_cache_changes: typing.Iterable[ typing.Tuple[ int, int, int ] ] ):
+        
+        for ( tag_id, current_delta, pending_delta ) in ac_cache_changes:
+            
+            if tag_id in self._tag_ids_to_keys:
+                
+                self._ChangeRank( tag_id, self._GetRank( tag_id ) + current_delta + pending_delta )
+                
+            else:
+                
+                self._tag_ids_to_check.add( tag_id )
+                
+            
+        
+    
+    def GetNumTags( self ) -> int:
+        
+        return len( self._tag_ids_to_ranks )
+        
+    
+    def GetNumTagIdsToCheck( self ) -> int:
+        
+        return len( self._tag_ids_to_check )
+        
+    
+    def GetTagIdsToCheck( self ) -> typing.Set[ int ]:
+        
+        return set( self._tag_ids_to_check )
+        
+    
+    def GetTopTagIds( self, prefix: str, namespace_id: typing.Optional[ int ] = None, limit: typing.Optional[ int ] = None ) -> typing.List[ int ]:
+        
+        # prefix should be from ConvertSearchableSubtagToPrefixKey
+        
+        if limit is None:
+            
+            limit = self._top_k
+            
+        
+        if prefix == '':
+            
+            return []
+            
+        
+        if limit > self._top_k or len( prefix ) > MAX_CACHED_PREFIX_LENGTH:
+            
+            return [ tag_id for tag_id in self._GetTopTagIds( prefix, namespace_id, limit ) if self._GetRank( tag_id ) >= self._min_rank ]
+            
+        
+        prefix_key = ( prefix, namespace_id )
+        
+        if prefix_key not in self._prefixes_to_top_tag_ids:
+            
+            top_tag_ids = self._GetTopTagIds( prefix, namespace_id, self._top_k + 1 )
+            
+            complete = len( top_tag_ids ) <= self._top_k
+            
+            self._prefixes_to_top_tag_ids[ prefix_key ] = [ top_tag_ids[ : self._top_k ], complete ]
+            
+        
+        ( top_tag_ids, complete ) = self._prefixes_to_top_tag_ids[ prefix_key ]
+        
+        # an indexed tag that has fallen below the floor may be beaten by one we don't index
+        return [ tag_id for tag_id in top_tag_ids[ : limit ] if self._GetRank( tag_id ) >= self._min_rank ]
+        
+    
+    def ReduceCounts( self, ac_cache_changes: typing.Iterable[ typing.Tuple[ int, int, int ] ] ):
+        
+        # a tag we don't index can only go further below the floor here, so there is nothing to check
+        
+        for ( tag_id, current_delta, pending_delta ) in ac_cache_changes:
+            
+            if tag_id in self._tag_ids_to_keys:
+                
+                self._ChangeRank( tag_id, self._GetRank( tag_id ) - current_delta - pending_delta )
+                
+            
+            
+        
+    
@@ -0,0 +1,380 @@
+import array
+import collections
+import typing
+
+# in-memory mirrors of the tag sibling and parent lookup cache tables
+# the display sync asks the same 'what is the ideal of x, what are the descendants of y' questions thousands of times, and these make that a dict hit rather than a query
+# the tables are always the truth. these are loaded from them and get the same row changes as them
+
+def _RemoveFromArrays( keys_to_arrays: typing.Dict[ int, array.array ], keys_to_removees: typing.Dict[ int, typing.Set[ int ] ] ):
+    
+    # a popular ancestor can have tens of thousands of children, so we rebuild each array once rather than removing one at a time
+    
+    for ( key, removees ) in keys_to_removees.items():
+        
+        if key not in keys_to_arrays:
+            
+            continue
+            
+        
+        remaining = array.array( 'q', ( item for item in keys_to_arrays[ key ] if item not in removees ) )
+        
+        if len( remaining ) == 0:
+            
+            del keys_to_arrays[ key ]
+            
+        else:
+            
+            keys_to_arrays[ key ] = remaining
+            
+        
+    
+
+def _ToArrays( keys_to_lists: typing.Dict[ int, typing.List[ int ] ] ) -> typing.Dict[ int, array.array ]:
+    
+    return { key : array.array( 'q', items ) for ( key, items ) in keys_to_lists.items() }
+    
+
+class TagSiblingsLookupIndex( object ):
+    
+    # mirrors ( bad_tag_id PRIMARY KEY, ideal_tag_id )
+    
+    def __init__( self, pairs: typing.Optional[ typing.Iterable[ typing.Tuple[ int, int ] ] ] = None ):
+        
+        self._bad_tag_ids_to_ideal_tag_ids = {}
+        self._ideal_tag_ids_to_bad_tag_ids = {}
+        
+        if pairs is not None:
+            
+            ideal_tag_ids_to_bad_tag_ids = collections.defaultdict( list )
+            
+            for ( bad_tag_id, ideal_tag_id ) in pairs:
+                
+                if bad_tag_id in self._bad_tag_ids_to_ideal_tag_ids:
+                    
+                    continue
+                    
+                
+                self._bad_tag_ids_to_ideal_tag_ids[ bad_tag_id ] = ideal_tag_id
+                
+                ideal_tag_ids_to_bad_tag_ids[ ideal_tag_id ].append( bad_tag_id )
+                
+            
+            self._ideal_tag_ids_to_bad_tag_ids = _ToArrays( ideal_tag_ids_to_bad_tag_ids )
+            
+        
+    
+    def AddPairs( self, pairs: typing.Iterable[ typing.Tuple[ int, int ] ] ):
+        
+        for ( bad_tag_id, ideal_tag_id ) in pairs:
+            
+            # INSERT OR IGNORE on the primary key
+            if bad_tag_id in self._bad_tag_ids_to_ideal_tag_ids:
+                
+                continue
+                
+            
+            self._bad_tag_ids_to_ideal_tag_ids[ bad_tag_id ] = ideal_tag_id
+            
+            if ideal_tag_id not in self._ideal_tag_ids_to_bad_tag_ids:
+                
+                self._ideal_tag_ids_to_bad_tag_ids[ ideal_tag_id ] = array.array( 'q' )
+                
+            
+            self._ideal_tag_ids_to_bad_tag_ids[ ideal_tag_id ].append( bad_tag_id )
+            
+        
+    
+    def DeletePairs( self, pairs: typing.Iterable[ typing.Tuple[ int, int ] ] ):
+        
+        ideal_tag_ids_to_removees = collections.defaultdict( set )
+        
+        for ( bad_tag_id, ideal_tag_id ) in pairs:
+            
+            if self._bad_tag_ids_to_ideal_tag_ids.get( bad_tag_id, None ) == ideal_tag_id:
+                
+                del self._bad_tag_ids_to_ideal_tag_ids[ bad_tag_id ]
+                
+                ideal_tag_ids_to_removees[ ideal_tag_id ].add( bad_tag_id )
+                
+            
+        
+        _RemoveFromArrays( self._ideal_tag_ids_to_bad_tag_ids, ideal_tag_ids_to_removees )
+        
+    
+    def DeleteTagIds( self, tag_ids: typing.Collection[ int ] ):
+        
+        # DELETE WHERE bad_tag_id = ? OR ideal_tag_id = ?
+        
+        pairs = [ ( tag_id, self._bad_tag_ids_to_ideal_tag_ids[ tag_id ] ) for tag_id in tag_ids if tag_id in self._bad_tag_ids_to_ideal_tag_ids ]
+        
+        for tag_id in tag_ids:
+            
+            if tag_id in self._ideal_tag_ids_to_bad_tag_ids:
+                
+                pairs.extend( ( ( bad_tag_id, tag_id ) for bad_tag_id in self._ideal_tag_ids_to_bad_tag_ids[ tag_id ] ) )
+                
+            
+        
+        self.DeletePairs( pairs )
+        
+    
+    def FilterChained( self, tag_ids: typing.Collection[ int ] ) -> typing.Set[ int ]:
+        
+        return { tag_id for tag_id in tag_ids if tag_id in self._bad_tag_ids_to_ideal_tag_ids or tag_id in self._ideal_tag_ids_to_bad_tag_ids }
+        
+    
+    def GetAllTagIds( self ) -> typing.Set[ int ]:
+        
+        tag_ids = set( self._bad_tag_ids_to_ideal_tag_ids.keys() )
+        
+        tag_ids.update( self._ideal_tag_ids_to_bad_tag_ids.keys() )
+        
+        return tag_ids
+        
+    
+    def GetChainsMembersFromIdeals( self, ideal_tag_ids: typing.Collection[ int ] ) -> typing.Set[ int ]:
+        
+        chain_tag_ids = set( ideal_tag_ids )
+        
+        for ideal_tag_id in ideal_tag_ids:
+            
+            if ideal_tag_id in self._ideal_tag_ids_to_bad_tag_ids:
+                
+                chain_tag_ids.update( self._ideal_tag_ids_to_bad_tag_ids[ ideal_tag_id ] )
+                
+            
+        
+        return chain_tag_ids
+        
+    
+    def GetIdealTagId( self, tag_id: int ) -> int:
+        
+        return self._bad_tag_ids_to_ideal_tag_ids.get( tag_id, tag_id )
+        
+    
+    def GetIdealTagIds( self, tag_ids: typing.Collection[ int ] ) -> typing.Set[ int ]:
+        
+        bad_tag_ids_to_ideal_tag_ids = self._bad_tag_ids_to_ideal_tag_ids
+        
+        return { bad_tag_ids_to_ideal_tag_ids.get( tag_id, tag_id ) for tag_id in tag_ids }
+        
+    
+    def GetIdealTagIdsToChains( self, ideal_tag_ids: typing.Collection[ int ] ) -> typing.Dict[ int, typing.Set[ int ] ]:
+        
+        ideal_tag_ids_to_chains = collections.defaultdict( set )
+        
+        for ideal_tag_id in ideal_tag_ids:
+            
+            chain = { ideal_tag_id }
+            
+            if ideal_tag_id in self._ideal_tag_ids_to_bad_tag_ids:
+                
+                chain.update( self._ideal_tag_ids_to_bad_tag_ids[ ideal_tag_id ] )
+                
+            
+            ideal_tag_ids_to_chains[ ideal_tag_id ] = chain
+            
+        
+        return ideal_tag_ids_to_chains
+        
+    
+    def GetNumRows( self ) -> int:
+        
+        return len( self._bad_tag_ids_to_ideal_tag_ids )
+        
+    
+    def GetTagIdsToIdealTagIds( self, tag_ids: typing.Collection[ int ] ) -> typing.Dict[ int, int ]:
+        
+        bad_tag_ids_to_ideal_tag_ids = self._bad_tag_ids_to_ideal_tag_ids
+        
+        return { tag_id : bad_tag_ids_to_ideal_tag_ids.get( tag_id, tag_id ) for tag_id in tag_ids }
+        
+    
+    def IsChained( self, tag_id: int ) -> bool:
+        
+        return tag_id in self._bad_tag_ids_to_ideal_tag_ids or tag_id in self._ideal_tag_ids_to_bad_tag_ids
+        
+    
+
+class TagParentsLookupIndex( object ):
+    
+    # mirrors ( child_tag_id, ancestor_tag_id ), which is already the transitive closure of the parent pairs
+    
+    def __init__( self, pairs: typing.Optional[ typing.Iterable[ typing.Tuple[ int, int ] ] ] = None ):
+        
+        self._child_tag_ids_to_ancestor_tag_ids = {}
+        self._ancestor_tag_ids_to_child_tag_ids = {}
+        
+        if pairs is not None:
+            
+            child_tag_ids_to_ancestor_tag_ids = collections.defaultdict( list )
+            ancestor_tag_ids_to_child_tag_ids = collections.defaultdict( list )
+            
+            # the table has these as its primary key, so they are unique
+            
+            for ( child_tag_id, ancestor_tag_id ) in pairs:
+                
+                child_tag_ids_to_ancestor_tag_ids[ child_tag_id ].append( ancestor_tag_id )
+                ancestor_tag_ids_to_child_tag_ids[ ancestor_tag_id ].append( child_tag_id )
+                
+            
+            self._child_tag_ids_to_ancestor_tag_ids = _ToArrays( child_tag_ids_to_ancestor_tag_ids )
+            self._ancestor_tag_ids_to_child_tag_ids = _ToArrays( ancestor_tag_ids_to_child_tag_ids )
+            
+        
+    
+    def AddPairs( self, pairs: typing.Iterable[ typing.Tuple[ int, int ] ] ):
+        
+        for ( child_tag_id, ancestor_tag_id ) in pairs:
+            
+            # INSERT OR IGNORE on the primary key. a child's ancestors are the short side, so we check there
+            
+            if child_tag_id in self._child_tag_ids_to_ancestor_tag_ids:
+                
+                if ancestor_tag_id in self._child_tag_ids_to_ancestor_tag_ids[ child_tag_id ]:
+                    
+                    continue
+                    
+                
+            else:
+                
+                self._child_tag_ids_to_ancestor_tag_ids[ child_tag_id ] = array.array( 'q' )
+                
+            
+            if ancestor_tag_id not in self._ancestor_tag_ids_to_child_tag_ids:
+                
+                self._ancestor_tag_ids_to_child_tag_ids[ ancestor_tag_id ] = array.array( 'q' )
+                
+            
+            self._child_tag_ids_to_ancestor_tag_ids[ child_tag_id ].append( ancestor_tag_id )
+            self._ancestor_tag_ids_to_child_tag_ids[ ancestor_tag_id ].append( child_tag_id )
+            
+        
+    
+    def DeletePairs( self, pairs: typing.Iterable[ typing.Tuple[ int, int ] ] ):
+        
+        child_tag_ids_to_removees = collections.defaultdict( set )
+        ancestor_tag_ids_to_removees = collections.defaultdict( set )
+        
+        for ( child_tag_id, ancestor_tag_id ) in pairs:
+            
+            if child_tag_id in self._child_tag_ids_to_ancestor_tag_ids and ancestor_tag_id in self._child_tag_ids_to_ancestor_tag_ids[ child_tag_id ]:
+                
+                child_tag_ids_to_removees[ child_tag_id ].add( ancestor_tag_id )
+                ancestor_tag_ids_to_removees[ ancestor_tag_id ].add( child_tag_id )
+                
+            
+        
+        _RemoveFromArrays( self._child_tag_ids_to_ancestor_tag_ids, child_tag_ids_to_removees )
+        _RemoveFromArrays( self._ancestor_tag_ids_to_child_tag_ids, ancestor_tag_ids_to_removees )
+        
+    
+    def DeleteTagIds( self, tag_ids: typing.Collection[ int ] ):
+        
+        # DELETE WHERE child_tag_id = ? OR ancestor_tag_id = ?
+        
+        pairs = set()
+        
+        for tag_id in tag_ids:
+            
+            if tag_id in self._child_tag_ids_to_ancestor_tag_ids:
+                
+                pairs.update( ( ( tag_id, ancestor_tag_id ) for ancestor_tag_id in self._child_tag_ids_to_ancestor_tag_ids[ tag_id ] ) )
+                
+            
+            if tag_id in self._ancestor_tag_ids_to_child_tag_ids:
+                
+                pairs.update( ( ( child_tag_id, tag_id ) for child_tag_id in self._ancestor_tag_ids_to_child_tag_ids[ tag_id ] ) )
+                
+            
+        
+        self.DeletePairs( pairs )
+        
+    
+    def FilterChained( self, tag_ids: typing.Collection[ int ] ) -> typing.Set[ int ]:
+        
+        return { tag_id for tag_id in tag_ids if tag_id in self._child_tag_ids_to_ancestor_tag_ids or tag_id in self._ancestor_tag_ids_to_child_tag_ids }
+        
+    
+    def GetAllTagIds( self ) -> typing.Set[ int ]:
+        
+        tag_ids = set( self._child_tag_ids_to_ancestor_tag_ids.keys() )
+        
+        tag_ids.update( self._ancestor_tag_ids_to_child_tag_ids.keys() )
+        
+        return tag_ids
+        
+    
+    def GetAncestors( self, tag_id: int ) -> typing.Set[ int ]:
+        
+        if tag_id in self._child_tag_ids_to_ancestor_tag_ids:
+            
+            return set( self._child_tag_ids_to_ancestor_tag_ids[ tag_id ] )
+            
+        
+        return set()
+        
+    
+    def GetChainsMembers( self, tag_ids: typing.Collection[ int ] ) -> typing.Set[ int ]:
+        
+        # everything connected to these, up or down, all the way
+        
+        chain_tag_ids = set( tag_ids )
+        next_search_tag_ids = set( tag_ids )
+        
+        while len( next_search_tag_ids ) > 0:
+            
+            round_of_tag_ids = set()
+            
+            for tag_id in next_search_tag_ids:
+                
+                if tag_id in self._child_tag_ids_to_ancestor_tag_ids:
+                    
+                    round_of_tag_ids.update( self._child_tag_ids_to_ancestor_tag_ids[ tag_id ] )
+                    
+                
+                if tag_id in self._ancestor_tag_ids_to_child_tag_ids:
+                    
+                    round_of_tag_ids.update( self._ancestor_tag_ids_to_child_tag_ids[ tag_id ] )
+                    
+                
+            
+            next_search_tag_ids = round_of_tag_ids.difference( chain_tag_ids )
+            
+            chain_tag_ids.update( next_search_tag_ids )
+            
+        
+        return chain_tag_ids
+        
+    
+    def GetDescendants( self, tag_id: int ) -> typing.Set[ int ]:
+        
+        if tag_id in self._ancestor_tag_ids_to_child_tag_ids:
+            
+            return set( self._ancestor_tag_ids_to_child_tag_ids[ tag_id ] )
+            
+        
+        return set()
+        
+    
+    def GetNumRows( self ) -> int:
+        
+        return sum( ( len( ancestor_tag_ids ) for ancestor_tag_ids in self._child_tag_ids_to_ancestor_tag_ids.values() ) )
+        
+    
+    def GetTagsToAncestors( self, tag_ids: typing.Collection[ int ] ) -> typing.Dict[ int, typing.Set[ int ] ]:
+        
+        return { tag_id : self.GetAncestors( tag_id ) for tag_id in tag_ids }
+        
+    
+    def GetTagsToDescendants( self, tag_ids: typing.Collection[ int ] ) -> typing.Dict[ int, typing.Set[ int ] ]:
+        
+        return { tag_id : self.GetDescendants( tag_id ) for tag_id in tag_ids }
+        
+    
+    def IsChained( self, tag_id: int ) -> bool:
+        
+        return tag_id in self._child_tag_ids_to_ancestor_tag_ids or tag_id in self._ancestor_tag_ids_to_child_tag_ids
+        
+    
@@ -45,7 +45,8 @@ CLIENT_API_INT_PARAMS = {
     'width',
     'height',
     'render_format',
-    'render_quality'
+    'render_quality',
+    'limit'
 }
 
 CLIENT_API_BYTE_PARAMS = {
@@ -73,7 +74,8 @@ CLIENT_API_STRING_PARAMS = {
     'reason',
     'tag_display_type',
     'source_hash_type',
-    'desired_hash_type'
+    'desired_hash_type',
+    'cursor'
 }
 
 CLIENT_API_JSON_PARAMS = {
@@ -103,7 +105,11 @@ CLIENT_API_JSON_PARAMS = {
     'doublecheck_file_system',
     'only_in_view',
     'include_current_tags',
-    'include_pending_tags'
+    'include_pending_tags',
+    'stream',
+    'fields',
+    'columnar',
+    'progressive'
 }
 
 CLIENT_API_JSON_BYTE_LIST_PARAMS = {
@@ -160,6 +166,40 @@ def Dumps( data, mime ):
         
     
 
+def DumpsStreamItem( data, mime ) -> bytes:
+    
+    # for streaming responses. JSON becomes JSON Lines, one object per line, and CBOR is just one item after another, which is a valid CBOR Sequence
+    
+    if mime == HC.APPLICATION_CBOR:
+        
+        if not CBOR_AVAILABLE:
+            
+            raise HydrusExceptions.NotAcceptable( 'Sorry, this service does not support CBOR!' )
+            
+        
+        return cbor2.dumps( data )
+        
+    else:
+        
+        return bytes( json.dumps( data ) + '\n', 'utf-8' )
+        
+    
+
+def GenerateStreamBody( header_dict: dict, rows_generator, mime ):
+    
+    # the first item is always the header, with the version info and anything else that is not per-row, and then the rows come in reasonable chunks
+    
+    header_dict[ 'version' ] = HC.CLIENT_API_VERSION
+    header_dict[ 'hydrus_version' ] = HC.SOFTWARE_VERSION
+    
+    yield DumpsStreamItem( header_dict, mime )
+    
+    for rows in rows_generator:
+        
+        yield b''.join( ( DumpsStreamItem( row, mime ) for row in rows ) )
+        
+    
+
 def CheckHashLength( hashes, hash_type = 'sha256' ):
     
     if len( hashes ) == 0:
@@ -5,6 +5,7 @@ import typing
 from hydrus.core import HydrusConstants as HC
 from hydrus.core import HydrusData
 from hydrus.core import HydrusExceptions
+from hydrus.core import HydrusLists
 from hydrus.core import HydrusText
 from hydrus.core import HydrusTime
 from hydrus.core.files import HydrusFileHandling
@@ -40,77 +41,95 @@ class HydrusResourceClientAPIRestrictedGetFilesSearchFiles( HydrusResourceClient
     
     def _threadDoGETJob( self, request: HydrusServerRequest.HydrusRequest ):
         
-        location_context = ClientLocalServerCore.ParseLocationContext( request, ClientLocation.LocationContext.STATICCreateSimple( CC.COMBINED_LOCAL_MEDIA_SERVICE_KEY ) )
+        return_hashes = request.parsed_request_args.GetValue( 'return_hashes', bool, default_value = False )
+        return_file_ids = request.parsed_request_args.GetValue( 'return_file_ids', bool, default_value = True )
+        stream = request.parsed_request_args.GetValue( 'stream', bool, default_value = False )
         
-        tag_service_key = ClientLocalServerCore.ParseTagServiceKey( request )
+        limit = None
         
-        if tag_service_key == CC.COMBINED_TAG_SERVICE_KEY and location_context.IsAllKnownFiles():
+        if 'limit' in request.parsed_request_args:
             
-            raise HydrusExceptions.BadRequestException( 'Sorry, search for all known tags over all known files is not supported!' )
+            limit = request.parsed_request_args.GetValue( 'limit', int )
+            
+            if limit < 1:
+                
+                raise HydrusExceptions.BadRequestException( 'The limit must be at least 1!' )
+                
             
         
-        include_current_tags = request.parsed_request_args.GetValue( 'include_current_tags', bool, default_value = True )
-        include_pending_tags = request.parsed_request_args.GetValue( 'include_pending_tags', bool, default_value = True )
-        
-        tag_context = ClientSearchTagContext.TagContext( service_key = tag_service_key, include_current_tags = include_current_tags, include_pending_tags = include_pending_tags )
-        predicates = ClientLocalServerCore.ParseClientAPISearchPredicates( request )
-        
-        return_hashes = False
-        return_file_ids = True
+        next_cursor = None
+        num_results = None
         
-        if len( predicates ) == 0:
-            
-            hash_ids = []
+        if 'cursor' in request.parsed_request_args:
             
-        else:
+            if limit is None:
+                
+                raise HydrusExceptions.BadRequestException( 'If you give a cursor, please give a limit too!' )
+                
             
-            file_search_context = ClientSearchFileSearchContext.FileSearchContext( location_context = location_context, tag_context = tag_context, predicates = predicates )
+            cursor = request.parsed_request_args.GetValue( 'cursor', str )
             
-            file_sort_type = CC.SORT_FILES_BY_IMPORT_TIME
+            ( hash_ids, next_cursor, num_results ) = request.client_api_permissions.GetSearchResultsCursorPage( cursor, limit )
             
-            if 'file_sort_type' in request.parsed_request_args:
-                
-                file_sort_type = request.parsed_request_args[ 'file_sort_type' ]
-                
+        else:
             
-            if file_sort_type not in CC.SYSTEM_SORT_TYPES:
-                
-                raise HydrusExceptions.BadRequestException( 'Sorry, did not understand that sort type!' )
-                
+            hash_ids = self._DoSearch( request )
             
-            file_sort_asc = False
+            request.client_api_permissions.SetLastSearchResults( hash_ids )
             
-            if 'file_sort_asc' in request.parsed_request_args:
+            if limit is not None:
+                
+                cursor = request.client_api_permissions.AddSearchResultsCursor( hash_ids )
                 
-                file_sort_asc = request.parsed_request_args.GetValue( 'file_sort_asc', bool )
+                ( hash_ids, next_cursor, num_results ) = request.client_api_permissions.GetSearchResultsCursorPage( cursor, limit )
                 
             
-            sort_order = CC.SORT_ASC if file_sort_asc else CC.SORT_DESC
+        
+        body_dict = {}
+        
+        if limit is not None:
             
-            # newest first
-            sort_by = ClientMedia.MediaSort( sort_type = ( 'system', file_sort_type ), sort_order = sort_order )
+            body_dict[ 'next_cursor' ] = next_cursor
+            body_dict[ 'num_results' ] = num_results
             
-            if 'return_hashes' in request.parsed_request_args:
-                
-                return_hashes = request.parsed_request_args.GetValue( 'return_hashes', bool )
-                
+        
+        if stream:
             
-            if 'return_file_ids' in request.parsed_request_args:
+            def rows_generator():
                 
-                return_file_ids = request.parsed_request_args.GetValue( 'return_file_ids', bool )
+                for block_of_hash_ids in HydrusLists.SplitListIntoChunks( hash_ids, 256 ):
+                    
+                    rows = [ {} for hash_id in block_of_hash_ids ]
+                    
+                    if return_file_ids:
+                        
+                        for ( row, hash_id ) in zip( rows, block_of_hash_ids ):
+                            
+                            row[ 'file_id' ] = hash_id
+                            
+                        
+                    
+                    if return_hashes:
+                        
+                        hash_ids_to_hashes = CG.client_controller.Read( 'hash_ids_to_hashes', hash_ids = block_of_hash_ids )
+                        
+                        for ( row, hash_id ) in zip( rows, block_of_hash_ids ):
+                            
+                            row[ 'hash' ] = hash_ids_to_hashes[ hash_id ].hex()
+                            
+                        
+                    
+                    yield rows
+                    
                 
             
-            job_status = ClientThreading.JobStatus( cancellable = True )
+            body_generator = ClientLocalServerCore.GenerateStreamBody( body_dict, rows_generator(), request.preferred_mime )
             
-            request.disconnect_callables.append( job_status.Cancel )
+            response_context = HydrusServerResources.ResponseContext( 200, mime = request.preferred_mime, body_generator = body_generator )
             
-            hash_ids = CG.client_controller.Read( 'file_query_ids', file_search_context, job_status = job_status, sort_by = sort_by, apply_implicit_limit = False )
+            return response_context
             
         
-        request.client_api_permissions.SetLastSearchResults( hash_ids )
-        
-        body_dict = {}
-        
         if return_hashes:
             
             hash_ids_to_hashes = CG.client_controller.Read( 'hash_ids_to_hashes', hash_ids = hash_ids )
@@ -131,6 +150,66 @@ class HydrusResourceClientAPIRestrictedGetFilesSearchFiles( HydrusResourceClient
         return response_context
         
     
+    def _DoSearch( self, request: HydrusServerRequest.HydrusRequest ):
+        
+        location_context = ClientLocalServerCore.ParseLocationContext( request, ClientLocation.LocationContext.STATICCreateSimple( CC.COMBINED_LOCAL_MEDIA_SERVICE_KEY ) )
+        
+        tag_service_key = ClientLocalServerCore.ParseTagServiceKey( request )
+        
+        if tag_service_key == CC.COMBINED_TAG_SERVICE_KEY and location_context.IsAllKnownFiles():
+            
+            raise HydrusExceptions.BadRequestException( 'Sorry, search for all known tags over all known files is not supported!' )
+            
+        
+        include_current_tags = request.parsed_request_args.GetValue( 'include_current_tags', bool, default_value = True )
+        include_pending_tags = request.parsed_request_args.GetValue( 'include_pending_tags', bool, default_value = True )
+        
+        tag_context = ClientSearchTagContext.TagContext( service_key = tag_service_key, include_current_tags = include_current_tags, include_pending_tags = include_pending_tags )
+        predicates = ClientLocalServerCore.ParseClientAPISearchPredicates( request )
+        
+        if len( predicates ) == 0:
+            
+            return []
+            
+        
+        file_search_context = ClientSearchFileSearchContext.FileSearchContext( location_context = location_context, tag_context = tag_context, predicates = predicates )
+        
+        file_sort_type = CC.SORT_FILES_BY_IMPORT_TIME
+        
+        if 'file_sort_type' in request.parsed_request_args:
+            
+            file_sort_type = request.parsed_request_args[ 'file_sort_type' ]
+            
+        
+        if file_sort_type not in CC.SYSTEM_SORT_TYPES:
+            
+            raise HydrusExceptions.BadRequestException( 'Sorry, did not understand that sort type!' )
+            
+        
+        file_sort_asc = False
+        
+        if 'file_sort_asc' in request.parsed_request_args:
+            
+            file_sort_asc = request.parsed_request_args.GetValue( 'file_sort_asc', bool )
+            
+        
+        sort_order = CC.SORT_ASC if file_sort_asc else CC.SORT_DESC
+        
+        # newest first
+        sort_by = ClientMedia.MediaSort( sort_type = ( 'system', file_sort_type ), sort_order = sort_order )
+        
+        # with a system:limit, this walks the sort index and stops as soon as it has enough files
+        progressive = request.parsed_request_args.GetValue( 'progressive', bool, default_value = False )
+        
+        job_status = ClientThreading.JobStatus( cancellable = True )
+        
+        request.disconnect_callables.append( job_status.Cancel )
+        
+        hash_ids = CG.client_controller.Read( 'file_query_ids', file_search_context, job_status = job_status, sort_by = sort_by, apply_implicit_limit = False, progressive = progressive )
+        
+        return hash_ids
+        
+    
 
 def ParseAndFetchMediaResult( request: HydrusServerRequest.HydrusRequest ) -> ClientMediaResult.MediaResult:
     
@@ -253,19 +332,7 @@ class HydrusResourceClientAPIRestrictedGetFilesGetRenderedFile( HydrusResourceCl
                 format = HC.IMAGE_PNG
                 
             
-            renderer = CG.client_controller.images_cache.GetImageRenderer( media_result )
-            
-            while not renderer.IsReady():
-                
-                if request.disconnected:
-                    
-                    return
-                    
-                
-                time.sleep( 0.01 )
-                
-            
-            numpy_image = renderer.GetNumPyImage()
+            target_resolution = None
             
             if 'width' in request.parsed_request_args and 'height' in request.parsed_request_args:
                 
@@ -282,7 +349,7 @@ class HydrusResourceClientAPIRestrictedGetFilesGetRenderedFile( HydrusResourceCl
                     raise HydrusExceptions.BadRequestException( 'Height must be greater than 0!' )
                     
                 
-                numpy_image = HydrusImageHandling.ResizeNumPyImage( numpy_image, ( width, height ) )
+                target_resolution = ( width, height )
                 
             
             if 'render_quality' in request.parsed_request_args:
@@ -302,8 +369,43 @@ class HydrusResourceClientAPIRestrictedGetFilesGetRenderedFile( HydrusResourceCl
                 
             max_age = 86400 * 365
             
-            body = HydrusImageHandling.GenerateFileBytesForRenderAPI( numpy_image, format, quality )
-        
+            render_disk_cache = CG.client_controller.render_disk_cache
+            
+            ( width, height ) = media_result.GetResolution() if target_resolution is None else target_resolution
+            
+            variant = 'render_{}_{}_{}_{}'.format( width, height, format, quality )
+            
+            body = render_disk_cache.GetData( media_result.GetHash(), variant )
+            
+            if body is None:
+                
+                renderer = CG.client_controller.images_cache.GetImageRenderer( media_result )
+                
+                while not renderer.IsReady():
+                    
+                    if request.disconnected:
+                        
+                        return
+                        
+                    
+                    time.sleep( 0.01 )
+                    
+                
+                numpy_image = renderer.GetNumPyImage()
+                
+                if target_resolution is not None:
+                    
+                    numpy_image = HydrusImageHandling.ResizeNumPyImage( numpy_image, target_resolution )
+                    
+                
+                body = HydrusImageHandling.GenerateFileBytesForRenderAPI( numpy_image, format, quality )
+                
+                if not renderer.RenderFailed():
+                    
+                    render_disk_cache.AddData( media_result.GetHash(), variant, body )
+                    
+                
+            
         elif media_result.GetMime() == HC.ANIMATION_UGOIRA:
             
             if 'render_format' in request.parsed_request_args:
@@ -410,6 +512,56 @@ class HydrusResourceClientAPIRestrictedGetFilesFileHashes( HydrusResourceClientA
         
     
 
+FILE_METADATA_IDENTIFIER_FIELDS = {
+    'file_id',
+    'hash'
+}
+
+FILE_METADATA_FILE_INFO_FIELDS = {
+    'size',
+    'mime',
+    'filetype_human',
+    'filetype_enum',
+    'ext',
+    'width',
+    'height',
+    'duration',
+    'num_frames',
+    'num_words',
+    'has_audio',
+    'blurhash',
+    'pixel_hash',
+    'filetype_forced',
+    'original_mime',
+    'thumbnail_width',
+    'thumbnail_height',
+    'has_transparency',
+    'has_exif',
+    'has_human_readable_embedded_metadata',
+    'has_icc_profile'
+}
+
+FILE_METADATA_MEDIA_RESULT_FIELDS = {
+    'notes',
+    'file_services',
+    'time_modified',
+    'time_modified_details',
+    'is_inbox',
+    'is_local',
+    'is_trashed',
+    'is_deleted',
+    'known_urls',
+    'ipfs_multihashes',
+    'detailed_known_urls',
+    'ratings',
+    'tags',
+    'file_viewing_statistics',
+    'service_keys_to_statuses_to_tags',
+    'service_keys_to_statuses_to_display_tags'
+}
+
+FILE_METADATA_FIELDS = FILE_METADATA_IDENTIFIER_FIELDS.union( FILE_METADATA_FILE_INFO_FIELDS ).union( FILE_METADATA_MEDIA_RESULT_FIELDS )
+
 def AddMissingHashToFileMetadata( metadata: list, hash: bytes ):
     
     metadata_row = {
@@ -420,9 +572,94 @@ def AddMissingHashToFileMetadata( metadata: list, hash: bytes ):
     metadata.append( metadata_row )
     
 
+def ConvertFileMetadataRowsToColumns( metadata: list ) -> dict:
+    
+    # one list per field, all the same length, with null where a row did not have that field (e.g. a missing file)
+    
+    columns = {}
+    
+    for ( i, metadata_row ) in enumerate( metadata ):
+        
+        for ( key, value ) in metadata_row.items():
+            
+            if key not in columns:
+                
+                columns[ key ] = [ None ] * len( metadata )
+                
+            
+            columns[ key ][ i ] = value
+            
+        
+    
+    return columns
+    
+
+def GenerateFileInfoMetadataRow( file_info_manager: ClientMediaManagers.FileInfoManager, thumbnail_bounding_dimensions, thumbnail_scale_type, thumbnail_dpr_percent ) -> dict:
+    
+    mime = file_info_manager.mime
+    width = file_info_manager.width
+    height = file_info_manager.height
+    
+    pixel_hash = file_info_manager.pixel_hash
+    
+    if pixel_hash is not None:
+        
+        pixel_hash_encoded = pixel_hash.hex()
+        
+    else:
+        
+        pixel_hash_encoded = None
+        
+    
+    metadata_row = {
+        'file_id' : file_info_manager.hash_id,
+        'hash' : file_info_manager.hash.hex(),
+        'size' : file_info_manager.size,
+        'mime' : HC.mime_mimetype_string_lookup[ mime ],
+        'filetype_human' : HC.mime_string_lookup[ file_info_manager.mime ],
+        'filetype_enum' : file_info_manager.mime,
+        'ext' : HC.mime_ext_lookup[ mime ],
+        'width' : width,
+        'height' : height,
+        'duration' : file_info_manager.duration_ms,
+        'num_frames' : file_info_manager.num_frames,
+        'num_words' : file_info_manager.num_words,
+        'has_audio' : file_info_manager.has_audio,
+        'blurhash' : file_info_manager.blurhash,
+        'pixel_hash' : pixel_hash_encoded
+    }
+    
+    filetype_forced = file_info_manager.FiletypeIsForced()
+    
+    metadata_row[ 'filetype_forced' ] = filetype_forced
+    
+    if filetype_forced:
+        
+        metadata_row[ 'original_mime' ] = HC.mime_mimetype_string_lookup[ file_info_manager.original_mime ]
+        
+    
+    if file_info_manager.mime in HC.MIMES_WITH_THUMBNAILS:
+        
+        if width is not None and height is not None and width > 0 and height > 0:
+            
+            ( expected_thumbnail_width, expected_thumbnail_height ) = HydrusImageHandling.GetThumbnailResolution( ( width, height ), thumbnail_bounding_dimensions, thumbnail_scale_type, thumbnail_dpr_percent )
+            
+            metadata_row[ 'thumbnail_width' ] = expected_thumbnail_width
+            metadata_row[ 'thumbnail_height' ] = expected_thumbnail_height
+            
+        
+    
+    metadata_row[ 'has_transparency' ] = file_info_manager.has_transparency
+    metadata_row[ 'has_exif' ] = file_info_manager.has_exif
+    metadata_row[ 'has_human_readable_embedded_metadata' ] = file_info_manager.has_human_readable_embedded_metadata
+    metadata_row[ 'has_icc_profile' ] = file_info_manager.has_icc_profile
+    
+    return metadata_row
+    
+
 class HydrusResourceClientAPIRestrictedGetFilesFileMetadata( HydrusResourceClientAPIRestrictedGetFiles ):
     
-    def _threadDoGETJob( self, request: HydrusServerRequest.HydrusRequest ):
+    def _GetMetadataRows( self, request: HydrusServerRequest.HydrusRequest, hashes, hashes_to_hash_ids, fields: typing.Optional[ typing.Set[ str ] ] = None ):
         
         only_return_identifiers = request.parsed_request_args.GetValue( 'only_return_identifiers', bool, default_value = False )
         only_return_basic_information = request.parsed_request_args.GetValue( 'only_return_basic_information', bool, default_value = False )
@@ -430,10 +667,22 @@ class HydrusResourceClientAPIRestrictedGetFilesFileMetadata( HydrusResourceClien
         detailed_url_information = request.parsed_request_args.GetValue( 'detailed_url_information', bool, default_value = False )
         include_notes = request.parsed_request_args.GetValue( 'include_notes', bool, default_value = False )
         include_milliseconds = request.parsed_request_args.GetValue( 'include_milliseconds', bool, default_value = False )
-        include_services_object = request.parsed_request_args.GetValue( 'include_services_object', bool, default_value = True )
-        create_new_file_ids = request.parsed_request_args.GetValue( 'create_new_file_ids', bool, default_value = False )
         include_blurhash = request.parsed_request_args.GetValue( 'include_blurhash', bool, default_value = False )
         
+        if fields is None:
+            
+            wanted_fields = FILE_METADATA_FIELDS
+            
+        else:
+            
+            # asking for a field is asking for it, whatever the older flags say
+            wanted_fields = fields
+            
+            hide_service_keys_tags = 'service_keys_to_statuses_to_tags' not in fields and 'service_keys_to_statuses_to_display_tags' not in fields
+            detailed_url_information = 'detailed_known_urls' in fields
+            include_notes = 'notes' in fields
+            
+        
         if include_milliseconds:
             
             time_converter = HydrusTime.SecondiseMSFloat
@@ -443,21 +692,11 @@ class HydrusResourceClientAPIRestrictedGetFilesFileMetadata( HydrusResourceClien
             time_converter = HydrusTime.SecondiseMS
             
         
-        hashes = ClientLocalServerCore.ParseHashes( request )
-        
-        hash_ids_to_hashes = CG.client_controller.Read( 'hash_ids_to_hashes', hashes = hashes, create_new_hash_ids = create_new_file_ids )
-        
-        hashes_to_hash_ids = { hash : hash_id for ( hash_id, hash ) in hash_ids_to_hashes.items() }
-        
-        hash_ids = set( hash_ids_to_hashes.keys() )
-        
-        request.client_api_permissions.CheckPermissionToSeeFiles( hash_ids )
-        
-        body_dict = {}
+        hash_ids = { hashes_to_hash_ids[ hash ] for hash in hashes if hash in hashes_to_hash_ids }
         
         metadata = []
         
-        if only_return_identifiers:
+        if ( fields is None and only_return_identifiers ) or wanted_fields.issubset( FILE_METADATA_IDENTIFIER_FIELDS ):
             
             for hash in hashes:
                 
@@ -476,7 +715,7 @@ class HydrusResourceClientAPIRestrictedGetFilesFileMetadata( HydrusResourceClien
                     
                 
             
-        elif only_return_basic_information:
+        elif fields is None and only_return_basic_information:
             
             file_info_managers: typing.List[ ClientMediaManagers.FileInfoManager ] = CG.client_controller.Read( 'file_info_managers_from_ids', hash_ids )
             
@@ -526,6 +765,32 @@ class HydrusResourceClientAPIRestrictedGetFilesFileMetadata( HydrusResourceClien
                     
                 
             
+        elif wanted_fields.issubset( FILE_METADATA_IDENTIFIER_FIELDS.union( FILE_METADATA_FILE_INFO_FIELDS ) ):
+            
+            # file info is a handful of cheap columns, so if that is all they want, we can skip loading tags, urls, and everything else
+            
+            file_info_managers: typing.List[ ClientMediaManagers.FileInfoManager ] = CG.client_controller.Read( 'file_info_managers_from_ids', hash_ids )
+            
+            hashes_to_file_info_managers = { file_info_manager.hash : file_info_manager for file_info_manager in file_info_managers }
+            
+            thumbnail_bounding_dimensions = CG.client_controller.options[ 'thumbnail_dimensions' ]
+            thumbnail_scale_type = CG.client_controller.new_options.GetInteger( 'thumbnail_scale_type' )
+            thumbnail_dpr_percent = CG.client_controller.new_options.GetInteger( 'thumbnail_dpr_percent' )
+            
+            for hash in hashes:
+                
+                if hash in hashes_to_file_info_managers:
+                    
+                    metadata_row = GenerateFileInfoMetadataRow( hashes_to_file_info_managers[ hash ], thumbnail_bounding_dimensions, thumbnail_scale_type, thumbnail_dpr_percent )
+                    
+                    metadata.append( metadata_row )
+                    
+                else:
+                    
+                    AddMissingHashToFileMetadata( metadata, hash )
+                    
+                
+            
         else:
             
             media_results: typing.List[ ClientMediaResult.MediaResult ] = CG.client_controller.Read( 'media_results_from_ids', hash_ids )
@@ -553,126 +818,85 @@ class HydrusResourceClientAPIRestrictedGetFilesFileMetadata( HydrusResourceClien
                     
                     file_info_manager = media_result.GetFileInfoManager()
                     
-                    mime = file_info_manager.mime
-                    width = file_info_manager.width
-                    height = file_info_manager.height
-                    
-                    pixel_hash = file_info_manager.pixel_hash
+                    metadata_row = GenerateFileInfoMetadataRow( file_info_manager, thumbnail_bounding_dimensions, thumbnail_scale_type, thumbnail_dpr_percent )
                     
-                    if pixel_hash is not None:
-                        
-                        pixel_hash_encoded = pixel_hash.hex()
-                        
-                    else:
+                    if include_notes:
                         
-                        pixel_hash_encoded = None
+                        metadata_row[ 'notes' ] = media_result.GetNotesManager().GetNamesToNotes()
                         
                     
-                    metadata_row = {
-                        'file_id' : file_info_manager.hash_id,
-                        'hash' : file_info_manager.hash.hex(),
-                        'size' : file_info_manager.size,
-                        'mime' : HC.mime_mimetype_string_lookup[ mime ],
-                        'filetype_human' : HC.mime_string_lookup[ file_info_manager.mime ],
-                        'filetype_enum' : file_info_manager.mime,
-                        'ext' : HC.mime_ext_lookup[ mime ],
-                        'width' : width,
-                        'height' : height,
-                        'duration' : file_info_manager.duration_ms,
-                        'num_frames' : file_info_manager.num_frames,
-                        'num_words' : file_info_manager.num_words,
-                        'has_audio' : file_info_manager.has_audio,
-                        'blurhash' : file_info_manager.blurhash,
-                        'pixel_hash' : pixel_hash_encoded
-                    }
-                    
-                    filetype_forced = file_info_manager.FiletypeIsForced()
+                    locations_manager = media_result.GetLocationsManager()
                     
-                    metadata_row[ 'filetype_forced' ] = filetype_forced
+                    times_manager = locations_manager.GetTimesManager()
                     
-                    if filetype_forced:
+                    if 'file_services' in wanted_fields:
                         
-                        metadata_row[ 'original_mime' ] = HC.mime_mimetype_string_lookup[ file_info_manager.original_mime ]
+                        metadata_row[ 'file_services' ] = {
+                            'current' : {},
+                            'deleted' : {}
+                        }
                         
-                    
-                    if file_info_manager.mime in HC.MIMES_WITH_THUMBNAILS:
+                        current = locations_manager.GetCurrent()
                         
-                        if width is not None and height is not None and width > 0 and height > 0:
-                            
-                            ( expected_thumbnail_width, expected_thumbnail_height ) = HydrusImageHandling.GetThumbnailResolution( ( width, height ), thumbnail_bounding_dimensions, thumbnail_scale_type, thumbnail_dpr_percent )
+                        for file_service_key in current:
                             
-                            metadata_row[ 'thumbnail_width' ] = expected_thumbnail_width
-                            metadata_row[ 'thumbnail_height' ] = expected_thumbnail_height
+                            metadata_row[ 'file_services' ][ 'current' ][ file_service_key.hex() ] = {
+                                'name' : service_keys_to_names[ file_service_key ],
+                                'type' : service_keys_to_types[ file_service_key ],
+                                'type_pretty' : HC.service_string_lookup[ service_keys_to_types[ file_service_key ] ],
+                                'time_imported' : time_converter( times_manager.GetImportedTimestampMS( file_service_key ) )
+                            }
                             
                         
-                    
-                    if include_notes:
+                        deleted = locations_manager.GetDeleted()
                         
-                        metadata_row[ 'notes' ] = media_result.GetNotesManager().GetNamesToNotes()
+                        for file_service_key in deleted:
+                            
+                            metadata_row[ 'file_services' ][ 'deleted' ][ file_service_key.hex() ] = {
+                                'name' : service_keys_to_names[ file_service_key ],
+                                'type' : service_keys_to_types[ file_service_key ],
+                                'type_pretty' : HC.service_string_lookup[ service_keys_to_types[ file_service_key ] ],
+                                'time_deleted' : time_converter( times_manager.GetDeletedTimestampMS( file_service_key ) ),
+                                'time_imported' : time_converter( times_manager.GetPreviouslyImportedTimestampMS( file_service_key ) )
+                            }
+                            
                         
                     
-                    locations_manager = media_result.GetLocationsManager()
-                    
-                    metadata_row[ 'file_services' ] = {
-                        'current' : {},
-                        'deleted' : {}
-                    }
-                    
-                    times_manager = locations_manager.GetTimesManager()
-                    
-                    current = locations_manager.GetCurrent()
-                    
-                    for file_service_key in current:
+                    if 'time_modified' in wanted_fields:
                         
-                        metadata_row[ 'file_services' ][ 'current' ][ file_service_key.hex() ] = {
-                            'name' : service_keys_to_names[ file_service_key ],
-                            'type' : service_keys_to_types[ file_service_key ],
-                            'type_pretty' : HC.service_string_lookup[ service_keys_to_types[ file_service_key ] ],
-                            'time_imported' : time_converter( times_manager.GetImportedTimestampMS( file_service_key ) )
-                        }
+                        metadata_row[ 'time_modified' ] = time_converter( times_manager.GetAggregateModifiedTimestampMS() )
                         
                     
-                    deleted = locations_manager.GetDeleted()
-                    
-                    for file_service_key in deleted:
+                    if 'time_modified_details' in wanted_fields:
                         
-                        metadata_row[ 'file_services' ][ 'deleted' ][ file_service_key.hex() ] = {
-                            'name' : service_keys_to_names[ file_service_key ],
-                            'type' : service_keys_to_types[ file_service_key ],
-                            'type_pretty' : HC.service_string_lookup[ service_keys_to_types[ file_service_key ] ],
-                            'time_deleted' : time_converter( times_manager.GetDeletedTimestampMS( file_service_key ) ),
-                            'time_imported' : time_converter( times_manager.GetPreviouslyImportedTimestampMS( file_service_key ) )
-                        }
+                        domains_to_file_modified_timestamps_ms = times_manager.GetDomainModifiedTimestampsMS()
                         
-                    
-                    metadata_row[ 'time_modified' ] = time_converter( times_manager.GetAggregateModifiedTimestampMS() )
-                    
-                    domains_to_file_modified_timestamps_ms = times_manager.GetDomainModifiedTimestampsMS()
-                    
-                    local_modified_timestamp_ms = times_manager.GetFileModifiedTimestampMS()
-                    
-                    if local_modified_timestamp_ms is not None:
+                        local_modified_timestamp_ms = times_manager.GetFileModifiedTimestampMS()
                         
-                        domains_to_file_modified_timestamps_ms[ 'local' ] = local_modified_timestamp_ms
+                        if local_modified_timestamp_ms is not None:
+                            
+                            domains_to_file_modified_timestamps_ms[ 'local' ] = local_modified_timestamp_ms
+                            
+                        
+                        metadata_row[ 'time_modified_details' ] = { domain : time_converter( timestamp_ms ) for ( domain, timestamp_ms ) in domains_to_file_modified_timestamps_ms.items() }
                         
-                    
-                    metadata_row[ 'time_modified_details' ] = { domain : time_converter( timestamp_ms ) for ( domain, timestamp_ms ) in domains_to_file_modified_timestamps_ms.items() }
                     
                     metadata_row[ 'is_inbox' ] = locations_manager.inbox
                     metadata_row[ 'is_local' ] = locations_manager.IsLocal()
                     metadata_row[ 'is_trashed' ] = locations_manager.IsTrashed()
                     metadata_row[ 'is_deleted' ] = CC.COMBINED_LOCAL_MEDIA_SERVICE_KEY in locations_manager.GetDeleted() or locations_manager.IsTrashed()
                     
-                    metadata_row[ 'has_transparency' ] = file_info_manager.has_transparency
-                    metadata_row[ 'has_exif' ] = file_info_manager.has_exif
-                    metadata_row[ 'has_human_readable_embedded_metadata' ] = file_info_manager.has_human_readable_embedded_metadata
-                    metadata_row[ 'has_icc_profile' ] = file_info_manager.has_icc_profile
-                    
-                    known_urls = sorted( locations_manager.GetURLs() )
-                    
-                    metadata_row[ 'known_urls' ] = known_urls
+                    if 'known_urls' in wanted_fields or detailed_url_information:
+                        
+                        known_urls = sorted( locations_manager.GetURLs() )
+                        
+                        metadata_row[ 'known_urls' ] = known_urls
+                        
                     
-                    metadata_row[ 'ipfs_multihashes' ] = { ipfs_service_key.hex() : multihash for ( ipfs_service_key, multihash ) in locations_manager.GetServiceFilenames().items() if ipfs_service_key in ipfs_service_keys }
+                    if 'ipfs_multihashes' in wanted_fields:
+                        
+                        metadata_row[ 'ipfs_multihashes' ] = { ipfs_service_key.hex() : multihash for ( ipfs_service_key, multihash ) in locations_manager.GetServiceFilenames().items() if ipfs_service_key in ipfs_service_keys }
+                        
                     
                     if detailed_url_information:
                         
@@ -704,113 +928,122 @@ class HydrusResourceClientAPIRestrictedGetFilesFileMetadata( HydrusResourceClien
                         metadata_row[ 'detailed_known_urls' ] = detailed_known_urls
                         
                     
-                    ratings_manager = media_result.GetRatingsManager()
-                    
-                    ratings_dict = {}
-                    
-                    for rating_service_key in rating_service_keys:
+                    if 'ratings' in wanted_fields:
                         
-                        rating_object = ratings_manager.GetRatingForAPI( rating_service_key )
+                        ratings_manager = media_result.GetRatingsManager()
                         
-                        ratings_dict[ rating_service_key.hex() ] = rating_object
+                        ratings_dict = {}
+                        
+                        for rating_service_key in rating_service_keys:
+                            
+                            rating_object = ratings_manager.GetRatingForAPI( rating_service_key )
+                            
+                            ratings_dict[ rating_service_key.hex() ] = rating_object
+                            
+                        
+                        metadata_row[ 'ratings' ] = ratings_dict
                         
-                    
-                    metadata_row[ 'ratings' ] = ratings_dict
                     
                     tags_manager = media_result.GetTagsManager()
                     
-                    tags_dict = {}
-                    
-                    for tag_service_key in tag_service_keys:
-                        
-                        storage_statuses_to_tags = tags_manager.GetStatusesToTags( tag_service_key, ClientTags.TAG_DISPLAY_STORAGE )
-                        
-                        storage_tags_json_serialisable = { str( status ) : sorted( tags, key = HydrusText.HumanTextSortKey ) for ( status, tags ) in storage_statuses_to_tags.items() if len( tags ) > 0 }
+                    if 'tags' in wanted_fields:
                         
-                        display_statuses_to_tags = tags_manager.GetStatusesToTags( tag_service_key, ClientTags.TAG_DISPLAY_DISPLAY_ACTUAL )
+                        tags_dict = {}
                         
-                        display_tags_json_serialisable = { str( status ) : sorted( tags, key = HydrusText.HumanTextSortKey ) for ( status, tags ) in display_statuses_to_tags.items() if len( tags ) > 0 }
-                        
-                        tags_dict_object = {
-                            'name' : service_keys_to_names[ tag_service_key ],
-                            'type' : service_keys_to_types[ tag_service_key ],
-                            'type_pretty' : HC.service_string_lookup[ service_keys_to_types[ tag_service_key ] ],
-                            'storage_tags' : storage_tags_json_serialisable,
-                            'display_tags' : display_tags_json_serialisable
-                        }
+                        for tag_service_key in tag_service_keys:
+                            
+                            storage_statuses_to_tags = tags_manager.GetStatusesToTags( tag_service_key, ClientTags.TAG_DISPLAY_STORAGE )
+                            
+                            storage_tags_json_serialisable = { str( status ) : sorted( tags, key = HydrusText.HumanTextSortKey ) for ( status, tags ) in storage_statuses_to_tags.items() if len( tags ) > 0 }
+                            
+                            display_statuses_to_tags = tags_manager.GetStatusesToTags( tag_service_key, ClientTags.TAG_DISPLAY_DISPLAY_ACTUAL )
+                            
+                            display_tags_json_serialisable = { str( status ) : sorted( tags, key = HydrusText.HumanTextSortKey ) for ( status, tags ) in display_statuses_to_tags.items() if len( tags ) > 0 }
+                            
+                            tags_dict_object = {
+                                'name' : service_keys_to_names[ tag_service_key ],
+                                'type' : service_keys_to_types[ tag_service_key ],
+                                'type_pretty' : HC.service_string_lookup[ service_keys_to_types[ tag_service_key ] ],
+                                'storage_tags' : storage_tags_json_serialisable,
+                                'display_tags' : display_tags_json_serialisable
+                            }
+                            
+                            tags_dict[ tag_service_key.hex() ] = tags_dict_object
+                            
                         
-                        tags_dict[ tag_service_key.hex() ] = tags_dict_object
+                        metadata_row[ 'tags' ] = tags_dict
                         
                     
-                    metadata_row[ 'tags' ] = tags_dict
-                    
                     #
                     
-                    file_viewing_stats_list = []
-                    
-                    fvsm = media_result.GetFileViewingStatsManager()
-                    
-                    for canvas_type in [
-                        CC.CANVAS_MEDIA_VIEWER,
-                        CC.CANVAS_PREVIEW,
-                        CC.CANVAS_CLIENT_API
-                    ]:
+                    if 'file_viewing_statistics' in wanted_fields:
                         
-                        views = fvsm.GetViews( canvas_type )
-                        viewtime = HydrusTime.SecondiseMSFloat( fvsm.GetViewtimeMS( canvas_type ) )
-                        last_viewed_timestamp = HydrusTime.SecondiseMSFloat( times_manager.GetLastViewedTimestampMS( canvas_type ) )
+                        file_viewing_stats_list = []
                         
-                        json_object = {
-                            'canvas_type' : canvas_type,
-                            'canvas_type_pretty' : CC.canvas_type_str_lookup[ canvas_type ],
-                            'views' : views,
-                            'viewtime' : viewtime,
-                            'last_viewed_timestamp' : last_viewed_timestamp
-                        }
+                        fvsm = media_result.GetFileViewingStatsManager()
+                        
+                        for canvas_type in [
+                            CC.CANVAS_MEDIA_VIEWER,
+                            CC.CANVAS_PREVIEW,
+                            CC.CANVAS_CLIENT_API
+                        ]:
+                            
+                            views = fvsm.GetViews( canvas_type )
+                            viewtime = HydrusTime.SecondiseMSFloat( fvsm.GetViewtimeMS( canvas_type ) )
+                            last_viewed_timestamp = HydrusTime.SecondiseMSFloat( times_manager.GetLastViewedTimestampMS( canvas_type ) )
+                            
+                            json_object = {
+                                'canvas_type' : canvas_type,
+                                'canvas_type_pretty' : CC.canvas_type_str_lookup[ canvas_type ],
+                                'views' : views,
+                                'viewtime' : viewtime,
+                                'last_viewed_timestamp' : last_viewed_timestamp
+                            }
+                            
+                            file_viewing_stats_list.append( json_object )
+                            
                         
-                        file_viewing_stats_list.append( json_object )
+                        metadata_row[ 'file_viewing_statistics' ] = file_viewing_stats_list
                         
                     
-                    metadata_row[ 'file_viewing_statistics' ] = file_viewing_stats_list
-                    
                     # Old stuff starts here
                     
-                    api_service_keys_to_statuses_to_tags = {}
-                    
-                    service_keys_to_statuses_to_tags = tags_manager.GetServiceKeysToStatusesToTags( ClientTags.TAG_DISPLAY_STORAGE )
-                    
-                    for ( service_key, statuses_to_tags ) in service_keys_to_statuses_to_tags.items():
+                    if not hide_service_keys_tags and 'service_keys_to_statuses_to_tags' in wanted_fields:
+                        
+                        api_service_keys_to_statuses_to_tags = {}
                         
-                        statuses_to_tags_json_serialisable = { str( status ) : sorted( tags, key = HydrusText.HumanTextSortKey ) for ( status, tags ) in statuses_to_tags.items() if len( tags ) > 0 }
+                        service_keys_to_statuses_to_tags = tags_manager.GetServiceKeysToStatusesToTags( ClientTags.TAG_DISPLAY_STORAGE )
                         
-                        if len( statuses_to_tags_json_serialisable ) > 0:
+                        for ( service_key, statuses_to_tags ) in service_keys_to_statuses_to_tags.items():
                             
-                            api_service_keys_to_statuses_to_tags[ service_key.hex() ] = statuses_to_tags_json_serialisable
+                            statuses_to_tags_json_serialisable = { str( status ) : sorted( tags, key = HydrusText.HumanTextSortKey ) for ( status, tags ) in statuses_to_tags.items() if len( tags ) > 0 }
+                            
+                            if len( statuses_to_tags_json_serialisable ) > 0:
+                                
+                                api_service_keys_to_statuses_to_tags[ service_key.hex() ] = statuses_to_tags_json_serialisable
+                                
                             
-                        
-                    
-                    if not hide_service_keys_tags:
                         
                         metadata_row[ 'service_keys_to_statuses_to_tags' ] = api_service_keys_to_statuses_to_tags
                         
                     
                     #
                     
-                    api_service_keys_to_statuses_to_tags = {}
-                    
-                    service_keys_to_statuses_to_tags = tags_manager.GetServiceKeysToStatusesToTags( ClientTags.TAG_DISPLAY_DISPLAY_ACTUAL )
-                    
-                    for ( service_key, statuses_to_tags ) in service_keys_to_statuses_to_tags.items():
+                    if not hide_service_keys_tags and 'service_keys_to_statuses_to_display_tags' in wanted_fields:
                         
-                        statuses_to_tags_json_serialisable = { str( status ) : sorted( tags, key = HydrusText.HumanTextSortKey ) for ( status, tags ) in statuses_to_tags.items() if len( tags ) > 0 }
+                        api_service_keys_to_statuses_to_tags = {}
                         
-                        if len( statuses_to_tags_json_serialisable ) > 0:
+                        service_keys_to_statuses_to_tags = tags_manager.GetServiceKeysToStatusesToTags( ClientTags.TAG_DISPLAY_DISPLAY_ACTUAL )
+                        
+                        for ( service_key, statuses_to_tags ) in service_keys_to_statuses_to_tags.items():
                             
-                            api_service_keys_to_statuses_to_tags[ service_key.hex() ] = statuses_to_tags_json_serialisable
+                            statuses_to_tags_json_serialisable = { str( status ) : sorted( tags, key = HydrusText.HumanTextSortKey ) for ( status, tags ) in statuses_to_tags.items() if len( tags ) > 0 }
+                            
+                            if len( statuses_to_tags_json_serialisable ) > 0:
+                                
+                                api_service_keys_to_statuses_to_tags[ service_key.hex() ] = statuses_to_tags_json_serialisable
+                                
                             
-                        
-                    
-                    if not hide_service_keys_tags:
                         
                         metadata_row[ 'service_keys_to_statuses_to_display_tags' ] = api_service_keys_to_statuses_to_tags
                         
@@ -828,6 +1061,94 @@ class HydrusResourceClientAPIRestrictedGetFilesFileMetadata( HydrusResourceClien
                 
             
         
+        if fields is not None:
+            
+            metadata = [ { key : value for ( key, value ) in metadata_row.items() if key in fields } for metadata_row in metadata ]
+            
+        
+        return metadata
+        
+    
+    def _threadDoGETJob( self, request: HydrusServerRequest.HydrusRequest ):
+        
+        include_services_object = request.parsed_request_args.GetValue( 'include_services_object', bool, default_value = True )
+        create_new_file_ids = request.parsed_request_args.GetValue( 'create_new_file_ids', bool, default_value = False )
+        stream = request.parsed_request_args.GetValue( 'stream', bool, default_value = False )
+        columnar = request.parsed_request_args.GetValue( 'columnar', bool, default_value = False )
+        
+        fields = None
+        
+        if 'fields' in request.parsed_request_args:
+            
+            fields = set( request.parsed_request_args.GetValue( 'fields', list, expected_list_type = str ) )
+            
+            unknown_fields = fields.difference( FILE_METADATA_FIELDS )
+            
+            if len( unknown_fields ) > 0:
+                
+                raise HydrusExceptions.BadRequestException( 'Sorry, I do not know these fields: {}'.format( ', '.join( sorted( unknown_fields ) ) ) )
+                
+            
+            # the identifiers always come back, so you know what is what
+            fields.update( FILE_METADATA_IDENTIFIER_FIELDS )
+            
+        
+        hashes = ClientLocalServerCore.ParseHashes( request )
+        
+        hash_ids_to_hashes = CG.client_controller.Read( 'hash_ids_to_hashes', hashes = hashes, create_new_hash_ids = create_new_file_ids )
+        
+        hashes_to_hash_ids = { hash : hash_id for ( hash_id, hash ) in hash_ids_to_hashes.items() }
+        
+        hash_ids = set( hash_ids_to_hashes.keys() )
+        
+        request.client_api_permissions.CheckPermissionToSeeFiles( hash_ids )
+        
+        mime = request.preferred_mime
+        
+        if stream:
+            
+            header_dict = {}
+            
+            if include_services_object:
+                
+                header_dict[ 'services' ] = ClientLocalServerCore.GetServicesDict()
+                
+            
+            # we fetch and send in blocks, so the client never holds the whole response in memory and the caller can start work on the first rows straight away
+            
+            def rows_generator():
+                
+                for block_of_hashes in HydrusLists.SplitListIntoChunks( hashes, 256 ):
+                    
+                    metadata = self._GetMetadataRows( request, block_of_hashes, hashes_to_hash_ids, fields = fields )
+                    
+                    if columnar:
+                        
+                        yield [ ConvertFileMetadataRowsToColumns( metadata ) ]
+                        
+                    else:
+                        
+                        yield metadata
+                        
+                    
+                
+            
+            body_generator = ClientLocalServerCore.GenerateStreamBody( header_dict, rows_generator(), mime )
+            
+            response_context = HydrusServerResources.ResponseContext( 200, mime = mime, body_generator = body_generator )
+            
+            return response_context
+            
+        
+        body_dict = {}
+        
+        metadata = self._GetMetadataRows( request, hashes, hashes_to_hash_ids, fields = fields )
+        
+        if columnar:
+            
+            metadata = ConvertFileMetadataRowsToColumns( metadata )
+            
+        
         body_dict[ 'metadata' ] = metadata
         
         if include_services_object:
@@ -835,7 +1156,6 @@ class HydrusResourceClientAPIRestrictedGetFilesFileMetadata( HydrusResourceClien
             body_dict[ 'services' ] = ClientLocalServerCore.GetServicesDict()
             
         
-        mime = request.preferred_mime
         body = ClientLocalServerCore.Dumps( body_dict, mime )
         
         response_context = HydrusServerResources.ResponseContext( 200, mime = mime, body = body )
@@ -856,14 +1176,18 @@ class HydrusResourceClientAPIRestrictedGetFilesGetThumbnail( HydrusResourceClien
             
             try:
                 
-                path = CG.client_controller.client_files_manager.GetThumbnailPath( media_result )
+                # might be in a pack file, so we can't rely on a path
+                thumbnail_bytes = CG.client_controller.client_files_manager.GetThumbnailBytes( media_result )
                 
-                if not os.path.exists( path ):
+                response_mime = HydrusFileHandling.GetThumbnailMimeFromBytes( thumbnail_bytes )
+                
+                if response_mime is None:
                     
-                    # not _supposed_ to happen, but it seems in odd situations it can
-                    raise HydrusExceptions.FileMissingException()
+                    response_mime = HC.IMAGE_JPEG
                     
                 
+                return HydrusServerResources.ResponseContext( 200, mime = response_mime, body = thumbnail_bytes )
+                
             except HydrusExceptions.FileMissingException:
                 
                 path = HydrusFileHandling.mimes_to_default_thumbnail_paths[ mime ]
@@ -0,0 +1,409 @@
+import array
+import collections
+import threading
+import typing
+
+from hydrus.core import HydrusConstants as HC
+
+from hydrus.client import ClientConstants as CC
+from hydrus.client.metadata import ClientContentUpdates
+from hydrus.client.search import ClientSearchFileSearchContext
+from hydrus.client.search import ClientSearchPredicate
+
+# what a cached search depends on. these are ( content type, service_key or None ) pairs, where None means any service
+# archive/inbox comes in as files content, but it only matters to a handful of predicates, so it gets its own type
+DEPENDENCY_INBOX = 'inbox'
+
+TAG_PREDICATE_TYPES = {
+    ClientSearchPredicate.PREDICATE_TYPE_TAG,
+    ClientSearchPredicate.PREDICATE_TYPE_NAMESPACE,
+    ClientSearchPredicate.PREDICATE_TYPE_PARENT,
+    ClientSearchPredicate.PREDICATE_TYPE_WILDCARD,
+    ClientSearchPredicate.PREDICATE_TYPE_SYSTEM_UNTAGGED,
+    ClientSearchPredicate.PREDICATE_TYPE_SYSTEM_NUM_TAGS,
+    ClientSearchPredicate.PREDICATE_TYPE_SYSTEM_TAG_AS_NUMBER
+}
+
+# these only look at what files are where and their basic metadata. anything that changes that without a content update clears the whole cache
+FILE_ONLY_PREDICATE_TYPES = {
+    ClientSearchPredicate.PREDICATE_TYPE_SYSTEM_EVERYTHING,
+    ClientSearchPredicate.PREDICATE_TYPE_SYSTEM_LIMIT,
+    ClientSearchPredicate.PREDICATE_TYPE_SYSTEM_SIZE,
+    ClientSearchPredicate.PREDICATE_TYPE_SYSTEM_HASH,
+    ClientSearchPredicate.PREDICATE_TYPE_SYSTEM_WIDTH,
+    ClientSearchPredicate.PREDICATE_TYPE_SYSTEM_HEIGHT,
+    ClientSearchPredicate.PREDICATE_TYPE_SYSTEM_RATIO,
+    ClientSearchPredicate.PREDICATE_TYPE_SYSTEM_DURATION,
+    ClientSearchPredicate.PREDICATE_TYPE_SYSTEM_MIME,
+    ClientSearchPredicate.PREDICATE_TYPE_SYSTEM_SIMILAR_TO_FILES,
+    ClientSearchPredicate.PREDICATE_TYPE_SYSTEM_SIMILAR_TO_DATA,
+    ClientSearchPredicate.PREDICATE_TYPE_SYSTEM_LOCAL,
+    ClientSearchPredicate.PREDICATE_TYPE_SYSTEM_NOT_LOCAL,
+    ClientSearchPredicate.PREDICATE_TYPE_SYSTEM_NUM_WORDS,
+    ClientSearchPredicate.PREDICATE_TYPE_SYSTEM_FILE_SERVICE,
+    ClientSearchPredicate.PREDICATE_TYPE_SYSTEM_NUM_PIXELS,
+    ClientSearchPredicate.PREDICATE_TYPE_SYSTEM_DIMENSIONS,
+    ClientSearchPredicate.PREDICATE_TYPE_SYSTEM_FILE_RELATIONSHIPS_COUNT,
+    ClientSearchPredicate.PREDICATE_TYPE_SYSTEM_FILE_RELATIONSHIPS_KING,
+    ClientSearchPredicate.PREDICATE_TYPE_SYSTEM_FILE_RELATIONSHIPS,
+    ClientSearchPredicate.PREDICATE_TYPE_SYSTEM_HAS_AUDIO,
+    ClientSearchPredicate.PREDICATE_TYPE_SYSTEM_FRAMERATE,
+    ClientSearchPredicate.PREDICATE_TYPE_SYSTEM_NUM_FRAMES,
+    ClientSearchPredicate.PREDICATE_TYPE_SYSTEM_HAS_ICC_PROFILE,
+    ClientSearchPredicate.PREDICATE_TYPE_SYSTEM_HAS_HUMAN_READABLE_EMBEDDED_METADATA,
+    ClientSearchPredicate.PREDICATE_TYPE_SYSTEM_FILE_PROPERTIES,
+    ClientSearchPredicate.PREDICATE_TYPE_SYSTEM_HAS_EXIF,
+    ClientSearchPredicate.PREDICATE_TYPE_SYSTEM_HAS_TRANSPARENCY,
+    ClientSearchPredicate.PREDICATE_TYPE_SYSTEM_HAS_FORCED_FILETYPE
+}
+
+TIME_PREDICATE_TYPES = {
+    ClientSearchPredicate.PREDICATE_TYPE_SYSTEM_AGE,
+    ClientSearchPredicate.PREDICATE_TYPE_SYSTEM_LAST_VIEWED_TIME,
+    ClientSearchPredicate.PREDICATE_TYPE_SYSTEM_MODIFIED_TIME,
+    ClientSearchPredicate.PREDICATE_TYPE_SYSTEM_ARCHIVED_TIME
+}
+
+PREDICATE_TYPES_TO_DEPENDENCIES = {
+    ClientSearchPredicate.PREDICATE_TYPE_SYSTEM_INBOX : { ( DEPENDENCY_INBOX, None ) },
+    ClientSearchPredicate.PREDICATE_TYPE_SYSTEM_ARCHIVE : { ( DEPENDENCY_INBOX, None ) },
+    ClientSearchPredicate.PREDICATE_TYPE_SYSTEM_AGE : { ( HC.CONTENT_TYPE_TIMESTAMP, None ) },
+    ClientSearchPredicate.PREDICATE_TYPE_SYSTEM_MODIFIED_TIME : { ( HC.CONTENT_TYPE_TIMESTAMP, None ) },
+    ClientSearchPredicate.PREDICATE_TYPE_SYSTEM_ARCHIVED_TIME : { ( DEPENDENCY_INBOX, None ), ( HC.CONTENT_TYPE_TIMESTAMP, None ) },
+    ClientSearchPredicate.PREDICATE_TYPE_SYSTEM_LAST_VIEWED_TIME : { ( HC.CONTENT_TYPE_FILE_VIEWING_STATS, None ), ( HC.CONTENT_TYPE_TIMESTAMP, None ) },
+    ClientSearchPredicate.PREDICATE_TYPE_SYSTEM_FILE_VIEWING_STATS : { ( HC.CONTENT_TYPE_FILE_VIEWING_STATS, None ) },
+    ClientSearchPredicate.PREDICATE_TYPE_SYSTEM_NUM_NOTES : { ( HC.CONTENT_TYPE_NOTES, None ) },
+    ClientSearchPredicate.PREDICATE_TYPE_SYSTEM_NOTES : { ( HC.CONTENT_TYPE_NOTES, None ) },
+    ClientSearchPredicate.PREDICATE_TYPE_SYSTEM_HAS_NOTE_NAME : { ( HC.CONTENT_TYPE_NOTES, None ) },
+    ClientSearchPredicate.PREDICATE_TYPE_SYSTEM_KNOWN_URLS : { ( HC.CONTENT_TYPE_URLS, None ) },
+    ClientSearchPredicate.PREDICATE_TYPE_SYSTEM_NUM_URLS : { ( HC.CONTENT_TYPE_URLS, None ) },
+    ClientSearchPredicate.PREDICATE_TYPE_SYSTEM_URLS : { ( HC.CONTENT_TYPE_URLS, None ) },
+    ClientSearchPredicate.PREDICATE_TYPE_SYSTEM_TAG_ADVANCED : { ( HC.CONTENT_TYPE_MAPPINGS, None ) }
+}
+
+MAX_NUM_ENTRIES = 64
+MAX_TOTAL_NUM_HASH_IDS = 4 * 1000 * 1000
+
+def _AddPredicateDependencies( predicate: ClientSearchPredicate.Predicate, tag_dependency, dependencies: set ) -> bool:
+    
+    predicate_type = predicate.GetType()
+    
+    if predicate_type == ClientSearchPredicate.PREDICATE_TYPE_OR_CONTAINER:
+        
+        return all( ( _AddPredicateDependencies( or_predicate, tag_dependency, dependencies ) for or_predicate in predicate.GetORPredicates() ) )
+        
+    
+    if predicate_type in TIME_PREDICATE_TYPES:
+        
+        ( operator, age_type, age_value ) = predicate.GetValue()
+        
+        if age_type == 'delta':
+            
+            # 'imported in the last seven days' means something different every time we run it
+            return False
+            
+        
+    
+    if predicate_type in TAG_PREDICATE_TYPES:
+        
+        dependencies.add( tag_dependency )
+        
+    elif predicate_type == ClientSearchPredicate.PREDICATE_TYPE_SYSTEM_RATING:
+        
+        ( operator, value, service_key ) = predicate.GetValue()
+        
+        dependencies.add( ( HC.CONTENT_TYPE_RATINGS, service_key ) )
+        
+    elif predicate_type in PREDICATE_TYPES_TO_DEPENDENCIES:
+        
+        dependencies.update( PREDICATE_TYPES_TO_DEPENDENCIES[ predicate_type ] )
+        
+    elif predicate_type not in FILE_ONLY_PREDICATE_TYPES:
+        
+        # something new we don't know about, so let's not guess
+        return False
+        
+    
+    return True
+    
+
+def GetCacheKey( file_search_context: ClientSearchFileSearchContext.FileSearchContext ):
+    
+    # predicate order doesn't change the result, so the key doesn't care about it either
+    
+    location_context = file_search_context.GetLocationContext()
+    
+    return (
+        tuple( sorted( location_context.current_service_keys ) ),
+        tuple( sorted( location_context.deleted_service_keys ) ),
+        file_search_context.GetTagContext().DumpToString(),
+        tuple( sorted( ( predicate.DumpToString() for predicate in file_search_context.GetPredicates() ) ) )
+    )
+    
+
+def GetDependencies( file_search_context: ClientSearchFileSearchContext.FileSearchContext ) -> typing.Optional[ typing.Set[ typing.Tuple[ typing.Any, typing.Optional[ bytes ] ] ] ]:
+    
+    # None means we can't cache this search
+    
+    tag_service_key = file_search_context.GetTagContext().service_key
+    
+    if tag_service_key == CC.COMBINED_TAG_SERVICE_KEY:
+        
+        tag_dependency = ( HC.CONTENT_TYPE_MAPPINGS, None )
+        
+    else:
+        
+        tag_dependency = ( HC.CONTENT_TYPE_MAPPINGS, tag_service_key )
+        
+    
+    # every search depends on what files are where
+    dependencies = { ( HC.CONTENT_TYPE_FILES, None ) }
+    
+    for predicate in file_search_context.GetPredicates():
+        
+        if not _AddPredicateDependencies( predicate, tag_dependency, dependencies ):
+            
+            return None
+            
+        
+    
+    return dependencies
+    
+
+def GetInvalidations( service_key: bytes, content_updates: typing.Collection[ ClientContentUpdates.ContentUpdate ] ) -> typing.Optional[ typing.Set[ typing.Tuple[ typing.Any, typing.Optional[ bytes ] ] ] ]:
+    
+    # None means invalidate everything
+    
+    invalidations = set()
+    
+    for content_update in content_updates:
+        
+        ( data_type, action, row ) = content_update.ToTuple()
+        
+        if data_type == HC.CONTENT_TYPE_FILES:
+            
+            if action in ( HC.CONTENT_UPDATE_ARCHIVE, HC.CONTENT_UPDATE_INBOX ):
+                
+                invalidations.add( ( DEPENDENCY_INBOX, None ) )
+                invalidations.add( ( HC.CONTENT_TYPE_TIMESTAMP, None ) )
+                
+            else:
+                
+                invalidations.add( ( HC.CONTENT_TYPE_FILES, None ) )
+                
+            
+        elif data_type in ( HC.CONTENT_TYPE_TAG_SIBLINGS, HC.CONTENT_TYPE_TAG_PARENTS ):
+            
+            # display rules can apply one service's siblings and parents to another, so this hits every tag search
+            invalidations.add( ( HC.CONTENT_TYPE_MAPPINGS, None ) )
+            
+        elif data_type in ( HC.CONTENT_TYPE_MAPPINGS, HC.CONTENT_TYPE_RATINGS ):
+            
+            invalidations.add( ( data_type, service_key ) )
+            
+        elif data_type in ( HC.CONTENT_TYPE_URLS, HC.CONTENT_TYPE_TIMESTAMP, HC.CONTENT_TYPE_FILE_VIEWING_STATS, HC.CONTENT_TYPE_NOTES ):
+            
+            invalidations.add( ( data_type, None ) )
+            
+        elif data_type == HC.CONTENT_TYPE_DIRECTORIES:
+            
+            pass
+            
+        else:
+            
+            return None
+            
+        
+    
+    return invalidations
+    
+
+def DependenciesAreInvalidated( dependencies, invalidations ) -> bool:
+    
+    for ( content_type, dependency_service_key ) in dependencies:
+        
+        for ( invalidation_content_type, invalidation_service_key ) in invalidations:
+            
+            if content_type == invalidation_content_type and ( dependency_service_key is None or invalidation_service_key is None or dependency_service_key == invalidation_service_key ):
+                
+                return True
+                
+            
+        
+    
+    return False
+    
+
+class FileSearchResultCache( object ):
+    
+    # recent whole-search results, before sort and limit, keyed on a canonical form of the search
+    # searches can run on the read pool while the main connection is writing, so everything is guarded by a generation number:
+    # a result is only stored if nothing was invalidated while it was being computed, and a write's invalidations are applied again after it commits
+    
+    def __init__( self ):
+        
+        self._lock = threading.Lock()
+        
+        self._keys_to_entries = collections.OrderedDict()
+        self._total_num_hash_ids = 0
+        
+        self._generation = 0
+        
+        self._pending_invalidations = []
+        self._pending_invalidate_all = False
+        
+    
+    def _Delete( self, key ):
+        
+        ( hash_ids, dependencies ) = self._keys_to_entries[ key ]
+        
+        del self._keys_to_entries[ key ]
+        
+        self._total_num_hash_ids -= len( hash_ids )
+        
+    
+    def _Invalidate( self, invalidations ):
+        
+        keys_to_delete = [ key for ( key, ( hash_ids, dependencies ) ) in self._keys_to_entries.items() if DependenciesAreInvalidated( dependencies, invalidations ) ]
+        
+        for key in keys_to_delete:
+            
+            self._Delete( key )
+            
+        
+    
+    def _InvalidateAll( self ):
+        
+        self._keys_to_entries = collections.OrderedDict()
+        self._total_num_hash_ids = 0
+        
+    
+    def GetGeneration( self ) -> int:
+        
+        with self._lock:
+            
+            return self._generation
+            
+        
+    
+    def GetNumEntries( self ) -> int:
+        
+        with self._lock:
+            
+            return len( self._keys_to_entries )
+            
+        
+    
+    def GetResult( self, key ) -> typing.Optional[ typing.List[ int ] ]:
+        
+        with self._lock:
+            
+            if key not in self._keys_to_entries:
+                
+                return None
+                
+            
+            self._keys_to_entries.move_to_end( key )
+            
+            ( hash_ids, dependencies ) = self._keys_to_entries[ key ]
+            
+            # the caller is free to sort or shuffle this
+            return list( hash_ids )
+            
+        
+    
+    def Invalidate( self, service_key: bytes, content_updates: typing.Collection[ ClientContentUpdates.ContentUpdate ] ):
+        
+        invalidations = GetInvalidations( service_key, content_updates )
+        
+        if invalidations is None:
+            
+            self.InvalidateAll()
+            
+            return
+            
+        
+        if len( invalidations ) == 0:
+            
+            return
+            
+        
+        with self._lock:
+            
+            self._generation += 1
+            
+            self._Invalidate( invalidations )
+            
+            self._pending_invalidations.append( invalidations )
+            
+        
+    
+    def InvalidateAll( self ):
+        
+        with self._lock:
+            
+            self._generation += 1
+            
+            self._InvalidateAll()
+            
+            self._pending_invalidate_all = True
+            
+        
+    
+    def ReapplyInvalidationsAfterJob( self ):
+        
+        # a read pool search may have finished and stored a result from before the write committed, so we clear again now it has
+        
+        with self._lock:
+            
+            if not self._pending_invalidate_all and len( self._pending_invalidations ) == 0:
+                
+                return
+                
+            
+            self._generation += 1
+            
+            if self._pending_invalidate_all:
+                
+                self._InvalidateAll()
+                
+            else:
+                
+                for invalidations in self._pending_invalidations:
+                    
+                    self._Invalidate( invalidations )
+                    
+                
+            
+            self._pending_invalidations = []
+            self._pending_invalidate_all = False
+            
+        
+    
+    def SetResult( self, key, generation: int, hash_ids: typing.Collection[ int ], dependencies ):
+        
+        if len( hash_ids ) > MAX_TOTAL_NUM_HASH_IDS:
+            
+            return
+            
+        
+        with self._lock:
+            
+            if generation != self._generation:
+                
+                return
+                
+            
+            if key in self._keys_to_entries:
+                
+                self._Delete( key )
+                
+            
+            self._keys_to_entries[ key ] = ( array.array( 'q', hash_ids ), dependencies )
+            self._total_num_hash_ids += len( hash_ids )
+            
+            while len( self._keys_to_entries ) > MAX_NUM_ENTRIES or self._total_num_hash_ids > MAX_TOTAL_NUM_HASH_IDS:
+                
+                ( oldest_key, entry ) = next( iter( self._keys_to_entries.items() ) )
+                
+                self._Delete( oldest_key )
@@ -1,5 +1,7 @@
 import zlib
 
+from hydrus.core import HydrusExceptions
+
 LZ4_OK = False
 
 try:
@@ -13,10 +15,149 @@ except: # ImportError wasn't enough here as Linux went up the shoot with a __ver
     
     pass # this is no big deal
     
+
+ZSTD_OK = False
+
+try:
+    
+    import zstandard
+    
+    ZSTD_OK = True
+    
+except:
+    
+    pass # also no big deal, we fall back to lz4 or zlib
+    
+
+# framed payloads describe themselves, so we can change codec later and still read everything we ever wrote
+# zlib streams cannot start with 0xa7 (the low nibble of the first byte is always 8), and an old raw lz4 block starting with these bytes would be a >1GB payload
+FRAME_MAGIC = b'\xa7HYC'
+FRAME_VERSION = 1
+FRAME_HEADER_LENGTH = len( FRAME_MAGIC ) + 3
+
+CODEC_ZLIB = 0
+CODEC_LZ4 = 1
+CODEC_ZSTD = 2
+
+codec_string_lookup = {
+    CODEC_ZLIB : 'zlib',
+    CODEC_LZ4 : 'lz4',
+    CODEC_ZSTD : 'zstd'
+}
+
+DICTIONARY_NONE = 0
+DICTIONARY_IMPORT_LOGS = 1
+
+# a raw-content dictionary seeded with the bits of json that file and gallery logs repeat over and over
+# many small similar objects compress very poorly on their own, so this gives the codec a head start
+# never edit this! old payloads were compressed against these exact bytes. make a new id instead
+IMPORT_LOGS_DICTIONARY_BYTES = bytes(
+    ''.join(
+        (
+            'index.php?page=post&s=view&id=',
+            '/posts/',
+            '/post/show/',
+            '/artworks/',
+            '/status/',
+            '/original/',
+            '/images/',
+            '/data/',
+            '.jpeg", ',
+            '.webm", ',
+            '.gif", ',
+            '.mp4", ',
+            'page:',
+            'title:',
+            'meta:',
+            'rating:',
+            'character:',
+            'series:',
+            'creator:',
+            'Found 0 new URLs.", ',
+            'Found 1 new URLs.", ',
+            'already in db", ',
+            '"md5", "',
+            '"sha1", "',
+            '"sha512", "',
+            '&page=',
+            '?tags=',
+            'https://www.',
+            '.png", ',
+            '.jpg", ',
+            '.com/',
+            ', true, [], [77, 1, []], ',
+            '[2, [66, 4, ["https://',
+            ', null, {}, [], [77, 1, []], [',
+            '], [], [',
+            '"https://',
+            '[["sha256", "',
+            '[2, [57, 8, [1, "https://'
+        )
+    ),
+    'utf-8'
+)
+
+_dictionary_ids_to_bytes = {
+    DICTIONARY_IMPORT_LOGS : IMPORT_LOGS_DICTIONARY_BYTES
+}
+
 def CompressBytesToBytes( obj_bytes: bytes ) -> bytes:
     
     return zlib.compress( obj_bytes, 9 )
     
+def CompressBytesToFramedBytes( obj_bytes: bytes, codec = None, dictionary_id = DICTIONARY_NONE ) -> bytes:
+    
+    if codec is None:
+        
+        codec = GetDefaultCodec()
+        
+    
+    dictionary_bytes = GetDictionaryBytes( dictionary_id )
+    
+    if codec == CODEC_ZSTD:
+        
+        if dictionary_bytes is None:
+            
+            compressor = zstandard.ZstdCompressor( level = 3 )
+            
+        else:
+            
+            compressor = zstandard.ZstdCompressor( level = 3, dict_data = zstandard.ZstdCompressionDict( dictionary_bytes, dict_type = zstandard.DICT_TYPE_RAWCONTENT ) )
+            
+        
+        payload = compressor.compress( obj_bytes )
+        
+    elif codec == CODEC_LZ4:
+        
+        if dictionary_bytes is None:
+            
+            payload = lz4.block.compress( obj_bytes )
+            
+        else:
+            
+            payload = lz4.block.compress( obj_bytes, dict = dictionary_bytes )
+            
+        
+    elif codec == CODEC_ZLIB:
+        
+        if dictionary_bytes is None:
+            
+            compressor = zlib.compressobj( 1 )
+            
+        else:
+            
+            compressor = zlib.compressobj( 1, zdict = dictionary_bytes )
+            
+        
+        payload = compressor.compress( obj_bytes ) + compressor.flush()
+        
+    else:
+        
+        raise ValueError( 'Unknown compression codec: {}'.format( codec ) )
+        
+    
+    return FRAME_MAGIC + bytes( ( FRAME_VERSION, codec, dictionary_id ) ) + payload
+    
 def CompressFastBytesToBytes( obj_bytes: bytes ) -> bytes:
     
     if LZ4_OK:
@@ -34,8 +175,19 @@ def CompressStringToBytes( obj_string: str ) -> bytes:
     
     return CompressBytesToBytes( obj_bytes )
     
+def CompressStringToFramedBytes( obj_string: str, codec = None, dictionary_id = DICTIONARY_NONE ) -> bytes:
+    
+    obj_bytes = bytes( obj_string, 'utf-8' )
+    
+    return CompressBytesToFramedBytes( obj_bytes, codec = codec, dictionary_id = dictionary_id )
+    
 def DecompressBytesToBytes( compressed_bytes: bytes ) -> bytes:
     
+    if IsFramedBytes( compressed_bytes ):
+        
+        return DecompressFramedBytesToBytes( compressed_bytes )
+        
+    
     try:
         
         obj_bytes = zlib.decompress( compressed_bytes )
@@ -72,4 +224,122 @@ def DecompressFastBytesToBytes( compressed_bytes: bytes ) -> bytes:
         
         return compressed_bytes
         
-    
\ No newline at end of file
+    
+def DecompressFramedBytesToBytes( compressed_bytes: bytes ) -> bytes:
+    
+    if len( compressed_bytes ) < FRAME_HEADER_LENGTH:
+        
+        raise ValueError( 'This compressed payload is truncated!' )
+        
+    
+    ( frame_version, codec, dictionary_id ) = compressed_bytes[ len( FRAME_MAGIC ) : FRAME_HEADER_LENGTH ]
+    
+    if frame_version > FRAME_VERSION:
+        
+        raise HydrusExceptions.UnsupportedCompressionException( 'This compressed payload is from a newer version of hydrus!' )
+        
+    
+    dictionary_bytes = GetDictionaryBytes( dictionary_id )
+    
+    if dictionary_id != DICTIONARY_NONE and dictionary_bytes is None:
+        
+        raise HydrusExceptions.UnsupportedCompressionException( 'This compressed payload needs compression dictionary {}, which is unknown!'.format( dictionary_id ) )
+        
+    
+    payload = compressed_bytes[ FRAME_HEADER_LENGTH : ]
+    
+    if codec == CODEC_ZSTD:
+        
+        if not ZSTD_OK:
+            
+            raise HydrusExceptions.UnsupportedCompressionException( 'This compressed payload needs zstd, but the zstandard library is not available! Please install it and try again.' )
+            
+        
+        if dictionary_bytes is None:
+            
+            decompressor = zstandard.ZstdDecompressor()
+            
+        else:
+            
+            decompressor = zstandard.ZstdDecompressor( dict_data = zstandard.ZstdCompressionDict( dictionary_bytes, dict_type = zstandard.DICT_TYPE_RAWCONTENT ) )
+            
+        
+        # we don't stream, so the content size is always in the frame header
+        return decompressor.decompress( payload )
+        
+    elif codec == CODEC_LZ4:
+        
+        if not LZ4_OK:
+            
+            raise HydrusExceptions.UnsupportedCompressionException( 'This compressed payload needs lz4, but the lz4 library is not available! Please install it and try again.' )
+            
+        
+        if dictionary_bytes is None:
+            
+            return lz4.block.decompress( payload )
+            
+        else:
+            
+            return lz4.block.decompress( payload, dict = dictionary_bytes )
+            
+        
+    elif codec == CODEC_ZLIB:
+        
+        if dictionary_bytes is None:
+            
+            decompressor = zlib.decompressobj()
+            
+        else:
+            
+            decompressor = zlib.decompressobj( zdict = dictionary_bytes )
+            
+        
+        return decompressor.decompress( payload ) + decompressor.flush()
+        
+    else:
+        
+        raise HydrusExceptions.UnsupportedCompressionException( 'Unknown compression codec: {}'.format( codec ) )
+        
+    
+def GetDictionaryBytes( dictionary_id: int ):
+    
+    if dictionary_id == DICTIONARY_NONE:
+        
+        return None
+        
+    
+    return _dictionary_ids_to_bytes.get( dictionary_id, None )
+    
+def GetDefaultCodec() -> int:
+    
+    # this is what we write to the db, so it has to be something every future boot can read
+    # zstd is optional, and if a user lost it after an update, everything written with it would be unloadable, so it is only used when asked for
+    
+    if LZ4_OK:
+        
+        return CODEC_LZ4
+        
+    else:
+        
+        return CODEC_ZLIB
+        
+    
+def IsFramedBytes( compressed_bytes: bytes ) -> bool:
+    
+    return compressed_bytes[ : len( FRAME_MAGIC ) ] == FRAME_MAGIC
+    
+def RegisterDictionary( dictionary_id: int, dictionary_bytes: bytes ):
+    
+    # ids are written into every payload, so they must be stable forever and fit in a byte
+    
+    if not 0 < dictionary_id < 256:
+        
+        raise ValueError( 'Compression dictionary ids must be 1-255!' )
+        
+    
+    if dictionary_id in _dictionary_ids_to_bytes and _dictionary_ids_to_bytes[ dictionary_id ] != dictionary_bytes:
+        
+        raise ValueError( 'Compression dictionary {} is already registered with different data!'.format( dictionary_id ) )
+        
+    
+    _dictionary_ids_to_bytes[ dictionary_id ] = dictionary_bytes
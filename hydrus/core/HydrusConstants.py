@@ -105,8 +105,8 @@ options = {}
 # Misc
 
 NETWORK_VERSION = 20
-SOFTWARE_VERSION = 622
-CLIENT_API_VERSION = 80
+SOFTWARE_VERSION = 623
+CLIENT_API_VERSION = 82
 
 SERVER_THUMBNAIL_DIMENSIONS = ( 200, 200 )
 
@@ -1,6 +1,5 @@
 import collections
 import os
-import random
 import sys
 import threading
 import time
@@ -10,6 +9,7 @@ from hydrus.core import HydrusConstants as HC
 from hydrus.core import HydrusData
 from hydrus.core import HydrusDB
 from hydrus.core import HydrusGlobals as HG
+from hydrus.core import HydrusNumbers
 from hydrus.core import HydrusPaths
 from hydrus.core import HydrusProcess
 from hydrus.core import HydrusPubSub
@@ -50,10 +50,11 @@ class HydrusController( object ):
         
         self._thread_slot_lock = threading.Lock()
         
-        self._call_to_threads = []
+        self._call_to_thread_pool = HydrusThreading.CallToThreadPool( self )
         self._long_running_call_to_threads = []
         
         self._thread_pool_busy_status_text = ''
+        self._thread_pool_busy_status_tooltip = ''
         self._thread_pool_busy_status_text_new_check_time = 0
         
         self._call_to_thread_lock = threading.Lock()
@@ -74,38 +75,27 @@ class HydrusController( object ):
         self.TouchTime( 'last_sleep_check' )
         
     
-    def _GetCallToThread( self ):
+    def _CallToThreadPool( self, priority, callable, *args, **kwargs ) -> None:
         
-        with self._call_to_thread_lock:
-            
-            for call_to_thread in self._call_to_threads:
-                
-                if not call_to_thread.CurrentlyWorking():
-                    
-                    return call_to_thread
-                    
-                
-            
-            # all the threads in the pool are currently busy
+        if HG.callto_report_mode:
             
-            calling_from_the_thread_pool = threading.current_thread() in self._call_to_threads
+            what_to_report = [ callable ]
             
-            if calling_from_the_thread_pool or len( self._call_to_threads ) < 200:
-                
-                call_to_thread = HydrusThreading.THREADCallToThread( self, 'CallToThread' )
-                
-                self._call_to_threads.append( call_to_thread )
+            if len( args ) > 0:
                 
-                call_to_thread.start()
+                what_to_report.append( args )
                 
-            else:
+            
+            if len( kwargs ) > 0:
                 
-                call_to_thread = random.choice( self._call_to_threads )
+                what_to_report.append( kwargs )
                 
             
-            return call_to_thread
+            HydrusData.ShowText( tuple( what_to_report ) )
             
         
+        self._call_to_thread_pool.Submit( priority, callable, *args, **kwargs )
+        
     
     def _GetCallToThreadLongRunning( self ):
         
@@ -171,6 +161,8 @@ class HydrusController( object ):
         # we don't really want to hang on to threads that are done as event.wait() has a bit of idle cpu
         # so, any that are in the pools that aren't doing anything can be killed and sent to garbage
         
+        self._call_to_thread_pool.CullIdleWorkers()
+        
         with self._call_to_thread_lock:
             
             def filter_call_to_threads( t ):
@@ -187,8 +179,6 @@ class HydrusController( object ):
                     
                 
             
-            self._call_to_threads = list( filter( filter_call_to_threads, self._call_to_threads ) )
-            
             self._long_running_call_to_threads = list( filter( filter_call_to_threads, self._long_running_call_to_threads ) )
             
         
@@ -353,26 +343,21 @@ class HydrusController( object ):
     
     def CallToThread( self, callable, *args, **kwargs ) -> None:
         
-        if HG.callto_report_mode:
-            
-            what_to_report = [ callable ]
-            
-            if len( args ) > 0:
-                
-                what_to_report.append( args )
-                
-            
-            if len( kwargs ) > 0:
-                
-                what_to_report.append( kwargs )
-                
-            
-            HydrusData.ShowText( tuple( what_to_report ) )
-            
+        self._CallToThreadPool( HydrusThreading.CALL_TO_THREAD_PRIORITY_NORMAL, callable, *args, **kwargs )
+        
+    
+    def CallToThreadBackground( self, callable, *args, **kwargs ) -> None:
         
-        call_to_thread = self._GetCallToThread()
+        # for bulk work like import queues that can wait a moment if the user is doing something
         
-        call_to_thread.put( callable, *args, **kwargs )
+        self._CallToThreadPool( HydrusThreading.CALL_TO_THREAD_PRIORITY_BACKGROUND, callable, *args, **kwargs )
+        
+    
+    def CallToThreadInteractive( self, callable, *args, **kwargs ) -> None:
+        
+        # for quick jobs the user is waiting on, which should not sit in a queue behind heavy work
+        
+        self._CallToThreadPool( HydrusThreading.CALL_TO_THREAD_PRIORITY_INTERACTIVE, callable, *args, **kwargs )
         
     
     def CallToThreadLongRunning( self, callable, *args, **kwargs ) -> None:
@@ -510,39 +495,63 @@ class HydrusController( object ):
         
         if HydrusTime.TimeHasPassed( self._thread_pool_busy_status_text_new_check_time ):
             
-            with self._call_to_thread_lock:
-                
-                num_threads = sum( ( 1 for t in self._call_to_threads if t.CurrentlyWorking() ) )
-                
+            ( num_threads, num_working, priorities_to_num_waiting, priorities_to_latencies ) = self._call_to_thread_pool.GetStatus()
             
-            if num_threads < 4:
+            if num_working < 4:
                 
-                self._thread_pool_busy_status_text = ''
+                text = ''
                 
-            elif num_threads < 10:
+            elif num_working < 10:
                 
-                self._thread_pool_busy_status_text = 'working'
+                text = 'working'
                 
-            elif num_threads < 20:
+            elif num_working < 20:
                 
-                self._thread_pool_busy_status_text = 'busy'
+                text = 'busy'
                 
             else:
                 
-                self._thread_pool_busy_status_text = 'very busy!'
+                text = 'very busy!'
                 
             
+            num_waiting = sum( priorities_to_num_waiting.values() )
+            
+            if num_waiting > 0:
+                
+                # we only queue when we hit the thread caps
+                text = 'very busy! ({} queued)'.format( HydrusNumbers.ToHumanInt( num_waiting ) )
+                
+            
+            tooltip_lines = [ '{} threads, {} working'.format( HydrusNumbers.ToHumanInt( num_threads ), HydrusNumbers.ToHumanInt( num_working ) ) ]
+            
+            for priority in HydrusThreading.CALL_TO_THREAD_PRIORITIES:
+                
+                line = '{}: {} queued'.format( HydrusThreading.call_to_thread_priority_str_lookup[ priority ], HydrusNumbers.ToHumanInt( priorities_to_num_waiting[ priority ] ) )
+                
+                if priority in priorities_to_latencies:
+                    
+                    ( mean_latency, max_latency ) = priorities_to_latencies[ priority ]
+                    
+                    line += ', recent wait to start {} average, {} worst'.format( HydrusTime.MillisecondsDurationToPrettyTime( int( mean_latency * 1000 ), force_numbers = True ), HydrusTime.MillisecondsDurationToPrettyTime( int( max_latency * 1000 ), force_numbers = True ) )
+                    
+                
+                tooltip_lines.append( line )
+                
+            
+            self._thread_pool_busy_status_text = text
+            self._thread_pool_busy_status_tooltip = '\n'.join( tooltip_lines )
+            
             self._thread_pool_busy_status_text_new_check_time = HydrusTime.GetNow() + 10
             
         
-        return self._thread_pool_busy_status_text
+        return ( self._thread_pool_busy_status_text, self._thread_pool_busy_status_tooltip )
         
     
     def GetThreadsSnapshot( self ):
         
         threads = []
         
-        threads.extend( self._call_to_threads )
+        threads.extend( self._call_to_thread_pool.GetWorkers() )
         threads.extend( self._long_running_call_to_threads )
         
         threads.append( self._slow_job_scheduler )
@@ -851,13 +860,10 @@ class HydrusController( object ):
             HydrusPaths.DeletePath( self._hydrus_temp_dir )
             
         
+        self._call_to_thread_pool.Shutdown()
+        
         with self._call_to_thread_lock:
             
-            for call_to_thread in self._call_to_threads:
-                
-                call_to_thread.shutdown()
-                
-            
             for long_running_call_to_thread in self._long_running_call_to_threads:
                 
                 long_running_call_to_thread.shutdown()
@@ -1,3 +1,4 @@
+import copy
 import os
 import queue
 import sqlite3
@@ -5,6 +6,7 @@ import threading
 import traceback
 import time
 import typing
+import urllib.parse
 
 from hydrus.core import HydrusDBBase
 from hydrus.core import HydrusConstants as HC
@@ -17,6 +19,9 @@ from hydrus.core import HydrusPaths
 from hydrus.core import HydrusProfiling
 from hydrus.core import HydrusTime
 
+# if the read pool has had a read this recently, we commit after each write so it stays current
+READ_POOL_RECENT_READ_PERIOD = 10
+
 def CheckCanVacuum( db_path, stop_time = None ):
     
     db = sqlite3.connect( db_path, isolation_level = None, detect_types = sqlite3.PARSE_DECLTYPES )
@@ -301,6 +306,10 @@ def VacuumDBInto( db_path: str ):
 class HydrusDB( HydrusDBBase.DBBase ):
     
     READ_WRITE_ACTIONS = []
+    READ_POOL_SAFE_ACTIONS = set()
+    
+    # read pool threads keep their modules across commits. these writes change something a module holds in memory, so the pool rebuilds its modules after them
+    READ_POOL_MODULE_CHANGING_WRITE_ACTIONS = set()
     UPDATE_WAIT = 2
     
     def __init__( self, controller: "HG.HydrusController.HydrusController", db_dir, db_name ):
@@ -376,6 +385,28 @@ class HydrusDB( HydrusDBBase.DBBase ):
         
         self._jobs = queue.Queue()
         
+        # the read pool is a set of read-only connections that can serve some reads while the main connection is busy writing
+        # it needs WAL, since that is what lets readers see the last commit while a writer is working
+        
+        if HG.db_journal_mode == 'WAL' and len( self.READ_POOL_SAFE_ACTIONS ) > 0:
+            
+            self._read_pool_size = HG.db_read_pool_size
+            
+        else:
+            
+            self._read_pool_size = 0
+            
+        
+        self._read_pool_jobs = queue.Queue()
+        self._read_pool_lock = threading.Lock()
+        self._read_pool_num_working = 0
+        self._read_pool_connection_generation = 0
+        self._read_pool_fresh_at_num_commits = 0
+        self._read_pool_last_read_time = 0.0
+        
+        # readers are copies of us, and they set this for themselves
+        self._is_read_pool_reader = False
+        
         self._currently_doing_job = False
         self._current_status = ''
         self._current_job_name = ''
@@ -495,6 +526,11 @@ class HydrusDB( HydrusDBBase.DBBase ):
                 
             
         
+        for i in range( self._read_pool_size ):
+            
+            self._controller.CallToThreadLongRunning( self.ReadPoolLoop )
+            
+        
     
     def _AttachExternalDatabases( self ):
         
@@ -520,11 +556,46 @@ class HydrusDB( HydrusDBBase.DBBase ):
         self._Execute( 'ATTACH ? AS durable_temp;', ( db_path, ) )
         
     
+    def _AttachExternalDatabasesReadOnly( self ):
+        
+        for ( name, filename ) in self._db_filenames.items():
+            
+            if name == 'main':
+                
+                continue
+                
+            
+            db_path = os.path.join( self._db_dir, filename )
+            
+            self._Execute( 'ATTACH ? AS ' + name + ';', ( self._GetReadOnlyURI( db_path ), ) )
+            
+        
+    
     def _CleanAfterJobWork( self ):
         
         self._cursor_transaction_wrapper.CleanPubSubs()
         
     
+    def _CloseReadPoolConnection( self ):
+        
+        if self._db is not None:
+            
+            self._CloseCursor()
+            
+            self._db.close()
+            
+            del self._db
+            
+            self._db = None
+            
+            self._is_connected = False
+            
+            self._cursor_transaction_wrapper = None
+            
+            self._UnloadModules()
+            
+        
+    
     def _CloseDBConnection( self ):
         
         HydrusDBBase.TemporaryIntegerTableNameCache.instance().Clear()
@@ -576,11 +647,43 @@ class HydrusDB( HydrusDBBase.DBBase ):
         return HydrusDBBase.JobDatabase( job_type, synchronous, action, *args, **kwargs )
         
     
+    def _GenerateReadPoolReader( self ) -> "HydrusDB":
+        
+        # a reader is a shallow copy of us with its own read-only connection and its own modules, so module caches and cursors are never shared across threads
+        
+        reader = copy.copy( self )
+        
+        reader._InitReadPoolConnection()
+        
+        return reader
+        
+    
     def _GetPossibleAdditionalDBFilenames( self ):
         
         return [ self._ssl_cert_filename, self._ssl_key_filename ]
         
     
+    def _GetReadOnlyURI( self, db_path ):
+        
+        return 'file:{}?mode=ro'.format( urllib.parse.quote( db_path ) )
+        
+    
+    def _GetReadPoolGeneration( self ):
+        
+        cursor_transaction_wrapper = self._cursor_transaction_wrapper
+        
+        if cursor_transaction_wrapper is None:
+            
+            num_commits_that_change_modules = -1
+            
+        else:
+            
+            num_commits_that_change_modules = cursor_transaction_wrapper.GetNumCommitsThatChangeReadPoolModules()
+            
+        
+        return ( self._read_pool_connection_generation, num_commits_that_change_modules )
+        
+    
     def _InitCaches( self ):
         
         pass
@@ -757,6 +860,9 @@ class HydrusDB( HydrusDBBase.DBBase ):
             
             self._cursor_transaction_wrapper = HydrusDBBase.DBCursorTransactionWrapper( self._c, HG.db_transaction_commit_period )
             
+            self._read_pool_connection_generation += 1
+            self._read_pool_fresh_at_num_commits = 0
+            
             if HG.no_db_temp_files:
                 
                 self._Execute( 'PRAGMA temp_store = 2;' ) # use memory for temp store exclusively
@@ -837,6 +943,50 @@ class HydrusDB( HydrusDBBase.DBBase ):
             
         
     
+    def _InitReadPoolConnection( self ):
+        
+        self._is_read_pool_reader = True
+        
+        self._db = None
+        self._c = None
+        self._modules = []
+        
+        db_path = os.path.join( self._db_dir, self._db_filenames[ 'main' ] )
+        
+        self._db = sqlite3.connect( self._GetReadOnlyURI( db_path ), isolation_level = None, detect_types = sqlite3.PARSE_DECLTYPES, uri = True )
+        
+        c = self._db.cursor()
+        
+        self._SetCursor( c )
+        
+        self._is_connected = True
+        
+        # we never begin a transaction with this, but the modules like to have one to talk to
+        self._cursor_transaction_wrapper = HydrusDBBase.DBCursorTransactionWrapper( self._c, HG.db_transaction_commit_period )
+        
+        if HG.no_db_temp_files:
+            
+            self._Execute( 'PRAGMA temp_store = 2;' )
+            
+        
+        self._AttachExternalDatabasesReadOnly()
+        
+        self._Execute( 'ATTACH ":memory:" AS mem;' )
+        
+        HydrusDBBase.TemporaryIntegerTableNameCache.instance().Clear()
+        
+        db_names = [ name for ( index, name, path ) in self._Execute( 'PRAGMA database_list;' ) if name not in ( 'mem', 'temp' ) ]
+        
+        for db_name in db_names:
+            
+            self._Execute( 'PRAGMA {}.cache_size = -{};'.format( db_name, HG.db_cache_size * 1024 ) )
+            
+        
+        self._LoadModules()
+        
+        self._InitCommandsToMethods()
+        
+    
     def _InitExternalDatabases( self ):
         
         pass
@@ -866,6 +1016,11 @@ class HydrusDB( HydrusDBBase.DBBase ):
                 
                 self._cursor_transaction_wrapper.NotifyWriteOccuring()
                 
+                if action in self.READ_POOL_MODULE_CHANGING_WRITE_ACTIONS:
+                    
+                    self._cursor_transaction_wrapper.NotifyReadPoolModulesChanging()
+                    
+                
             else:
                 
                 self._current_status = 'db reading'
@@ -901,6 +1056,18 @@ class HydrusDB( HydrusDBBase.DBBase ):
                     
                 
             
+            if job_type in ( 'read_write', 'write' ):
+                
+                # the read pool only sees commits, so it is out of date until the commit after this job
+                self._read_pool_fresh_at_num_commits = self._cursor_transaction_wrapper.GetNumCommitsWithWrites() + 1
+                
+                if action in self.READ_POOL_MODULE_CHANGING_WRITE_ACTIONS:
+                    
+                    # again, in case the job committed partway through
+                    self._cursor_transaction_wrapper.NotifyReadPoolModulesChanging()
+                    
+                
+            
             if job.IsSynchronous():
                 
                 job.PutResult( result )
@@ -908,7 +1075,10 @@ class HydrusDB( HydrusDBBase.DBBase ):
             
             self._cursor_transaction_wrapper.Save()
             
-            if self._cursor_transaction_wrapper.TimeToCommit():
+            # the read pool only sees commits. while people are reading, we commit after writes so they see them. when nobody is, we batch as normal
+            read_pool_wants_commit = job_type in ( 'read_write', 'write' ) and not HydrusTime.TimeHasPassedFloat( self._read_pool_last_read_time + READ_POOL_RECENT_READ_PERIOD )
+            
+            if self._cursor_transaction_wrapper.TimeToCommit() or read_pool_wants_commit:
                 
                 self._current_status = 'db committing'
                 
@@ -948,6 +1118,54 @@ class HydrusDB( HydrusDBBase.DBBase ):
             
         
     
+    def _ProcessReadPoolJob( self, job: HydrusDBBase.JobDatabase ):
+        
+        ( action, args, kwargs ) = job.GetCallableTuple()
+        
+        try:
+            
+            # a deferred transaction pins us to one consistent snapshot for the whole job
+            self._Execute( 'BEGIN DEFERRED;' )
+            
+            try:
+                
+                result = self._Read( action, *args, **kwargs )
+                
+            finally:
+                
+                self._Execute( 'COMMIT;' )
+                
+            
+            job.PutResult( result )
+            
+            self._cursor_transaction_wrapper.DoPubSubs()
+            
+        except sqlite3.OperationalError as e:
+            
+            if 'readonly' in str( e ):
+                
+                raise
+                
+            
+            self._ManageDBError( job, e )
+            
+        except HydrusExceptions.DBReadPoolCannotServeException:
+            
+            raise
+            
+        except Exception as e:
+            
+            self._ManageDBError( job, e )
+            
+        finally:
+            
+            if self._cursor_transaction_wrapper is not None:
+                
+                self._cursor_transaction_wrapper.CleanPubSubs()
+                
+            
+        
+    
     def _Read( self, action, *args, **kwargs ):
         
         if action not in self._read_commands_to_methods:
@@ -1014,9 +1232,38 @@ class HydrusDB( HydrusDBBase.DBBase ):
         pass
         
     
+    def _ReadPoolCanServe( self, action ):
+        
+        if self._read_pool_size == 0 or action not in self.READ_POOL_SAFE_ACTIONS or self._pause_and_disconnect:
+            
+            return False
+            
+        
+        self._read_pool_last_read_time = HydrusTime.GetNowFloat()
+        
+        cursor_transaction_wrapper = self._cursor_transaction_wrapper
+        
+        if cursor_transaction_wrapper is None:
+            
+            return False
+            
+        
+        # if a finished write is still uncommitted, the pool would give an out of date answer, so we wait on the main connection
+        # a write that is still in progress is fine--nothing could have seen that yet
+        if cursor_transaction_wrapper.GetNumCommitsWithWrites() >= self._read_pool_fresh_at_num_commits:
+            
+            return True
+            
+        
+        # someone is reading now, so let's commit after the current job and the next read can go to the pool
+        cursor_transaction_wrapper.DoACommitAsSoonAsPossible()
+        
+        return False
+        
+    
     def CurrentlyDoingJob( self ):
         
-        return self._currently_doing_job
+        return self._currently_doing_job or self._read_pool_num_working > 0
         
     
     def ForceACommit( self ):
@@ -1106,7 +1353,7 @@ class HydrusDB( HydrusDBBase.DBBase ):
     
     def JobsQueueEmpty( self ):
         
-        return self._jobs.empty()
+        return self._jobs.empty() and self._read_pool_jobs.empty()
         
     
     def MainLoop( self ):
@@ -1257,11 +1504,147 @@ class HydrusDB( HydrusDBBase.DBBase ):
             raise HydrusExceptions.ShutdownException( 'Application has shut down!' )
             
         
-        self._jobs.put( job )
+        if job_type == 'read' and self._ReadPoolCanServe( action ):
+            
+            self._read_pool_jobs.put( job )
+            
+        else:
+            
+            self._jobs.put( job )
+            
         
         return job.GetResult()
         
     
+    def ReadPoolLoop( self ):
+        
+        HydrusDBBase.TemporaryIntegerTableNameCache( this_thread_only = True )
+        
+        reader = None
+        reader_generation = None
+        
+        while not ( ( self._local_shutdown or HG.model_shutdown ) and self._read_pool_jobs.empty() ):
+            
+            if self._pause_and_disconnect and reader is not None:
+                
+                reader._CloseReadPoolConnection()
+                
+                reader = None
+                
+            
+            try:
+                
+                job = self._read_pool_jobs.get( timeout = 1 )
+                
+            except queue.Empty:
+                
+                continue
+                
+            
+            if self._pause_and_disconnect:
+                
+                self._jobs.put( job )
+                
+                continue
+                
+            
+            with self._read_pool_lock:
+                
+                self._read_pool_num_working += 1
+                
+            
+            try:
+                
+                # each job begins its own transaction, so it always sees the latest commit. we only rebuild the modules if a commit changed something they hold in memory
+                # there is a tiny window where such a commit lands just after this check, in which case one job sees new rows with old caches
+                
+                generation = self._GetReadPoolGeneration()
+                
+                if reader is None or generation != reader_generation:
+                    
+                    if reader is not None:
+                        
+                        reader._CloseReadPoolConnection()
+                        
+                        reader = None
+                        
+                    
+                    reader = self._GenerateReadPoolReader()
+                    reader_generation = generation
+                    
+                
+                if HG.db_report_mode:
+                    
+                    HydrusData.ShowText( 'Running db read pool job: ' + job.ToString() )
+                    
+                
+                reader._ProcessReadPoolJob( job )
+                
+            except sqlite3.OperationalError as e:
+                
+                if 'readonly' in str( e ):
+                    
+                    # this read wanted to write something, like a new hash definition. the main connection will sort it out
+                    
+                    if reader is not None:
+                        
+                        reader._CloseReadPoolConnection()
+                        
+                        reader = None
+                        
+                    
+                    self._jobs.put( job )
+                    
+                else:
+                    
+                    job.PutResult( e )
+                    
+                
+            except HydrusExceptions.DBReadPoolCannotServeException:
+                
+                # this read needs something only the main connection can set up. it'll go there, and it'll be ready next time
+                
+                self._jobs.put( job )
+                
+            except Exception as e:
+                
+                HydrusData.PrintException( e )
+                
+                job.PutResult( e )
+                
+                if reader is not None:
+                    
+                    # we don't know what state it is in, so drop it. the next job gets a fresh one
+                    
+                    try:
+                        
+                        reader._CloseReadPoolConnection()
+                        
+                    except Exception as close_e:
+                        
+                        HydrusData.PrintException( close_e )
+                        
+                    
+                    reader = None
+                    
+                
+            finally:
+                
+                with self._read_pool_lock:
+                    
+                    self._read_pool_num_working -= 1
+                    
+                
+                self._finished_job_event.set()
+                
+            
+        
+        if reader is not None:
+            
+            reader._CloseReadPoolConnection()
+            
+        
+    
     def ReadyToServeRequests( self ):
         
         return self._ready_to_serve_requests
@@ -136,9 +136,19 @@ class TemporaryIntegerTableNameCache( object ):
     
     my_instance = None
     
-    def __init__( self ):
+    # read pool connections have their own 'mem' database, so they each need their own cache of what has been created there
+    my_thread_instances = threading.local()
+    
+    def __init__( self, this_thread_only = False ):
         
-        TemporaryIntegerTableNameCache.my_instance = self
+        if this_thread_only:
+            
+            TemporaryIntegerTableNameCache.my_thread_instances.instance = self
+            
+        else:
+            
+            TemporaryIntegerTableNameCache.my_instance = self
+            
         
         self._column_name_tuples_to_table_names = collections.defaultdict( collections.deque )
         self._column_name_tuples_counter = collections.Counter()
@@ -147,6 +157,13 @@ class TemporaryIntegerTableNameCache( object ):
     @staticmethod
     def instance() -> 'TemporaryIntegerTableNameCache':
         
+        thread_instance = getattr( TemporaryIntegerTableNameCache.my_thread_instances, 'instance', None )
+        
+        if thread_instance is not None:
+            
+            return thread_instance
+            
+        
         if TemporaryIntegerTableNameCache.my_instance is None:
             
             raise Exception( 'TemporaryIntegerTableNameCache is not yet initialised!' )
@@ -676,6 +693,11 @@ class DBCursorTransactionWrapper( DBBase ):
         self._in_transaction = False
         self._transaction_contains_writes = False
         
+        self._num_commits_with_writes = 0
+        
+        self._transaction_changes_read_pool_modules = False
+        self._num_commits_that_change_read_pool_modules = 0
+        
         self._committing_as_soon_as_possible = False
         
         self._last_mem_refresh_time = HydrusTime.GetNow()
@@ -721,6 +743,7 @@ class DBCursorTransactionWrapper( DBBase ):
             self._transaction_start_time = HydrusTime.GetNow()
             self._in_transaction = True
             self._transaction_contains_writes = False
+            self._transaction_changes_read_pool_modules = False
             
         
     
@@ -739,8 +762,19 @@ class DBCursorTransactionWrapper( DBBase ):
             
             self._Execute( 'COMMIT;' )
             
+            if self._transaction_contains_writes:
+                
+                self._num_commits_with_writes += 1
+                
+            
+            if self._transaction_changes_read_pool_modules:
+                
+                self._num_commits_that_change_read_pool_modules += 1
+                
+            
             self._in_transaction = False
             self._transaction_contains_writes = False
+            self._transaction_changes_read_pool_modules = False
             
             if HG.db_journal_mode == 'WAL' and HydrusTime.TimeHasPassed( self._last_wal_passive_checkpoint_time + WAL_PASSIVE_CHECKPOINT_PERIOD ):
                 
@@ -811,11 +845,31 @@ class DBCursorTransactionWrapper( DBBase ):
         return self._committing_as_soon_as_possible
         
     
+    def GetNumCommitsThatChangeReadPoolModules( self ) -> int:
+        
+        return self._num_commits_that_change_read_pool_modules
+        
+    
+    def GetNumCommitsWithWrites( self ) -> int:
+        
+        return self._num_commits_with_writes
+        
+    
+    def HasUncommittedWrites( self ) -> bool:
+        
+        return self._in_transaction and self._transaction_contains_writes
+        
+    
     def InTransaction( self ):
         
         return self._in_transaction
         
     
+    def NotifyReadPoolModulesChanging( self ):
+        
+        self._transaction_changes_read_pool_modules = True
+        
+    
     def NotifyWriteOccuring( self ):
         
         self._transaction_contains_writes = True
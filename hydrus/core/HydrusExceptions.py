@@ -46,11 +46,13 @@ class DBException( HydrusException ):
     
 
 class DBAccessException( HydrusException ): pass
+class DBReadPoolCannotServeException( HydrusException ): pass
 class DBCredentialsException( HydrusException ): pass
 class DBVersionException( HydrusException ): pass
 class FileMissingException( HydrusException ): pass
 class DirectoryMissingException( HydrusException ): pass
 class SerialisationException( HydrusException ): pass
+class UnsupportedCompressionException( SerialisationException ): pass
 class NameException( HydrusException ): pass
 class ShutdownException( HydrusException ): pass
 class QtDeadWindowException( HydrusException ): pass
@@ -1,6 +1,8 @@
 import hashlib
 import json
+import threading
 import typing
+import zlib
 
 from hydrus.core import HydrusCompression
 from hydrus.core import HydrusData
@@ -148,6 +150,7 @@ SERIALISABLE_TYPE_POTENTIAL_DUPLICATES_SEARCH_CONTEXT = 134
 SERIALISABLE_TYPE_SUBSIDIARY_PAGE_PARSER = 135
 SERIALISABLE_TYPE_PARSE_FORMULA_STATIC = 136
 SERIALISABLE_TYPE_DUPLICATES_AUTO_RESOLUTION_PAIR_COMPARATOR_TWO_FILES_RELATIVE_HARDCODED = 137
+SERIALISABLE_TYPE_SERIALISABLE_LIST_BLOCKS = 138
 
 SERIALISABLE_TYPES_TO_OBJECT_TYPES = {}
 
@@ -737,3 +740,201 @@ class SerialisableList( SerialisableBase, list ):
     
 
 SERIALISABLE_TYPES_TO_OBJECT_TYPES[ SERIALISABLE_TYPE_LIST ] = SerialisableList
+
+# big lists of small objects, like file and gallery import logs, can save themselves as a list of content-addressed blocks instead of one giant blob
+# this only happens while a block store is active on the thread, which the db does when it saves and loads the objects it knows about
+# everything else (duplicating, exporting, network) still sees a normal inline list
+
+BLOCKS_MIN_LIST_SIZE = 256
+BLOCK_BOUNDARY_MASK = 63 # about 64 items per block
+BLOCK_MIN_SIZE = 16
+BLOCK_MAX_SIZE = 512
+
+_block_store_local = threading.local()
+
+class SerialisableBlockStore( object ):
+    
+    def __init__( self, block_fetcher = None ):
+        
+        # block_fetcher takes a list of block hashes and returns a dict of hash to block serialisable info. missing blocks are omitted
+        self._block_fetcher = block_fetcher
+        
+        self._hashes_to_new_block_dumps = {}
+        
+        self._previous_store = None
+        
+    
+    def __enter__( self ):
+        
+        self._previous_store = GetBlockStore()
+        
+        _block_store_local.store = self
+        
+        return self
+        
+    
+    def __exit__( self, exc_type, exc_val, exc_tb ):
+        
+        _block_store_local.store = self._previous_store
+        
+        self._previous_store = None
+        
+    
+    def _StoreBlock( self, block_item_dumps: typing.List[ str ] ) -> bytes:
+        
+        # this matches json.dumps( list_of_items )
+        block_dump = '[' + ', '.join( block_item_dumps ) + ']'
+        
+        block_hash = hashlib.sha256( bytes( block_dump, 'utf-8' ) ).digest()
+        
+        self._hashes_to_new_block_dumps[ block_hash ] = block_dump
+        
+        return block_hash
+        
+    
+    def GetNewBlockDumps( self ) -> typing.Dict[ bytes, str ]:
+        
+        return dict( self._hashes_to_new_block_dumps )
+        
+    
+    def LoadBlocks( self, block_hashes: typing.List[ bytes ] ) -> list:
+        
+        if self._block_fetcher is None:
+            
+            raise HydrusExceptions.SerialisationException( 'This block store cannot load blocks!' )
+            
+        
+        hashes_to_blocks = self._block_fetcher( block_hashes )
+        
+        items = []
+        
+        for block_hash in block_hashes:
+            
+            if block_hash not in hashes_to_blocks:
+                
+                raise HydrusExceptions.SerialisationException( 'A serialised list block, "{}", was missing!'.format( block_hash.hex() ) )
+                
+            
+            items.extend( hashes_to_blocks[ block_hash ] )
+            
+        
+        return items
+        
+    
+    def StoreBlocks( self, items: list ) -> typing.List[ bytes ]:
+        
+        # content-defined boundaries, so inserting or removing an item only changes the block it was in, not every block after it
+        
+        block_hashes = []
+        
+        block_item_dumps = []
+        
+        for item in items:
+            
+            item_dump = json.dumps( item )
+            
+            block_item_dumps.append( item_dump )
+            
+            num_in_block = len( block_item_dumps )
+            
+            at_boundary = num_in_block >= BLOCK_MIN_SIZE and zlib.crc32( bytes( item_dump, 'utf-8' ) ) & BLOCK_BOUNDARY_MASK == 0
+            
+            if at_boundary or num_in_block >= BLOCK_MAX_SIZE:
+                
+                block_hashes.append( self._StoreBlock( block_item_dumps ) )
+                
+                block_item_dumps = []
+                
+            
+        
+        if len( block_item_dumps ) > 0:
+            
+            block_hashes.append( self._StoreBlock( block_item_dumps ) )
+            
+        
+        return block_hashes
+        
+    
+
+def CreateFromBlockableListSerialisableTuple( obj_tuple ) -> SerialisableList:
+    
+    ( serialisable_type, version, serialisable_info ) = obj_tuple
+    
+    if serialisable_type == SERIALISABLE_TYPE_SERIALISABLE_LIST_BLOCKS:
+        
+        block_store = GetBlockStore()
+        
+        if block_store is None:
+            
+            raise HydrusExceptions.SerialisationException( 'Was asked to load a list saved in blocks, but there was no block store to load from!' )
+            
+        
+        block_hashes = [ bytes.fromhex( block_hash_hex ) for block_hash_hex in serialisable_info ]
+        
+        meta_tuples = block_store.LoadBlocks( block_hashes )
+        
+        obj_tuple = ( SERIALISABLE_TYPE_LIST, SerialisableList.SERIALISABLE_VERSION, meta_tuples )
+        
+    
+    return CreateFromSerialisableTuple( obj_tuple )
+    
+
+def GetBlockableListSerialisableTuple( serialisable_list: SerialisableList ):
+    
+    meta_tuples = SerialisableList._GetSerialisableInfo( serialisable_list )
+    
+    block_store = GetBlockStore()
+    
+    if block_store is None or len( meta_tuples ) < BLOCKS_MIN_LIST_SIZE:
+        
+        return ( SERIALISABLE_TYPE_LIST, SerialisableList.SERIALISABLE_VERSION, meta_tuples )
+        
+    
+    block_hashes = block_store.StoreBlocks( meta_tuples )
+    
+    return ( SERIALISABLE_TYPE_SERIALISABLE_LIST_BLOCKS, 1, [ block_hash.hex() for block_hash in block_hashes ] )
+    
+
+def GetBlockHashesFromSerialisableInfo( serialisable_info ) -> typing.Set[ bytes ]:
+    
+    # walks raw json, or a fresh serialisable tuple, looking for blocked lists, so the db can tell which blocks are still in use without loading every object
+    
+    block_hashes = set()
+    
+    stack = [ serialisable_info ]
+    
+    while len( stack ) > 0:
+        
+        item = stack.pop()
+        
+        if isinstance( item, ( list, tuple ) ):
+            
+            if len( item ) == 3 and item[0] == SERIALISABLE_TYPE_SERIALISABLE_LIST_BLOCKS and isinstance( item[1], int ) and isinstance( item[2], ( list, tuple ) ) and False not in ( isinstance( block_hash_hex, str ) for block_hash_hex in item[2] ):
+                
+                try:
+                    
+                    block_hashes.update( [ bytes.fromhex( block_hash_hex ) for block_hash_hex in item[2] ] )
+                    
+                    continue
+                    
+                except ValueError:
+                    
+                    pass # just some list that happened to look like one of ours
+                    
+                
+            
+            stack.extend( item )
+            
+        elif isinstance( item, dict ):
+            
+            stack.extend( item.values() )
+            
+        
+    
+    return block_hashes
+    
+
+def GetBlockStore() -> typing.Optional[ SerialisableBlockStore ]:
+    
+    return getattr( _block_store_local, 'store', None )
+    
@@ -1,4 +1,5 @@
-import bisect
+import collections
+import heapq
 import queue
 import random
 import subprocess
@@ -15,6 +16,24 @@ from hydrus.core import HydrusTime
 
 NEXT_THREAD_CLEAROUT = 0
 
+CALL_TO_THREAD_PRIORITY_INTERACTIVE = 0
+CALL_TO_THREAD_PRIORITY_NORMAL = 1
+CALL_TO_THREAD_PRIORITY_BACKGROUND = 2
+
+CALL_TO_THREAD_PRIORITIES = ( CALL_TO_THREAD_PRIORITY_INTERACTIVE, CALL_TO_THREAD_PRIORITY_NORMAL, CALL_TO_THREAD_PRIORITY_BACKGROUND )
+
+call_to_thread_priority_str_lookup = {
+    CALL_TO_THREAD_PRIORITY_INTERACTIVE : 'interactive',
+    CALL_TO_THREAD_PRIORITY_NORMAL : 'normal',
+    CALL_TO_THREAD_PRIORITY_BACKGROUND : 'background'
+}
+
+# the scheduler wakes up at least this often to check for shutdown
+JOB_SCHEDULER_MAX_WAIT = 1.0
+
+# below this, it isn't worth rebuilding the heap to clear out cancelled entries
+JOB_SCHEDULER_MIN_COMPACT_SIZE = 64
+
 THREADS_TO_THREAD_INFO = {}
 THREAD_INFO_LOCK = threading.Lock()
 
@@ -478,6 +497,357 @@ class THREADCallToThread( DAEMON ):
             
         
     
+class THREADCallToThreadPoolWorker( DAEMON ):
+    
+    def __init__( self, controller, pool: "CallToThreadPool", first_job = None ):
+        
+        super().__init__( controller, 'CallToThread' )
+        
+        self._pool = pool
+        self._first_job = first_job
+        
+        self._callable = None
+        
+    
+    def CurrentlyWorking( self ) -> bool:
+        
+        return self._callable is not None
+        
+    
+    def GetCurrentJobSummary( self ):
+        
+        return self._callable
+        
+    
+    def WaitForWake( self, timeout ) -> None:
+        
+        self._event.wait( timeout )
+        
+        self._event.clear()
+        
+    
+    def run( self ) -> None:
+        
+        try:
+            
+            while True:
+                
+                if self._first_job is None:
+                    
+                    job = self._pool.GetJob( self )
+                    
+                else:
+                    
+                    job = self._first_job
+                    
+                    self._first_job = None
+                    
+                
+                if job is None:
+                    
+                    return
+                    
+                
+                ( priority, callable, args, kwargs ) = job
+                
+                try:
+                    
+                    self._DoPreCall()
+                    
+                    self._callable = ( callable, args, kwargs )
+                    
+                    if HG.profile_mode:
+                        
+                        summary = 'Profiling CallTo Job: {}'.format( callable )
+                        
+                        HydrusProfiling.Profile( summary, 'callable( *args, **kwargs )', globals(), locals(), min_duration_ms = HG.callto_profile_min_job_time_ms )
+                        
+                    else:
+                        
+                        callable( *args, **kwargs )
+                        
+                    
+                    del callable
+                    
+                except HydrusExceptions.ShutdownException:
+                    
+                    return
+                    
+                except Exception as e:
+                    
+                    HydrusData.Print( traceback.format_exc() )
+                    
+                    HydrusData.ShowException( e )
+                    
+                finally:
+                    
+                    self._callable = None
+                    
+                    self._pool.JobDone( priority )
+                    
+                
+            
+        finally:
+            
+            self._pool.WorkerExited( self )
+            
+        
+    
+
+class CallToThreadPool( object ):
+    
+    def __init__( self, controller: "HG.HydrusController.HydrusController", max_threads = 200, priorities_to_max_working = None ):
+        
+        if priorities_to_max_working is None:
+            
+            priorities_to_max_working = {
+                CALL_TO_THREAD_PRIORITY_INTERACTIVE : max_threads,
+                CALL_TO_THREAD_PRIORITY_NORMAL : max_threads - ( max_threads // 10 ),
+                CALL_TO_THREAD_PRIORITY_BACKGROUND : max( 1, max_threads // 4 )
+            }
+            
+        
+        self._controller = controller
+        self._max_threads = max_threads
+        
+        # a job may start if fewer than its cap of workers are doing jobs of its priority or lower
+        # so background work eats into the normal cap, and there are always some threads that only interactive work can have
+        self._priorities_to_max_working = priorities_to_max_working
+        
+        self._priorities_to_queues = { priority : collections.deque() for priority in CALL_TO_THREAD_PRIORITIES }
+        
+        # jobs submitted by a pool job. the parent may be waiting on them, so they ignore the caps and go before everything else
+        self._nested_queue = collections.deque()
+        
+        self._priorities_to_num_working = { priority : 0 for priority in CALL_TO_THREAD_PRIORITIES }
+        self._priorities_to_recent_latencies = { priority : collections.deque( maxlen = 100 ) for priority in CALL_TO_THREAD_PRIORITIES }
+        
+        self._workers = set()
+        self._idle_workers = []
+        self._workers_to_cull = set()
+        
+        self._lock = threading.Lock()
+        
+    
+    def _CanStart( self, priority ) -> bool:
+        
+        num_working_at_this_priority_or_lower = sum( ( self._priorities_to_num_working[ p ] for p in CALL_TO_THREAD_PRIORITIES if p >= priority ) )
+        
+        return num_working_at_this_priority_or_lower < self._priorities_to_max_working[ priority ]
+        
+    
+    def _PopRunnableJob( self ):
+        
+        if len( self._nested_queue ) > 0:
+            
+            ( priority, callable, args, kwargs, time_queued ) = self._nested_queue.popleft()
+            
+            self._priorities_to_num_working[ priority ] += 1
+            self._priorities_to_recent_latencies[ priority ].append( HydrusTime.GetNowPrecise() - time_queued )
+            
+            return ( priority, callable, args, kwargs )
+            
+        
+        for priority in CALL_TO_THREAD_PRIORITIES:
+            
+            job_queue = self._priorities_to_queues[ priority ]
+            
+            if len( job_queue ) == 0:
+                
+                continue
+                
+            
+            ( callable, args, kwargs, time_queued ) = job_queue[0]
+            
+            if self._CanStart( priority ):
+                
+                job_queue.popleft()
+                
+                self._priorities_to_num_working[ priority ] += 1
+                self._priorities_to_recent_latencies[ priority ].append( HydrusTime.GetNowPrecise() - time_queued )
+                
+                return ( priority, callable, args, kwargs )
+                
+            
+        
+        return None
+        
+    
+    def CullIdleWorkers( self ) -> None:
+        
+        # idle threads still cost a little cpu to wait, so we let them go when things are quiet
+        
+        with self._lock:
+            
+            for worker in self._idle_workers:
+                
+                self._workers_to_cull.add( worker )
+                
+                worker.wake()
+                
+            
+            self._idle_workers = []
+            
+        
+    
+    def GetJob( self, worker: THREADCallToThreadPoolWorker ):
+        
+        while True:
+            
+            with self._lock:
+                
+                if worker in self._workers_to_cull or IsThreadShuttingDown():
+                    
+                    return None
+                    
+                
+                job = self._PopRunnableJob()
+                
+                if job is not None:
+                    
+                    return job
+                    
+                
+                self._idle_workers.append( worker )
+                
+            
+            worker.WaitForWake( 10.0 )
+            
+            with self._lock:
+                
+                if worker in self._idle_workers:
+                    
+                    self._idle_workers.remove( worker )
+                    
+                
+            
+        
+    
+    def GetStatus( self ):
+        
+        with self._lock:
+            
+            num_threads = len( self._workers )
+            num_working = sum( self._priorities_to_num_working.values() )
+            
+            priorities_to_num_waiting = { priority : len( job_queue ) for ( priority, job_queue ) in self._priorities_to_queues.items() }
+            
+            for ( priority, callable, args, kwargs, time_queued ) in self._nested_queue:
+                
+                priorities_to_num_waiting[ priority ] += 1
+                
+            
+            priorities_to_latencies = {}
+            
+            for ( priority, latencies ) in self._priorities_to_recent_latencies.items():
+                
+                if len( latencies ) > 0:
+                    
+                    priorities_to_latencies[ priority ] = ( sum( latencies ) / len( latencies ), max( latencies ) )
+                    
+                
+            
+        
+        return ( num_threads, num_working, priorities_to_num_waiting, priorities_to_latencies )
+        
+    
+    def GetWorkers( self ):
+        
+        with self._lock:
+            
+            return list( self._workers )
+            
+        
+    
+    def JobDone( self, priority ) -> None:
+        
+        with self._lock:
+            
+            self._priorities_to_num_working[ priority ] -= 1
+            
+        
+    
+    def Shutdown( self ) -> None:
+        
+        with self._lock:
+            
+            for worker in self._workers:
+                
+                worker.shutdown()
+                
+            
+        
+    
+    def Submit( self, priority, callable, *args, **kwargs ) -> None:
+        
+        with self._lock:
+            
+            # if a pool job is waiting on a job it is spawning, we have to run that now or we could deadlock, so it gets to skip the queue and caps
+            # it must never sit behind a queued job that is blocked by a cap, so it goes in its own queue that is checked first
+            calling_from_the_thread_pool = threading.current_thread() in self._workers
+            
+            if calling_from_the_thread_pool:
+                
+                if len( self._idle_workers ) > 0:
+                    
+                    self._nested_queue.append( ( priority, callable, args, kwargs, HydrusTime.GetNowPrecise() ) )
+                    
+                    worker = self._idle_workers.pop()
+                    
+                    worker.wake()
+                    
+                else:
+                    
+                    self._priorities_to_num_working[ priority ] += 1
+                    
+                    worker = THREADCallToThreadPoolWorker( self._controller, self, first_job = ( priority, callable, args, kwargs ) )
+                    
+                    self._workers.add( worker )
+                    
+                    worker.start()
+                    
+                
+                return
+                
+            
+            self._priorities_to_queues[ priority ].append( ( callable, args, kwargs, HydrusTime.GetNowPrecise() ) )
+            
+            if not self._CanStart( priority ):
+                
+                # a worker will pick it up when the jobs ahead of it are done
+                return
+                
+            
+            if len( self._idle_workers ) > 0:
+                
+                worker = self._idle_workers.pop()
+                
+                worker.wake()
+                
+            elif len( self._workers ) < self._max_threads:
+                
+                worker = THREADCallToThreadPoolWorker( self._controller, self )
+                
+                self._workers.add( worker )
+                
+                worker.start()
+                
+            
+        
+    
+    def WorkerExited( self, worker: THREADCallToThreadPoolWorker ) -> None:
+        
+        with self._lock:
+            
+            self._workers.discard( worker )
+            self._workers_to_cull.discard( worker )
+            
+            if worker in self._idle_workers:
+                
+                self._idle_workers.remove( worker )
+            
+        
+    
 class JobScheduler( threading.Thread ):
     
     def __init__( self, controller: "HG.HydrusController.HydrusController" ):
@@ -486,7 +856,11 @@ class JobScheduler( threading.Thread ):
         
         self._controller = controller
         
+        # a heap of ( next_work_time, sequence, job ) entries. a job only ever has one live entry, the one in _jobs_to_entries
+        # rescheduling pushes a new entry and cancelling just forgets the job, so stale entries are skipped when they come off the top
         self._waiting = []
+        self._jobs_to_entries = {}
+        self._next_sequence = 0
         
         self._waiting_lock = threading.Lock()
         
@@ -494,68 +868,111 @@ class JobScheduler( threading.Thread ):
         
         self._current_job = None
         
-        self._cancel_filter_needed = threading.Event()
-        self._sort_needed = threading.Event()
-        
         self._controller.sub( self, 'shutdown', 'shutdown' )
         
     
-    def _FilterCancelled( self ):
+    def _CompactWaiting( self ):
         
-        with self._waiting_lock:
+        # only call this under the waiting lock
+        
+        if len( self._waiting ) > JOB_SCHEDULER_MIN_COMPACT_SIZE and len( self._waiting ) > 2 * len( self._jobs_to_entries ):
+            
+            self._waiting = list( self._jobs_to_entries.values() )
             
-            self._waiting = [ job for job in self._waiting if not job.IsCancelled() ]
+            heapq.heapify( self._waiting )
             
         
     
+    def _GetLiveEntries( self ):
+        
+        # only call this under the waiting lock
+        
+        return sorted( self._jobs_to_entries.values() )
+        
+    
     def _GetLoopWaitTime( self ):
         
         with self._waiting_lock:
             
+            self._PopStaleEntries()
+            
             if len( self._waiting ) == 0:
                 
-                return 0.2
+                return JOB_SCHEDULER_MAX_WAIT
                 
             
-            next_job = self._waiting[0]
+            ( next_work_time, sequence, next_job ) = self._waiting[0]
             
         
-        time_delta_until_due = next_job.GetTimeDeltaUntilDue()
+        time_delta_until_due = HydrusTime.GetTimeDeltaUntilTimeFloat( next_work_time )
         
-        return min( 1.0, time_delta_until_due )
+        return min( JOB_SCHEDULER_MAX_WAIT, time_delta_until_due )
         
     
     def _NoWorkToStart( self ) -> bool:
         
         with self._waiting_lock:
             
+            self._PopStaleEntries()
+            
             if len( self._waiting ) == 0:
                 
                 return True
                 
             
-            next_job = self._waiting[0]
+            ( next_work_time, sequence, next_job ) = self._waiting[0]
             
         
-        if next_job.IsDue():
+        return not HydrusTime.TimeHasPassedFloat( next_work_time )
+        
+    
+    def _PopStaleEntries( self ):
+        
+        # only call this under the waiting lock
+        
+        while len( self._waiting ) > 0:
             
-            return False
+            entry = self._waiting[0]
             
-        else:
+            if self._jobs_to_entries.get( entry[2], None ) is entry:
+                
+                return
+                
             
-            return True
+            heapq.heappop( self._waiting )
             
         
     
-    def _SortWaiting( self ):
+    def _PushJob( self, job ) -> bool:
+        
+        # only call this under the waiting lock
+        # returns True if this job is now at the front of the queue, so the loop should recalculate its wait
         
-        # sort the waiting jobs in ascending order of expected work time
+        self._PopStaleEntries()
         
-        with self._waiting_lock: # this uses __lt__ to sort
+        if len( self._waiting ) == 0:
+            
+            current_next_work_time = None
+            
+        else:
             
-            self._waiting.sort()
+            current_next_work_time = self._waiting[0][0]
             
         
+        next_work_time = job.GetNextWorkTime()
+        
+        entry = ( next_work_time, self._next_sequence, job )
+        
+        self._next_sequence += 1
+        
+        self._jobs_to_entries[ job ] = entry
+        
+        heapq.heappush( self._waiting, entry )
+        
+        self._CompactWaiting()
+        
+        return current_next_work_time is None or next_work_time < current_next_work_time
+        
     
     def _StartWork( self ) -> None:
         
@@ -565,6 +982,8 @@ class JobScheduler( threading.Thread ):
             
             with self._waiting_lock:
                 
+                self._PopStaleEntries()
+                
                 if len( self._waiting ) == 0:
                     
                     break
@@ -575,15 +994,17 @@ class JobScheduler( threading.Thread ):
                     break
                     
                 
-                next_job = self._waiting[0]
+                ( next_work_time, sequence, next_job ) = self._waiting[0]
                 
-                if not next_job.IsDue():
+                if not HydrusTime.TimeHasPassedFloat( next_work_time ):
                     
-                    # front is not due, so nor is the rest of the list
+                    # front is not due, so nor is the rest of the heap
                     break
                     
                 
-                next_job = self._waiting.pop( 0 )
+                heapq.heappop( self._waiting )
+                
+                del self._jobs_to_entries[ next_job ]
                 
             
             if next_job.IsCancelled():
@@ -604,7 +1025,7 @@ class JobScheduler( threading.Thread ):
                 
                 with self._waiting_lock:
                     
-                    bisect.insort( self._waiting, next_job )
+                    self._PushJob( next_job )
                     
                 
             
@@ -614,17 +1035,27 @@ class JobScheduler( threading.Thread ):
         
         with self._waiting_lock:
             
-            bisect.insort( self._waiting, job )
+            new_front = self._PushJob( job )
             
         
-        self._new_job_arrived.set()
+        if new_front:
+            
+            self._new_job_arrived.set()
+            
         
     
     def ClearOutDead( self ) -> None:
         
         with self._waiting_lock:
             
-            self._waiting = [ job for job in self._waiting if not job.IsDead() ]
+            dead_jobs = [ job for job in self._jobs_to_entries.keys() if job.IsDead() ]
+            
+            for job in dead_jobs:
+                
+                del self._jobs_to_entries[ job ]
+                
+            
+            self._CompactWaiting()
             
         
     
@@ -637,7 +1068,7 @@ class JobScheduler( threading.Thread ):
         
         with self._waiting_lock:
             
-            return HydrusNumbers.ToHumanInt( len( self._waiting ) ) + ' jobs'
+            return HydrusNumbers.ToHumanInt( len( self._jobs_to_entries ) ) + ' jobs'
             
         
     
@@ -645,7 +1076,7 @@ class JobScheduler( threading.Thread ):
         
         with self._waiting_lock:
             
-            return list( self._waiting )
+            return [ job for ( next_work_time, sequence, job ) in self._GetLiveEntries() ]
             
         
     
@@ -653,9 +1084,9 @@ class JobScheduler( threading.Thread ):
         
         with self._waiting_lock:
             
-            num_jobs = len( self._waiting )
+            num_jobs = len( self._jobs_to_entries )
             
-            job_lines = [ repr( job ) for job in self._waiting ]
+            job_lines = [ repr( job ) for ( next_work_time, sequence, job ) in self._GetLiveEntries() ]
             
             lines = [ HydrusNumbers.ToHumanInt( num_jobs ) + ' jobs:' ] + job_lines
             
@@ -665,9 +1096,19 @@ class JobScheduler( threading.Thread ):
             
         
     
-    def JobCancelled( self ) -> None:
+    def JobCancelled( self, job ) -> None:
         
-        self._cancel_filter_needed.set()
+        # the heap entry stays where it is and gets skipped when it comes up
+        
+        with self._waiting_lock:
+            
+            if job in self._jobs_to_entries:
+                
+                del self._jobs_to_entries[ job ]
+                
+                self._CompactWaiting()
+                
+            
         
     
     def shutdown( self ) -> None:
@@ -677,9 +1118,23 @@ class JobScheduler( threading.Thread ):
         self._new_job_arrived.set()
         
     
-    def WorkTimesHaveChanged( self ) -> None:
+    def WorkTimesHaveChanged( self, job ) -> None:
         
-        self._sort_needed.set()
+        with self._waiting_lock:
+            
+            if job not in self._jobs_to_entries:
+                
+                # it is currently working or was never added, and it'll be scheduled again with its new time when it is
+                return
+                
+            
+            new_front = self._PushJob( job )
+            
+        
+        if new_front:
+            
+            self._new_job_arrived.set()
+            
         
     
     def run( self ) -> None:
@@ -695,32 +1150,14 @@ class JobScheduler( threading.Thread ):
                         return
                         
                     
-                    #
-                    
-                    if self._cancel_filter_needed.is_set():
-                        
-                        self._FilterCancelled()
-                        
-                        self._cancel_filter_needed.clear()
-                        
-                    
-                    if self._sort_needed.is_set():
-                        
-                        self._SortWaiting()
-                        
-                        self._sort_needed.clear()
-                        
-                        continue # if some work is now due, let's do it!
-                        
+                    # we wait right up until the next job is due, or until an earlier job arrives
                     
-                    #
+                    self._new_job_arrived.clear()
                     
                     wait_time = self._GetLoopWaitTime()
                     
                     self._new_job_arrived.wait( wait_time )
                     
-                    self._new_job_arrived.clear()
-                    
                 
                 self._StartWork()
                 
@@ -765,7 +1202,7 @@ class SchedulableJob( object ):
         self._is_cancelled = threading.Event()
         
     
-    def __lt__( self, other ): # for the scheduler to do bisect.insort noice
+    def __lt__( self, other ):
         
         return self._next_work_time < other._next_work_time
         
@@ -777,14 +1214,22 @@ class SchedulableJob( object ):
     
     def _BootWorker( self ):
         
-        self._controller.CallToThread( self.Work )
+        if self._thread_slot_type is None:
+            
+            self._controller.CallToThread( self.Work )
+            
+        else:
+            
+            # import queues and similar, which can have a lot of work going at once
+            self._controller.CallToThreadBackground( self.Work )
+            
         
     
     def Cancel( self ) -> None:
         
         self._is_cancelled.set()
         
-        self._scheduler.JobCancelled()
+        self._scheduler.JobCancelled( self )
         
     
     def CurrentlyWorking( self ) -> bool:
@@ -801,7 +1246,7 @@ class SchedulableJob( object ):
         
         self._next_work_time = HydrusTime.GetNowFloat() + delay
         
-        self._scheduler.WorkTimesHaveChanged()
+        self._scheduler.WorkTimesHaveChanged( self )
         
     
     def GetDueString( self ) -> str:
@@ -907,7 +1352,7 @@ class SchedulableJob( object ):
         
         self._next_work_time = next_work_time
         
-        self._scheduler.WorkTimesHaveChanged()
+        self._scheduler.WorkTimesHaveChanged( self )
         
     
     def WakeOnPubSub( self, topic ) -> None:
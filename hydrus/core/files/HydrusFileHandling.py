@@ -8,7 +8,6 @@ from hydrus.core import HydrusData
 from hydrus.core import HydrusExceptions
 from hydrus.core import HydrusNumbers
 from hydrus.core import HydrusPaths
-from hydrus.core import HydrusSerialisable
 from hydrus.core import HydrusTemp
 from hydrus.core import HydrusText
 from hydrus.core import HydrusTime
@@ -27,6 +26,7 @@ from hydrus.core.files import HydrusOfficeOpenXMLHandling
 from hydrus.core.files import HydrusOLEHandling
 from hydrus.core.files.images import HydrusImageHandling
 from hydrus.core.networking import HydrusNetwork
+from hydrus.core.networking import HydrusNetworkBinaryUpdates
 
 try:
     
@@ -734,13 +734,13 @@ def GetMime( path, ok_to_look_for_hydrus_updates = False ):
         
         try:
             
-            update = HydrusSerialisable.CreateFromNetworkBytes( update_network_bytes )
+            update = HydrusNetworkBinaryUpdates.CreateUpdateFromNetworkBytes( update_network_bytes, streaming = True )
             
-            if isinstance( update, HydrusNetwork.ContentUpdate ):
+            if isinstance( update, ( HydrusNetwork.ContentUpdate, HydrusNetworkBinaryUpdates.BinaryContentUpdateReader ) ):
                 
                 return HC.APPLICATION_HYDRUS_UPDATE_CONTENT
                 
-            elif isinstance( update, HydrusNetwork.DefinitionsUpdate ):
+            elif isinstance( update, ( HydrusNetwork.DefinitionsUpdate, HydrusNetworkBinaryUpdates.BinaryDefinitionsUpdateReader ) ):
                 
                 return HC.APPLICATION_HYDRUS_UPDATE_DEFINITIONS
                 
@@ -917,6 +917,20 @@ def GetThumbnailMime( path ):
         bit_to_check = f.read( 256 )
         
     
+    mime = GetThumbnailMimeFromBytes( bit_to_check )
+    
+    if mime is None:
+        
+        mime = GetMime( path )
+        
+    
+    return mime
+    
+
+def GetThumbnailMimeFromBytes( thumbnail_bytes: bytes ):
+    
+    bit_to_check = thumbnail_bytes[:256]
+    
     for ( offsets_and_headers, mime ) in headers_and_mime_thumbnails:
         
         if passes_offsets_and_headers( offsets_and_headers, bit_to_check ):
@@ -925,5 +939,5 @@ def GetThumbnailMime( path ):
             
         
     
-    return GetMime( path )
+    return None
     
@@ -322,6 +322,65 @@ def GenerateNumPyImage( path, mime, force_pil = False, human_file_description =
     
     return numpy_image
     
+
+def GenerateNumPyImageFromBytes( file_bytes: bytes, mime, force_pil = False ) -> numpy.array:
+    
+    # for simple images we already have in memory, like thumbnails out of a pack file
+    
+    force_pil = force_pil or FORCE_PIL_ALWAYS
+    
+    if mime in PIL_ONLY_MIMETYPES:
+        
+        force_pil = True
+        
+    
+    if not force_pil:
+        
+        pil_image = HydrusImageOpening.RawOpenPILImage( io.BytesIO( file_bytes ) )
+        
+        if pil_image.mode == 'LAB' or HydrusImageMetadata.HasICCProfile( pil_image ):
+            
+            force_pil = True
+            
+        
+    
+    numpy_image = None
+    
+    if not force_pil:
+        
+        if mime in ( HC.IMAGE_JPEG, HC.IMAGE_TIFF ):
+            
+            flags = CV_IMREAD_FLAGS_JPEG
+            
+        elif mime == HC.IMAGE_PNG:
+            
+            flags = CV_IMREAD_FLAGS_PNG
+            
+        else:
+            
+            flags = CV_IMREAD_FLAGS_WEIRD
+            
+        
+        numpy_image = cv2.imdecode( numpy.frombuffer( file_bytes, dtype = 'uint8' ), flags )
+        
+        if numpy_image is not None:
+            
+            numpy_image = HydrusImageNormalisation.DequantizeFreshlyLoadedNumPyImage( numpy_image )
+            
+            numpy_image = HydrusImageNormalisation.StripOutAnyUselessAlphaChannel( numpy_image )
+            
+        
+    
+    if numpy_image is None:
+        
+        pil_image = GeneratePILImage( io.BytesIO( file_bytes ) )
+        
+        numpy_image = GenerateNumPyImageFromPILImage( pil_image )
+        
+    
+    return numpy_image
+    
+
 def GenerateNumPyImageFromPILImage( pil_image: PILImage.Image, strip_useless_alpha = True ) -> numpy.array:
     
     try:
@@ -21,6 +21,14 @@ MAX_UPDATE_PERIOD = 100000 * 100 # three months or so jej
 MIN_NULLIFICATION_PERIOD = 86400
 MAX_NULLIFICATION_PERIOD = 86400 * 365 * 5
 
+UPDATE_FORMAT_JSON = 0
+UPDATE_FORMAT_BINARY = 1
+
+update_format_string_lookup = {
+    UPDATE_FORMAT_JSON : 'compressed JSON (readable by all clients)',
+    UPDATE_FORMAT_BINARY : 'compact binary (faster, but needs a recent client)'
+}
+
 def GenerateDefaultServiceDictionary( service_type ):
     
     # don't store bytes key/value data here until ~version 537
@@ -44,6 +52,7 @@ def GenerateDefaultServiceDictionary( service_type ):
             
             dictionary[ 'service_options' ][ 'update_period' ] = update_period
             dictionary[ 'service_options' ][ 'nullification_period' ] = 90 * 86400
+            dictionary[ 'service_options' ][ 'update_format' ] = UPDATE_FORMAT_JSON
             
             dictionary[ 'next_nullification_update_index' ] = 0
             
@@ -1943,6 +1952,16 @@ class DefinitionsUpdate( HydrusSerialisable.SerialisableBase ):
         return self._tag_ids_to_tags
         
     
+    def IterateHashIdsToHashes( self ):
+        
+        return iter( self._hash_ids_to_hashes.items() )
+        
+    
+    def IterateTagIdsToTags( self ):
+        
+        return iter( self._tag_ids_to_tags.items() )
+        
+    
 HydrusSerialisable.SERIALISABLE_TYPES_TO_OBJECT_TYPES[ HydrusSerialisable.SERIALISABLE_TYPE_DEFINITIONS_UPDATE ] = DefinitionsUpdate
 
 class Metadata( HydrusSerialisable.SerialisableBase ):
@@ -2931,6 +2950,11 @@ class ServerServiceRepository( ServerServiceRestricted ):
             self._service_options[ 'nullification_period' ] = default_nullification_period
             
         
+        if 'update_format' not in self._service_options:
+            
+            self._service_options[ 'update_format' ] = UPDATE_FORMAT_JSON
+            
+        
         if 'next_nullification_update_index' not in dictionary:
             
             dictionary[ 'next_nullification_update_index' ] = 0
@@ -2965,6 +2989,14 @@ class ServerServiceRepository( ServerServiceRestricted ):
             
         
     
+    def GetUpdateFormat( self ) -> int:
+        
+        with self._lock:
+            
+            return self._service_options[ 'update_format' ]
+            
+        
+    
     def GetUpdatePeriod( self ) -> int:
         
         with self._lock:
@@ -3091,6 +3123,16 @@ class ServerServiceRepository( ServerServiceRestricted ):
         HG.controller.pub( 'notify_new_nullification' )
         
     
+    def SetUpdateFormat( self, update_format: int ):
+        
+        with self._lock:
+            
+            self._service_options[ 'update_format' ] = update_format
+            
+            self._SetDirty()
+            
+        
+    
     def SetUpdatePeriod( self, update_period: int ):
         
         with self._lock:
@@ -3135,10 +3177,11 @@ class ServerServiceRepository( ServerServiceRestricted ):
                         
                     
                     update_period = self._service_options[ 'update_period' ]
+                    update_format = self._service_options[ 'update_format' ]
                     
                     end = begin + update_period
                     
-                    update_hashes = HG.controller.WriteSynchronous( 'create_update', service_key, begin, end )
+                    update_hashes = HG.controller.WriteSynchronous( 'create_update', service_key, begin, end, update_format = update_format )
                     
                     update_created = True
                     
@@ -0,0 +1,799 @@
+import array
+import itertools
+import operator
+import sys
+import typing
+import zlib
+
+from hydrus.core import HydrusConstants as HC
+from hydrus.core import HydrusExceptions
+from hydrus.core import HydrusLists
+from hydrus.core import HydrusSerialisable
+from hydrus.core.networking import HydrusNetwork
+
+# a compact alternative to the JSON update format
+# the JSON updates are fine, but a client has to decompress and json.loads the whole thing, making a big python object graph, before it can process a single row
+# this format is a small uncompressed header that says what is in the update and how many rows, followed by a zlib stream of sections
+# each section is a run of blocks, and each block stores its columns as packed int arrays, delta-encoded where that helps
+# so the client can decode one block at a time, with C doing the heavy lifting, and it never needs more than a block in memory
+
+BINARY_UPDATE_MAGIC = b'\x89hyupd\r\n'
+BINARY_UPDATE_VERSION = 1
+
+BINARY_UPDATE_TYPE_DEFINITIONS = 0
+BINARY_UPDATE_TYPE_CONTENT = 1
+
+BLOCK_NUM_RECORDS = 4096
+BLOCK_NUM_ROWS = 65536
+
+DECOMPRESSION_CHUNK_SIZE = 256 * 1024
+
+NUM_FILE_INFO_COLUMNS = 8 # size, mime, timestamp, width, height, duration, num_frames, num_words
+
+UNSIGNED_TYPECODES_AND_LIMITS = [ ( 'B', 2 ** 8 ), ( 'H', 2 ** 16 ), ( 'I', 2 ** 32 ), ( 'Q', 2 ** 64 ) ]
+SIGNED_TYPECODES_AND_LIMITS = [ ( 'b', 2 ** 7 ), ( 'h', 2 ** 15 ), ( 'i', 2 ** 31 ), ( 'q', 2 ** 63 ) ]
+
+def GetIntArrayTypecode( values ) -> str:
+    
+    if len( values ) == 0:
+        
+        return 'B'
+        
+    
+    lowest = min( values )
+    highest = max( values )
+    
+    if lowest >= 0:
+        
+        for ( typecode, limit ) in UNSIGNED_TYPECODES_AND_LIMITS:
+            
+            if highest < limit:
+                
+                return typecode
+                
+            
+        
+    else:
+        
+        for ( typecode, limit ) in SIGNED_TYPECODES_AND_LIMITS:
+            
+            if -limit <= lowest and highest < limit:
+                
+                return typecode
+                
+            
+        
+    
+    raise ValueError( 'Integer too large to pack: {}'.format( ( lowest, highest ) ) )
+    
+
+def WriteVarint( buffer: bytearray, n: int ):
+    
+    if n < 0:
+        
+        raise ValueError( 'Varints must be non-negative!' )
+        
+    
+    while n >= 0x80:
+        
+        buffer.append( ( n & 0x7F ) | 0x80 )
+        
+        n >>= 7
+        
+    
+    buffer.append( n )
+    
+
+def WriteIntArray( buffer: bytearray, values, delta = False ):
+    
+    values = list( values )
+    
+    if delta and len( values ) > 1:
+        
+        values = [ values[0] ] + list( map( operator.sub, values[1:], values ) )
+        
+    
+    typecode = GetIntArrayTypecode( values )
+    
+    packed = array.array( typecode, values )
+    
+    if sys.byteorder == 'big':
+        
+        packed.byteswap()
+        
+    
+    buffer.append( 1 if delta else 0 )
+    buffer.append( ord( typecode ) )
+    
+    WriteVarint( buffer, len( values ) )
+    
+    buffer.extend( packed.tobytes() )
+    
+
+def WriteNullableIntArray( buffer: bytearray, values ):
+    
+    WriteIntArray( buffer, [ 0 if value is None else 1 for value in values ] )
+    WriteIntArray( buffer, [ value for value in values if value is not None ] )
+    
+
+def WriteBytesArray( buffer: bytearray, values: typing.List[ bytes ] ):
+    
+    WriteIntArray( buffer, [ len( value ) for value in values ] )
+    
+    buffer.extend( b''.join( values ) )
+    
+
+def WriteSectionBlock( buffer: bytearray, section_key, records ):
+    
+    ( content_type, action ) = section_key
+    
+    if content_type == HC.CONTENT_TYPE_DEFINITIONS:
+        
+        WriteIntArray( buffer, [ service_id for ( service_id, value ) in records ], delta = True )
+        
+        if action == HC.DEFINITIONS_TYPE_HASHES:
+            
+            WriteBytesArray( buffer, [ hash for ( service_hash_id, hash ) in records ] )
+            
+        else:
+            
+            WriteBytesArray( buffer, [ bytes( tag, 'utf-8' ) for ( service_tag_id, tag ) in records ] )
+            
+        
+    elif content_type == HC.CONTENT_TYPE_FILES:
+        
+        if action == HC.CONTENT_UPDATE_ADD:
+            
+            WriteIntArray( buffer, [ file_row[0] for file_row in records ], delta = True )
+            
+            for i in range( 1, NUM_FILE_INFO_COLUMNS + 1 ):
+                
+                WriteNullableIntArray( buffer, [ file_row[ i ] for file_row in records ] )
+                
+            
+        else:
+            
+            WriteIntArray( buffer, records, delta = True )
+            
+        
+    elif content_type == HC.CONTENT_TYPE_MAPPINGS:
+        
+        WriteIntArray( buffer, [ service_tag_id for ( service_tag_id, service_hash_ids ) in records ], delta = True )
+        WriteIntArray( buffer, [ len( service_hash_ids ) for ( service_tag_id, service_hash_ids ) in records ] )
+        WriteIntArray( buffer, itertools.chain.from_iterable( ( sorted( service_hash_ids ) for ( service_tag_id, service_hash_ids ) in records ) ), delta = True )
+        
+    else:
+        
+        WriteIntArray( buffer, [ a for ( a, b ) in records ], delta = True )
+        WriteIntArray( buffer, [ b for ( a, b ) in records ], delta = True )
+        
+    
+
+def GetUpdateSections( update ):
+    
+    if isinstance( update, HydrusNetwork.DefinitionsUpdate ):
+        
+        return ( BINARY_UPDATE_TYPE_DEFINITIONS, [
+            ( ( HC.CONTENT_TYPE_DEFINITIONS, HC.DEFINITIONS_TYPE_HASHES ), sorted( update.GetHashIdsToHashes().items() ) ),
+            ( ( HC.CONTENT_TYPE_DEFINITIONS, HC.DEFINITIONS_TYPE_TAGS ), sorted( update.GetTagIdsToTags().items() ) )
+        ] )
+        
+    elif isinstance( update, HydrusNetwork.ContentUpdate ):
+        
+        # this is the order the client processes things, so a reader that is consumed in processing order never has to rewind
+        
+        return ( BINARY_UPDATE_TYPE_CONTENT, [
+            ( ( HC.CONTENT_TYPE_FILES, HC.CONTENT_UPDATE_ADD ), sorted( update.GetNewFiles() ) ),
+            ( ( HC.CONTENT_TYPE_FILES, HC.CONTENT_UPDATE_DELETE ), sorted( update.GetDeletedFiles() ) ),
+            ( ( HC.CONTENT_TYPE_MAPPINGS, HC.CONTENT_UPDATE_ADD ), update.GetNewMappings() ),
+            ( ( HC.CONTENT_TYPE_MAPPINGS, HC.CONTENT_UPDATE_DELETE ), update.GetDeletedMappings() ),
+            ( ( HC.CONTENT_TYPE_TAG_PARENTS, HC.CONTENT_UPDATE_ADD ), sorted( update.GetNewTagParents() ) ),
+            ( ( HC.CONTENT_TYPE_TAG_PARENTS, HC.CONTENT_UPDATE_DELETE ), sorted( update.GetDeletedTagParents() ) ),
+            ( ( HC.CONTENT_TYPE_TAG_SIBLINGS, HC.CONTENT_UPDATE_ADD ), sorted( update.GetNewTagSiblings() ) ),
+            ( ( HC.CONTENT_TYPE_TAG_SIBLINGS, HC.CONTENT_UPDATE_DELETE ), sorted( update.GetDeletedTagSiblings() ) )
+        ] )
+        
+    
+    raise HydrusExceptions.DataMissing( 'Do not know how to write a binary update for {}!'.format( update ) )
+    
+
+def SplitRecordsIntoBlocks( section_key, records ):
+    
+    ( content_type, action ) = section_key
+    
+    if content_type != HC.CONTENT_TYPE_MAPPINGS:
+        
+        yield from HydrusLists.SplitListIntoChunks( records, BLOCK_NUM_RECORDS )
+        
+        return
+        
+    
+    # a mapping record can have tens of thousands of files, so we go by weight here
+    
+    block = []
+    block_weight = 0
+    
+    for record in records:
+        
+        ( service_tag_id, service_hash_ids ) = record
+        
+        if len( block ) > 0 and ( len( block ) >= BLOCK_NUM_RECORDS or block_weight + len( service_hash_ids ) > BLOCK_NUM_ROWS ):
+            
+            yield block
+            
+            block = []
+            block_weight = 0
+            
+        
+        block.append( record )
+        block_weight += len( service_hash_ids )
+        
+    
+    if len( block ) > 0:
+        
+        yield block
+        
+    
+
+def DumpUpdateToBinaryBytes( update ) -> bytes:
+    
+    ( update_type, sections ) = GetUpdateSections( update )
+    
+    sections = [ ( section_key, records ) for ( section_key, records ) in sections if len( records ) > 0 ]
+    
+    header = bytearray( BINARY_UPDATE_MAGIC )
+    
+    header.append( BINARY_UPDATE_VERSION )
+    header.append( update_type )
+    
+    WriteVarint( header, len( sections ) )
+    
+    body = bytearray()
+    
+    for ( section_key, records ) in sections:
+        
+        ( content_type, action ) = section_key
+        
+        if content_type == HC.CONTENT_TYPE_MAPPINGS:
+            
+            num_rows = sum( ( len( service_hash_ids ) for ( service_tag_id, service_hash_ids ) in records ) )
+            
+        else:
+            
+            num_rows = len( records )
+            
+        
+        WriteVarint( header, content_type )
+        WriteVarint( header, action )
+        WriteVarint( header, len( records ) )
+        WriteVarint( header, num_rows )
+        
+        for block_of_records in SplitRecordsIntoBlocks( section_key, records ):
+            
+            WriteVarint( body, len( block_of_records ) )
+            
+            WriteSectionBlock( body, section_key, block_of_records )
+            
+        
+        WriteVarint( body, 0 )
+        
+    
+    return bytes( header ) + zlib.compress( bytes( body ), 9 )
+    
+
+def IsBinaryUpdate( update_bytes: bytes ) -> bool:
+    
+    return update_bytes[ : len( BINARY_UPDATE_MAGIC ) ] == BINARY_UPDATE_MAGIC
+    
+
+class DecompressingStream( object ):
+    
+    def __init__( self, compressed_bytes: bytes, offset: int ):
+        
+        self._compressed = memoryview( compressed_bytes )[ offset : ]
+        self._compressed_position = 0
+        
+        self._decompressor = zlib.decompressobj()
+        
+        self._buffer = bytearray()
+        self._buffer_position = 0
+        
+    
+    def _Fill( self, n: int ):
+        
+        while len( self._buffer ) - self._buffer_position < n:
+            
+            if self._buffer_position > 0:
+                
+                # we only ever hold what we have not read yet, plus one chunk
+                del self._buffer[ : self._buffer_position ]
+                
+                self._buffer_position = 0
+                
+            
+            if len( self._decompressor.unconsumed_tail ) > 0:
+                
+                data = self._decompressor.decompress( self._decompressor.unconsumed_tail, DECOMPRESSION_CHUNK_SIZE )
+                
+            elif self._compressed_position < len( self._compressed ):
+                
+                chunk = self._compressed[ self._compressed_position : self._compressed_position + DECOMPRESSION_CHUNK_SIZE ]
+                
+                self._compressed_position += len( chunk )
+                
+                data = self._decompressor.decompress( chunk, DECOMPRESSION_CHUNK_SIZE )
+                
+            else:
+                
+                raise HydrusExceptions.DataMissing( 'This binary update appears to be truncated!' )
+                
+            
+            self._buffer.extend( data )
+            
+        
+    
+    def Read( self, n: int ) -> bytes:
+        
+        self._Fill( n )
+        
+        data = bytes( self._buffer[ self._buffer_position : self._buffer_position + n ] )
+        
+        self._buffer_position += n
+        
+        return data
+        
+    
+    def ReadByte( self ) -> int:
+        
+        self._Fill( 1 )
+        
+        byte = self._buffer[ self._buffer_position ]
+        
+        self._buffer_position += 1
+        
+        return byte
+        
+    
+    def ReadVarint( self ) -> int:
+        
+        n = 0
+        shift = 0
+        
+        while True:
+            
+            byte = self.ReadByte()
+            
+            n |= ( byte & 0x7F ) << shift
+            
+            if byte < 0x80:
+                
+                return n
+                
+            
+            shift += 7
+            
+        
+    
+    def ReadIntArray( self ) -> typing.List[ int ]:
+        
+        delta = self.ReadByte() == 1
+        typecode = chr( self.ReadByte() )
+        num_values = self.ReadVarint()
+        
+        packed = array.array( typecode )
+        
+        packed.frombytes( self.Read( num_values * packed.itemsize ) )
+        
+        if sys.byteorder == 'big':
+            
+            packed.byteswap()
+            
+        
+        if delta:
+            
+            return list( itertools.accumulate( packed ) )
+            
+        else:
+            
+            return packed.tolist()
+            
+        
+    
+    def ReadNullableIntArray( self ) -> typing.List[ typing.Optional[ int ] ]:
+        
+        present = self.ReadIntArray()
+        values = iter( self.ReadIntArray() )
+        
+        return [ next( values ) if is_present else None for is_present in present ]
+        
+    
+    def ReadBytesArray( self ) -> typing.List[ bytes ]:
+        
+        lengths = self.ReadIntArray()
+        
+        blob = self.Read( sum( lengths ) )
+        
+        results = []
+        position = 0
+        
+        for length in lengths:
+            
+            results.append( blob[ position : position + length ] )
+            
+            position += length
+            
+        
+        return results
+        
+    
+
+def ReadVarintFromBytes( data: bytes, position: int ):
+    
+    n = 0
+    shift = 0
+    
+    while True:
+        
+        if position >= len( data ):
+            
+            raise HydrusExceptions.DataMissing( 'This binary update appears to be truncated!' )
+            
+        
+        byte = data[ position ]
+        
+        position += 1
+        
+        n |= ( byte & 0x7F ) << shift
+        
+        if byte < 0x80:
+            
+            return ( n, position )
+            
+        
+        shift += 7
+        
+    
+
+class BinaryUpdateReader( object ):
+    
+    def __init__( self, update_bytes: bytes ):
+        
+        if not IsBinaryUpdate( update_bytes ):
+            
+            raise HydrusExceptions.SerialisationException( 'This is not a binary update!' )
+            
+        
+        position = len( BINARY_UPDATE_MAGIC )
+        
+        if len( update_bytes ) < position + 2:
+            
+            raise HydrusExceptions.DataMissing( 'This binary update appears to be truncated!' )
+            
+        
+        version = update_bytes[ position ]
+        
+        if version > BINARY_UPDATE_VERSION:
+            
+            raise HydrusExceptions.SerialisationException( 'This binary update is from a newer version of hydrus! Please update your client!' )
+            
+        
+        self._update_type = update_bytes[ position + 1 ]
+        
+        position += 2
+        
+        ( num_sections, position ) = ReadVarintFromBytes( update_bytes, position )
+        
+        self._sections = []
+        
+        for i in range( num_sections ):
+            
+            section_info = []
+            
+            for j in range( 4 ):
+                
+                ( value, position ) = ReadVarintFromBytes( update_bytes, position )
+                
+                section_info.append( value )
+                
+            
+            ( content_type, action, num_records, num_rows ) = section_info
+            
+            self._sections.append( ( ( content_type, action ), num_records, num_rows ) )
+            
+        
+        self._update_bytes = update_bytes
+        self._body_offset = position
+        
+        self._stream = None
+        self._next_section_index = 0
+        self._active_section_index = None
+        
+    
+    def _GetSectionIndex( self, section_key ):
+        
+        for ( i, ( key, num_records, num_rows ) ) in enumerate( self._sections ):
+            
+            if key == section_key:
+                
+                return i
+                
+            
+        
+        return None
+        
+    
+    def _IterateSection( self, section_key ):
+        
+        index = self._GetSectionIndex( section_key )
+        
+        if index is None:
+            
+            return
+            
+        
+        if self._stream is None or self._next_section_index > index:
+            
+            # someone wants something we already went past, so start again
+            
+            self._stream = DecompressingStream( self._update_bytes, self._body_offset )
+            self._next_section_index = 0
+            
+        
+        while self._next_section_index < index:
+            
+            for block in self._ReadSectionBlocks( self._sections[ self._next_section_index ][0] ):
+                
+                pass
+                
+            
+            self._next_section_index += 1
+            
+        
+        self._next_section_index = index + 1
+        self._active_section_index = index
+        
+        for block in self._ReadSectionBlocks( section_key ):
+            
+            if self._active_section_index != index:
+                
+                raise Exception( 'Binary update sections were read out of order!' )
+                
+            
+            yield from block
+            
+        
+    
+    def _ReadSectionBlocks( self, section_key ):
+        
+        ( content_type, action ) = section_key
+        
+        stream = self._stream
+        
+        while True:
+            
+            num_records = stream.ReadVarint()
+            
+            if num_records == 0:
+                
+                return
+                
+            
+            if content_type == HC.CONTENT_TYPE_DEFINITIONS:
+                
+                service_ids = stream.ReadIntArray()
+                values = stream.ReadBytesArray()
+                
+                if action == HC.DEFINITIONS_TYPE_TAGS:
+                    
+                    values = [ str( value, 'utf-8' ) for value in values ]
+                    
+                
+                block = list( zip( service_ids, values ) )
+                
+            elif content_type == HC.CONTENT_TYPE_FILES:
+                
+                if action == HC.CONTENT_UPDATE_ADD:
+                    
+                    columns = [ stream.ReadIntArray() ]
+                    
+                    for i in range( NUM_FILE_INFO_COLUMNS ):
+                        
+                        columns.append( stream.ReadNullableIntArray() )
+                        
+                    
+                    block = list( zip( *columns ) )
+                    
+                else:
+                    
+                    block = stream.ReadIntArray()
+                    
+                
+            elif content_type == HC.CONTENT_TYPE_MAPPINGS:
+                
+                service_tag_ids = stream.ReadIntArray()
+                counts = stream.ReadIntArray()
+                service_hash_ids = stream.ReadIntArray()
+                
+                block = []
+                position = 0
+                
+                for ( service_tag_id, count ) in zip( service_tag_ids, counts ):
+                    
+                    block.append( ( service_tag_id, service_hash_ids[ position : position + count ] ) )
+                    
+                    position += count
+                    
+                
+            else:
+                
+                block = list( zip( stream.ReadIntArray(), stream.ReadIntArray() ) )
+                
+            
+            if len( block ) != num_records:
+                
+                raise HydrusExceptions.SerialisationException( 'A binary update block did not have the expected number of rows!' )
+                
+            
+            yield block
+            
+        
+    
+    def GetNumRows( self, content_types_to_count = None ):
+        
+        num = 0
+        
+        for ( ( content_type, action ), num_records, num_rows ) in self._sections:
+            
+            if content_types_to_count is not None and content_type not in content_types_to_count:
+                
+                continue
+                
+            
+            num += num_rows
+            
+        
+        return num
+        
+    
+
+class BinaryContentUpdateReader( BinaryUpdateReader ):
+    
+    def GetDeletedFiles( self ):
+        
+        return self._IterateSection( ( HC.CONTENT_TYPE_FILES, HC.CONTENT_UPDATE_DELETE ) )
+        
+    
+    def GetDeletedMappings( self ):
+        
+        return self._IterateSection( ( HC.CONTENT_TYPE_MAPPINGS, HC.CONTENT_UPDATE_DELETE ) )
+        
+    
+    def GetDeletedTagParents( self ):
+        
+        return self._IterateSection( ( HC.CONTENT_TYPE_TAG_PARENTS, HC.CONTENT_UPDATE_DELETE ) )
+        
+    
+    def GetDeletedTagSiblings( self ):
+        
+        return self._IterateSection( ( HC.CONTENT_TYPE_TAG_SIBLINGS, HC.CONTENT_UPDATE_DELETE ) )
+        
+    
+    def GetNewFiles( self ):
+        
+        return self._IterateSection( ( HC.CONTENT_TYPE_FILES, HC.CONTENT_UPDATE_ADD ) )
+        
+    
+    def GetNewMappings( self ):
+        
+        return self._IterateSection( ( HC.CONTENT_TYPE_MAPPINGS, HC.CONTENT_UPDATE_ADD ) )
+        
+    
+    def GetNewTagParents( self ):
+        
+        return self._IterateSection( ( HC.CONTENT_TYPE_TAG_PARENTS, HC.CONTENT_UPDATE_ADD ) )
+        
+    
+    def GetNewTagSiblings( self ):
+        
+        return self._IterateSection( ( HC.CONTENT_TYPE_TAG_SIBLINGS, HC.CONTENT_UPDATE_ADD ) )
+        
+    
+    def ToUpdate( self ) -> HydrusNetwork.ContentUpdate:
+        
+        content_update = HydrusNetwork.ContentUpdate()
+        
+        for ( section_key, num_records, num_rows ) in list( self._sections ):
+            
+            ( content_type, action ) = section_key
+            
+            for row in self._IterateSection( section_key ):
+                
+                content_update.AddRow( ( content_type, action, row ) )
+                
+            
+        
+        return content_update
+        
+    
+
+class BinaryDefinitionsUpdateReader( BinaryUpdateReader ):
+    
+    def IterateHashIdsToHashes( self ):
+        
+        return self._IterateSection( ( HC.CONTENT_TYPE_DEFINITIONS, HC.DEFINITIONS_TYPE_HASHES ) )
+        
+    
+    def IterateTagIdsToTags( self ):
+        
+        return self._IterateSection( ( HC.CONTENT_TYPE_DEFINITIONS, HC.DEFINITIONS_TYPE_TAGS ) )
+        
+    
+    def ToUpdate( self ) -> HydrusNetwork.DefinitionsUpdate:
+        
+        definitions_update = HydrusNetwork.DefinitionsUpdate()
+        
+        for ( section_key, num_records, num_rows ) in list( self._sections ):
+            
+            ( content_type, definitions_type ) = section_key
+            
+            for ( key, value ) in self._IterateSection( section_key ):
+                
+                definitions_update.AddRow( ( definitions_type, key, value ) )
+                
+            
+        
+        return definitions_update
+        
+    
+
+def CreateBinaryUpdateReader( update_bytes: bytes ) -> BinaryUpdateReader:
+    
+    position = len( BINARY_UPDATE_MAGIC ) + 1
+    
+    if len( update_bytes ) <= position:
+        
+        raise HydrusExceptions.DataMissing( 'This binary update appears to be truncated!' )
+        
+    
+    update_type = update_bytes[ position ]
+    
+    if update_type == BINARY_UPDATE_TYPE_DEFINITIONS:
+        
+        return BinaryDefinitionsUpdateReader( update_bytes )
+        
+    elif update_type == BINARY_UPDATE_TYPE_CONTENT:
+        
+        return BinaryContentUpdateReader( update_bytes )
+        
+    
+    raise HydrusExceptions.SerialisationException( 'Unknown binary update type!' )
+    
+
+def CreateUpdateFromNetworkBytes( update_network_bytes: bytes, streaming = False ):
+    
+    # the one place to load an update file, whatever format it is in
+    # if streaming, a binary update comes back as a reader that decodes as you iterate, rather than a full update object
+    
+    if IsBinaryUpdate( update_network_bytes ):
+        
+        reader = CreateBinaryUpdateReader( update_network_bytes )
+        
+        if streaming:
+            
+            return reader
+            
+        
+        return reader.ToUpdate()
+        
+    
+    return HydrusSerialisable.CreateFromNetworkBytes( update_network_bytes )
+    
+
+def DumpUpdateToNetworkBytes( update, update_format: int ) -> bytes:
+    
+    if update_format == HydrusNetwork.UPDATE_FORMAT_BINARY:
+        
+        return DumpUpdateToBinaryBytes( update )
+        
+    
+    return update.DumpToNetworkBytes()
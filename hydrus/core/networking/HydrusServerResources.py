@@ -18,6 +18,12 @@ from hydrus.core import HydrusSerialisable
 from hydrus.core import HydrusTemp
 from hydrus.core.networking import HydrusServerRequest
 
+# a streamed body is a sequence of items, not one document, so it is not the normal type
+STREAMED_MIMES_TO_MIMETYPE_STRINGS = {
+    HC.APPLICATION_JSON : 'application/jsonl',
+    HC.APPLICATION_CBOR : 'application/cbor-seq'
+}
+
 def GetServerSummaryTexts( service ):
     
     name = service.GetName()
@@ -424,6 +430,147 @@ class HydrusDomain( object ):
         return self._local_only
         
     
+class BodyGeneratorProducer( object ):
+    
+    # writes a response body as a generator makes it, rather than all at once at the end
+    # we ask a thread for every chunk so the reactor never waits on a db job, and we stop asking while twisted's write buffer is full
+    
+    def __init__( self, resource: "HydrusResource", request: HydrusServerRequest.HydrusRequest, body_generator ):
+        
+        self._resource = resource
+        self._request = request
+        self._body_generator = body_generator
+        
+        self._paused = False
+        self._waiting_on_chunk = False
+        self._stopped = False
+        
+        self._num_bytes_written = 0
+        
+    
+    def _CloseGenerator( self ):
+        
+        # must not happen while a thread is in the middle of it
+        deferToThread( self._body_generator.close )
+        
+    
+    def _errbackChunk( self, failure ):
+        
+        self._waiting_on_chunk = False
+        
+        HydrusData.Print( 'A streaming response failed partway through! Error follows:' )
+        
+        HydrusData.PrintException( failure.value, do_wait = False )
+        
+        if self._stopped:
+            
+            return
+            
+        
+        self._stopped = True
+        
+        self._request.unregisterProducer()
+        
+        # the headers and maybe a bunch of data have gone already, so all we can do is drop the connection without the end chunk, so the other side knows it failed
+        
+        if self._request.channel is not None:
+            
+            self._request.channel.loseConnection()
+            
+        
+    
+    def _callbackChunk( self, chunk ):
+        
+        self._waiting_on_chunk = False
+        
+        if self._stopped:
+            
+            self._CloseGenerator()
+            
+            return
+            
+        
+        if chunk is None:
+            
+            self._Finish()
+            
+            return
+            
+        
+        if len( chunk ) > 0:
+            
+            self._request.write( chunk )
+            
+            self._num_bytes_written += len( chunk )
+            
+        
+        if not self._paused:
+            
+            self._FetchChunk()
+            
+        
+    
+    def _FetchChunk( self ):
+        
+        self._waiting_on_chunk = True
+        
+        d = deferToThread( next, self._body_generator, None )
+        
+        d.addCallbacks( self._callbackChunk, self._errbackChunk )
+        
+    
+    def _Finish( self ):
+        
+        self._stopped = True
+        
+        self._request.unregisterProducer()
+        
+        self._resource._reportDataUsed( self._request, self._num_bytes_written )
+        
+        if self._request.channel is not None:
+            
+            self._request.finish()
+            
+        
+    
+    def pauseProducing( self ):
+        
+        self._paused = True
+        
+    
+    def resumeProducing( self ):
+        
+        self._paused = False
+        
+        if not self._waiting_on_chunk and not self._stopped:
+            
+            self._FetchChunk()
+            
+        
+    
+    def start( self ):
+        
+        self._request.registerProducer( self, True )
+        
+        self._FetchChunk()
+        
+    
+    def stopProducing( self ):
+        
+        if self._stopped:
+            
+            return
+            
+        
+        self._stopped = True
+        
+        if not self._waiting_on_chunk:
+            
+            self._CloseGenerator()
+            
+        
+    
+
 class HydrusResource( Resource ):
     
     def __init__( self, service, domain ):
@@ -671,6 +818,33 @@ class HydrusResource( Resource ):
             
             do_finish = False
             
+        elif response_context.HasBodyGenerator():
+            
+            mime = response_context.GetMime()
+            
+            if mime in STREAMED_MIMES_TO_MIMETYPE_STRINGS:
+                
+                content_type = STREAMED_MIMES_TO_MIMETYPE_STRINGS[ mime ]
+                
+            else:
+                
+                content_type = HC.mime_mimetype_string_lookup[ mime ]
+                
+            
+            request.setHeader( 'Content-Type', content_type )
+            request.setHeader( 'Content-Disposition', content_disposition_type )
+            
+            # no Content-Length, so twisted sends this chunked. the producer reports the data used when it is done
+            content_length = 0
+            
+            producer = BodyGeneratorProducer( self, request, response_context.GetBodyGenerator() )
+            
+            request.disconnect_callables.append( producer.stopProducing )
+            
+            producer.start()
+            
+            do_finish = False
+            
         elif response_context.HasBody():
             
             mime = response_context.GetMime()
@@ -1249,7 +1423,7 @@ class HydrusResourceWelcome( HydrusResource ):
     
 class ResponseContext( object ):
     
-    def __init__( self, status_code, mime = HC.APPLICATION_JSON, body = None, path = None, cookies = None, is_attachment = False, max_age = None ):
+    def __init__( self, status_code, mime = HC.APPLICATION_JSON, body = None, path = None, cookies = None, is_attachment = False, max_age = None, body_generator = None ):
         
         if body is None:
             
@@ -1279,7 +1453,7 @@ class ResponseContext( object ):
         
         if max_age is None:
             
-            if body is not None:
+            if body is not None or body_generator is not None:
                 
                 max_age = 4
                 
@@ -1292,6 +1466,7 @@ class ResponseContext( object ):
         self._status_code = status_code
         self._mime = mime
         self._body_bytes = body_bytes
+        self._body_generator = body_generator
         self._path = path
         self._cookies = cookies
         self._is_attachment = is_attachment
@@ -1303,6 +1478,11 @@ class ResponseContext( object ):
         return self._body_bytes
         
     
+    def GetBodyGenerator( self ):
+        
+        return self._body_generator
+        
+    
     def GetCookies( self ):
         
         return self._cookies
@@ -1338,6 +1518,11 @@ class ResponseContext( object ):
         return self._body_bytes is not None
         
     
+    def HasBodyGenerator( self ):
+        
+        return self._body_generator is not None
+        
+    
     def HasPath( self ):
         
         return self._path is not None
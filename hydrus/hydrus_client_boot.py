@@ -41,6 +41,7 @@ try:
     argparser.add_argument( '--db_journal_mode', default = 'WAL', choices = [ 'WAL', 'TRUNCATE', 'PERSIST', 'MEMORY' ], help = 'change db journal mode (default=WAL)' )
     argparser.add_argument( '--db_cache_size', type = int, help = 'override SQLite cache_size per db file, in MB (default=256)' )
     argparser.add_argument( '--db_transaction_commit_period', type = int, help = 'override how often (in seconds) database changes are saved to disk (default=30,min=10)' )
+    argparser.add_argument( '--db_read_pool_size', type = int, help = 'use this many extra read-only db connections to serve some searches while the db is busy writing, WAL only (default=0,max=16)' )
     argparser.add_argument( '--db_synchronous_override', type = int, choices = range(4), help = 'override SQLite Synchronous PRAGMA (default=2)' )
     argparser.add_argument( '--no_db_temp_files', action='store_true', help = 'run db temp operations entirely in memory' )
     argparser.add_argument( '--boot_debug', action='store_true', help = 'print additional bootup information to the log' )
@@ -84,6 +85,15 @@ try:
         HG.db_transaction_commit_period = 30
         
     
+    if result.db_read_pool_size is not None:
+        
+        HG.db_read_pool_size = min( max( 0, result.db_read_pool_size ), 16 )
+        
+    else:
+        
+        HG.db_read_pool_size = 0
+        
+    
     if result.db_synchronous_override is not None:
         
         HG.db_synchronous = int( result.db_synchronous_override )
@@ -19,6 +19,7 @@ from hydrus.core import HydrusSerialisable
 from hydrus.core import HydrusTags
 from hydrus.core import HydrusTime
 from hydrus.core.networking import HydrusNetwork
+from hydrus.core.networking import HydrusNetworkBinaryUpdates
 
 from hydrus.server import ServerFiles
 from hydrus.server import ServerGlobals as SG
@@ -2072,7 +2073,7 @@ class DB( HydrusDB.HydrusDB ):
         self._RepositoryRegenerateServiceInfo( service_id = service_id )
         
     
-    def _RepositoryCreateUpdate( self, service_key, begin, end ):
+    def _RepositoryCreateUpdate( self, service_key, begin, end, update_format = HydrusNetwork.UPDATE_FORMAT_JSON ):
         
         service_id = self._GetServiceId( service_key )
         
@@ -2102,7 +2103,16 @@ class DB( HydrusDB.HydrusDB ):
                     total_content_rows += num_rows
                     
                 
-                update_bytes = update.DumpToNetworkBytes()
+                try:
+                    
+                    update_bytes = HydrusNetworkBinaryUpdates.DumpUpdateToNetworkBytes( update, update_format )
+                    
+                except Exception as e:
+                    
+                    HydrusData.Print( 'Could not create a {} update, falling back to JSON. Error was: {}'.format( HydrusNetwork.update_format_string_lookup[ update_format ], e ) )
+                    
+                    update_bytes = update.DumpToNetworkBytes()
+                    
                 
                 update_hash = hashlib.sha256( update_bytes ).digest()
                 
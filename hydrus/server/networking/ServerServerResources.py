@@ -376,7 +376,8 @@ class HydrusResourceRestrictedOptions( HydrusResourceRestricted ):
             
             service_options = {
                 'update_period' : self._service.GetUpdatePeriod(),
-                'nullification_period' : self._service.GetNullificationPeriod()
+                'nullification_period' : self._service.GetNullificationPeriod(),
+                'update_format' : self._service.GetUpdateFormat()
             }
             
         else:
@@ -437,6 +438,38 @@ class HydrusResourceRestrictedOptionsModifyNullificationPeriod( HydrusResourceRe
         
     
 
+class HydrusResourceRestrictedOptionsModifyUpdateFormat( HydrusResourceRestrictedOptionsModify ):
+    
+    def _threadDoPOSTJob( self, request: HydrusServerRequest.HydrusRequest ):
+        
+        update_format = request.parsed_request_args[ 'update_format' ]
+        
+        if update_format not in HydrusNetwork.update_format_string_lookup:
+            
+            raise HydrusExceptions.BadRequestException( 'Did not understand that update format!' )
+            
+        
+        old_update_format = self._service.GetUpdateFormat()
+        
+        if old_update_format != update_format:
+            
+            self._service.SetUpdateFormat( update_format )
+            
+            HydrusData.Print(
+                'Account {} changed the update format from "{}" to "{}".'.format(
+                    request.hydrus_account.GetAccountKey().hex(),
+                    HydrusNetwork.update_format_string_lookup[ old_update_format ],
+                    HydrusNetwork.update_format_string_lookup[ update_format ]
+                )
+            )
+            
+        
+        response_context = HydrusServerResources.ResponseContext( 200 )
+        
+        return response_context
+        
+    
+
 class HydrusResourceRestrictedOptionsModifyUpdatePeriod( HydrusResourceRestrictedOptionsModify ):
     
     def _threadDoPOSTJob( self, request: HydrusServerRequest.HydrusRequest ):
@@ -3230,7 +3230,7 @@ class TestClientAPI( unittest.TestCase ):
         
         media_results = [ HF.GetFakeMediaResult( bytes.fromhex( hash_hex ) ) for hash_hex in [ hash_hex, hash2_hex ] ]
         
-        media_results[1].GetTagsManager().GetDeleted( CC.DEFAULT_LOCAL_TAG_SERVICE_KEY, ClientTags.TAG_DISPLAY_STORAGE ).add( 'test_add' ) # cannot add when there is a deletion record
+        media_results[1].GetTagsManager().ProcessContentUpdate( CC.DEFAULT_LOCAL_TAG_SERVICE_KEY, ClientContentUpdates.ContentUpdate( HC.CONTENT_TYPE_MAPPINGS, HC.CONTENT_UPDATE_DELETE, ( 'test_add', set() ) ) ) # cannot add when there is a deletion record
         
         TG.test_controller.SetRead( 'media_results', media_results )
         
@@ -3268,7 +3268,7 @@ class TestClientAPI( unittest.TestCase ):
         
         media_results = [ HF.GetFakeMediaResult( bytes.fromhex( hash_hex ) ) for hash_hex in [ hash_hex, hash2_hex ] ]
         
-        media_results[0].GetTagsManager().GetCurrent( CC.DEFAULT_LOCAL_TAG_SERVICE_KEY, ClientTags.TAG_DISPLAY_STORAGE ).add( 'test_delete' ) # can only delete when it already exists
+        media_results[0].GetTagsManager().ProcessContentUpdate( CC.DEFAULT_LOCAL_TAG_SERVICE_KEY, ClientContentUpdates.ContentUpdate( HC.CONTENT_TYPE_MAPPINGS, HC.CONTENT_UPDATE_ADD, ( 'test_delete', set() ) ) ) # can only delete when it already exists
         
         TG.test_controller.SetRead( 'media_results', media_results )
         
@@ -6202,6 +6202,110 @@ class TestClientAPI( unittest.TestCase ):
         
         self.assertEqual( response.status, 200 )
         
+        # paginated
+        
+        TG.test_controller.ClearReads( 'file_query_ids' )
+        
+        sample_hash_ids = [ 5, 3, 100, 1, 17 ]
+        
+        TG.test_controller.SetRead( 'file_query_ids', list( sample_hash_ids ) )
+        
+        tags = [ 'kino', 'green' ]
+        
+        path = '/get_files/search_files?tags={}&limit=2'.format( urllib.parse.quote( json.dumps( tags ) ) )
+        
+        file_ids = []
+        num_pages = 0
+        
+        while True:
+            
+            connection.request( 'GET', path, headers = headers )
+            
+            response = connection.getresponse()
+            
+            data = response.read()
+            
+            text = str( data, 'utf-8' )
+            
+            self.assertEqual( response.status, 200 )
+            
+            d = json.loads( text )
+            
+            self.assertEqual( d[ 'num_results' ], len( sample_hash_ids ) )
+            
+            file_ids.extend( d[ 'file_ids' ] )
+            num_pages += 1
+            
+            if d[ 'next_cursor' ] is None:
+                
+                break
+                
+            
+            ( cursor_key, position ) = d[ 'next_cursor' ].split( ':' )
+            
+            path = '/get_files/search_files?limit=2&cursor={}'.format( urllib.parse.quote( d[ 'next_cursor' ] ) )
+            
+        
+        self.assertEqual( file_ids, sample_hash_ids )
+        self.assertEqual( num_pages, 3 )
+        
+        # the search only ran once
+        
+        self.assertEqual( len( TG.test_controller.GetRead( 'file_query_ids' ) ), 1 )
+        
+        # bad cursor
+        
+        path = '/get_files/search_files?limit=2&cursor={}'.format( urllib.parse.quote( 'abcd:0' ) )
+        
+        connection.request( 'GET', path, headers = headers )
+        
+        response = connection.getresponse()
+        
+        data = response.read()
+        
+        self.assertEqual( response.status, 400 )
+        
+        # negative position
+        
+        path = '/get_files/search_files?limit=2&cursor={}'.format( urllib.parse.quote( '{}:-1'.format( cursor_key ) ) )
+        
+        connection.request( 'GET', path, headers = headers )
+        
+        response = connection.getresponse()
+        
+        data = response.read()
+        
+        self.assertEqual( response.status, 400 )
+        
+        # streamed
+        
+        TG.test_controller.SetRead( 'file_query_ids', list( sample_hash_ids ) )
+        
+        path = '/get_files/search_files?tags={}&stream=true'.format( urllib.parse.quote( json.dumps( tags ) ) )
+        
+        connection.request( 'GET', path, headers = headers )
+        
+        response = connection.getresponse()
+        
+        data = response.read()
+        
+        text = str( data, 'utf-8' )
+        
+        self.assertEqual( response.status, 200 )
+        self.assertEqual( response.headers[ 'Content-Type' ], 'application/jsonl' )
+        
+        lines = [ json.loads( line ) for line in text.splitlines() ]
+        
+        header = lines[0]
+        
+        expected_header = {}
+        
+        wash_example_json_response( expected_header )
+        
+        self.assertEqual( header, expected_header )
+        
+        self.assertEqual( lines[1:], [ { 'file_id' : hash_id } for hash_id in sample_hash_ids ] )
+        
     
     def _test_search_files_predicate_parsing( self, connection, set_up_permissions ):
         
@@ -6810,6 +6914,27 @@ class TestClientAPI( unittest.TestCase ):
         
         self.assertEqual( d, expected_identifier_result )
         
+        # identifiers, streamed
+        
+        TG.test_controller.SetRead( 'hash_ids_to_hashes', { k : v for ( k, v ) in file_ids_to_hashes.items() if k in [ 1, 2, 3 ] } )
+        
+        path = '/get_files/file_metadata?file_ids={}&only_return_identifiers=true&stream=true'.format( urllib.parse.quote( json.dumps( [ 1, 2, 3 ] ) ) )
+        
+        connection.request( 'GET', path, headers = headers )
+        
+        response = connection.getresponse()
+        
+        data = response.read()
+        
+        text = str( data, 'utf-8' )
+        
+        self.assertEqual( response.status, 200 )
+        
+        lines = [ json.loads( line ) for line in text.splitlines() ]
+        
+        self.assertEqual( lines[0][ 'services' ], expected_identifier_result[ 'services' ] )
+        self.assertEqual( lines[1:], expected_identifier_result[ 'metadata' ] )
+        
         # basic metadata from file_ids
         
         TG.test_controller.SetRead( 'hash_ids_to_hashes', { k : v for ( k, v ) in file_ids_to_hashes.items() if k in [ 1, 2, 3 ] } )
@@ -6878,6 +7003,50 @@ class TestClientAPI( unittest.TestCase ):
         
         self.assertEqual( d, expected_result )
         
+        # projected fields, columnar
+        
+        TG.test_controller.SetRead( 'hash_ids_to_hashes', { k : v for ( k, v ) in file_ids_to_hashes.items() if k in [ 1, 2, 3 ] } )
+        
+        TG.test_controller.ClearReads( 'file_info_managers_from_ids' )
+        TG.test_controller.ClearReads( 'media_results_from_ids' )
+        
+        path = '/get_files/file_metadata?file_ids={}&fields={}&columnar=true'.format( urllib.parse.quote( json.dumps( [ 1, 2, 3 ] ) ), urllib.parse.quote( json.dumps( [ 'size', 'mime' ] ) ) )
+        
+        connection.request( 'GET', path, headers = headers )
+        
+        response = connection.getresponse()
+        
+        data = response.read()
+        
+        text = str( data, 'utf-8' )
+        
+        self.assertEqual( response.status, 200 )
+        
+        d = json.loads( text )
+        
+        basic_rows = expected_only_return_basic_information_result[ 'metadata' ]
+        
+        expected_columns = { field : [ row[ field ] for row in basic_rows ] for field in ( 'file_id', 'hash', 'size', 'mime' ) }
+        
+        self.assertEqual( d[ 'metadata' ], expected_columns )
+        
+        # only the cheap file info was fetched
+        
+        self.assertEqual( len( TG.test_controller.GetRead( 'file_info_managers_from_ids' ) ), 1 )
+        self.assertNotIn( 'media_results_from_ids', TG.test_controller._read_call_args )
+        
+        # bad field
+        
+        path = '/get_files/file_metadata?file_ids={}&fields={}'.format( urllib.parse.quote( json.dumps( [ 1, 2, 3 ] ) ), urllib.parse.quote( json.dumps( [ 'size', 'colour' ] ) ) )
+        
+        connection.request( 'GET', path, headers = headers )
+        
+        response = connection.getresponse()
+        
+        data = response.read()
+        
+        self.assertEqual( response.status, 400 )
+        
         # metadata from file_ids
         
         TG.test_controller.SetRead( 'hash_ids_to_hashes', { k : v for ( k, v ) in file_ids_to_hashes.items() if k in [ 1, 2, 3 ] } )
@@ -7119,6 +7288,28 @@ class TestClientAPI( unittest.TestCase ):
         
         self.assertEqual( d, expected_metadata_result )
         
+        # projected fields from the full metadata
+        
+        fields = [ 'is_inbox', 'known_urls', 'tags' ]
+        
+        path = '/get_files/file_metadata?hashes={}&fields={}'.format( urllib.parse.quote( json.dumps( [ file_ids_to_hashes[ hash_id ].hex() for hash_id in [ 1, 2, 3 ] ] ) ), urllib.parse.quote( json.dumps( fields ) ) )
+        
+        connection.request( 'GET', path, headers = headers )
+        
+        response = connection.getresponse()
+        
+        data = response.read()
+        
+        text = str( data, 'utf-8' )
+        
+        self.assertEqual( response.status, 200 )
+        
+        d = json.loads( text )
+        
+        expected_rows = [ { key : value for ( key, value ) in row.items() if key in fields or key in ( 'file_id', 'hash' ) } for row in expected_metadata_result[ 'metadata' ] ]
+        
+        self.assertEqual( d[ 'metadata' ], expected_rows )
+        
         # same but diff order
         
         path = '/get_files/file_metadata?hashes={}'.format( urllib.parse.quote( json.dumps( [ file_ids_to_hashes[ hash_id ].hex() for hash_id in expected_order ] ) ) )
@@ -0,0 +1,424 @@
+import collections
+import gc
+import os
+import random
+import time
+import tracemalloc
+import typing
+import unittest
+
+from hydrus.core import HydrusConstants as HC
+from hydrus.core import HydrusData
+from hydrus.core import HydrusNumbers
+from hydrus.core import HydrusThreading
+
+from hydrus.client import ClientConstants as CC
+from hydrus.client import ClientData
+from hydrus.client.db import ClientDB
+from hydrus.client.importing import ClientImportFiles
+from hydrus.client.importing.options import FileImportOptions
+from hydrus.client.media import ClientMediaManagers
+from hydrus.client.media import ClientMediaResult
+from hydrus.client.metadata import ClientContentUpdates
+from hydrus.client.metadata import ClientTags
+
+from hydrus.test import TestController
+from hydrus.test import TestGlobals as TG
+
+# these are not part of the normal test run. do 'hydrus_test.py benchmark' to see the numbers
+
+NUM_MEDIA_RESULTS = 100000
+NUM_DB_FILES = 5000
+NUM_SCHEDULER_JOBS = 100000
+NUM_SCHEDULER_WAKEUPS = 100
+NUM_POOL_HEAVY_JOBS = 20000
+NUM_POOL_INTERACTIVE_JOBS = 100
+
+def GenerateMediaResults( num_media_results, seed = 0 ):
+    
+    # roughly what ClientDBMediaResults makes for a typical local file: a few tags, local file services, imported times, no ratings or notes
+    
+    r = random.Random( seed )
+    
+    tag_pool = [ 'series:benchmark tag {}'.format( i ) for i in range( 20000 ) ]
+    
+    now_ms = 1700000000000
+    
+    media_results = []
+    
+    for hash_id in range( num_media_results ):
+        
+        hash = r.randbytes( 32 )
+        
+        file_info_manager = ClientMediaManagers.FileInfoManager( hash_id, hash, size = r.randint( 8192, 20 * 1048576 ), mime = HC.IMAGE_JPEG, width = r.randint( 200, 4096 ), height = r.randint( 200, 4096 ), num_frames = None, has_audio = False )
+        
+        file_info_manager.has_exif = r.random() < 0.5
+        file_info_manager.has_icc_profile = r.random() < 0.5
+        
+        # fresh strings for each file, like we get from sqlite
+        tags = { ( tag + '.' )[ : -1 ] for tag in r.sample( tag_pool, 12 ) }
+        
+        service_keys_to_statuses_to_tags = collections.defaultdict( HydrusData.default_dict_set )
+        service_keys_to_statuses_to_tags[ CC.DEFAULT_LOCAL_TAG_SERVICE_KEY ][ HC.CONTENT_STATUS_CURRENT ] = tags
+        
+        service_keys_to_statuses_to_display_tags = collections.defaultdict( HydrusData.default_dict_set )
+        service_keys_to_statuses_to_display_tags[ CC.DEFAULT_LOCAL_TAG_SERVICE_KEY ][ HC.CONTENT_STATUS_CURRENT ] = set( tags )
+        
+        tags_manager = ClientMediaManagers.TagsManager( service_keys_to_statuses_to_tags, service_keys_to_statuses_to_display_tags )
+        
+        times_manager = ClientMediaManagers.TimesManager()
+        
+        import_timestamp_ms = now_ms - r.randint( 1000, 1000000000 )
+        
+        times_manager.SetFileModifiedTimestampMS( import_timestamp_ms - r.randint( 1, 50000000 ) )
+        
+        current_to_timestamps_ms = { CC.COMBINED_LOCAL_FILE_SERVICE_KEY : import_timestamp_ms, CC.COMBINED_LOCAL_MEDIA_SERVICE_KEY : import_timestamp_ms, CC.LOCAL_FILE_SERVICE_KEY : import_timestamp_ms }
+        
+        times_manager.SetImportedTimestampsMS( current_to_timestamps_ms )
+        
+        locations_manager = ClientMediaManagers.LocationsManager( set( current_to_timestamps_ms.keys() ), set(), set(), set(), times_manager, inbox = r.random() < 0.2, urls = { 'https://example.com/post/{}'.format( hash_id ) }, service_keys_to_filenames = {} )
+        
+        ratings_manager = ClientMediaManagers.RatingsManager( {} )
+        notes_manager = ClientMediaManagers.NotesManager( {} )
+        file_viewing_stats_manager = ClientMediaManagers.FileViewingStatsManager.STATICGenerateEmptyManager( times_manager )
+        
+        media_result = ClientMediaResult.MediaResult( file_info_manager, tags_manager, times_manager, locations_manager, ratings_manager, notes_manager, file_viewing_stats_manager )
+        
+        media_results.append( media_result )
+        
+    
+    return media_results
+    
+
+def MeasureMediaResults( num_media_results ):
+    
+    # warm up the shared tag table, so we are measuring the media results, not the tags
+    GenerateMediaResults( 100 )
+    
+    # tracemalloc is slow, so we time a separate run
+    
+    started = time.perf_counter()
+    
+    media_results = GenerateMediaResults( num_media_results )
+    
+    time_took = time.perf_counter() - started
+    
+    del media_results
+    
+    gc.collect()
+    
+    tracemalloc.start()
+    
+    try:
+        
+        ( start_bytes, peak_bytes ) = tracemalloc.get_traced_memory()
+        
+        media_results = GenerateMediaResults( num_media_results )
+        
+        gc.collect()
+        
+        ( end_bytes, peak_bytes ) = tracemalloc.get_traced_memory()
+        
+    finally:
+        
+        tracemalloc.stop()
+        
+    
+    bytes_per_media_result = ( end_bytes - start_bytes ) / len( media_results )
+    
+    return ( bytes_per_media_result, time_took )
+    
+
+class TestMediaResultBenchmarks( unittest.TestCase ):
+    
+    def test_media_result_memory_and_construction( self ):
+        
+        ( bytes_per_media_result, time_took ) = MeasureMediaResults( NUM_MEDIA_RESULTS )
+        
+        print( '' )
+        print( '{} media results: {} each, built in {:.2f}s'.format( HydrusNumbers.ToHumanInt( NUM_MEDIA_RESULTS ), ClientData.ToHumanBytes( bytes_per_media_result ), time_took ) )
+        
+        self.assertGreater( bytes_per_media_result, 0 )
+        
+        media_result = GenerateMediaResults( 1 )[0]
+        
+        for obj in ( media_result, media_result.GetFileInfoManager(), media_result.GetTimesManager(), media_result.GetLocationsManager(), media_result.GetTagsManager(), media_result.GetRatingsManager(), media_result.GetNotesManager(), media_result.GetFileViewingStatsManager() ):
+            
+            self.assertFalse( hasattr( obj, '__dict__' ), msg = type( obj ).__name__ )
+            
+        
+    
+class TestCallToThreadPoolBenchmarks( unittest.TestCase ):
+    
+    def test_interactive_latency_under_load( self ):
+        
+        # a flood of slow import-style work, and some quick ui jobs. how long do the ui jobs wait to start?
+        
+        pool = HydrusThreading.CallToThreadPool( TG.test_controller )
+        
+        lateness = []
+        
+        def do_heavy_work():
+            
+            time.sleep( 0.05 )
+            
+        
+        def do_it( time_submitted ):
+            
+            lateness.append( time.perf_counter() - time_submitted )
+            
+        
+        try:
+            
+            for i in range( NUM_POOL_HEAVY_JOBS ):
+                
+                priority = HydrusThreading.CALL_TO_THREAD_PRIORITY_BACKGROUND if i % 2 == 0 else HydrusThreading.CALL_TO_THREAD_PRIORITY_NORMAL
+                
+                pool.Submit( priority, do_heavy_work )
+                
+            
+            for i in range( NUM_POOL_INTERACTIVE_JOBS ):
+                
+                pool.Submit( HydrusThreading.CALL_TO_THREAD_PRIORITY_INTERACTIVE, do_it, time.perf_counter() )
+                
+                time.sleep( 0.01 )
+                
+            
+            started = time.perf_counter()
+            
+            while len( lateness ) < NUM_POOL_INTERACTIVE_JOBS and time.perf_counter() - started < 30:
+                
+                time.sleep( 0.05 )
+                
+            
+            ( num_threads, num_working, priorities_to_num_waiting, priorities_to_latencies ) = pool.GetStatus()
+            
+        finally:
+            
+            pool.Shutdown()
+            
+        
+        print( '' )
+        print( '{} interactive jobs under {} heavy jobs on {} threads: mean wait {:.1f}ms, worst {:.1f}ms'.format( HydrusNumbers.ToHumanInt( NUM_POOL_INTERACTIVE_JOBS ), HydrusNumbers.ToHumanInt( NUM_POOL_HEAVY_JOBS ), HydrusNumbers.ToHumanInt( num_threads ), 1000 * sum( lateness ) / len( lateness ), 1000 * max( lateness ) ) )
+        
+        self.assertEqual( len( lateness ), NUM_POOL_INTERACTIVE_JOBS )
+        
+    
+class TestDBMediaResultBenchmarks( unittest.TestCase ):
+    
+    _db: typing.Any = None
+    
+    @classmethod
+    def setUpClass( cls ):
+        
+        cls._db = ClientDB.DB( TG.test_controller, TestController.DB_DIR, 'client' )
+        
+        TG.test_controller.SetTestDB( cls._db )
+        
+        cls._hashes = cls._do_fake_imports( NUM_DB_FILES )
+        
+    
+    @classmethod
+    def tearDownClass( cls ):
+        
+        cls._db.Shutdown()
+        
+        while not cls._db.LoopIsFinished():
+            
+            time.sleep( 0.1 )
+            
+        
+        for filename in list( cls._db._db_filenames.values() ):
+            
+            os.remove( os.path.join( TestController.DB_DIR, filename ) )
+            
+        
+        del cls._db
+        
+        TG.test_controller.ClearTestDB()
+        
+    
+    @classmethod
+    def _do_fake_imports( cls, num_files ):
+        
+        r = random.Random( 0 )
+        
+        file_import_options = FileImportOptions.FileImportOptions()
+        file_import_options.SetIsDefault( True )
+        
+        tag_pool = [ 'series:benchmark tag {}'.format( i ) for i in range( 2000 ) ]
+        
+        hashes = []
+        
+        for i in range( num_files ):
+            
+            hash = HydrusData.GenerateKey()
+            
+            fake_file_import_job = ClientImportFiles.FileImportJob( 'fake path', file_import_options )
+            
+            fake_file_import_job._pre_import_file_status = ClientImportFiles.FileImportStatus( CC.STATUS_UNKNOWN, hash )
+            fake_file_import_job._file_info = ( r.randint( 8192, 20 * 1048576 ), HC.IMAGE_JPEG, r.randint( 200, 4096 ), r.randint( 200, 4096 ), None, None, False, None )
+            fake_file_import_job._extra_hashes = ( os.urandom( 16 ), os.urandom( 20 ), os.urandom( 64 ) )
+            fake_file_import_job._perceptual_hashes = [ os.urandom( 8 ) ]
+            
+            cls._db.Write( 'import_file', True, fake_file_import_job )
+            
+            hashes.append( hash )
+            
+        
+        # a dozen tags, a url, and the odd note and rating, like a typical booru import
+        
+        content_updates = []
+        
+        for hash in hashes:
+            
+            for tag in r.sample( tag_pool, 12 ):
+                
+                content_updates.append( ClientContentUpdates.ContentUpdate( HC.CONTENT_TYPE_MAPPINGS, HC.CONTENT_UPDATE_ADD, ( tag, ( hash, ) ) ) )
+                
+            
+        
+        content_update_package = ClientContentUpdates.ContentUpdatePackage.STATICCreateFromContentUpdates( CC.DEFAULT_LOCAL_TAG_SERVICE_KEY, content_updates )
+        
+        cls._db.Write( 'content_updates', True, content_update_package )
+        
+        content_updates = [ ClientContentUpdates.ContentUpdate( HC.CONTENT_TYPE_URLS, HC.CONTENT_UPDATE_ADD, ( ( 'https://example.com/post/{}'.format( i ), ), ( hash, ) ) ) for ( i, hash ) in enumerate( hashes ) ]
+        
+        content_update_package = ClientContentUpdates.ContentUpdatePackage.STATICCreateFromContentUpdates( CC.COMBINED_LOCAL_FILE_SERVICE_KEY, content_updates )
+        
+        cls._db.Write( 'content_updates', True, content_update_package )
+        
+        content_updates = [ ClientContentUpdates.ContentUpdate( HC.CONTENT_TYPE_NOTES, HC.CONTENT_UPDATE_SET, ( hash, 'comment', 'benchmark note' ) ) for hash in hashes[ : : 10 ] ]
+        
+        content_update_package = ClientContentUpdates.ContentUpdatePackage.STATICCreateFromContentUpdates( CC.LOCAL_NOTES_SERVICE_KEY, content_updates )
+        
+        cls._db.Write( 'content_updates', True, content_update_package )
+        
+        content_update_package = ClientContentUpdates.ContentUpdatePackage.STATICCreateFromContentUpdate( CC.DEFAULT_FAVOURITES_RATING_SERVICE_KEY, ClientContentUpdates.ContentUpdate( HC.CONTENT_TYPE_RATINGS, HC.CONTENT_UPDATE_ADD, ( 1.0, hashes[ : : 10 ] ) ) )
+        
+        cls._db.Write( 'content_updates', True, content_update_package )
+        
+        return hashes
+        
+    
+    def test_db_media_result_loading( self ):
+        
+        times = []
+        
+        for i in range( 5 ):
+            
+            # the db keeps a cache of media results, so we have to clear it or we'd be measuring that
+            self._db.modules_media_results.ClearMediaResultCache()
+            
+            gc.collect()
+            
+            started = time.perf_counter()
+            
+            media_results = self._db.Read( 'media_results', self._hashes )
+            
+            times.append( time.perf_counter() - started )
+            
+            self.assertEqual( len( media_results ), NUM_DB_FILES )
+            
+            del media_results
+            
+        
+        print( '' )
+        print( '{} media results from the db: best of five is {:.3f}s'.format( HydrusNumbers.ToHumanInt( NUM_DB_FILES ), min( times ) ) )
+        
+        media_results = self._db.Read( 'media_results', self._hashes[ : 10 ], sorted = True )
+        
+        self.assertEqual( [ media_result.GetHash() for media_result in media_results ], self._hashes[ : 10 ] )
+        
+        for media_result in media_results:
+            
+            self.assertEqual( len( media_result.GetTagsManager().GetCurrent( CC.DEFAULT_LOCAL_TAG_SERVICE_KEY, ClientTags.TAG_DISPLAY_STORAGE ) ), 12 )
+            self.assertEqual( len( media_result.GetLocationsManager().GetURLs() ), 1 )
+            
+        
+    
+class TestJobSchedulerBenchmarks( unittest.TestCase ):
+    
+    def test_schedule_and_cancel( self ):
+        
+        # not started, so this is just the bookkeeping
+        
+        scheduler = HydrusThreading.JobScheduler( TG.test_controller )
+        
+        r = random.Random( 0 )
+        
+        jobs = [ HydrusThreading.SingleJob( TG.test_controller, scheduler, r.uniform( 60, 3600 ), lambda: None ) for i in range( NUM_SCHEDULER_JOBS ) ]
+        
+        started = time.perf_counter()
+        
+        for job in jobs:
+            
+            scheduler.AddJob( job )
+            
+        
+        add_time = time.perf_counter() - started
+        
+        r.shuffle( jobs )
+        
+        started = time.perf_counter()
+        
+        for job in jobs[ : NUM_SCHEDULER_JOBS // 2 ]:
+            
+            job.Delay( r.uniform( 60, 3600 ) )
+            
+        
+        delay_time = time.perf_counter() - started
+        
+        started = time.perf_counter()
+        
+        for job in jobs:
+            
+            job.Cancel()
+            
+        
+        cancel_time = time.perf_counter() - started
+        
+        print( '' )
+        print( '{} scheduler jobs: added in {:.3f}s, half delayed in {:.3f}s, all cancelled in {:.3f}s'.format( HydrusNumbers.ToHumanInt( NUM_SCHEDULER_JOBS ), add_time, delay_time, cancel_time ) )
+        
+        self.assertEqual( scheduler.GetJobs(), [] )
+        
+    
+    def test_wakeup_jitter( self ):
+        
+        # a busy queue of far-off jobs, and a trickle of near ones. how late do the near ones fire?
+        
+        far_jobs = [ TG.test_controller.CallLater( 3600 + i, lambda: None ) for i in range( NUM_SCHEDULER_JOBS ) ]
+        
+        lateness = []
+        
+        def do_it( due_time ):
+            
+            lateness.append( time.perf_counter() - due_time )
+            
+        
+        for i in range( NUM_SCHEDULER_WAKEUPS ):
+            
+            delay = 0.05 + ( i * 0.01 )
+            
+            TG.test_controller.CallLater( delay, do_it, time.perf_counter() + delay )
+            
+        
+        started = time.perf_counter()
+        
+        while len( lateness ) < NUM_SCHEDULER_WAKEUPS and time.perf_counter() - started < 30:
+            
+            time.sleep( 0.05 )
+            
+        
+        for job in far_jobs:
+            
+            job.Cancel()
+            
+        
+        print( '' )
+        print( '{} wakeups with {} jobs waiting: mean lateness {:.1f}ms, worst {:.1f}ms'.format( HydrusNumbers.ToHumanInt( NUM_SCHEDULER_WAKEUPS ), HydrusNumbers.ToHumanInt( NUM_SCHEDULER_JOBS ), 1000 * sum( lateness ) / len( lateness ), 1000 * max( lateness ) ) )
+        
+        self.assertEqual( len( lateness ), NUM_SCHEDULER_WAKEUPS )
+        
+    
@@ -1,10 +1,12 @@
 import os
+import threading
 import time
 import typing
 import unittest
 
 from hydrus.core import HydrusConstants as HC
 from hydrus.core import HydrusData
+from hydrus.core import HydrusGlobals as HG
 from hydrus.core import HydrusNumbers
 from hydrus.core import HydrusSerialisable
 from hydrus.core import HydrusTime
@@ -21,9 +23,12 @@ from hydrus.client.files import ClientFilesPhysical
 from hydrus.client.files.images import ClientImagePerceptualHashes
 from hydrus.client.gui.pages import ClientGUIPageManager
 from hydrus.client.gui.pages import ClientGUISession
+from hydrus.client.importing import ClientImportFileSeeds
 from hydrus.client.importing import ClientImportLocal
 from hydrus.client.importing import ClientImportFiles
+from hydrus.client.importing import ClientImportSubscriptionQuery
 from hydrus.client.importing.options import FileImportOptions
+from hydrus.client.media import ClientMedia
 from hydrus.client.metadata import ClientContentUpdates
 from hydrus.client.metadata import ClientTags
 from hydrus.client.search import ClientNumberTest
@@ -239,6 +244,68 @@ class TestClientDB( unittest.TestCase ):
         self.assertEqual( set( result ), preds )
         
     
+    def test_autocomplete_top_predicates( self ):
+        
+        location_context = ClientLocation.LocationContext.STATICCreateSimple( CC.COMBINED_FILE_SERVICE_KEY )
+        tag_context = ClientSearchTagContext.TagContext( service_key = CC.DEFAULT_LOCAL_TAG_SERVICE_KEY )
+        
+        file_search_context = ClientSearchFileSearchContext.FileSearchContext( location_context = location_context, tag_context = tag_context )
+        
+        TestClientDB._clear_db()
+        
+        def do_mappings( action, tag, hashes ):
+            
+            content_update_package = ClientContentUpdates.ContentUpdatePackage.STATICCreateFromContentUpdate( CC.DEFAULT_LOCAL_TAG_SERVICE_KEY, ClientContentUpdates.ContentUpdate( HC.CONTENT_TYPE_MAPPINGS, action, ( tag, hashes ) ) )
+            
+            self._write( 'content_updates', content_update_package )
+            
+        
+        def read_top( search_text, **kwargs ):
+            
+            result = self._read( 'autocomplete_top_predicates', ClientTags.TAG_DISPLAY_STORAGE, file_search_context, search_text = search_text, **kwargs )
+            
+            return [ ( predicate.GetValue(), predicate.GetCount().GetMinCount( HC.CONTENT_STATUS_CURRENT ) ) for predicate in result ]
+            
+        
+        self.assertEqual( read_top( 'c*' ), [] )
+        
+        hashes = [ HydrusData.GenerateKey() for i in range( 10 ) ]
+        
+        do_mappings( HC.CONTENT_UPDATE_ADD, 'car', hashes[ : 3 ] )
+        do_mappings( HC.CONTENT_UPDATE_ADD, 'series:cars', hashes[ : 2 ] )
+        do_mappings( HC.CONTENT_UPDATE_ADD, 'cat', hashes[ : 1 ] )
+        do_mappings( HC.CONTENT_UPDATE_ADD, 'maker:ford', hashes[ : 1 ] )
+        do_mappings( HC.CONTENT_UPDATE_ADD, 'character:samus aran', hashes[ : 1 ] )
+        
+        # this first read builds the index from the counts cache
+        
+        self.assertEqual( read_top( 'c*' ), [ ( 'car', 3 ), ( 'series:cars', 2 ), ( 'cat', 1 ) ] )
+        self.assertEqual( read_top( 'c*', limit = 2 ), [ ( 'car', 3 ), ( 'series:cars', 2 ) ] )
+        self.assertEqual( read_top( 'series:c*' ), [ ( 'series:cars', 2 ) ] )
+        self.assertEqual( read_top( 'ar*' ), [ ( 'character:samus aran', 1 ) ] )
+        self.assertEqual( read_top( 'samus ar*' ), [ ( 'character:samus aran', 1 ) ] )
+        self.assertEqual( read_top( 'aran sam*' ), [] )
+        self.assertEqual( read_top( 'nonexistent:c*' ), [] )
+        
+        # the normal search does these
+        
+        self.assertEqual( read_top( 'c*r*' ), [] )
+        self.assertEqual( read_top( 'car' ), [] )
+        
+        # and from now on it stays current with the counts
+        
+        do_mappings( HC.CONTENT_UPDATE_ADD, 'cat', hashes )
+        do_mappings( HC.CONTENT_UPDATE_DELETE, 'car', hashes[ : 3 ] )
+        do_mappings( HC.CONTENT_UPDATE_ADD, 'cow', hashes[ : 4 ] )
+        
+        self.assertEqual( read_top( 'c*' ), [ ( 'cat', 10 ), ( 'cow', 4 ), ( 'series:cars', 2 ) ] )
+        self.assertEqual( read_top( 'co*' ), [ ( 'cow', 4 ) ] )
+        
+        do_mappings( HC.CONTENT_UPDATE_DELETE, 'cat', hashes )
+        
+        self.assertEqual( read_top( 'c*' ), [ ( 'cow', 4 ), ( 'series:cars', 2 ) ] )
+        
+    
     def test_export_folders( self ):
         
         tag_context = ClientSearchTagContext.TagContext( service_key = HydrusData.GenerateKey() )
@@ -793,6 +860,314 @@ class TestClientDB( unittest.TestCase ):
         run_system_predicate_tests( tests )
         
     
+    def test_file_search_progressive( self ):
+        
+        TestClientDB._clear_db()
+        
+        file_search_result_cache = TestClientDB._db._file_search_result_cache
+        
+        file_import_options = FileImportOptions.FileImportOptions()
+        file_import_options.SetIsDefault( True )
+        
+        hashes = []
+        
+        for i in range( 300 ):
+            
+            hash = HydrusData.GenerateKey()
+            
+            fake_file_import_job = ClientImportFiles.FileImportJob( 'fake path', file_import_options )
+            
+            # sizes out of import order, so the sorts disagree
+            
+            fake_file_import_job._pre_import_file_status = ClientImportFiles.FileImportStatus( CC.STATUS_UNKNOWN, hash )
+            fake_file_import_job._file_info = ( 1024 + ( ( i * 37 ) % 300 ), HC.IMAGE_JPEG, 640, 480, None, None, False, None )
+            fake_file_import_job._extra_hashes = ( os.urandom( 16 ), os.urandom( 20 ), os.urandom( 64 ) )
+            fake_file_import_job._perceptual_hashes = [ os.urandom( 8 ) ]
+            
+            self._write( 'import_file', fake_file_import_job )
+            
+            hashes.append( hash )
+            
+        
+        content_updates = []
+        
+        for ( i, hash ) in enumerate( hashes ):
+            
+            tags = [ 'common' ]
+            
+            if i % 2 == 0:
+                
+                tags.append( 'even' )
+                
+            
+            if i % 100 == 7:
+                
+                tags.append( 'rare' )
+                
+            
+            content_updates.extend( ( ClientContentUpdates.ContentUpdate( HC.CONTENT_TYPE_MAPPINGS, HC.CONTENT_UPDATE_ADD, ( tag, ( hash, ) ) ) for tag in tags ) )
+            
+        
+        self._write( 'content_updates', ClientContentUpdates.ContentUpdatePackage.STATICCreateFromContentUpdates( CC.DEFAULT_LOCAL_TAG_SERVICE_KEY, content_updates ) )
+        
+        location_context = ClientLocation.LocationContext.STATICCreateSimple( CC.LOCAL_FILE_SERVICE_KEY )
+        tag_context = ClientSearchTagContext.TagContext( service_key = CC.DEFAULT_LOCAL_TAG_SERVICE_KEY )
+        
+        def tag_pred( tag ):
+            
+            return ClientSearchPredicate.Predicate( ClientSearchPredicate.PREDICATE_TYPE_TAG, tag )
+            
+        
+        def limit_pred( limit ):
+            
+            return ClientSearchPredicate.Predicate( ClientSearchPredicate.PREDICATE_TYPE_SYSTEM_LIMIT, limit )
+            
+        
+        for sort_type in ( CC.SORT_FILES_BY_IMPORT_TIME, CC.SORT_FILES_BY_FILESIZE ):
+            
+            for sort_order in ( CC.SORT_ASC, CC.SORT_DESC ):
+                
+                sort_by = ClientMedia.MediaSort( sort_type = ( 'system', sort_type ), sort_order = sort_order )
+                
+                for predicates in (
+                    [ tag_pred( 'even' ), limit_pred( 10 ) ],
+                    [ tag_pred( 'common' ), tag_pred( 'even' ), limit_pred( 100 ) ],
+                    [ tag_pred( 'even' ), limit_pred( 500 ) ],
+                    [ tag_pred( 'rare' ), limit_pred( 2 ) ]
+                ):
+                    
+                    file_search_context = ClientSearchFileSearchContext.FileSearchContext( location_context = location_context, tag_context = tag_context, predicates = predicates )
+                    
+                    # the cache would answer the progressive search if we let it
+                    
+                    file_search_result_cache.InvalidateAll()
+                    
+                    progressive_hash_ids = self._read( 'file_query_ids', file_search_context, sort_by = sort_by, progressive = True )
+                    
+                    file_search_result_cache.InvalidateAll()
+                    
+                    normal_hash_ids = self._read( 'file_query_ids', file_search_context, sort_by = sort_by )
+                    
+                    self.assertEqual( progressive_hash_ids, normal_hash_ids )
+                    
+                
+            
+        
+        # limit_sort_by works too
+        
+        sort_by = ClientMedia.MediaSort( sort_type = ( 'system', CC.SORT_FILES_BY_FILESIZE ), sort_order = CC.SORT_DESC )
+        
+        file_search_context = ClientSearchFileSearchContext.FileSearchContext( location_context = location_context, tag_context = tag_context, predicates = [ tag_pred( 'even' ), limit_pred( 5 ) ] )
+        
+        file_search_result_cache.InvalidateAll()
+        
+        hash_ids = self._read( 'file_query_ids', file_search_context, limit_sort_by = sort_by, progressive = True )
+        
+        media_results = self._read( 'media_results_from_ids', hash_ids )
+        
+        hash_ids_to_sizes = { media_result.GetHashId() : media_result.GetSize() for media_result in media_results }
+        
+        self.assertEqual( [ hash_ids_to_sizes[ hash_id ] for hash_id in hash_ids ], [ 1322, 1320, 1318, 1316, 1314 ] )
+        
+    
+    def test_file_search_result_cache( self ):
+        
+        TestClientDB._clear_db()
+        
+        file_search_result_cache = TestClientDB._db._file_search_result_cache
+        
+        path = os.path.join( HC.STATIC_DIR, 'hydrus.png' )
+        
+        file_import_options = FileImportOptions.FileImportOptions()
+        file_import_options.SetIsDefault( True )
+        
+        file_import_job = ClientImportFiles.FileImportJob( path, file_import_options )
+        
+        file_import_job.GeneratePreImportHashAndStatus()
+        
+        file_import_job.GenerateInfo()
+        
+        self._write( 'import_file', file_import_job )
+        
+        hash = file_import_job.GetHash()
+        
+        location_context = ClientLocation.LocationContext.STATICCreateSimple( CC.LOCAL_FILE_SERVICE_KEY )
+        
+        def get_search_context( predicates ):
+            
+            return ClientSearchFileSearchContext.FileSearchContext( location_context = location_context, tag_context = ClientSearchTagContext.TagContext( service_key = CC.DEFAULT_LOCAL_TAG_SERVICE_KEY ), predicates = predicates )
+            
+        
+        def add_tag( service_key, tag ):
+            
+            content_update = ClientContentUpdates.ContentUpdate( HC.CONTENT_TYPE_MAPPINGS, HC.CONTENT_UPDATE_ADD, ( tag, ( hash, ) ) )
+            
+            self._write( 'content_updates', ClientContentUpdates.ContentUpdatePackage.STATICCreateFromContentUpdate( service_key, content_update ) )
+            
+        
+        tag_search_context = get_search_context( [ ClientSearchPredicate.Predicate( ClientSearchPredicate.PREDICATE_TYPE_TAG, 'cached' ) ] )
+        inbox_search_context = get_search_context( [ ClientSearchPredicate.Predicate( ClientSearchPredicate.PREDICATE_TYPE_SYSTEM_INBOX ) ] )
+        
+        self.assertEqual( self._read( 'file_query_ids', tag_search_context ), [] )
+        
+        ( hash_id, ) = self._read( 'file_query_ids', inbox_search_context )
+        
+        self.assertEqual( file_search_result_cache.GetNumEntries(), 2 )
+        
+        # a repeat is served from the cache, and predicate order does not matter
+        
+        generation = file_search_result_cache.GetGeneration()
+        
+        self.assertEqual( self._read( 'file_query_ids', inbox_search_context ), [ hash_id ] )
+        
+        tag_and_inbox_predicates = [ ClientSearchPredicate.Predicate( ClientSearchPredicate.PREDICATE_TYPE_TAG, 'cached' ), ClientSearchPredicate.Predicate( ClientSearchPredicate.PREDICATE_TYPE_SYSTEM_INBOX ) ]
+        
+        self.assertEqual( self._read( 'file_query_ids', get_search_context( tag_and_inbox_predicates ) ), [] )
+        self.assertEqual( self._read( 'file_query_ids', get_search_context( list( reversed( tag_and_inbox_predicates ) ) ) ), [] )
+        
+        self.assertEqual( file_search_result_cache.GetNumEntries(), 3 )
+        self.assertEqual( file_search_result_cache.GetGeneration(), generation )
+        
+        # a tag on another service leaves these searches alone
+        
+        add_tag( CC.DEFAULT_LOCAL_DOWNLOADER_TAG_SERVICE_KEY, 'cached' )
+        
+        self.assertEqual( file_search_result_cache.GetNumEntries(), 3 )
+        self.assertEqual( self._read( 'file_query_ids', tag_search_context ), [] )
+        
+        # but one on the search's service clears the tag searches, and only them
+        
+        add_tag( CC.DEFAULT_LOCAL_TAG_SERVICE_KEY, 'cached' )
+        
+        self.assertEqual( file_search_result_cache.GetNumEntries(), 1 )
+        
+        self.assertEqual( self._read( 'file_query_ids', tag_search_context ), [ hash_id ] )
+        self.assertEqual( self._read( 'file_query_ids', get_search_context( tag_and_inbox_predicates ) ), [ hash_id ] )
+        
+        # archiving clears the inbox searches
+        
+        self._write( 'content_updates', ClientContentUpdates.ContentUpdatePackage.STATICCreateFromContentUpdate( CC.COMBINED_LOCAL_FILE_SERVICE_KEY, ClientContentUpdates.ContentUpdate( HC.CONTENT_TYPE_FILES, HC.CONTENT_UPDATE_ARCHIVE, ( hash, ) ) ) )
+        
+        self.assertEqual( file_search_result_cache.GetNumEntries(), 1 )
+        
+        self.assertEqual( self._read( 'file_query_ids', inbox_search_context ), [] )
+        self.assertEqual( self._read( 'file_query_ids', get_search_context( tag_and_inbox_predicates ) ), [] )
+        self.assertEqual( self._read( 'file_query_ids', tag_search_context ), [ hash_id ] )
+        
+        # limit and sort are applied after the cache
+        
+        limit_search_context = get_search_context( [ ClientSearchPredicate.Predicate( ClientSearchPredicate.PREDICATE_TYPE_TAG, 'cached' ), ClientSearchPredicate.Predicate( ClientSearchPredicate.PREDICATE_TYPE_SYSTEM_LIMIT, 0 ) ] )
+        
+        self.assertEqual( self._read( 'file_query_ids', limit_search_context ), [] )
+        
+        # relative times mean something new every time, so they are never cached
+        
+        num_entries = file_search_result_cache.GetNumEntries()
+        
+        age_search_context = get_search_context( [ ClientSearchPredicate.Predicate( ClientSearchPredicate.PREDICATE_TYPE_SYSTEM_AGE, ( '<', 'delta', ( 1, 1, 1, 1, ) ) ) ] )
+        
+        self.assertEqual( self._read( 'file_query_ids', age_search_context ), [ hash_id ] )
+        
+        self.assertEqual( file_search_result_cache.GetNumEntries(), num_entries )
+        
+        # any other write clears everything
+        
+        self._write( 'regenerate_local_hash_cache' )
+        
+        self.assertEqual( file_search_result_cache.GetNumEntries(), 0 )
+        
+        self.assertEqual( self._read( 'file_query_ids', tag_search_context ), [ hash_id ] )
+        
+    
+    def test_file_search_tag_order( self ):
+        
+        TestClientDB._clear_db()
+        
+        # tags of very different sizes, so the searches go through both the temp table join and the fetch-and-intersect paths
+        
+        file_import_options = FileImportOptions.FileImportOptions()
+        file_import_options.SetIsDefault( True )
+        
+        hashes = []
+        
+        for i in range( 30 ):
+            
+            hash = HydrusData.GenerateKey()
+            
+            fake_file_import_job = ClientImportFiles.FileImportJob( 'fake path', file_import_options )
+            
+            fake_file_import_job._pre_import_file_status = ClientImportFiles.FileImportStatus( CC.STATUS_UNKNOWN, hash )
+            fake_file_import_job._file_info = ( 1024 * ( i + 1 ), HC.IMAGE_JPEG, 640, 480, None, None, False, None )
+            fake_file_import_job._extra_hashes = ( os.urandom( 16 ), os.urandom( 20 ), os.urandom( 64 ) )
+            fake_file_import_job._perceptual_hashes = [ os.urandom( 8 ) ]
+            
+            self._write( 'import_file', fake_file_import_job )
+            
+            hashes.append( hash )
+            
+        
+        content_updates = []
+        
+        for ( i, hash ) in enumerate( hashes ):
+            
+            tags = [ 'common' ]
+            
+            if i % 3 == 0:
+                
+                tags.append( 'series:uncommon' )
+                
+            
+            if i in ( 3, 4 ):
+                
+                tags.append( 'rare' )
+                
+            
+            content_updates.extend( ( ClientContentUpdates.ContentUpdate( HC.CONTENT_TYPE_MAPPINGS, HC.CONTENT_UPDATE_ADD, ( tag, ( hash, ) ) ) for tag in tags ) )
+            
+        
+        self._write( 'content_updates', ClientContentUpdates.ContentUpdatePackage.STATICCreateFromContentUpdates( CC.DEFAULT_LOCAL_TAG_SERVICE_KEY, content_updates ) )
+        
+        self._write( 'content_updates', ClientContentUpdates.ContentUpdatePackage.STATICCreateFromContentUpdate( CC.COMBINED_LOCAL_FILE_SERVICE_KEY, ClientContentUpdates.ContentUpdate( HC.CONTENT_TYPE_FILES, HC.CONTENT_UPDATE_ARCHIVE, hashes[ : 10 ] ) ) )
+        
+        location_context = ClientLocation.LocationContext.STATICCreateSimple( CC.LOCAL_FILE_SERVICE_KEY )
+        
+        for tag_service_key in ( CC.DEFAULT_LOCAL_TAG_SERVICE_KEY, CC.COMBINED_TAG_SERVICE_KEY ):
+            
+            tag_context = ClientSearchTagContext.TagContext( service_key = tag_service_key )
+            
+            def run_test( predicates, expected_indices ):
+                
+                file_search_context = ClientSearchFileSearchContext.FileSearchContext( location_context = location_context, tag_context = tag_context, predicates = predicates )
+                
+                hash_ids = self._read( 'file_query_ids', file_search_context, apply_implicit_limit = False )
+                
+                result_hashes = { media_result.GetHash() for media_result in self._read( 'media_results_from_ids', hash_ids ) }
+                
+                self.assertEqual( result_hashes, { hashes[ i ] for i in expected_indices } )
+                
+            
+            def tag_pred( tag, inclusive = True ):
+                
+                return ClientSearchPredicate.Predicate( ClientSearchPredicate.PREDICATE_TYPE_TAG, tag, inclusive )
+                
+            
+            archive_pred = ClientSearchPredicate.Predicate( ClientSearchPredicate.PREDICATE_TYPE_SYSTEM_ARCHIVE )
+            inbox_pred = ClientSearchPredicate.Predicate( ClientSearchPredicate.PREDICATE_TYPE_SYSTEM_INBOX )
+            size_pred = ClientSearchPredicate.Predicate( ClientSearchPredicate.PREDICATE_TYPE_SYSTEM_SIZE, ( '>', 10240, HydrusNumbers.UnitToInt( 'B' ) ) )
+            all_hashes_pred = ClientSearchPredicate.Predicate( ClientSearchPredicate.PREDICATE_TYPE_SYSTEM_HASH, ( tuple( hashes ), 'sha256' ) )
+            
+            run_test( [ tag_pred( 'common' ), tag_pred( 'series:uncommon' ), tag_pred( 'rare' ) ], [ 3 ] )
+            run_test( [ tag_pred( 'common' ), tag_pred( 'series:uncommon' ) ], range( 0, 30, 3 ) )
+            run_test( [ tag_pred( 'common' ), tag_pred( 'not a tag anyone has' ) ], [] )
+            run_test( [ tag_pred( 'common' ), tag_pred( 'series:uncommon' ), inbox_pred ], range( 12, 30, 3 ) )
+            run_test( [ tag_pred( 'series:uncommon' ), archive_pred, size_pred ], [] )
+            run_test( [ tag_pred( 'common' ), tag_pred( 'rare', inclusive = False ), size_pred, archive_pred ], [] )
+            run_test( [ tag_pred( 'common' ), tag_pred( 'rare', inclusive = False ), size_pred ], range( 10, 30 ) )
+            run_test( [ all_hashes_pred, tag_pred( 'rare' ) ], [ 3, 4 ] )
+            run_test( [ all_hashes_pred, tag_pred( 'rare' ), tag_pred( 'series:uncommon' ) ], [ 3 ] )
+            
+        
+    
     def test_file_system_predicates( self ):
         
         TestClientDB._clear_db()
@@ -2094,3 +2469,404 @@ class TestClientDB( unittest.TestCase ):
             
         
     
+    def test_subscription_query_log_blocks( self ):
+        
+        file_seeds = []
+        
+        for i in range( 1000 ):
+            
+            url = 'https://example.com/post/{}'.format( i )
+            
+            file_seed = ClientImportFileSeeds.FileSeed()
+            
+            file_seed.file_seed_data = url
+            file_seed.file_seed_data_for_comparison = url
+            
+            file_seeds.append( file_seed )
+            
+        
+        file_seed_cache = ClientImportFileSeeds.FileSeedCache()
+        
+        file_seed_cache.AddFileSeeds( file_seeds )
+        
+        query_log_container = ClientImportSubscriptionQuery.SubscriptionQueryLogContainer( 'block test' )
+        
+        query_log_container.SetFileSeedCache( file_seed_cache )
+        
+        self._write( 'serialisable', query_log_container )
+        
+        # the big file log went to the hashed table in blocks, so orphan maintenance must know to keep them
+        
+        self._write( 'maintain_hashed_serialisables', force_start = True )
+        
+        loaded_query_log_container = self._read( 'serialisable_named', HydrusSerialisable.SERIALISABLE_TYPE_SUBSCRIPTION_QUERY_LOG_CONTAINER, 'block test' )
+        
+        urls = [ file_seed.file_seed_data for file_seed in file_seed_cache.GetFileSeeds() ]
+        loaded_urls = [ file_seed.file_seed_data for file_seed in loaded_query_log_container.GetFileSeedCache().GetFileSeeds() ]
+        
+        self.assertEqual( loaded_urls, urls )
+        
+        # once the log is gone, its blocks are orphans
+        
+        self._write( 'delete_serialisable_named', HydrusSerialisable.SERIALISABLE_TYPE_SUBSCRIPTION_QUERY_LOG_CONTAINER, 'block test' )
+        
+        num_deleted = self._write( 'maintain_hashed_serialisables', force_start = True )
+        
+        self.assertGreater( num_deleted, 1 )
+        
+    
+    def test_gui_session_page_blocks( self ):
+        
+        paths = [ '/fake/path/{}.png'.format( i ) for i in range( 1000 ) ]
+        
+        page_manager = ClientGUIPageManager.CreatePageManagerImportHDD( paths, FileImportOptions.FileImportOptions(), [], {}, False )
+        
+        page_name = page_manager.GetPageName()
+        
+        page_data = ClientGUISession.GUISessionPageData( page_manager, [] )
+        
+        page_data_hash = page_data.GetSerialisedHash()
+        
+        page_container = ClientGUISession.GUISessionContainerPageSingle( page_name, page_data_hash = page_data_hash )
+        
+        top_notebook_container = ClientGUISession.GUISessionContainerPageNotebook( 'top notebook', page_containers = [ page_container ] )
+        
+        session = ClientGUISession.GUISessionContainer( 'block test session', top_notebook_container = top_notebook_container, hashes_to_page_data = { page_data_hash : page_data } )
+        
+        # clear out anything other tests left behind
+        self._write( 'maintain_hashed_serialisables', force_start = True )
+        
+        self._write( 'serialisable', session )
+        
+        # the page's import log went to blocks, and the page recorded them when it was saved, so maintenance keeps them
+        
+        num_deleted = self._write( 'maintain_hashed_serialisables', force_start = True )
+        
+        self.assertEqual( num_deleted, 0 )
+        
+        loaded_session = self._read( 'gui_session', 'block test session' )
+        
+        self.assertTrue( loaded_session.HasAllPageData() )
+        
+        loaded_page_manager = loaded_session.GetPageData( page_data_hash ).GetPageManager()
+        
+        loaded_paths = [ file_seed.file_seed_data for file_seed in loaded_page_manager.GetVariable( 'hdd_import' ).GetFileSeedCache().GetFileSeeds() ]
+        
+        self.assertEqual( loaded_paths, paths )
+        
+        # and once the session is gone, the page and its blocks are orphans
+        
+        self._write( 'delete_serialisable_named', HydrusSerialisable.SERIALISABLE_TYPE_GUI_SESSION_CONTAINER, 'block test session' )
+        
+        num_deleted = self._write( 'maintain_hashed_serialisables', force_start = True )
+        
+        self.assertGreater( num_deleted, 2 )
+        
+    
+
+class TestClientDBReadPool( unittest.TestCase ):
+    
+    _db: typing.Any = None
+    _original_db_read_pool_size = 0
+    
+    @classmethod
+    def setUpClass( cls ):
+        
+        cls._original_db_read_pool_size = HG.db_read_pool_size
+        
+        HG.db_read_pool_size = 2
+        
+        cls._db = ClientDB.DB( TG.test_controller, TestController.DB_DIR, 'client' )
+        
+        TG.test_controller.SetTestDB( cls._db )
+        
+        # a write job that holds the main connection for a while, like a big chunk of repository processing
+        def do_slow_write( duration, started_event = None ):
+            
+            if started_event is not None:
+                
+                started_event.set()
+                
+            
+            time.sleep( duration )
+            
+        
+        cls._db._write_commands_to_methods[ 'test_slow_write' ] = do_slow_write
+        
+        path = os.path.join( HC.STATIC_DIR, 'hydrus.png' )
+        
+        file_import_options = FileImportOptions.FileImportOptions()
+        file_import_options.SetIsDefault( True )
+        
+        file_import_job = ClientImportFiles.FileImportJob( path, file_import_options )
+        
+        file_import_job.GeneratePreImportHashAndStatus()
+        
+        file_import_job.GenerateInfo()
+        
+        cls._db.Write( 'import_file', True, file_import_job )
+        
+        cls._hash = file_import_job.GetHash()
+        
+        ( cls._hash_id, ) = cls._db.Read( 'file_query_ids', ClientSearchFileSearchContext.FileSearchContext( location_context = ClientLocation.LocationContext.STATICCreateSimple( CC.LOCAL_FILE_SERVICE_KEY ) ) )
+        
+    
+    @classmethod
+    def tearDownClass( cls ):
+        
+        cls._db.Shutdown()
+        
+        while not cls._db.LoopIsFinished():
+            
+            time.sleep( 0.1 )
+            
+        
+        for filename in cls._db._db_filenames.values():
+            
+            path = os.path.join( TestController.DB_DIR, filename )
+            
+            os.remove( path )
+            
+        
+        del cls._db
+        
+        TG.test_controller.ClearTestDB()
+        
+        HG.db_read_pool_size = cls._original_db_read_pool_size
+        
+    
+    def _read( self, action, *args, **kwargs ): return TestClientDBReadPool._db.Read( action, *args, **kwargs )
+    def _write( self, action, *args, **kwargs ): return TestClientDBReadPool._db.Write( action, True, *args, **kwargs )
+    
+    def _add_tag( self, tag ):
+        
+        content_update = ClientContentUpdates.ContentUpdate( HC.CONTENT_TYPE_MAPPINGS, HC.CONTENT_UPDATE_ADD, ( tag, ( self._hash, ) ) )
+        
+        content_update_package = ClientContentUpdates.ContentUpdatePackage.STATICCreateFromContentUpdate( CC.DEFAULT_LOCAL_TAG_SERVICE_KEY, content_update )
+        
+        self._write( 'content_updates', content_update_package )
+        
+    
+    def _get_tag_search_context( self, tag ):
+        
+        location_context = ClientLocation.LocationContext.STATICCreateSimple( CC.LOCAL_FILE_SERVICE_KEY )
+        
+        predicates = [ ClientSearchPredicate.Predicate( ClientSearchPredicate.PREDICATE_TYPE_TAG, tag ) ]
+        
+        return ClientSearchFileSearchContext.FileSearchContext( location_context = location_context, predicates = predicates )
+        
+    
+    def _start_slow_write( self, duration ):
+        
+        started_event = threading.Event()
+        
+        TestClientDBReadPool._db.Write( 'test_slow_write', False, duration, started_event = started_event )
+        
+        started_event.wait( 10 )
+        
+    
+    def test_read_pool( self ):
+        
+        self._add_tag( 'car' )
+        
+        TestClientDBReadPool._db.ForceACommit()
+        
+        # the main connection is busy for several seconds, but the pool answers straight away
+        
+        self._start_slow_write( 3 )
+        
+        time_started = HydrusTime.GetNowPrecise()
+        
+        result = self._read( 'file_query_ids', self._get_tag_search_context( 'car' ) )
+        
+        time_took = HydrusTime.GetNowPrecise() - time_started
+        
+        self.assertEqual( result, [ self._hash_id ] )
+        self.assertLess( time_took, 1.5 )
+        
+        TestClientDBReadPool._db.WaitUntilFree()
+        
+        # new commits are picked up by the pool
+        
+        self._add_tag( 'bus' )
+        
+        TestClientDBReadPool._db.ForceACommit()
+        
+        self._start_slow_write( 3 )
+        
+        time_started = HydrusTime.GetNowPrecise()
+        
+        result = self._read( 'file_query_ids', self._get_tag_search_context( 'bus' ) )
+        
+        time_took = HydrusTime.GetNowPrecise() - time_started
+        
+        self.assertEqual( result, [ self._hash_id ] )
+        self.assertLess( time_took, 1.5 )
+        
+        TestClientDBReadPool._db.WaitUntilFree()
+        
+        # a read that turns out to want to write a new definition gets bounced back to the main connection
+        
+        location_context = ClientLocation.LocationContext.STATICCreateSimple( CC.LOCAL_FILE_SERVICE_KEY )
+        
+        predicates = [ ClientSearchPredicate.Predicate( ClientSearchPredicate.PREDICATE_TYPE_SYSTEM_HASH, ( ( HydrusData.GenerateKey(), ), 'sha256' ) ) ]
+        
+        file_search_context = ClientSearchFileSearchContext.FileSearchContext( location_context = location_context, predicates = predicates )
+        
+        self._start_slow_write( 1 )
+        
+        result = self._read( 'file_query_ids', file_search_context )
+        
+        self.assertEqual( result, [] )
+        
+        TestClientDBReadPool._db.WaitUntilFree()
+        
+    
+    def test_read_pool_generation( self ):
+        
+        db = TestClientDBReadPool._db
+        
+        db.ForceACommit()
+        
+        generation = db._GetReadPoolGeneration()
+        
+        # everyday writes and forced commits don't make the pool rebuild its modules
+        
+        self._add_tag( 'generation' )
+        
+        db.ForceACommit()
+        
+        self.assertEqual( db._GetReadPoolGeneration(), generation )
+        
+        self._write( 'test_slow_write', 0.01 )
+        
+        db.ForceACommit()
+        
+        self.assertEqual( db._GetReadPoolGeneration(), generation )
+        
+        # writes that change what the modules hold in memory do
+        
+        self._write( 'dirty_services', [] )
+        
+        db.ForceACommit()
+        
+        self.assertNotEqual( db._GetReadPoolGeneration(), generation )
+        
+        # and with nobody reading, writes are batched into the normal commit
+        
+        db._read_pool_last_read_time = 0.0
+        
+        self._add_tag( 'batched' )
+        
+        self.assertTrue( db._cursor_transaction_wrapper.HasUncommittedWrites() )
+        
+        db.ForceACommit()
+        
+    
+    def test_read_pool_similar_files( self ):
+        
+        db = TestClientDBReadPool._db
+        
+        location_context = ClientLocation.LocationContext.STATICCreateSimple( CC.LOCAL_FILE_SERVICE_KEY )
+        
+        # the first search loads the shared index on the main connection
+        
+        db._perceptual_hash_search_index_cache.Clear()
+        
+        db.ForceACommit()
+        
+        predicates = [ ClientSearchPredicate.Predicate( ClientSearchPredicate.PREDICATE_TYPE_SYSTEM_SIMILAR_TO_FILES, ( ( self._hash, ), 4 ) ) ]
+        
+        result = self._read( 'file_query_ids', ClientSearchFileSearchContext.FileSearchContext( location_context = location_context, predicates = predicates ) )
+        
+        self.assertIn( self._hash_id, result )
+        self.assertGreater( len( db._perceptual_hash_search_index_cache ), 0 )
+        
+        # a new import goes into that index, so the pool sees it as soon as it is committed
+        
+        path = os.path.join( HC.STATIC_DIR, 'hydrus_32_non-transparent.png' )
+        
+        file_import_options = FileImportOptions.FileImportOptions()
+        file_import_options.SetIsDefault( True )
+        
+        file_import_job = ClientImportFiles.FileImportJob( path, file_import_options )
+        
+        file_import_job.GeneratePreImportHashAndStatus()
+        
+        file_import_job.GenerateInfo()
+        
+        perceptual_hashes = file_import_job.GetPerceptualHashes()
+        
+        self.assertGreater( len( perceptual_hashes ), 0 )
+        
+        self._write( 'import_file', file_import_job )
+        
+        db.ForceACommit()
+        
+        ( new_hash_id, ) = self._read( 'file_query_ids', ClientSearchFileSearchContext.FileSearchContext( location_context = location_context, predicates = [ ClientSearchPredicate.Predicate( ClientSearchPredicate.PREDICATE_TYPE_SYSTEM_HASH, ( ( file_import_job.GetHash(), ), 'sha256' ) ) ] ) )
+        
+        predicates = [ ClientSearchPredicate.Predicate( ClientSearchPredicate.PREDICATE_TYPE_SYSTEM_SIMILAR_TO_DATA, ( (), tuple( perceptual_hashes ), 4 ) ) ]
+        
+        result = self._read( 'file_query_ids', ClientSearchFileSearchContext.FileSearchContext( location_context = location_context, predicates = predicates ) )
+        
+        self.assertIn( new_hash_id, result )
+        
+    
+    def test_read_pool_stress( self ):
+        
+        self._add_tag( 'stress' )
+        
+        TestClientDBReadPool._db.ForceACommit()
+        
+        num_writes = 50
+        write_duration = 0.05
+        
+        write_load_done = threading.Event()
+        
+        def do_write_load():
+            
+            try:
+                
+                for i in range( num_writes ):
+                    
+                    self._write( 'test_slow_write', write_duration )
+                    
+                    self._add_tag( f'load:{i}' )
+                    
+                
+            finally:
+                
+                write_load_done.set()
+                
+            
+        
+        threading.Thread( target = do_write_load ).start()
+        
+        latencies = []
+        
+        while not write_load_done.is_set():
+            
+            time_started = HydrusTime.GetNowPrecise()
+            
+            result = self._read( 'file_query_ids', self._get_tag_search_context( 'stress' ) )
+            
+            latencies.append( HydrusTime.GetNowPrecise() - time_started )
+            
+            self.assertEqual( result, [ self._hash_id ] )
+            
+        
+        # the writer is never idle, so without the pool a typical read waits behind some of a slow write
+        
+        latencies.sort()
+        
+        median_latency = latencies[ len( latencies ) // 2 ]
+        
+        self.assertLess( median_latency, write_duration )
+        
+        TestClientDBReadPool._db.ForceACommit()
+        
+        result = self._read( 'file_query_ids', self._get_tag_search_context( f'load:{num_writes - 1}' ) )
+        
+        self.assertEqual( result, [ self._hash_id ] )
+        
+    
@@ -1,4 +1,5 @@
 import os
+import random
 import time
 import typing
 import unittest
@@ -10,6 +11,7 @@ from hydrus.core import HydrusNumbers
 from hydrus.client import ClientConstants as CC
 from hydrus.client import ClientLocation
 from hydrus.client.db import ClientDB
+from hydrus.client.db import ClientDBSimilarFiles
 from hydrus.client.duplicates import ClientDuplicates
 from hydrus.client.duplicates import ClientPotentialDuplicatesSearchContext
 from hydrus.client.importing import ClientImportFiles
@@ -1210,3 +1212,98 @@ class TestClientDBDuplicates( unittest.TestCase ):
         self._test_dissolve()
         
     
+class TestPerceptualHashSearchIndex( unittest.TestCase ):
+    
+    def _brute_force_search( self, perceptual_hash_ids_to_perceptual_hashes, search_perceptual_hash, max_hamming_distance ):
+        
+        results = {}
+        
+        for ( perceptual_hash_id, perceptual_hash ) in perceptual_hash_ids_to_perceptual_hashes.items():
+            
+            distance = HydrusData.Get64BitHammingDistance( search_perceptual_hash, perceptual_hash )
+            
+            if distance <= max_hamming_distance:
+                
+                results[ perceptual_hash_id ] = distance
+                
+            
+        
+        return results
+        
+    
+    def _flip_bits( self, perceptual_hash, num_bits ):
+        
+        value = int.from_bytes( perceptual_hash, 'big' )
+        
+        for bit in random.sample( range( 64 ), num_bits ):
+            
+            value ^= 1 << bit
+            
+        
+        return value.to_bytes( 8, 'big' )
+        
+    
+    def test_search( self ):
+        
+        perceptual_hash_ids_to_perceptual_hashes = { perceptual_hash_id : os.urandom( 8 ) for perceptual_hash_id in range( 1, 3001 ) }
+        
+        # some near neighbours so there is something to find
+        for perceptual_hash_id in range( 3001, 3201 ):
+            
+            perceptual_hash_ids_to_perceptual_hashes[ perceptual_hash_id ] = self._flip_bits( perceptual_hash_ids_to_perceptual_hashes[ perceptual_hash_id - 3000 ], random.randint( 0, 10 ) )
+            
+        
+        index = ClientDBSimilarFiles.PerceptualHashSearchIndex( list( perceptual_hash_ids_to_perceptual_hashes.items() ) )
+        
+        self.assertEqual( len( index ), len( perceptual_hash_ids_to_perceptual_hashes ) )
+        
+        search_perceptual_hashes = [ perceptual_hash_ids_to_perceptual_hashes[ perceptual_hash_id ] for perceptual_hash_id in range( 1, 201 ) ]
+        search_perceptual_hashes.append( os.urandom( 8 ) )
+        
+        for max_hamming_distance in ( 0, 4, 8, 12 ):
+            
+            results = index.Search( search_perceptual_hashes, max_hamming_distance )
+            
+            self.assertEqual( len( results ), len( search_perceptual_hashes ) )
+            
+            for ( search_perceptual_hash, result ) in zip( search_perceptual_hashes, results ):
+                
+                self.assertEqual( result, self._brute_force_search( perceptual_hash_ids_to_perceptual_hashes, search_perceptual_hash, max_hamming_distance ) )
+                
+            
+        
+        # incremental removes and adds
+        
+        removees = set( range( 3001, 3101 ) )
+        
+        index.RemovePerceptualHashIds( removees )
+        
+        for perceptual_hash_id in removees:
+            
+            del perceptual_hash_ids_to_perceptual_hashes[ perceptual_hash_id ]
+            
+        
+        additions = { perceptual_hash_id : self._flip_bits( perceptual_hash_ids_to_perceptual_hashes[ perceptual_hash_id - 4000 ], random.randint( 0, 10 ) ) for perceptual_hash_id in range( 4001, 4101 ) }
+        
+        # a removed id coming back with a new value
+        additions[ 3001 ] = self._flip_bits( perceptual_hash_ids_to_perceptual_hashes[ 1 ], 2 )
+        
+        index.AddPerceptualHashes( list( additions.items() ) )
+        
+        perceptual_hash_ids_to_perceptual_hashes.update( additions )
+        
+        self.assertEqual( len( index ), len( perceptual_hash_ids_to_perceptual_hashes ) )
+        
+        results = index.Search( search_perceptual_hashes, 8 )
+        
+        for ( search_perceptual_hash, result ) in zip( search_perceptual_hashes, results ):
+            
+            self.assertEqual( result, self._brute_force_search( perceptual_hash_ids_to_perceptual_hashes, search_perceptual_hash, 8 ) )
+            
+        
+        self.assertEqual( results[0].get( 3001 ), 2 )
+        
+        self.assertEqual( index.Search( [], 8 ), [] )
+        self.assertEqual( ClientDBSimilarFiles.PerceptualHashSearchIndex().Search( search_perceptual_hashes, 8 ), [ {} for search_perceptual_hash in search_perceptual_hashes ] )
+        
+    
@@ -1584,6 +1584,87 @@ class TestClientDBTags( unittest.TestCase ):
         self._test_ac( 'lara*', self._public_service_key, CC.COMBINED_FILE_SERVICE_KEY, { lara_tag : ClientSearchPredicate.PredicateCount.STATICCreateStaticCount( 0, 1 ) }, { lara_tag : ClientSearchPredicate.PredicateCount.STATICCreateStaticCount( 0, 1 ) } )
         
     
+    def test_display_sync_batch( self ):
+        
+        # a big sibling or parent update gets its display mappings applied in large batches, so let's make sure a batch of many chains gets the same answer as doing them one by one would
+        
+        self._clear_db()
+        
+        TG.test_controller.SetRead( 'hash_status', ClientImportFiles.FileImportStatus.STATICGetUnknownStatus() )
+        
+        path = os.path.join( HC.STATIC_DIR, 'testing', 'muh_jpg.jpg' )
+        
+        file_import_options = FileImportOptions.FileImportOptions()
+        file_import_options.SetIsDefault( True )
+        
+        file_import_job = ClientImportFiles.FileImportJob( path, file_import_options )
+        
+        file_import_job.GeneratePreImportHashAndStatus()
+        
+        file_import_job.GenerateInfo()
+        
+        self._write( 'import_file', file_import_job )
+        
+        muh_jpg_hash = file_import_job.GetHash()
+        
+        num_chains = 100
+        
+        content_updates = []
+        
+        for i in range( num_chains ):
+            
+            # the local file tests the specific caches, and a file we don't have for each tag tests the combined counts
+            
+            hashes = ( muh_jpg_hash, os.urandom( 32 ) )
+            
+            content_updates.append( ClientContentUpdates.ContentUpdate( HC.CONTENT_TYPE_MAPPINGS, HC.CONTENT_UPDATE_ADD, ( f'batch bad {i}', hashes ) ) )
+            
+        
+        self._write( 'content_updates', ClientContentUpdates.ContentUpdatePackage.STATICCreateFromContentUpdates( self._my_service_key, content_updates ) )
+        
+        sibling_content_updates = [ ClientContentUpdates.ContentUpdate( HC.CONTENT_TYPE_TAG_SIBLINGS, HC.CONTENT_UPDATE_ADD, ( f'batch bad {i}', f'batch good {i}' ) ) for i in range( num_chains ) ]
+        parent_content_updates = [ ClientContentUpdates.ContentUpdate( HC.CONTENT_TYPE_TAG_PARENTS, HC.CONTENT_UPDATE_ADD, ( f'batch good {i}', 'batch parent' ) ) for i in range( num_chains ) ]
+        
+        self._write( 'content_updates', ClientContentUpdates.ContentUpdatePackage.STATICCreateFromContentUpdates( self._my_service_key, sibling_content_updates + parent_content_updates ) )
+        
+        self._sync_display()
+        
+        local_storage_counts = { f'batch bad {i}' : ClientSearchPredicate.PredicateCount.STATICCreateStaticCount( 1, 0 ) for i in range( num_chains ) }
+        combined_storage_counts = { f'batch bad {i}' : ClientSearchPredicate.PredicateCount.STATICCreateStaticCount( 2, 0 ) for i in range( num_chains ) }
+        
+        local_display_counts = { f'batch good {i}' : ClientSearchPredicate.PredicateCount.STATICCreateStaticCount( 1, 0 ) for i in range( num_chains ) }
+        local_display_counts[ 'batch parent' ] = ClientSearchPredicate.PredicateCount.STATICCreateStaticCount( 1, 0 )
+        
+        combined_display_counts = { f'batch good {i}' : ClientSearchPredicate.PredicateCount.STATICCreateStaticCount( 2, 0 ) for i in range( num_chains ) }
+        combined_display_counts[ 'batch parent' ] = ClientSearchPredicate.PredicateCount.STATICCreateStaticCount( 1 + num_chains, 0 )
+        
+        self._test_ac( 'batch*', self._my_service_key, CC.LOCAL_FILE_SERVICE_KEY, local_storage_counts, local_display_counts )
+        self._test_ac( 'batch*', self._my_service_key, CC.COMBINED_FILE_SERVICE_KEY, combined_storage_counts, combined_display_counts )
+        
+        # and now take it all apart again
+        
+        parent_content_updates = [ ClientContentUpdates.ContentUpdate( HC.CONTENT_TYPE_TAG_PARENTS, HC.CONTENT_UPDATE_DELETE, ( f'batch good {i}', 'batch parent' ) ) for i in range( num_chains ) ]
+        
+        self._write( 'content_updates', ClientContentUpdates.ContentUpdatePackage.STATICCreateFromContentUpdates( self._my_service_key, parent_content_updates ) )
+        
+        self._sync_display()
+        
+        del local_display_counts[ 'batch parent' ]
+        del combined_display_counts[ 'batch parent' ]
+        
+        self._test_ac( 'batch*', self._my_service_key, CC.LOCAL_FILE_SERVICE_KEY, local_storage_counts, local_display_counts )
+        self._test_ac( 'batch*', self._my_service_key, CC.COMBINED_FILE_SERVICE_KEY, combined_storage_counts, combined_display_counts )
+        
+        sibling_content_updates = [ ClientContentUpdates.ContentUpdate( HC.CONTENT_TYPE_TAG_SIBLINGS, HC.CONTENT_UPDATE_DELETE, ( f'batch bad {i}', f'batch good {i}' ) ) for i in range( num_chains ) ]
+        
+        self._write( 'content_updates', ClientContentUpdates.ContentUpdatePackage.STATICCreateFromContentUpdates( self._my_service_key, sibling_content_updates ) )
+        
+        self._sync_display()
+        
+        self._test_ac( 'batch*', self._my_service_key, CC.LOCAL_FILE_SERVICE_KEY, local_storage_counts, local_storage_counts )
+        self._test_ac( 'batch*', self._my_service_key, CC.COMBINED_FILE_SERVICE_KEY, combined_storage_counts, combined_storage_counts )
+        
+    
     def test_parents_pairs_lookup( self ):
         
         self._clear_db()
@@ -1,6 +1,7 @@
 import os
 import unittest
 
+from hydrus.core import HydrusConstants as HC
 from hydrus.core import HydrusData
 from hydrus.core import HydrusExceptions
 
@@ -217,3 +218,156 @@ class TestClientFileStorage( unittest.TestCase ):
         
         
     
+    def test_thumbnail_pack( self ):
+        
+        dir_path = os.path.join( TG.test_controller.db_dir, 'thumbnail_pack_test' )
+        
+        os.makedirs( dir_path, exist_ok = True )
+        
+        path = os.path.join( dir_path, ClientFilesPhysical.THUMBNAIL_PACK_FILENAME )
+        
+        hashes_to_thumbnail_bytes = { os.urandom( 32 ) : os.urandom( 1000 + i ) for i in range( 50 ) }
+        
+        thumbnail_pack = ClientFilesPhysical.ThumbnailPack( path )
+        
+        self.assertEqual( thumbnail_pack.GetHashes(), [] )
+        self.assertFalse( os.path.exists( path ) )
+        
+        thumbnail_pack.AddThumbnails( list( hashes_to_thumbnail_bytes.items() )[ : 25 ] )
+        
+        # we are mapped now, so this tests the remap on growth
+        self.assertEqual( thumbnail_pack.GetThumbnailBytes( list( hashes_to_thumbnail_bytes.keys() )[0] ), list( hashes_to_thumbnail_bytes.values() )[0] )
+        
+        thumbnail_pack.AddThumbnails( list( hashes_to_thumbnail_bytes.items() )[ 25 : ] )
+        
+        for ( hash, thumbnail_bytes ) in hashes_to_thumbnail_bytes.items():
+            
+            self.assertTrue( thumbnail_pack.HasThumbnail( hash ) )
+            self.assertEqual( thumbnail_pack.GetThumbnailBytes( hash ), thumbnail_bytes )
+            
+        
+        # rewrite and delete
+        
+        hashes = list( hashes_to_thumbnail_bytes.keys() )
+        
+        for hash in hashes[ : 10 ]:
+            
+            hashes_to_thumbnail_bytes[ hash ] = os.urandom( 500 )
+            
+        
+        thumbnail_pack.AddThumbnails( [ ( hash, hashes_to_thumbnail_bytes[ hash ] ) for hash in hashes[ : 10 ] ] )
+        
+        self.assertEqual( thumbnail_pack.DeleteThumbnails( hashes[ 40 : ] + [ os.urandom( 32 ) ] ), 10 )
+        
+        for hash in hashes[ 40 : ]:
+            
+            del hashes_to_thumbnail_bytes[ hash ]
+            
+        
+        def check_contents():
+            
+            self.assertEqual( set( thumbnail_pack.GetHashes() ), set( hashes_to_thumbnail_bytes.keys() ) )
+            
+            for ( hash, thumbnail_bytes ) in hashes_to_thumbnail_bytes.items():
+                
+                self.assertEqual( thumbnail_pack.GetThumbnailBytes( hash ), thumbnail_bytes )
+                
+            
+            for hash in hashes[ 40 : ]:
+                
+                self.assertFalse( thumbnail_pack.HasThumbnail( hash ) )
+                self.assertIsNone( thumbnail_pack.GetThumbnailBytes( hash ) )
+                
+            
+        
+        check_contents()
+        
+        # the index is rebuilt from the file, and a half-written record at the end is discarded
+        
+        thumbnail_pack.Close()
+        
+        with open( path, 'ab' ) as f:
+            
+            f.write( ClientFilesPhysical.THUMBNAIL_PACK_RECORD_HEADER.pack( os.urandom( 32 ), 5000 ) )
+            f.write( b'abc' )
+            
+        
+        thumbnail_pack = ClientFilesPhysical.ThumbnailPack( path )
+        
+        check_contents()
+        
+        new_hash = os.urandom( 32 )
+        
+        hashes_to_thumbnail_bytes[ new_hash ] = os.urandom( 100 )
+        
+        thumbnail_pack.AddThumbnails( [ ( new_hash, hashes_to_thumbnail_bytes[ new_hash ] ) ] )
+        
+        check_contents()
+        
+        size_before = os.path.getsize( path )
+        
+        thumbnail_pack.Compact()
+        
+        self.assertLess( os.path.getsize( path ), size_before )
+        
+        check_contents()
+        
+        thumbnail_pack.Close()
+        
+        thumbnail_pack = ClientFilesPhysical.ThumbnailPack( path )
+        
+        check_contents()
+        
+        # emptying it out deletes the file
+        
+        thumbnail_pack.DeleteThumbnails( list( hashes_to_thumbnail_bytes.keys() ) )
+        
+        self.assertTrue( thumbnail_pack.NeedsCompaction() )
+        
+        thumbnail_pack.Compact()
+        
+        self.assertFalse( os.path.exists( path ) )
+        self.assertEqual( thumbnail_pack.GetHashes(), [] )
+        
+    
+    def test_thumbnail_pack_migration( self ):
+        
+        client_files_manager = TG.test_controller.client_files_manager
+        
+        hash = os.urandom( 32 )
+        
+        with open( os.path.join( HC.STATIC_DIR, 'hydrus.png' ), 'rb' ) as f:
+            
+            thumbnail_bytes = f.read()
+            
+        
+        loose_path = client_files_manager._GenerateExpectedThumbnailPath( hash )
+        
+        client_files_manager.AddThumbnailFromBytes( hash, thumbnail_bytes, silent = True )
+        
+        self.assertTrue( os.path.exists( loose_path ) )
+        
+        client_files_manager.MigrateThumbnailStorage( True )
+        
+        self.assertFalse( os.path.exists( loose_path ) )
+        self.assertTrue( client_files_manager.LocklessHasThumbnail( hash ) )
+        self.assertEqual( client_files_manager._ReadThumbnailBytes( hash ), thumbnail_bytes )
+        
+        new_thumbnail_bytes = thumbnail_bytes + b'\x00'
+        
+        client_files_manager.AddThumbnailFromBytes( hash, new_thumbnail_bytes, silent = True )
+        
+        self.assertFalse( os.path.exists( loose_path ) )
+        self.assertEqual( client_files_manager._ReadThumbnailBytes( hash ), new_thumbnail_bytes )
+        
+        client_files_manager.MigrateThumbnailStorage( False )
+        
+        self.assertTrue( os.path.exists( loose_path ) )
+        self.assertFalse( os.path.exists( os.path.join( os.path.dirname( loose_path ), ClientFilesPhysical.THUMBNAIL_PACK_FILENAME ) ) )
+        self.assertEqual( client_files_manager._ReadThumbnailBytes( hash ), new_thumbnail_bytes )
+        
+        os.remove( loose_path )
+        
+        self.assertFalse( client_files_manager.LocklessHasThumbnail( hash ) )
+        
+    
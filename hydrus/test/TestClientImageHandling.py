@@ -1,11 +1,261 @@
+import numpy
 import os
+import tempfile
+import time
 import unittest
 
 from hydrus.core import HydrusConstants as HC
 
 from hydrus.client import ClientConstants as CC
+from hydrus.client.caches import ClientCaches
+from hydrus.client.caches import ClientCachesBase
 from hydrus.client.files.images import ClientImagePerceptualHashes
 
+from hydrus.test import TestGlobals as TG
+
+class FixedSizeCacheableObject( ClientCachesBase.CacheableObject ):
+    
+    def __init__( self, size ):
+        
+        self._size = size
+        
+    
+    def GetEstimatedMemoryFootprint( self ) -> int:
+        
+        return self._size
+        
+    
+
+class TestDataCache( unittest.TestCase ):
+    
+    def _RunHotSetAndScan( self, cache_eviction_policy_type ):
+        
+        # 1,000 bytes of cache. ten hot items we keep coming back to, then a long scroll through stuff we see once
+        
+        data_cache = ClientCachesBase.DataCache( TG.test_controller, 'test cache', 1000, cache_eviction_policy_type = cache_eviction_policy_type )
+        
+        hot_keys = [ 'hot {}'.format( i ) for i in range( 10 ) ]
+        
+        for i in range( 5 ):
+            
+            for key in hot_keys:
+                
+                if data_cache.GetIfHasData( key ) is None:
+                    
+                    data_cache.AddData( key, FixedSizeCacheableObject( 50 ) )
+                    
+                
+            
+        
+        for i in range( 500 ):
+            
+            key = 'scan {}'.format( i )
+            
+            if data_cache.GetIfHasData( key ) is None:
+                
+                data_cache.AddData( key, FixedSizeCacheableObject( 50 ) )
+                
+            
+        
+        num_hot_keys_kept = len( [ key for key in hot_keys if data_cache.HasData( key ) ] )
+        
+        return ( data_cache, num_hot_keys_kept )
+        
+    
+    def test_lru( self ):
+        
+        ( data_cache, num_hot_keys_kept ) = self._RunHotSetAndScan( ClientCachesBase.CACHE_EVICTION_POLICY_LRU )
+        
+        self.assertEqual( num_hot_keys_kept, 0 )
+        
+        statistics = data_cache.GetStatistics()
+        
+        self.assertEqual( statistics[ 'eviction_policy' ], 'least recently used' )
+        self.assertEqual( statistics[ 'hits' ], 40 )
+        self.assertEqual( statistics[ 'misses' ], 510 )
+        self.assertLessEqual( statistics[ 'size' ], 1000 )
+        self.assertEqual( statistics[ 'evictions' ], 510 - statistics[ 'num_items' ] )
+        
+    
+    def test_w_tinylfu( self ):
+        
+        ( data_cache, num_hot_keys_kept ) = self._RunHotSetAndScan( ClientCachesBase.CACHE_EVICTION_POLICY_W_TINYLFU )
+        
+        self.assertEqual( num_hot_keys_kept, 10 )
+        
+        statistics = data_cache.GetStatistics()
+        
+        self.assertEqual( statistics[ 'eviction_policy' ], 'W-TinyLFU' )
+        self.assertEqual( statistics[ 'hits' ], 40 )
+        self.assertEqual( statistics[ 'misses' ], 510 )
+        self.assertLessEqual( statistics[ 'size' ], 1000 )
+        self.assertEqual( statistics[ 'evictions' ], 510 - statistics[ 'num_items' ] )
+        
+        data_cache.DeleteData( 'hot 0' )
+        
+        self.assertFalse( data_cache.HasData( 'hot 0' ) )
+        
+        data_cache.Clear()
+        
+        self.assertEqual( data_cache.GetStatistics()[ 'num_items' ], 0 )
+        
+    
+    def test_sketch_growth( self ):
+        
+        # the sketch grows as the cache fills up, and it must not forget what it has seen when it does
+        
+        sketch = ClientCachesBase.FrequencySketch()
+        
+        keys = [ 'key {}'.format( i ) for i in range( 200 ) ]
+        
+        for ( i, key ) in enumerate( keys ):
+            
+            for j in range( i % 8 ):
+                
+                sketch.Increment( key )
+                
+            
+        
+        frequencies = [ sketch.GetFrequency( key ) for key in keys ]
+        
+        sketch.EnsureCapacity( 5000 )
+        
+        self.assertEqual( [ sketch.GetFrequency( key ) for key in keys ], frequencies )
+        
+        for ( i, key ) in enumerate( keys ):
+            
+            self.assertGreaterEqual( sketch.GetFrequency( key ), i % 8 )
+            
+        
+    
+    def test_size_awareness( self ):
+        
+        data_cache = ClientCachesBase.DataCache( TG.test_controller, 'test cache', 1000, cache_eviction_policy_type = ClientCachesBase.CACHE_EVICTION_POLICY_W_TINYLFU )
+        
+        for i in range( 20 ):
+            
+            data_cache.AddData( i, FixedSizeCacheableObject( 10 ) )
+            
+        
+        data_cache.AddData( 'big', FixedSizeCacheableObject( 900 ) )
+        
+        self.assertLessEqual( data_cache.GetStatistics()[ 'size' ], 1000 )
+        
+        data_cache.SetCacheSizeAndTimeout( 100, 1200 )
+        
+        statistics = data_cache.GetStatistics()
+        
+        self.assertLessEqual( statistics[ 'size' ], 100 )
+        self.assertGreater( statistics[ 'num_items' ], 0 )
+        
+    
+
+class TestRenderDiskCache( unittest.TestCase ):
+    
+    def _GetInitialisedCache( self, cache_dir ):
+        
+        render_disk_cache = ClientCaches.RenderDiskCache( TG.test_controller, cache_dir )
+        
+        for i in range( 100 ):
+            
+            if render_disk_cache.IsEnabled():
+                
+                break
+                
+            
+            time.sleep( 0.05 )
+            
+        
+        self.assertTrue( render_disk_cache.IsEnabled() )
+        
+        return render_disk_cache
+        
+    
+    def test_render_disk_cache( self ):
+        
+        cache_dir = os.path.join( tempfile.mkdtemp(), 'client_render_cache' )
+        
+        hash_1 = os.urandom( 32 )
+        hash_2 = os.urandom( 32 )
+        
+        new_options = TG.test_controller.new_options
+        
+        new_options.SetNoneableInteger( 'render_disk_cache_size', 1000 )
+        
+        try:
+            
+            render_disk_cache = self._GetInitialisedCache( cache_dir )
+            
+            self.assertIsNone( render_disk_cache.GetData( hash_1, 'render_a' ) )
+            
+            render_disk_cache.AddData( hash_1, 'render_a', b'a' * 400 )
+            render_disk_cache.AddData( hash_1, 'render_b', b'b' * 400 )
+            render_disk_cache.AddData( hash_2, 'render_a', b'c' * 100 )
+            
+            self.assertEqual( render_disk_cache.GetData( hash_1, 'render_a' ), b'a' * 400 )
+            
+            # 'b' is now the least recently used, so it goes
+            
+            render_disk_cache.AddData( hash_2, 'render_b', b'd' * 400 )
+            
+            self.assertTrue( render_disk_cache.HasData( hash_1, 'render_a' ) )
+            self.assertFalse( render_disk_cache.HasData( hash_1, 'render_b' ) )
+            self.assertTrue( render_disk_cache.HasData( hash_2, 'render_b' ) )
+            
+            statistics = render_disk_cache.GetStatistics()
+            
+            self.assertEqual( statistics[ 'hits' ], 1 )
+            self.assertEqual( statistics[ 'misses' ], 1 )
+            self.assertEqual( statistics[ 'evictions' ], 1 )
+            self.assertEqual( statistics[ 'size' ], 900 )
+            
+            # survives a restart, and a write that never finished gets cleared out
+            
+            leftover_temp_path = os.path.join( cache_dir, hash_1.hex()[:2], 'hydrus_leftover.tmp' )
+            
+            with open( leftover_temp_path, 'wb' ) as f:
+                
+                f.write( b'e' * 50 )
+                
+            
+            render_disk_cache = self._GetInitialisedCache( cache_dir )
+            
+            self.assertEqual( render_disk_cache.GetStatistics()[ 'num_items' ], 3 )
+            self.assertFalse( os.path.exists( leftover_temp_path ) )
+            self.assertEqual( [ name for name in os.listdir( os.path.dirname( leftover_temp_path ) ) if name.endswith( '.tmp' ) ], [] )
+            self.assertEqual( render_disk_cache.GetData( hash_2, 'render_b' ), b'd' * 400 )
+            
+            render_disk_cache.DeleteHashes( { hash_2 } )
+            
+            self.assertFalse( render_disk_cache.HasData( hash_2, 'render_a' ) )
+            self.assertFalse( render_disk_cache.HasData( hash_2, 'render_b' ) )
+            self.assertTrue( render_disk_cache.HasData( hash_1, 'render_a' ) )
+            
+            # tiles
+            
+            numpy_image = numpy.random.default_rng( 451 ).integers( 0, 256, ( 10, 12, 3 ), dtype = numpy.uint8 )
+            
+            render_disk_cache.AddNumPyImage( hash_2, 'tile', numpy_image )
+            
+            self.assertTrue( numpy.array_equal( render_disk_cache.GetNumPyImage( hash_2, 'tile' ), numpy_image ) )
+            
+            render_disk_cache.Clear()
+            
+            self.assertEqual( render_disk_cache.GetStatistics()[ 'num_items' ], 0 )
+            
+            new_options.SetNoneableInteger( 'render_disk_cache_size', None )
+            
+            render_disk_cache.NotifyNewOptions()
+            
+            self.assertFalse( render_disk_cache.IsEnabled() )
+            
+        finally:
+            
+            new_options.SetNoneableInteger( 'render_disk_cache_size', None )
+            
+        
+    
+
 class TestImageHandling( unittest.TestCase ):
     
     def test_perceptual_hash( self ):
@@ -23,3 +273,34 @@ class TestImageHandling( unittest.TestCase ):
         self.assertEqual( perceptual_hashes, set( [ b'\xb4M\xc7\xb2M\xcb8\x1c' ] ) )
         
     
+    def test_perceptual_hash_batch( self ):
+        
+        paths_and_mimes = [
+            ( os.path.join( HC.STATIC_DIR, 'hydrus.png' ), HC.IMAGE_PNG ),
+            ( os.path.join( HC.STATIC_DIR, 'hydrus_non-transparent.png' ), HC.IMAGE_PNG ),
+            ( os.path.join( HC.STATIC_DIR, 'does_not_exist.png' ), HC.IMAGE_PNG ),
+            ( os.path.join( HC.STATIC_DIR, 'boned.jpg' ), HC.IMAGE_JPEG )
+        ]
+        
+        expected_list_of_perceptual_hashes = [ ClientImagePerceptualHashes.GenerateShapePerceptualHashes( path, mime ) for ( path, mime ) in paths_and_mimes ]
+        
+        self.assertEqual( expected_list_of_perceptual_hashes[0], set( [ b'\xb4M\xc7\xb2M\xcb8\x1c' ] ) )
+        self.assertEqual( expected_list_of_perceptual_hashes[2], set() )
+        
+        self.assertEqual( ClientImagePerceptualHashes.GenerateShapePerceptualHashesBatch( paths_and_mimes ), expected_list_of_perceptual_hashes )
+        
+        # random noise and alpha, which goes through the white canvas path
+        
+        random_state = numpy.random.default_rng( 451 )
+        
+        numpy_images = [ random_state.integers( 0, 256, ( random_state.integers( 32, 300 ), random_state.integers( 32, 300 ), depth ), dtype = numpy.uint8 ) for depth in [ 3, 4 ] * 50 ]
+        
+        expected_list_of_perceptual_hashes = [ ClientImagePerceptualHashes.GenerateShapePerceptualHashesNumPy( numpy_image ) for numpy_image in numpy_images ]
+        
+        numpy_images_tiny = [ ClientImagePerceptualHashes.GenerateShapePerceptualHashTinyImage( numpy_image ) for numpy_image in numpy_images ]
+        
+        self.assertEqual( ClientImagePerceptualHashes.GenerateShapePerceptualHashesFromTinyImages( numpy_images_tiny ), expected_list_of_perceptual_hashes )
+        
+        self.assertEqual( ClientImagePerceptualHashes.GenerateShapePerceptualHashesFromTinyImages( [] ), [] )
+        
+    
@@ -2,15 +2,81 @@ import os
 import unittest
 
 from hydrus.core import HydrusConstants as HC
+from hydrus.core.files import HydrusFileHandling
 
+from hydrus.client import ClientConstants as CC
 from hydrus.client import ClientStrings
+from hydrus.client.importing import ClientImportFiles
 from hydrus.client.importing import ClientImportFileSeeds
+from hydrus.client.importing.options import FileImportOptions
 from hydrus.client.networking import ClientNetworkingURLClass
 
 from hydrus.test import TestGlobals as TG
 
+class TestFileImportWorkerPool( unittest.TestCase ):
+    
+    def test_prefetch( self ):
+        
+        file_import_options = FileImportOptions.GetRealFileImportOptions( FileImportOptions.FileImportOptions(), FileImportOptions.IMPORT_TYPE_LOUD )
+        
+        file_import_info_settings = ClientImportFiles.GetFileImportInfoSettings( file_import_options )
+        
+        paths = [ os.path.join( HC.STATIC_DIR, filename ) for filename in ( 'hydrus.png', 'boned.jpg' ) ]
+        
+        pool = ClientImportFiles.FileImportWorkerPool( 1, ClientImportFiles.GetFileImportWorkerGlobalSettings() )
+        
+        try:
+            
+            pool.Prefetch( self, paths, file_import_info_settings )
+            
+            for path in paths:
+                
+                expected_hash = HydrusFileHandling.GetHashFromPath( path )
+                
+                expected_info = ClientImportFiles.GenerateFileImportInfo( path, expected_hash, None, file_import_info_settings )
+                
+                ( hash, info, exception ) = pool.PopResult( path, file_import_info_settings )
+                
+                self.assertIsNone( exception )
+                
+                self.assertEqual( hash, expected_hash )
+                self.assertEqual( info, expected_info )
+                
+            
+            self.assertIsNone( pool.PopResult( paths[0], file_import_info_settings ) )
+            
+        finally:
+            
+            pool.Shutdown()
+            
+        
+    
+
 class TestFileSeedCache( unittest.TestCase ):
     
+    def test_next_file_seeds( self ):
+        
+        file_seed_cache = ClientImportFileSeeds.FileSeedCache()
+        
+        file_seeds = [ ClientImportFileSeeds.FileSeed( ClientImportFileSeeds.FILE_SEED_TYPE_HDD, f'/fake/path/{i}.png' ) for i in range( 10 ) ]
+        
+        file_seed_cache.AddFileSeeds( file_seeds )
+        
+        self.assertEqual( file_seed_cache.GetNextFileSeeds( CC.STATUS_UNKNOWN, 3 ), file_seeds[ : 3 ] )
+        
+        for file_seed in ( file_seeds[0], file_seeds[1], file_seeds[3] ):
+            
+            file_seed.SetStatus( CC.STATUS_SUCCESSFUL_AND_NEW )
+            
+        
+        file_seed_cache.NotifyFileSeedsUpdated( ( file_seeds[0], file_seeds[1], file_seeds[3] ) )
+        
+        self.assertEqual( file_seed_cache.GetNextFileSeeds( CC.STATUS_UNKNOWN, 3 ), [ file_seeds[2], file_seeds[4], file_seeds[5] ] )
+        self.assertEqual( file_seed_cache.GetNextFileSeeds( CC.STATUS_UNKNOWN, 100 ), [ file_seeds[2] ] + file_seeds[ 4 : ] )
+        self.assertEqual( file_seed_cache.GetNextFileSeeds( CC.STATUS_SUCCESSFUL_AND_NEW, 100 ), [ file_seeds[0], file_seeds[1], file_seeds[3] ] )
+        self.assertEqual( file_seed_cache.GetNextFileSeeds( CC.STATUS_ERROR, 3 ), [] )
+        
+    
     def test_renormalise( self ):
         
         file_seed_cache = ClientImportFileSeeds.FileSeedCache()
@@ -2,13 +2,19 @@ import os
 import unittest
 
 from hydrus.core import HydrusConstants as HC
+from hydrus.core import HydrusData
 
 from hydrus.client import ClientConstants as CC
+from hydrus.client import ClientLocation
+from hydrus.client.metadata import ClientContentUpdates
 from hydrus.client.metadata import ClientTagsHandling
 from hydrus.client.search import ClientNumberTest
 from hydrus.client.search import ClientSearchAutocomplete
 from hydrus.client.search import ClientSearchParseSystemPredicates
+from hydrus.client.search import ClientSearchFileSearchContext
 from hydrus.client.search import ClientSearchPredicate
+from hydrus.client.search import ClientSearchResultCache
+from hydrus.client.search import ClientSearchTagContext
 
 class TestAutocompletePredGubbins( unittest.TestCase ):
     
@@ -1863,3 +1869,108 @@ class TestAutocompletePredGubbins( unittest.TestCase ):
         self.assertEqual( tag_autocomplete_options.GetExactMatchCharacterThreshold(), 2 )
         
     
+class TestFileSearchResultCache( unittest.TestCase ):
+    
+    def test_dependencies( self ):
+        
+        location_context = ClientLocation.LocationContext.STATICCreateSimple( CC.LOCAL_FILE_SERVICE_KEY )
+        
+        def get_search_context( tag_service_key, predicates ):
+            
+            return ClientSearchFileSearchContext.FileSearchContext( location_context = location_context, tag_context = ClientSearchTagContext.TagContext( service_key = tag_service_key ), predicates = predicates )
+            
+        
+        tag_predicate = ClientSearchPredicate.Predicate( ClientSearchPredicate.PREDICATE_TYPE_TAG, 'samus aran' )
+        inbox_predicate = ClientSearchPredicate.Predicate( ClientSearchPredicate.PREDICATE_TYPE_SYSTEM_INBOX )
+        delta_age_predicate = ClientSearchPredicate.Predicate( ClientSearchPredicate.PREDICATE_TYPE_SYSTEM_AGE, ( '<', 'delta', ( 0, 0, 7, 0 ) ) )
+        
+        dependencies = ClientSearchResultCache.GetDependencies( get_search_context( CC.DEFAULT_LOCAL_TAG_SERVICE_KEY, [ tag_predicate, inbox_predicate ] ) )
+        
+        self.assertEqual( dependencies, { ( HC.CONTENT_TYPE_FILES, None ), ( HC.CONTENT_TYPE_MAPPINGS, CC.DEFAULT_LOCAL_TAG_SERVICE_KEY ), ( ClientSearchResultCache.DEPENDENCY_INBOX, None ) } )
+        
+        dependencies = ClientSearchResultCache.GetDependencies( get_search_context( CC.COMBINED_TAG_SERVICE_KEY, [ tag_predicate ] ) )
+        
+        self.assertEqual( dependencies, { ( HC.CONTENT_TYPE_FILES, None ), ( HC.CONTENT_TYPE_MAPPINGS, None ) } )
+        
+        or_predicate = ClientSearchPredicate.Predicate( ClientSearchPredicate.PREDICATE_TYPE_OR_CONTAINER, ( tag_predicate, delta_age_predicate ) )
+        
+        self.assertIsNone( ClientSearchResultCache.GetDependencies( get_search_context( CC.DEFAULT_LOCAL_TAG_SERVICE_KEY, [ or_predicate ] ) ) )
+        
+        self.assertEqual(
+            ClientSearchResultCache.GetCacheKey( get_search_context( CC.DEFAULT_LOCAL_TAG_SERVICE_KEY, [ tag_predicate, inbox_predicate ] ) ),
+            ClientSearchResultCache.GetCacheKey( get_search_context( CC.DEFAULT_LOCAL_TAG_SERVICE_KEY, [ inbox_predicate, tag_predicate ] ) )
+        )
+        
+        self.assertNotEqual(
+            ClientSearchResultCache.GetCacheKey( get_search_context( CC.DEFAULT_LOCAL_TAG_SERVICE_KEY, [ tag_predicate ] ) ),
+            ClientSearchResultCache.GetCacheKey( get_search_context( CC.COMBINED_TAG_SERVICE_KEY, [ tag_predicate ] ) )
+        )
+        
+    
+    def test_invalidation( self ):
+        
+        file_search_result_cache = ClientSearchResultCache.FileSearchResultCache()
+        
+        my_tags_dependencies = { ( HC.CONTENT_TYPE_FILES, None ), ( HC.CONTENT_TYPE_MAPPINGS, CC.DEFAULT_LOCAL_TAG_SERVICE_KEY ) }
+        all_tags_dependencies = { ( HC.CONTENT_TYPE_FILES, None ), ( HC.CONTENT_TYPE_MAPPINGS, None ) }
+        
+        def populate():
+            
+            generation = file_search_result_cache.GetGeneration()
+            
+            file_search_result_cache.SetResult( 'my tags', generation, [ 1, 2, 3 ], my_tags_dependencies )
+            file_search_result_cache.SetResult( 'all tags', generation, [ 4, 5 ], all_tags_dependencies )
+            
+        
+        populate()
+        
+        result = file_search_result_cache.GetResult( 'my tags' )
+        
+        self.assertEqual( result, [ 1, 2, 3 ] )
+        
+        # callers shuffle and sort what they get, so it has to be a fresh list
+        
+        result.reverse()
+        
+        self.assertEqual( file_search_result_cache.GetResult( 'my tags' ), [ 1, 2, 3 ] )
+        
+        mappings_update = ClientContentUpdates.ContentUpdate( HC.CONTENT_TYPE_MAPPINGS, HC.CONTENT_UPDATE_ADD, ( 'samus aran', ( HydrusData.GenerateKey(), ) ) )
+        
+        file_search_result_cache.Invalidate( CC.DEFAULT_LOCAL_DOWNLOADER_TAG_SERVICE_KEY, [ mappings_update ] )
+        
+        self.assertEqual( file_search_result_cache.GetResult( 'my tags' ), [ 1, 2, 3 ] )
+        self.assertIsNone( file_search_result_cache.GetResult( 'all tags' ) )
+        
+        populate()
+        
+        file_search_result_cache.Invalidate( CC.DEFAULT_LOCAL_TAG_SERVICE_KEY, [ mappings_update ] )
+        
+        self.assertEqual( file_search_result_cache.GetNumEntries(), 0 )
+        
+        # a result computed while an invalidation came in is thrown away
+        
+        generation = file_search_result_cache.GetGeneration()
+        
+        file_search_result_cache.Invalidate( CC.DEFAULT_LOCAL_TAG_SERVICE_KEY, [ mappings_update ] )
+        
+        file_search_result_cache.SetResult( 'my tags', generation, [ 1, 2, 3 ], my_tags_dependencies )
+        
+        self.assertIsNone( file_search_result_cache.GetResult( 'my tags' ) )
+        
+        # and a result from before the write committed is cleared once it has
+        
+        file_search_result_cache.SetResult( 'my tags', file_search_result_cache.GetGeneration(), [ 1, 2, 3 ], my_tags_dependencies )
+        
+        file_search_result_cache.ReapplyInvalidationsAfterJob()
+        
+        self.assertIsNone( file_search_result_cache.GetResult( 'my tags' ) )
+        
+        # unknown content clears everything
+        
+        populate()
+        
+        file_search_result_cache.Invalidate( CC.LOCAL_FILE_SERVICE_KEY, [ ClientContentUpdates.ContentUpdate( HC.CONTENT_TYPE_UNKNOWN, HC.CONTENT_UPDATE_ADD, None ) ] )
+        
+        self.assertEqual( file_search_result_cache.GetNumEntries(), 0 )
+        
+    
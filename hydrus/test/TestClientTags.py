@@ -1,4 +1,5 @@
 import collections
+import random
 import unittest
 
 from hydrus.core import HydrusConstants as HC
@@ -9,7 +10,9 @@ from hydrus.client import ClientConstants as CC
 from hydrus.client.media import ClientMediaManagers
 from hydrus.client.metadata import ClientContentUpdates
 from hydrus.client.metadata import ClientTags
+from hydrus.client.metadata import ClientTagsAutocompleteIndex
 from hydrus.client.metadata import ClientTagsHandling
+from hydrus.client.metadata import ClientTagsLookupIndex
 from hydrus.client.search import ClientSearchTagContext
 
 from hydrus.test import TestGlobals as TG
@@ -182,6 +185,40 @@ class TestTagsManager( unittest.TestCase ):
         self.assertEqual( self._other_tags_manager.GetPetitioned( self._pending_service_key, ClientTags.TAG_DISPLAY_STORAGE ), set() )
         
     
+    def test_duplicate( self ):
+        
+        tags_manager = self._tags_manager.Duplicate()
+        
+        self.assertEqual( tags_manager.GetServiceKeysToStatusesToTags( ClientTags.TAG_DISPLAY_STORAGE ), self._tags_manager.GetServiceKeysToStatusesToTags( ClientTags.TAG_DISPLAY_STORAGE ) )
+        
+        content_update = ClientContentUpdates.ContentUpdate( HC.CONTENT_TYPE_MAPPINGS, HC.CONTENT_UPDATE_ADD, ( 'only in the duplicate', set() ) )
+        
+        tags_manager.ProcessContentUpdate( self._first_key, content_update )
+        
+        self.assertTrue( tags_manager.HasTag( 'only in the duplicate', ClientTags.TAG_DISPLAY_STORAGE ) )
+        self.assertFalse( self._tags_manager.HasTag( 'only in the duplicate', ClientTags.TAG_DISPLAY_STORAGE ) )
+        
+        # returned sets are copies, so editing them cannot hurt the manager
+        
+        tags_manager.GetCurrent( self._first_key, ClientTags.TAG_DISPLAY_STORAGE ).add( 'not a real tag' )
+        
+        self.assertNotIn( 'not a real tag', tags_manager.GetCurrent( self._first_key, ClientTags.TAG_DISPLAY_STORAGE ) )
+        
+    
+    def test_generate_from_tag_ids( self ):
+        
+        tag_id_table = ClientMediaManagers.TagIdTable.instance()
+        
+        storage_tag_ids = tag_id_table.GetTagIds( { 'series:blame!', 'creator:tsutomu nihei' } )
+        display_tag_ids = tag_id_table.GetTagIds( { 'series:blame!', 'creator:tsutomu nihei', 'series:sci-fi' } )
+        
+        tags_manager = ClientMediaManagers.TagsManager.STATICGenerateFromTagIds( { self._first_key : { HC.CONTENT_STATUS_CURRENT : storage_tag_ids } }, { self._first_key : { HC.CONTENT_STATUS_CURRENT : display_tag_ids } } )
+        
+        self.assertEqual( tags_manager.GetCurrent( self._first_key, ClientTags.TAG_DISPLAY_STORAGE ), { 'series:blame!', 'creator:tsutomu nihei' } )
+        self.assertEqual( tags_manager.GetCurrent( CC.COMBINED_TAG_SERVICE_KEY, ClientTags.TAG_DISPLAY_DISPLAY_ACTUAL ), { 'series:blame!', 'creator:tsutomu nihei', 'series:sci-fi' } )
+        self.assertEqual( tags_manager.GetCurrent( self._second_key, ClientTags.TAG_DISPLAY_STORAGE ), set() )
+        
+    
     def test_get_current( self ):
         
         self.assertEqual( self._tags_manager.GetCurrent( self._first_key, ClientTags.TAG_DISPLAY_STORAGE ), { 'current', '\u2835', 'creator:tsutomu nihei', 'series:blame!', 'title:test title', 'volume:3', 'chapter:2', 'page:1' } )
@@ -488,3 +525,375 @@ class TestTagRendering( unittest.TestCase ):
         TG.test_controller.new_options.SetBoolean( 'show_namespaces', True )
         
     
+
+class TestTagAutocompleteIndex( unittest.TestCase ):
+    
+    def _do_top_k_maintenance( self, min_rank ):
+        
+        # a small k so the cached top lists fill up, overflow and get invalidated, checked against a dumb scan
+        
+        r = random.Random( min_rank )
+        
+        words = [ 'samus', 'sam', 'samurai', 'aran', 'blue', 'bl', 'sky', 'a' ]
+        
+        tag_ids_to_texts = {}
+        
+        for tag_id in range( 1, 201 ):
+            
+            tag_ids_to_texts[ tag_id ] = ( r.randint( 1, 3 ), ' '.join( r.sample( words, r.randint( 1, 3 ) ) ) )
+            
+        
+        tag_ids_to_counts = { tag_id : r.randint( 1, 20 ) for tag_id in range( 1, 101 ) }
+        
+        rows = [ ( tag_id, namespace_id, searchable_subtag, tag_ids_to_counts[ tag_id ], 0 ) for ( tag_id, ( namespace_id, searchable_subtag ) ) in tag_ids_to_texts.items() if tag_ids_to_counts.get( tag_id, 0 ) >= min_rank ]
+        
+        autocomplete_index = ClientTagsAutocompleteIndex.TagAutocompleteIndex( rows = rows, min_rank = min_rank, top_k = 5 )
+        
+        def get_expected( prefix, namespace_id ):
+            
+            matching_tag_ids = []
+            
+            for ( tag_id, count ) in tag_ids_to_counts.items():
+                
+                if count < min_rank:
+                    
+                    continue
+                    
+                
+                ( tag_namespace_id, searchable_subtag ) = tag_ids_to_texts[ tag_id ]
+                
+                if namespace_id is not None and tag_namespace_id != namespace_id:
+                    
+                    continue
+                    
+                
+                if True in ( key.startswith( prefix ) for key in ClientTagsAutocompleteIndex.GenerateKeys( searchable_subtag ) ):
+                    
+                    matching_tag_ids.append( tag_id )
+                    
+                
+            
+            matching_tag_ids.sort( key = lambda tag_id: ( - tag_ids_to_counts[ tag_id ], tag_id ) )
+            
+            return matching_tag_ids[ : 5 ]
+            
+        
+        prefixes = [ 's', 'sa', 'sam', 'samu', 'samus', 'samus a', 'a', 'ar', 'b', 'bl', 'sk' ]
+        
+        for i in range( 300 ):
+            
+            tag_id = r.randint( 1, 200 )
+            
+            if tag_id in tag_ids_to_counts and r.random() < 0.5:
+                
+                delta = r.randint( 1, tag_ids_to_counts[ tag_id ] )
+                
+                autocomplete_index.ReduceCounts( [ ( tag_id, delta, 0 ) ] )
+                
+                tag_ids_to_counts[ tag_id ] -= delta
+                
+                if tag_ids_to_counts[ tag_id ] == 0:
+                    
+                    del tag_ids_to_counts[ tag_id ]
+                    
+                
+            else:
+                
+                delta = r.randint( 1, 10 )
+                
+                autocomplete_index.AddCounts( [ ( tag_id, delta, 0 ) ] )
+                
+                tag_ids_to_counts[ tag_id ] = tag_ids_to_counts.get( tag_id, 0 ) + delta
+                
+            
+            tag_ids_to_check = autocomplete_index.GetTagIdsToCheck()
+            
+            if len( tag_ids_to_check ) > 0 and r.random() < 0.5:
+                
+                autocomplete_index.AddCheckedRows( tag_ids_to_check, [ ( tag_id, ) + tag_ids_to_texts[ tag_id ] + ( tag_ids_to_counts[ tag_id ], 0 ) for tag_id in tag_ids_to_check if tag_id in tag_ids_to_counts ] )
+                
+            
+            if len( autocomplete_index.GetTagIdsToCheck() ) == 0:
+                
+                for prefix in prefixes:
+                    
+                    for namespace_id in ( None, 1 ):
+                        
+                        self.assertEqual( autocomplete_index.GetTopTagIds( prefix, namespace_id = namespace_id ), get_expected( prefix, namespace_id ), msg = ( i, prefix, namespace_id ) )
+                        
+                    
+                
+            
+        
+    
+    def test_lookups( self ):
+        
+        # ( tag_id, namespace_id, searchable_subtag, current_count, pending_count )
+        
+        rows = [
+            ( 1, 1, 'samus aran', 50, 0 ),
+            ( 2, 2, 'samus aran', 10, 5 ),
+            ( 3, 1, 'samurai', 20, 0 ),
+            ( 4, 1, 'aran_ryan', 30, 0 ),
+            ( 5, 1, 'blue sky', 1, 0 )
+        ]
+        
+        autocomplete_index = ClientTagsAutocompleteIndex.TagAutocompleteIndex( rows = rows, top_k = 10 )
+        
+        self.assertEqual( autocomplete_index.GetNumTags(), 5 )
+        
+        self.assertEqual( autocomplete_index.GetTopTagIds( 'sam' ), [ 1, 3, 2 ] )
+        self.assertEqual( autocomplete_index.GetTopTagIds( 'sam', limit = 2 ), [ 1, 3 ] )
+        self.assertEqual( autocomplete_index.GetTopTagIds( 'sam', namespace_id = 2 ), [ 2 ] )
+        self.assertEqual( autocomplete_index.GetTopTagIds( 'samus ar' ), [ 1, 2 ] )
+        self.assertEqual( autocomplete_index.GetTopTagIds( 'samus_ar' ), [] )
+        
+        # any word start matches, and punctuation splits words like fts4
+        
+        self.assertEqual( autocomplete_index.GetTopTagIds( 'ar' ), [ 1, 4, 2 ] )
+        self.assertEqual( autocomplete_index.GetTopTagIds( ClientTagsAutocompleteIndex.ConvertSearchableSubtagToPrefixKey( 'aran_r' ) ), [ 4 ] )
+        self.assertEqual( autocomplete_index.GetTopTagIds( 'ry' ), [ 4 ] )
+        self.assertEqual( autocomplete_index.GetTopTagIds( 'x' ), [] )
+        
+        self.assertEqual( ClientTagsAutocompleteIndex.ConvertSearchableSubtagToPrefixKey( '__' ), None )
+        
+        # counts move things about
+        
+        autocomplete_index.AddCounts( [ ( 3, 100, 0 ) ] )
+        autocomplete_index.ReduceCounts( [ ( 1, 50, 0 ) ] )
+        
+        self.assertEqual( autocomplete_index.GetNumTags(), 4 )
+        self.assertEqual( autocomplete_index.GetTopTagIds( 'sam' ), [ 3, 2 ] )
+        self.assertEqual( autocomplete_index.GetTopTagIds( 'ar' ), [ 4, 2 ] )
+        
+        # a new tag waits for the owner to look it up
+        
+        autocomplete_index.AddCounts( [ ( 6, 1000, 0 ) ] )
+        
+        self.assertEqual( autocomplete_index.GetTagIdsToCheck(), { 6 } )
+        self.assertEqual( autocomplete_index.GetTopTagIds( 'sam' ), [ 3, 2 ] )
+        
+        autocomplete_index.AddCheckedRows( { 6 }, [ ( 6, 1, 'samus', 1000, 0 ) ] )
+        
+        self.assertEqual( autocomplete_index.GetTagIdsToCheck(), set() )
+        self.assertEqual( autocomplete_index.GetTopTagIds( 'sam' ), [ 6, 3, 2 ] )
+        
+        # and one that has gone by the time we look is forgotten
+        
+        autocomplete_index.AddCounts( [ ( 7, 1, 0 ) ] )
+        autocomplete_index.ReduceCounts( [ ( 7, 1, 0 ) ] )
+        
+        autocomplete_index.AddCheckedRows( { 7 }, [] )
+        
+        self.assertEqual( autocomplete_index.GetTagIdsToCheck(), set() )
+        self.assertEqual( autocomplete_index.GetNumTags(), 5 )
+        
+    
+    def test_min_rank( self ):
+        
+        # the owner only gives us the tags with at least 10
+        
+        rows = [
+            ( 1, 1, 'samus aran', 50, 0 ),
+            ( 2, 1, 'samurai', 10, 0 )
+        ]
+        
+        autocomplete_index = ClientTagsAutocompleteIndex.TagAutocompleteIndex( rows = rows, min_rank = 10, top_k = 10 )
+        
+        self.assertEqual( autocomplete_index.GetTopTagIds( 'sam' ), [ 1, 2 ] )
+        
+        # something we don't index goes up, but not enough
+        
+        autocomplete_index.AddCounts( [ ( 3, 1, 0 ) ] )
+        
+        self.assertEqual( autocomplete_index.GetTagIdsToCheck(), { 3 } )
+        
+        autocomplete_index.AddCheckedRows( { 3 }, [ ( 3, 1, 'samson', 5, 0 ) ] )
+        
+        self.assertEqual( autocomplete_index.GetTopTagIds( 'sam' ), [ 1, 2 ] )
+        
+        # and now enough
+        
+        autocomplete_index.AddCounts( [ ( 3, 20, 0 ) ] )
+        autocomplete_index.AddCheckedRows( { 3 }, [ ( 3, 1, 'samson', 25, 0 ) ] )
+        
+        self.assertEqual( autocomplete_index.GetTopTagIds( 'sam' ), [ 1, 3, 2 ] )
+        
+        # an indexed tag that falls below the line might be beaten by something we don't know about, so we don't give it
+        
+        autocomplete_index.ReduceCounts( [ ( 2, 5, 0 ) ] )
+        
+        self.assertEqual( autocomplete_index.GetTopTagIds( 'sam' ), [ 1, 3 ] )
+        self.assertEqual( autocomplete_index.GetTopTagIds( 'samu' ), [ 1 ] )
+        
+    
+    def test_top_k_maintenance( self ):
+        
+        self._do_top_k_maintenance( 1 )
+        self._do_top_k_maintenance( 8 )
+        
+    
+
+class TestTagsLookupIndex( unittest.TestCase ):
+    
+    def test_parents( self ):
+        
+        # 1 -> 2 -> 3, 4 -> 3, 5 alone, stored as the full transitive closure like the lookup table
+        
+        lookup_index = ClientTagsLookupIndex.TagParentsLookupIndex( [ ( 1, 2 ), ( 1, 3 ), ( 2, 3 ), ( 4, 3 ) ] )
+        
+        self.assertEqual( lookup_index.GetNumRows(), 4 )
+        self.assertEqual( lookup_index.GetAllTagIds(), { 1, 2, 3, 4 } )
+        self.assertEqual( lookup_index.FilterChained( [ 1, 3, 5 ] ), { 1, 3 } )
+        
+        self.assertTrue( lookup_index.IsChained( 3 ) )
+        self.assertFalse( lookup_index.IsChained( 5 ) )
+        
+        self.assertEqual( lookup_index.GetAncestors( 1 ), { 2, 3 } )
+        self.assertEqual( lookup_index.GetAncestors( 3 ), set() )
+        self.assertEqual( lookup_index.GetDescendants( 3 ), { 1, 2, 4 } )
+        
+        self.assertEqual( lookup_index.GetTagsToAncestors( [ 1, 4, 5 ] ), { 1 : { 2, 3 }, 4 : { 3 }, 5 : set() } )
+        self.assertEqual( lookup_index.GetTagsToDescendants( [ 2, 3 ] ), { 2 : { 1 }, 3 : { 1, 2, 4 } } )
+        
+        self.assertEqual( lookup_index.GetChainsMembers( [ 1 ] ), { 1, 2, 3, 4 } )
+        self.assertEqual( lookup_index.GetChainsMembers( [ 5 ] ), { 5 } )
+        
+        # duplicate rows are ignored, like INSERT OR IGNORE
+        
+        lookup_index.AddPairs( [ ( 1, 2 ), ( 5, 3 ) ] )
+        
+        self.assertEqual( lookup_index.GetNumRows(), 5 )
+        self.assertEqual( lookup_index.GetDescendants( 3 ), { 1, 2, 4, 5 } )
+        
+        lookup_index.DeletePairs( [ ( 4, 3 ), ( 4, 2 ) ] )
+        
+        self.assertEqual( lookup_index.GetNumRows(), 4 )
+        self.assertEqual( lookup_index.GetDescendants( 3 ), { 1, 2, 5 } )
+        self.assertFalse( lookup_index.IsChained( 4 ) )
+        
+        # WHERE child_tag_id = ? OR ancestor_tag_id = ?
+        
+        lookup_index.DeleteTagIds( [ 2 ] )
+        
+        self.assertEqual( lookup_index.GetAncestors( 1 ), { 3 } )
+        self.assertEqual( lookup_index.GetDescendants( 3 ), { 1, 5 } )
+        self.assertEqual( lookup_index.GetAllTagIds(), { 1, 3, 5 } )
+        
+    
+    def test_random_changes_match_rebuild( self ):
+        
+        r = random.Random( 0 )
+        
+        sibling_rows = {}
+        parent_rows = set()
+        
+        sibling_lookup_index = ClientTagsLookupIndex.TagSiblingsLookupIndex()
+        parent_lookup_index = ClientTagsLookupIndex.TagParentsLookupIndex()
+        
+        for i in range( 2000 ):
+            
+            ( a, b ) = ( r.randint( 1, 60 ), r.randint( 1, 60 ) )
+            
+            action = r.random()
+            
+            if action < 0.5:
+                
+                if a not in sibling_rows:
+                    
+                    sibling_rows[ a ] = b
+                    
+                
+                sibling_lookup_index.AddPairs( [ ( a, b ) ] )
+                
+                parent_rows.add( ( a, b ) )
+                
+                parent_lookup_index.AddPairs( [ ( a, b ) ] )
+                
+            elif action < 0.8:
+                
+                if sibling_rows.get( a, None ) == b:
+                    
+                    del sibling_rows[ a ]
+                    
+                
+                sibling_lookup_index.DeletePairs( [ ( a, b ) ] )
+                
+                parent_rows.discard( ( a, b ) )
+                
+                parent_lookup_index.DeletePairs( [ ( a, b ) ] )
+                
+            else:
+                
+                sibling_rows = { bad : ideal for ( bad, ideal ) in sibling_rows.items() if a not in ( bad, ideal ) }
+                
+                sibling_lookup_index.DeleteTagIds( [ a ] )
+                
+                parent_rows = { ( child, ancestor ) for ( child, ancestor ) in parent_rows if a not in ( child, ancestor ) }
+                
+                parent_lookup_index.DeleteTagIds( [ a ] )
+                
+            
+        
+        all_tag_ids = list( range( 1, 61 ) )
+        
+        fresh_sibling_lookup_index = ClientTagsLookupIndex.TagSiblingsLookupIndex( sibling_rows.items() )
+        fresh_parent_lookup_index = ClientTagsLookupIndex.TagParentsLookupIndex( parent_rows )
+        
+        self.assertEqual( sibling_lookup_index.GetNumRows(), len( sibling_rows ) )
+        self.assertEqual( sibling_lookup_index.GetAllTagIds(), fresh_sibling_lookup_index.GetAllTagIds() )
+        self.assertEqual( sibling_lookup_index.GetTagIdsToIdealTagIds( all_tag_ids ), { tag_id : sibling_rows.get( tag_id, tag_id ) for tag_id in all_tag_ids } )
+        self.assertEqual( sibling_lookup_index.GetIdealTagIdsToChains( all_tag_ids ), fresh_sibling_lookup_index.GetIdealTagIdsToChains( all_tag_ids ) )
+        
+        self.assertEqual( parent_lookup_index.GetNumRows(), len( parent_rows ) )
+        self.assertEqual( parent_lookup_index.GetAllTagIds(), fresh_parent_lookup_index.GetAllTagIds() )
+        self.assertEqual( parent_lookup_index.GetTagsToAncestors( all_tag_ids ), { tag_id : { ancestor for ( child, ancestor ) in parent_rows if child == tag_id } for tag_id in all_tag_ids } )
+        self.assertEqual( parent_lookup_index.GetTagsToDescendants( all_tag_ids ), { tag_id : { child for ( child, ancestor ) in parent_rows if ancestor == tag_id } for tag_id in all_tag_ids } )
+        
+        for tag_id in all_tag_ids:
+            
+            self.assertEqual( parent_lookup_index.GetChainsMembers( [ tag_id ] ), fresh_parent_lookup_index.GetChainsMembers( [ tag_id ] ) )
+            
+        
+    
+    def test_siblings( self ):
+        
+        # 1 -> 3, 2 -> 3, 4 -> 5
+        
+        lookup_index = ClientTagsLookupIndex.TagSiblingsLookupIndex( [ ( 1, 3 ), ( 2, 3 ), ( 4, 5 ) ] )
+        
+        self.assertEqual( lookup_index.GetNumRows(), 3 )
+        self.assertEqual( lookup_index.GetAllTagIds(), { 1, 2, 3, 4, 5 } )
+        self.assertEqual( lookup_index.FilterChained( [ 1, 3, 6 ] ), { 1, 3 } )
+        
+        self.assertTrue( lookup_index.IsChained( 3 ) )
+        self.assertFalse( lookup_index.IsChained( 6 ) )
+        
+        self.assertEqual( lookup_index.GetIdealTagId( 1 ), 3 )
+        self.assertEqual( lookup_index.GetIdealTagId( 6 ), 6 )
+        self.assertEqual( lookup_index.GetIdealTagIds( [ 1, 2, 4, 6 ] ), { 3, 5, 6 } )
+        self.assertEqual( lookup_index.GetTagIdsToIdealTagIds( [ 1, 3, 6 ] ), { 1 : 3, 3 : 3, 6 : 6 } )
+        
+        self.assertEqual( lookup_index.GetChainsMembersFromIdeals( [ 3, 6 ] ), { 1, 2, 3, 6 } )
+        self.assertEqual( dict( lookup_index.GetIdealTagIdsToChains( [ 3, 5 ] ) ), { 3 : { 1, 2, 3 }, 5 : { 4, 5 } } )
+        
+        # bad_tag_id is the primary key, so a second ideal for the same bad tag is ignored
+        
+        lookup_index.AddPairs( [ ( 1, 5 ), ( 6, 5 ) ] )
+        
+        self.assertEqual( lookup_index.GetIdealTagId( 1 ), 3 )
+        self.assertEqual( lookup_index.GetChainsMembersFromIdeals( [ 5 ] ), { 4, 5, 6 } )
+        
+        lookup_index.DeletePairs( [ ( 1, 5 ), ( 1, 3 ) ] )
+        
+        self.assertEqual( lookup_index.GetIdealTagId( 1 ), 1 )
+        self.assertEqual( lookup_index.GetChainsMembersFromIdeals( [ 3 ] ), { 2, 3 } )
+        
+        # WHERE bad_tag_id = ? OR ideal_tag_id = ?
+        
+        lookup_index.DeleteTagIds( [ 5 ] )
+        
+        self.assertEqual( lookup_index.GetNumRows(), 1 )
+        self.assertEqual( lookup_index.GetAllTagIds(), { 2, 3 } )
+        
+    
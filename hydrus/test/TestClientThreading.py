@@ -1,6 +1,10 @@
+import random
+import threading
 import time
 import unittest
 
+from hydrus.core import HydrusThreading
+
 from hydrus.client import ClientThreading
 
 from hydrus.test import TestGlobals as TG
@@ -32,6 +36,211 @@ def do_write_job( rwlock, result_list, name ):
         
     
 
+class TestCallToThreadPool( unittest.TestCase ):
+    
+    def _wait_for( self, test_callable ):
+        
+        started = time.perf_counter()
+        
+        while not test_callable() and time.perf_counter() - started < 5:
+            
+            time.sleep( 0.01 )
+            
+        
+        self.assertTrue( test_callable() )
+        
+    
+    def test_priorities_and_caps( self ):
+        
+        priorities_to_max_working = {
+            HydrusThreading.CALL_TO_THREAD_PRIORITY_INTERACTIVE : 4,
+            HydrusThreading.CALL_TO_THREAD_PRIORITY_NORMAL : 3,
+            HydrusThreading.CALL_TO_THREAD_PRIORITY_BACKGROUND : 1
+        }
+        
+        pool = HydrusThreading.CallToThreadPool( TG.test_controller, max_threads = 4, priorities_to_max_working = priorities_to_max_working )
+        
+        release = threading.Event()
+        
+        result_list = []
+        
+        def do_it( name ):
+            
+            release.wait( 5 )
+            
+            result_list.append( name )
+            
+        
+        try:
+            
+            for i in range( 3 ):
+                
+                pool.Submit( HydrusThreading.CALL_TO_THREAD_PRIORITY_BACKGROUND, do_it, 'background {}'.format( i ) )
+                
+            
+            for i in range( 3 ):
+                
+                pool.Submit( HydrusThreading.CALL_TO_THREAD_PRIORITY_NORMAL, do_it, 'normal {}'.format( i ) )
+                
+            
+            # one background and two normal are working, everything else waits
+            
+            self._wait_for( lambda: pool.GetStatus()[1] == 3 )
+            
+            ( num_threads, num_working, priorities_to_num_waiting, priorities_to_latencies ) = pool.GetStatus()
+            
+            self.assertEqual( num_working, 3 )
+            self.assertEqual( priorities_to_num_waiting[ HydrusThreading.CALL_TO_THREAD_PRIORITY_BACKGROUND ], 2 )
+            self.assertEqual( priorities_to_num_waiting[ HydrusThreading.CALL_TO_THREAD_PRIORITY_NORMAL ], 1 )
+            
+            # the interactive job goes straight past all that
+            
+            pool.Submit( HydrusThreading.CALL_TO_THREAD_PRIORITY_INTERACTIVE, result_list.append, 'interactive' )
+            
+            self._wait_for( lambda: 'interactive' in result_list )
+            
+            release.set()
+            
+            self._wait_for( lambda: len( result_list ) == 7 )
+            
+            # the background cap is one, so they went one at a time, in order
+            
+            self.assertEqual( result_list[0], 'interactive' )
+            self.assertLess( result_list.index( 'background 0' ), result_list.index( 'background 1' ) )
+            self.assertLess( result_list.index( 'background 1' ), result_list.index( 'background 2' ) )
+            
+            ( num_threads, num_working, priorities_to_num_waiting, priorities_to_latencies ) = pool.GetStatus()
+            
+            self.assertEqual( num_working, 0 )
+            self.assertEqual( sum( priorities_to_num_waiting.values() ), 0 )
+            self.assertLessEqual( num_threads, 4 )
+            self.assertIn( HydrusThreading.CALL_TO_THREAD_PRIORITY_INTERACTIVE, priorities_to_latencies )
+            
+            pool.CullIdleWorkers()
+            
+            self._wait_for( lambda: len( pool.GetWorkers() ) == 0 )
+            
+        finally:
+            
+            release.set()
+            
+            pool.Shutdown()
+            
+        
+    
+    def test_nested_call( self ):
+        
+        # a job waiting on a job it spawned should never deadlock, even when the pool is full
+        
+        pool = HydrusThreading.CallToThreadPool( TG.test_controller, max_threads = 1 )
+        
+        result_list = []
+        
+        def do_child():
+            
+            result_list.append( 'child' )
+            
+        
+        def do_parent():
+            
+            pool.Submit( HydrusThreading.CALL_TO_THREAD_PRIORITY_NORMAL, do_child )
+            
+            started = time.perf_counter()
+            
+            while 'child' not in result_list and time.perf_counter() - started < 5:
+                
+                time.sleep( 0.01 )
+                
+            
+            result_list.append( 'parent' )
+            
+        
+        try:
+            
+            pool.Submit( HydrusThreading.CALL_TO_THREAD_PRIORITY_NORMAL, do_parent )
+            
+            self._wait_for( lambda: 'parent' in result_list )
+            
+            self.assertEqual( result_list, [ 'child', 'parent' ] )
+            
+        finally:
+            
+            pool.Shutdown()
+            
+        
+    
+    def test_nested_call_behind_cap( self ):
+        
+        # when the parents fill the cap and more are queued, a child must not wait behind those queued parents, even if there are idle workers
+        
+        priorities_to_max_working = {
+            HydrusThreading.CALL_TO_THREAD_PRIORITY_INTERACTIVE : 8,
+            HydrusThreading.CALL_TO_THREAD_PRIORITY_NORMAL : 8,
+            HydrusThreading.CALL_TO_THREAD_PRIORITY_BACKGROUND : 2
+        }
+        
+        pool = HydrusThreading.CallToThreadPool( TG.test_controller, max_threads = 8, priorities_to_max_working = priorities_to_max_working )
+        
+        release = threading.Event()
+        
+        warm_up_list = []
+        result_list = []
+        
+        def do_warm_up():
+            
+            release.wait( 5 )
+            
+            warm_up_list.append( 'done' )
+            
+        
+        def do_parent( name ):
+            
+            child_list = []
+            
+            pool.Submit( HydrusThreading.CALL_TO_THREAD_PRIORITY_BACKGROUND, child_list.append, 'child' )
+            
+            started = time.perf_counter()
+            
+            while len( child_list ) == 0 and time.perf_counter() - started < 5:
+                
+                time.sleep( 0.01 )
+                
+            
+            result_list.append( ( name, len( child_list ) == 1 ) )
+            
+        
+        try:
+            
+            # get some workers sitting idle
+            
+            for i in range( 4 ):
+                
+                pool.Submit( HydrusThreading.CALL_TO_THREAD_PRIORITY_NORMAL, do_warm_up )
+                
+            
+            self._wait_for( lambda: pool.GetStatus()[1] == 4 )
+            
+            release.set()
+            
+            self._wait_for( lambda: len( warm_up_list ) == 4 and pool.GetStatus()[1] == 0 )
+            
+            for i in range( 4 ):
+                
+                pool.Submit( HydrusThreading.CALL_TO_THREAD_PRIORITY_BACKGROUND, do_parent, 'parent {}'.format( i ) )
+                
+            
+            self._wait_for( lambda: len( result_list ) == 4 )
+            
+            self.assertEqual( sorted( result_list ), [ ( 'parent {}'.format( i ), True ) for i in range( 4 ) ] )
+            
+        finally:
+            
+            release.set()
+            
+            pool.Shutdown()
+            
+        
+    
 class TestFileRWLock( unittest.TestCase ):
     
     def test_simple( self ):
@@ -197,3 +406,97 @@ class TestFileRWLock( unittest.TestCase ):
                 
             
         
+    
+class TestJobScheduler( unittest.TestCase ):
+    
+    def test_ordering_and_cancel( self ):
+        
+        # not started, so we can look at the queue without anything firing
+        
+        scheduler = HydrusThreading.JobScheduler( TG.test_controller )
+        
+        jobs = [ HydrusThreading.SingleJob( TG.test_controller, scheduler, 1000 + i, lambda: None ) for i in range( 200 ) ]
+        
+        shuffled_jobs = list( jobs )
+        
+        random.shuffle( shuffled_jobs )
+        
+        for job in shuffled_jobs:
+            
+            scheduler.AddJob( job )
+            
+        
+        self.assertEqual( scheduler.GetJobs(), jobs )
+        
+        for job in jobs[ : 150 ]:
+            
+            job.Cancel()
+            
+        
+        self.assertEqual( scheduler.GetJobs(), jobs[ 150 : ] )
+        
+        # cancelled entries were cleared out of the heap along the way
+        
+        self.assertLess( len( scheduler._waiting ), 150 )
+        
+        jobs[199].Wake( jobs[150].GetNextWorkTime() - 1 )
+        jobs[150].Delay( 5000 )
+        
+        self.assertEqual( scheduler.GetJobs(), [ jobs[199] ] + jobs[ 151 : 199 ] + [ jobs[150] ] )
+        
+        self.assertEqual( scheduler.GetCurrentJobSummary(), '50 jobs' )
+        
+        for job in jobs:
+            
+            job.Cancel()
+            
+        
+        self.assertEqual( scheduler.GetJobs(), [] )
+        self.assertTrue( scheduler._NoWorkToStart() )
+        
+    
+    def test_prompt_wakeup( self ):
+        
+        # a far-off job should not stop the scheduler noticing a new earlier one
+        
+        far_job = TG.test_controller.CallLater( 3600, lambda: None )
+        
+        time.sleep( 0.1 )
+        
+        result_list = []
+        
+        started = time.perf_counter()
+        
+        job = TG.test_controller.CallLater( 0.05, result_list.append, 'done' )
+        
+        while not job.IsWorkComplete() and time.perf_counter() - started < 5:
+            
+            time.sleep( 0.01 )
+            
+        
+        self.assertEqual( result_list, [ 'done' ] )
+        self.assertLess( time.perf_counter() - started, 0.5 )
+        
+        # and waking a far-off job gets it going now, not on the next poll
+        
+        result_list = []
+        
+        job = TG.test_controller.CallLater( 3600, result_list.append, 'woke' )
+        
+        time.sleep( 0.1 )
+        
+        started = time.perf_counter()
+        
+        job.Wake()
+        
+        while not job.IsWorkComplete() and time.perf_counter() - started < 5:
+            
+            time.sleep( 0.01 )
+            
+        
+        self.assertEqual( result_list, [ 'woke' ] )
+        self.assertLess( time.perf_counter() - started, 0.5 )
+        
+        far_job.Cancel()
+        
+    
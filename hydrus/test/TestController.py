@@ -46,6 +46,7 @@ from hydrus.client.networking import ClientNetworkingSessions
 from hydrus.server import ServerGlobals as SG
 
 from hydrus.test import TestClientAPI
+from hydrus.test import TestClientBenchmarks
 from hydrus.test import TestClientConstants
 from hydrus.test import TestClientDaemons
 from hydrus.test import TestClientDB
@@ -311,6 +312,7 @@ class Controller( object ):
         
         self._managers[ 'undo' ] = ClientManagers.UndoManager( self )
         
+        self.render_disk_cache = ClientCaches.RenderDiskCache( self, os.path.join( self.db_dir, 'client_render_cache' ) )
         self.images_cache = ClientCaches.ImageRendererCache( self )
         self.image_tiles_cache = ClientCaches.ImageTileCache( self )
         self.thumbnails_cache = ClientCaches.ThumbnailCache( self )
@@ -450,6 +452,8 @@ class Controller( object ):
         call_to_thread.put( callable, *args, **kwargs )
         
     
+    CallToThreadBackground = CallToThread
+    CallToThreadInteractive = CallToThread
     CallToThreadLongRunning = CallToThread
     
     def CallAfterQtSafe( self, window, label, func, *args, **kwargs ):
@@ -891,6 +895,11 @@ class Controller( object ):
         
         module_lookup[ 'all' ] = sorted( HydrusLists.MassUnion( module_lookup.values() ), key = lambda d: d.__name__ )
         
+        # slow, and they report numbers more than they test anything, so not part of 'all'
+        module_lookup[ 'benchmark' ] = [
+            TestClientBenchmarks
+        ]
+        
         if run_all:
             
             modules = module_lookup[ 'all' ]
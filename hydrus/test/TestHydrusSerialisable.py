@@ -1,7 +1,11 @@
+import json
 import unittest
+import zlib
 
+from hydrus.core import HydrusCompression
 from hydrus.core import HydrusConstants as HC
 from hydrus.core import HydrusData
+from hydrus.core import HydrusExceptions
 from hydrus.core import HydrusSerialisable
 from hydrus.core import HydrusTags
 from hydrus.core import HydrusTime
@@ -11,6 +15,7 @@ from hydrus.client import ClientConstants as CC
 from hydrus.client import ClientDefaults
 from hydrus.client.duplicates import ClientDuplicates
 from hydrus.client.gui import ClientGUIShortcuts
+from hydrus.client.importing import ClientImportFileSeeds
 from hydrus.client.importing import ClientImportSubscriptions
 from hydrus.client.importing import ClientImportSubscriptionQuery
 from hydrus.client.importing.options import ClientImportOptions
@@ -24,6 +29,234 @@ from hydrus.client.search import ClientSearchPredicate
 from hydrus.test import HelperFunctions as HF
 from hydrus.test import TestController as TC
 
+class TestCompression( unittest.TestCase ):
+    
+    def test_framed_round_trip( self ):
+        
+        payload = bytes( '[[2, [57, 8, [1, "https://example.com/post/123", "https://example.com/post/123", null, {{}}, [], [77, 1, []], [], [], [], [], [["sha256", "{}"]]]]]]'.format( '0' * 64 ), 'utf-8' ) * 20
+        
+        codecs = [ HydrusCompression.CODEC_ZLIB ]
+        
+        if HydrusCompression.LZ4_OK:
+            
+            codecs.append( HydrusCompression.CODEC_LZ4 )
+            
+        
+        if HydrusCompression.ZSTD_OK:
+            
+            codecs.append( HydrusCompression.CODEC_ZSTD )
+            
+        
+        for codec in codecs:
+            
+            for dictionary_id in ( HydrusCompression.DICTIONARY_NONE, HydrusCompression.DICTIONARY_IMPORT_LOGS ):
+                
+                compressed_bytes = HydrusCompression.CompressBytesToFramedBytes( payload, codec = codec, dictionary_id = dictionary_id )
+                
+                self.assertTrue( HydrusCompression.IsFramedBytes( compressed_bytes ) )
+                self.assertLess( len( compressed_bytes ), len( payload ) )
+                
+                self.assertEqual( HydrusCompression.DecompressFramedBytesToBytes( compressed_bytes ), payload )
+                self.assertEqual( HydrusCompression.DecompressBytesToBytes( compressed_bytes ), payload )
+                
+            
+        
+        self.assertEqual( HydrusCompression.DecompressBytesToString( HydrusCompression.CompressStringToFramedBytes( 'hello' ) ), 'hello' )
+        
+        # what we write by default has to stay readable without the optional libraries
+        self.assertNotEqual( HydrusCompression.GetDefaultCodec(), HydrusCompression.CODEC_ZSTD )
+        
+    
+    def test_dictionary_helps_small_objects( self ):
+        
+        payload = b'[2, [57, 8, [1, "https://example.com/post/show/123", "https://example.com/post/show/123", null, {}, [], [77, 1, []], [], [], ["creator:someone"], [], [["sha256", "'
+        
+        without_dictionary = HydrusCompression.CompressBytesToFramedBytes( payload, codec = HydrusCompression.CODEC_ZLIB )
+        with_dictionary = HydrusCompression.CompressBytesToFramedBytes( payload, codec = HydrusCompression.CODEC_ZLIB, dictionary_id = HydrusCompression.DICTIONARY_IMPORT_LOGS )
+        
+        self.assertLess( len( with_dictionary ), len( without_dictionary ) )
+        
+    
+    def test_legacy_payloads( self ):
+        
+        payload = b'legacy hydrus payload ' * 10
+        
+        self.assertFalse( HydrusCompression.IsFramedBytes( HydrusCompression.CompressBytesToBytes( payload ) ) )
+        self.assertEqual( HydrusCompression.DecompressBytesToBytes( zlib.compress( payload, 9 ) ), payload )
+        
+        if HydrusCompression.LZ4_OK:
+            
+            self.assertEqual( HydrusCompression.DecompressBytesToBytes( HydrusCompression.CompressFastBytesToBytes( payload ) ), payload )
+            
+        
+    
+    def test_bad_frames( self ):
+        
+        compressed_bytes = HydrusCompression.CompressBytesToFramedBytes( b'test', codec = HydrusCompression.CODEC_ZLIB, dictionary_id = HydrusCompression.DICTIONARY_IMPORT_LOGS )
+        
+        with self.assertRaises( ValueError ):
+            
+            HydrusCompression.DecompressFramedBytesToBytes( compressed_bytes[ : 5 ] )
+            
+        
+        # these are fine data we can't read here, which the db must not treat as broken
+        
+        future_frame = HydrusCompression.FRAME_MAGIC + bytes( ( HydrusCompression.FRAME_VERSION + 1, HydrusCompression.CODEC_ZLIB, 0 ) ) + zlib.compress( b'test' )
+        
+        with self.assertRaises( HydrusExceptions.UnsupportedCompressionException ):
+            
+            HydrusCompression.DecompressFramedBytesToBytes( future_frame )
+            
+        
+        unknown_dictionary_frame = HydrusCompression.FRAME_MAGIC + bytes( ( HydrusCompression.FRAME_VERSION, HydrusCompression.CODEC_ZLIB, 200 ) ) + zlib.compress( b'test' )
+        
+        with self.assertRaises( HydrusExceptions.UnsupportedCompressionException ):
+            
+            HydrusCompression.DecompressFramedBytesToBytes( unknown_dictionary_frame )
+            
+        
+        unknown_codec_frame = HydrusCompression.FRAME_MAGIC + bytes( ( HydrusCompression.FRAME_VERSION, 200, 0 ) ) + zlib.compress( b'test' )
+        
+        with self.assertRaises( HydrusExceptions.UnsupportedCompressionException ):
+            
+            HydrusCompression.DecompressFramedBytesToBytes( unknown_codec_frame )
+            
+        
+        with self.assertRaises( ValueError ):
+            
+            HydrusCompression.RegisterDictionary( HydrusCompression.DICTIONARY_IMPORT_LOGS, b'something else' )
+            
+        
+    
+
+class TestSerialisableBlocks( unittest.TestCase ):
+    
+    def _GetFileSeedCache( self, num_file_seeds ):
+        
+        file_seed_cache = ClientImportFileSeeds.FileSeedCache()
+        
+        file_seeds = []
+        
+        for i in range( num_file_seeds ):
+            
+            url = 'https://example.com/post/{}'.format( i )
+            
+            file_seed = ClientImportFileSeeds.FileSeed()
+            
+            file_seed.file_seed_data = url
+            file_seed.file_seed_data_for_comparison = url
+            
+            # the dumps include these, and they decide the block boundaries, so keep them fixed
+            file_seed.created = 1700000000
+            file_seed.modified = 1700000000
+            
+            file_seeds.append( file_seed )
+            
+        
+        file_seed_cache.AddFileSeeds( file_seeds )
+        
+        return file_seed_cache
+        
+    
+    def test_small_and_storeless_lists_are_inline( self ):
+        
+        file_seed_cache = self._GetFileSeedCache( 1000 )
+        
+        ( serialisable_type, version, ( list_type, list_version, list_info ) ) = file_seed_cache.GetSerialisableTuple()
+        
+        self.assertEqual( list_type, HydrusSerialisable.SERIALISABLE_TYPE_LIST )
+        
+        small_file_seed_cache = self._GetFileSeedCache( 10 )
+        
+        block_store = HydrusSerialisable.SerialisableBlockStore()
+        
+        with block_store:
+            
+            ( serialisable_type, version, ( list_type, list_version, list_info ) ) = small_file_seed_cache.GetSerialisableTuple()
+            
+        
+        self.assertEqual( list_type, HydrusSerialisable.SERIALISABLE_TYPE_LIST )
+        self.assertEqual( block_store.GetNewBlockDumps(), {} )
+        
+    
+    def test_round_trip( self ):
+        
+        file_seed_cache = self._GetFileSeedCache( 1000 )
+        
+        block_store = HydrusSerialisable.SerialisableBlockStore()
+        
+        with block_store:
+            
+            serialisable_tuple = file_seed_cache.GetSerialisableTuple()
+            
+        
+        ( serialisable_type, version, ( list_type, list_version, list_info ) ) = serialisable_tuple
+        
+        self.assertEqual( list_type, HydrusSerialisable.SERIALISABLE_TYPE_SERIALISABLE_LIST_BLOCKS )
+        
+        block_dumps = block_store.GetNewBlockDumps()
+        
+        self.assertGreater( len( block_dumps ), 1 )
+        self.assertEqual( HydrusSerialisable.GetBlockHashesFromSerialisableInfo( json.loads( json.dumps( serialisable_tuple ) ) ), set( block_dumps.keys() ) )
+        
+        def block_fetcher( block_hashes ):
+            
+            return { block_hash : json.loads( block_dumps[ block_hash ] ) for block_hash in block_hashes if block_hash in block_dumps }
+            
+        
+        with HydrusSerialisable.SerialisableBlockStore( block_fetcher = block_fetcher ):
+            
+            loaded_file_seed_cache = HydrusSerialisable.CreateFromSerialisableTuple( serialisable_tuple )
+            
+        
+        self.assertEqual( [ file_seed.file_seed_data for file_seed in loaded_file_seed_cache.GetFileSeeds() ], [ file_seed.file_seed_data for file_seed in file_seed_cache.GetFileSeeds() ] )
+        
+        with self.assertRaises( HydrusExceptions.SerialisationException ):
+            
+            HydrusSerialisable.CreateFromSerialisableTuple( serialisable_tuple )
+            
+        
+        with self.assertRaises( HydrusExceptions.SerialisationException ):
+            
+            with HydrusSerialisable.SerialisableBlockStore( block_fetcher = lambda block_hashes: {} ):
+                
+                HydrusSerialisable.CreateFromSerialisableTuple( serialisable_tuple )
+                
+            
+        
+    
+    def test_small_change_writes_few_blocks( self ):
+        
+        file_seed_cache = self._GetFileSeedCache( 5000 )
+        
+        block_store = HydrusSerialisable.SerialisableBlockStore()
+        
+        with block_store:
+            
+            file_seed_cache.GetSerialisableTuple()
+            
+        
+        old_block_hashes = set( block_store.GetNewBlockDumps().keys() )
+        
+        file_seed = file_seed_cache.GetFileSeeds()[ 2500 ]
+        
+        file_seed.note = 'changed'
+        
+        file_seed_cache.NotifyFileSeedsUpdated( ( file_seed, ) )
+        
+        block_store = HydrusSerialisable.SerialisableBlockStore()
+        
+        with block_store:
+            
+            file_seed_cache.GetSerialisableTuple()
+            
+        
+        new_block_hashes = set( block_store.GetNewBlockDumps().keys() )
+        
+        self.assertEqual( len( new_block_hashes.difference( old_block_hashes ) ), 1 )
+        
+    
+
 class TestSerialisables( unittest.TestCase ):
     
     def _dump_and_load_and_test( self, obj, test_func ):
@@ -3,6 +3,7 @@ import http.client
 import os
 import random
 import ssl
+import threading
 import time
 import typing
 import unittest
@@ -13,9 +14,13 @@ import twisted.internet.ssl
 from hydrus.core import HydrusConstants as HC
 from hydrus.core import HydrusData
 from hydrus.core import HydrusEncryption
+from hydrus.core import HydrusExceptions
 from hydrus.core import HydrusPaths
+from hydrus.core import HydrusSerialisable
+from hydrus.core import HydrusTemp
 from hydrus.core import HydrusTime
 from hydrus.core.networking import HydrusNetwork
+from hydrus.core.networking import HydrusNetworkBinaryUpdates
 from hydrus.core.networking import HydrusNetworking
 
 from hydrus.client import ClientServices
@@ -35,6 +40,258 @@ with open( os.path.join( HC.STATIC_DIR, 'hydrus_small.png' ), 'rb' ) as f_g:
     
     EXAMPLE_THUMBNAIL = f_g.read()
     
+class TestBinaryUpdates( unittest.TestCase ):
+    
+    def test_content_update( self ):
+        
+        content_update = HydrusNetwork.ContentUpdate()
+        
+        for i in range( 20 ):
+            
+            content_update.AddRow( ( HC.CONTENT_TYPE_MAPPINGS, HC.CONTENT_UPDATE_ADD, ( random.randint( 100, 1000 ), sorted( random.sample( range( 1, 100000 ), 50 ) ) ) ) )
+            
+        
+        content_update.AddRow( ( HC.CONTENT_TYPE_MAPPINGS, HC.CONTENT_UPDATE_DELETE, ( 5, [ 1, 2, 3 ] ) ) )
+        content_update.AddRow( ( HC.CONTENT_TYPE_FILES, HC.CONTENT_UPDATE_ADD, ( 12, 12345, HC.IMAGE_JPEG, 1700000000, 640, 480, None, None, None ) ) )
+        content_update.AddRow( ( HC.CONTENT_TYPE_FILES, HC.CONTENT_UPDATE_ADD, ( 13, 54321, HC.VIDEO_WEBM, 1700000001, 1920, 1080, 30000, 900, None ) ) )
+        content_update.AddRow( ( HC.CONTENT_TYPE_FILES, HC.CONTENT_UPDATE_DELETE, 14 ) )
+        content_update.AddRow( ( HC.CONTENT_TYPE_TAG_PARENTS, HC.CONTENT_UPDATE_ADD, ( 7, 8 ) ) )
+        content_update.AddRow( ( HC.CONTENT_TYPE_TAG_SIBLINGS, HC.CONTENT_UPDATE_DELETE, ( 9, 10 ) ) )
+        
+        update_bytes = HydrusNetworkBinaryUpdates.DumpUpdateToNetworkBytes( content_update, HydrusNetwork.UPDATE_FORMAT_BINARY )
+        
+        self.assertTrue( HydrusNetworkBinaryUpdates.IsBinaryUpdate( update_bytes ) )
+        self.assertFalse( HydrusNetworkBinaryUpdates.IsBinaryUpdate( content_update.DumpToNetworkBytes() ) )
+        
+        # full decode
+        
+        decoded_update = HydrusNetworkBinaryUpdates.CreateUpdateFromNetworkBytes( update_bytes )
+        
+        self.assertIsInstance( decoded_update, HydrusNetwork.ContentUpdate )
+        self.assertEqual( decoded_update.GetNumRows(), content_update.GetNumRows() )
+        
+        for content_type in ( HC.CONTENT_TYPE_FILES, HC.CONTENT_TYPE_MAPPINGS, HC.CONTENT_TYPE_TAG_PARENTS, HC.CONTENT_TYPE_TAG_SIBLINGS ):
+            
+            self.assertEqual( decoded_update.GetNumRows( ( content_type, ) ), content_update.GetNumRows( ( content_type, ) ) )
+            
+        
+        # streaming decode
+        
+        reader = HydrusNetworkBinaryUpdates.CreateUpdateFromNetworkBytes( update_bytes, streaming = True )
+        
+        self.assertIsInstance( reader, HydrusNetworkBinaryUpdates.BinaryContentUpdateReader )
+        self.assertEqual( reader.GetNumRows(), content_update.GetNumRows() )
+        
+        self.assertEqual( [ ( tag_id, list( hash_ids ) ) for ( tag_id, hash_ids ) in reader.GetNewMappings() ], [ ( tag_id, list( hash_ids ) ) for ( tag_id, hash_ids ) in content_update.GetNewMappings() ] )
+        self.assertEqual( list( reader.GetDeletedMappings() ), [ ( 5, [ 1, 2, 3 ] ) ] )
+        self.assertEqual( [ tuple( row ) for row in reader.GetNewFiles() ], [ tuple( row ) for row in content_update.GetNewFiles() ] )
+        self.assertEqual( list( reader.GetDeletedFiles() ), [ 14 ] )
+        self.assertEqual( [ tuple( row ) for row in reader.GetNewTagParents() ], [ ( 7, 8 ) ] )
+        self.assertEqual( [ tuple( row ) for row in reader.GetDeletedTagSiblings() ], [ ( 9, 10 ) ] )
+        self.assertEqual( list( reader.GetNewTagSiblings() ), [] )
+        
+        # json is still the default and still readable
+        
+        json_bytes = HydrusNetworkBinaryUpdates.DumpUpdateToNetworkBytes( content_update, HydrusNetwork.UPDATE_FORMAT_JSON )
+        
+        self.assertEqual( json_bytes, content_update.DumpToNetworkBytes() )
+        self.assertEqual( HydrusNetworkBinaryUpdates.CreateUpdateFromNetworkBytes( json_bytes, streaming = True ).GetNumRows(), content_update.GetNumRows() )
+        
+    
+    def test_definitions_update( self ):
+        
+        definitions_update = HydrusNetwork.DefinitionsUpdate()
+        
+        for i in range( 100, 200 ):
+            
+            definitions_update.AddRow( ( HC.DEFINITIONS_TYPE_TAGS, i, 'series:test ' + str( i ) ) )
+            definitions_update.AddRow( ( HC.DEFINITIONS_TYPE_HASHES, i + 500, HydrusData.GenerateKey() ) )
+            
+        
+        update_bytes = HydrusNetworkBinaryUpdates.DumpUpdateToNetworkBytes( definitions_update, HydrusNetwork.UPDATE_FORMAT_BINARY )
+        
+        self.assertLess( len( update_bytes ), len( definitions_update.DumpToNetworkBytes() ) )
+        
+        reader = HydrusNetworkBinaryUpdates.CreateUpdateFromNetworkBytes( update_bytes, streaming = True )
+        
+        self.assertIsInstance( reader, HydrusNetworkBinaryUpdates.BinaryDefinitionsUpdateReader )
+        self.assertEqual( reader.GetNumRows(), 200 )
+        
+        self.assertEqual( dict( reader.IterateHashIdsToHashes() ), dict( definitions_update.IterateHashIdsToHashes() ) )
+        self.assertEqual( dict( reader.IterateTagIdsToTags() ), dict( definitions_update.IterateTagIdsToTags() ) )
+        
+        decoded_update = HydrusNetworkBinaryUpdates.CreateUpdateFromNetworkBytes( update_bytes )
+        
+        self.assertEqual( decoded_update.GetHashIdsToHashes(), definitions_update.GetHashIdsToHashes() )
+        self.assertEqual( decoded_update.GetTagIdsToTags(), definitions_update.GetTagIdsToTags() )
+        
+    
+    def test_corrupt_update( self ):
+        
+        definitions_update = HydrusNetwork.DefinitionsUpdate()
+        
+        for i in range( 1, 1000 ):
+            
+            definitions_update.AddRow( ( HC.DEFINITIONS_TYPE_HASHES, i, HydrusData.GenerateKey() ) )
+            
+        
+        update_bytes = HydrusNetworkBinaryUpdates.DumpUpdateToNetworkBytes( definitions_update, HydrusNetwork.UPDATE_FORMAT_BINARY )
+        
+        with self.assertRaises( HydrusExceptions.DataMissing ):
+            
+            HydrusNetworkBinaryUpdates.CreateUpdateFromNetworkBytes( update_bytes[ : len( update_bytes ) // 2 ] )
+            
+        
+        with self.assertRaises( HydrusExceptions.DataMissing ):
+            
+            HydrusNetworkBinaryUpdates.DumpUpdateToNetworkBytes( HydrusSerialisable.SerialisableList(), HydrusNetwork.UPDATE_FORMAT_BINARY )
+            
+        
+    
+
+class TestRepositoryUpdatePrefetch( unittest.TestCase ):
+    
+    def _AddUpdateFile( self, update_network_bytes, mime ):
+        
+        update_hash = hashlib.sha256( update_network_bytes ).digest()
+        
+        ( os_file_handle, temp_path ) = HydrusTemp.GetTempPath()
+        
+        try:
+            
+            with open( temp_path, 'wb' ) as f:
+                
+                f.write( update_network_bytes )
+                
+            
+            TG.test_controller.client_files_manager.AddFile( update_hash, mime, temp_path )
+            
+        finally:
+            
+            HydrusTemp.CleanUpTempPath( os_file_handle, temp_path )
+            
+        
+        return update_hash
+        
+    
+    def test_prefetch( self ):
+        
+        definitions_update = HydrusNetwork.DefinitionsUpdate()
+        
+        for i in range( 1, 100 ):
+            
+            definitions_update.AddRow( ( HC.DEFINITIONS_TYPE_HASHES, i, HydrusData.GenerateKey() ) )
+            definitions_update.AddRow( ( HC.DEFINITIONS_TYPE_TAGS, i, 'character:samus aran ' + str( i ) ) )
+            
+        
+        content_update = HydrusNetwork.ContentUpdate()
+        
+        content_update.AddRow( ( HC.CONTENT_TYPE_MAPPINGS, HC.CONTENT_UPDATE_ADD, ( 1, list( range( 1, 121 ) ) ) ) )
+        content_update.AddRow( ( HC.CONTENT_TYPE_TAG_SIBLINGS, HC.CONTENT_UPDATE_ADD, ( 2, 3 ) ) )
+        
+        definitions_hash = self._AddUpdateFile( definitions_update.DumpToNetworkBytes(), HC.APPLICATION_HYDRUS_UPDATE_DEFINITIONS )
+        binary_definitions_hash = self._AddUpdateFile( HydrusNetworkBinaryUpdates.DumpUpdateToBinaryBytes( definitions_update ), HC.APPLICATION_HYDRUS_UPDATE_DEFINITIONS )
+        content_hash = self._AddUpdateFile( content_update.DumpToNetworkBytes(), HC.APPLICATION_HYDRUS_UPDATE_CONTENT )
+        
+        jobs = [
+            ( definitions_hash, HC.APPLICATION_HYDRUS_UPDATE_DEFINITIONS, ( HC.CONTENT_TYPE_DEFINITIONS, ) ),
+            ( binary_definitions_hash, HC.APPLICATION_HYDRUS_UPDATE_DEFINITIONS, ( HC.CONTENT_TYPE_DEFINITIONS, ) ),
+            ( content_hash, HC.APPLICATION_HYDRUS_UPDATE_CONTENT, ( HC.CONTENT_TYPE_MAPPINGS, ) ),
+            ( HydrusData.GenerateKey(), HC.APPLICATION_HYDRUS_UPDATE_CONTENT, ( HC.CONTENT_TYPE_MAPPINGS, ) )
+        ]
+        
+        for num_to_prefetch in ( 0, 2 ):
+            
+            prefetcher = ClientServices.RepositoryUpdatePrefetcher( jobs, num_to_prefetch )
+            
+            try:
+                
+                for i in range( 2 ):
+                    
+                    ( num_rows, iterator_dict ) = prefetcher.GetNext()
+                    
+                    self.assertEqual( num_rows, 198 )
+                    self.assertEqual( dict( iterator_dict[ 'service_hash_ids_to_hashes' ] ), definitions_update.GetHashIdsToHashes() )
+                    self.assertEqual( dict( iterator_dict[ 'service_tag_ids_to_tags' ] ), definitions_update.GetTagIdsToTags() )
+                    
+                
+                ( num_rows, iterator_dict ) = prefetcher.GetNext()
+                
+                self.assertEqual( num_rows, 120 )
+                self.assertEqual( set( iterator_dict.keys() ), { 'new_mappings', 'deleted_mappings' } )
+                
+                # mappings come smoothed into small chunks
+                self.assertEqual( [ len( hash_ids ) for ( tag_id, hash_ids ) in iterator_dict[ 'new_mappings' ] ], [ 50, 50, 20 ] )
+                self.assertEqual( list( iterator_dict[ 'deleted_mappings' ] ), [] )
+                
+                with self.assertRaises( HydrusExceptions.FileMissingException ):
+                    
+                    prefetcher.GetNext()
+                    
+                
+            finally:
+                
+                prefetcher.Shutdown()
+                
+            
+        
+    
+    def test_decode_ahead( self ):
+        
+        num_pulled = [ 0 ]
+        
+        def source():
+            
+            for i in range( 10000 ):
+                
+                num_pulled[0] += 1
+                
+                yield i
+                
+            
+        
+        cancel_event = threading.Event()
+        
+        decode_ahead_iterator = ClientServices.DecodeAheadIterator( source(), cancel_event )
+        
+        fill_results = []
+        
+        fill_thread = threading.Thread( target = lambda: fill_results.append( decode_ahead_iterator.Fill() ), daemon = True )
+        
+        fill_thread.start()
+        
+        time.sleep( 0.2 )
+        
+        # the worker only gets a few chunks ahead of us
+        
+        self.assertLessEqual( num_pulled[0], ( ClientServices.DECODE_AHEAD_MAX_CHUNKS + 1 ) * ClientServices.DECODE_AHEAD_CHUNK_SIZE )
+        
+        self.assertEqual( list( decode_ahead_iterator ), list( range( 10000 ) ) )
+        
+        fill_thread.join( 5 )
+        
+        self.assertEqual( fill_results, [ True ] )
+        
+        # and a cancel lets a worker go, even if nobody is reading
+        
+        cancel_event = threading.Event()
+        
+        decode_ahead_iterator = ClientServices.DecodeAheadIterator( iter( range( 10000 ) ), cancel_event )
+        
+        fill_results = []
+        
+        fill_thread = threading.Thread( target = lambda: fill_results.append( decode_ahead_iterator.Fill() ), daemon = True )
+        
+        fill_thread.start()
+        
+        cancel_event.set()
+        
+        fill_thread.join( 5 )
+        
+        self.assertEqual( fill_results, [ False ] )
+        
+    
+
 class TestServer( unittest.TestCase ):
     
     _access_key: bytes = HydrusData.GenerateKey()
@@ -4,9 +4,14 @@
 # You just DO WHAT THE FUCK YOU WANT TO.
 # https://github.com/sirkris/WTFPL/blob/master/WTFPL.md
 
+import multiprocessing
+
 from hydrus import hydrus_client_boot
 
 if __name__ == '__main__':
     
+    # the file import worker pool spawns processes, which needs this in frozen builds
+    multiprocessing.freeze_support()
+    
     hydrus_client_boot.boot()
     